@@ -1,14 +1,28 @@
 from aws_cdk import (
     Stack,  # resource stack
+    Annotations,  # synth-time warnings
+    ArnFormat,
     RemovalPolicy,
     aws_s3 as s3,  # S3 bucket
     aws_dynamodb as dynamodb,  # DynamoDB table
     aws_lambda as _lambda,  # Lambda function, distinguished from python lambda keyword by underscore
     aws_iam as iam,  # IAM for permissions
     Duration,  # time duration
+    CfnOutput,  # stack outputs
+    aws_ssm as ssm,  # SSM Parameter Store
     aws_s3_notifications as s3n,  # S3 notifications (to trigger Lambda on S3 events)
+    aws_sns as sns,  # SNS topic for status push notifications
+    aws_lambda_event_sources as event_sources,  # DynamoDB stream -> Lambda
+    aws_events as events,  # scheduled rules
+    aws_events_targets as targets,
 )
 from constructs import Construct  # base construct class
+from docuflow.parameters import BUCKET_NAME_PARAMETER, TABLE_NAME_PARAMETER, parameter_name
+
+
+def context_flag(value):
+    """On/off context value: -c name=true on the CLI arrives as the string "true"."""
+    return str(value).strip().lower() in ("1", "true", "yes")
 
 
 class DocuflowStack(Stack):  # define stack for Docuflow application
@@ -18,6 +32,15 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
     ) -> None:  # initialize stack for resources, eg S3, DynamoDB.
         super().__init__(scope, construct_id, **kwargs)
 
+        # The Streamlit URL, the only origin allowed to post to the bucket from a browser
+        frontend_origin = self.node.try_get_context("frontend_origin")
+        if not frontend_origin:
+            Annotations.of(self).add_warning_v2(
+                "docuflow:cors-any-origin",
+                "frontend_origin is not set, so any web page can post uploads to the documents "
+                "bucket. Deploy with: cdk deploy -c frontend_origin=https://<your Streamlit URL>",
+            )
+
         # 1. S3 Bucket
         docs_bucket = s3.Bucket(  # new instance of S3 Bucket
             self,
@@ -25,8 +48,30 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
             versioned=True,  # Enable versioning for documents, helps in tracking changes
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
+            lifecycle_rules=[
+                # parts of multipart copies left behind by a routing run that was cut short
+                s3.LifecycleRule(abort_incomplete_multipart_upload_after=Duration.days(1)),
+                # every routed file leaves its upload behind as a noncurrent version (and a delete marker)
+                s3.LifecycleRule(
+                    prefix="uploads/",
+                    noncurrent_version_expiration=Duration.days(7),
+                    expired_object_delete_marker=True,
+                ),
+            ],
+            # the Upload page posts files straight from the browser (presigned POST)
+            cors=[
+                s3.CorsRule(
+                    allowed_methods=[s3.HttpMethods.POST],
+                    allowed_origins=[frontend_origin or "*"],  # warned about above when open
+                    allowed_headers=["*"],
+                )
+            ],
         )
 
+        # Optional push path for status changes (cdk deploy -c status_push=true),
+        # without it the frontend polls the in-flight files with BatchGetItem.
+        status_push = context_flag(self.node.try_get_context("status_push"))
+
         # 2. DynamoDB Table
         table = dynamodb.Table(
             self,
@@ -37,6 +82,10 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,  # pay only for what you use, no need to pre-provision read/write capacity
             removal_policy=RemovalPolicy.DESTROY,  # for development purposes. In production, consider using RETAIN.
+            time_to_live_attribute="expires_at",  # tombstones of deleted files expire automatically
+            stream=(
+                dynamodb.StreamViewType.NEW_AND_OLD_IMAGES if status_push else None
+            ),  # old and new image, so a status transition can be detected
         )
 
         # Add GSI(Global Secondary Index) for Category Search （全局二级索引）
@@ -50,6 +99,43 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
             projection_type=dynamodb.ProjectionType.ALL,  # include all attributes in the index when querying
         )
 
+        # One GSI per level of the category path (category_l1 = "CS", category_l2 = "CS/AI", ...),
+        # so every node of the sidebar tree is a single Query. Only the listed columns are projected.
+        # DynamoDB creates one GSI per table update: a table deployed without them gets them
+        # one deploy at a time, cdk deploy -c category_index_levels=1, then =2, then 3 (README).
+        category_index_levels = self.node.try_get_context("category_index_levels")
+        category_index_levels = 3 if category_index_levels is None else int(category_index_levels)
+        for level in range(1, category_index_levels + 1):
+            table.add_global_secondary_index(
+                index_name=f"category-l{level}-index",
+                partition_key=dynamodb.Attribute(
+                    name=f"category_l{level}",
+                    type=dynamodb.AttributeType.STRING,
+                ),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=[
+                    "original_file_name",
+                    "status",
+                    "ai_summary",
+                    "upload_timestamp",
+                ],
+            )
+
+        # Sparse GSI used as a change feed: only items stamped with sync_shard/updated_at are indexed.
+        # The frontend queries "updated_at > last sync token" instead of rescanning the table.
+        table.add_global_secondary_index(
+            index_name="updated-index",
+            partition_key=dynamodb.Attribute(
+                name="sync_shard",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="updated_at",
+                type=dynamodb.AttributeType.NUMBER,  # monotonic change sequence
+            ),
+            projection_type=dynamodb.ProjectionType.ALL,
+        )
+
         # 3. Define Lambda Function
         process_doc_lambda = _lambda.Function(
             self,
@@ -74,7 +160,8 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
             s3n.LambdaDestination(
                 process_doc_lambda
             ),  # trigger Lambda on new object creation
-            s3.NotificationKeyFilter(suffix=".pdf"),  # only for .pdf files
+            # only for .pdf files in the inbox: routed files (processed/...) must not trigger it again
+            s3.NotificationKeyFilter(prefix="uploads/", suffix=".pdf"),
         )
 
         # Grant permissions to Lambda function
@@ -88,7 +175,114 @@ class DocuflowStack(Stack):  # define stack for Docuflow application
         # Grant Bedrock permissions
         process_doc_lambda.add_to_role_policy(
             iam.PolicyStatement(
-                actions=["bedrock:InvokeModel"],
+                actions=[
+                    "bedrock:InvokeModel",
+                    "bedrock:InvokeModelWithResponseStream",  # streamed replies, stopped early
+                ],
                 resources=["*"],  # For development, allow all models
             )
         )
+
+        # Extractions that outlive one invocation go on in a new one (process_doc.continue_later).
+        # Granted by name: the function's own ARN in its role's policy would be a dependency cycle.
+        process_doc_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    self.format_arn(
+                        service="lambda",
+                        resource="function",
+                        resource_name=f"{self.stack_name}-ProcessDocFunction*",
+                        arn_format=ArnFormat.COLON_RESOURCE_NAME,
+                    )
+                ],
+            )
+        )
+
+        # Archives (ZIP/TAR of PDFs) uploaded under archives/ are unpacked into uploads/,
+        # where each PDF triggers ProcessDocFunction like a file uploaded on its own
+        ingest_archive_lambda = _lambda.Function(
+            self,
+            "IngestArchiveFunction",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler="ingest_archive.handler",
+            code=_lambda.Code.from_asset("lambda"),
+            timeout=Duration.minutes(15),  # a run cut short resumes from its progress item
+            memory_size=1536,  # up to MAX_IN_FLIGHT_BYTES buffered, and more network throughput
+            environment={
+                "TABLE_NAME": table.table_name,
+                "BUCKET_NAME": docs_bucket.bucket_name,
+            },
+        )
+        for suffix in (".zip", ".tar", ".tgz", ".tar.gz", ".tar.bz2"):  # one suffix per filter
+            docs_bucket.add_event_notification(
+                s3.EventType.OBJECT_CREATED,
+                s3n.LambdaDestination(ingest_archive_lambda),
+                s3.NotificationKeyFilter(prefix="archives/", suffix=suffix),
+            )
+        docs_bucket.grant_read(ingest_archive_lambda, "archives/*")
+        docs_bucket.grant_put(ingest_archive_lambda, "uploads/*")
+        table.grant_read_write_data(ingest_archive_lambda)  # the __archive__#<id> progress items
+
+        # Service role of Bedrock batch inference jobs (scripts/batch_reprocess.py):
+        # reads the packed prompts and writes the results under batch/ in the bucket
+        batch_role = iam.Role(
+            self,
+            "BatchInferenceRole",
+            assumed_by=iam.ServicePrincipal("bedrock.amazonaws.com"),
+        )
+        docs_bucket.grant_read_write(batch_role, "batch/*")
+        CfnOutput(self, "BatchInferenceRoleArn", value=batch_role.role_arn)
+
+        # Sweep of the files deferred while Bedrock was throttling (status DEFERRED)
+        events.Rule(
+            self,
+            "RetryDeferredSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(10)),
+            targets=[
+                targets.LambdaFunction(
+                    process_doc_lambda,
+                    event=events.RuleTargetInput.from_object({"retry_deferred": True}),
+                )
+            ],
+        )
+
+        # Status push: table stream -> Lambda -> SNS topic, one message per status transition
+        if status_push:
+            status_topic = sns.Topic(self, "StatusTopic")
+            status_stream_lambda = _lambda.Function(
+                self,
+                "StatusStreamFunction",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="status_stream.handler",
+                code=_lambda.Code.from_asset("lambda"),
+                timeout=Duration.seconds(30),
+                environment={"TOPIC_ARN": status_topic.topic_arn},
+            )
+            status_stream_lambda.add_event_source(
+                event_sources.DynamoEventSource(
+                    table,
+                    starting_position=_lambda.StartingPosition.LATEST,
+                    batch_size=100,
+                    retry_attempts=3,
+                )
+            )
+            status_topic.grant_publish(status_stream_lambda)
+            CfnOutput(self, "StatusTopicArn", value=status_topic.topic_arn)
+
+        # Publish resource names so the frontend can resolve them in one call
+        # instead of listing every table and bucket in the account (one set per stack).
+        ssm.StringParameter(
+            self,
+            "TableNameParameter",
+            parameter_name=parameter_name(self.stack_name, TABLE_NAME_PARAMETER),
+            string_value=table.table_name,
+        )
+        ssm.StringParameter(
+            self,
+            "BucketNameParameter",
+            parameter_name=parameter_name(self.stack_name, BUCKET_NAME_PARAMETER),
+            string_value=docs_bucket.bucket_name,
+        )
+        CfnOutput(self, "TableName", value=table.table_name)
+        CfnOutput(self, "BucketName", value=docs_bucket.bucket_name)
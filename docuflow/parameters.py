@@ -0,0 +1,12 @@
+# SSM parameters under which DocuflowStack publishes the names of its resources.
+# They are namespaced by stack name, so a second stack (another stage, a test
+# deployment) never reads the first one's table or bucket. No CDK imports: the
+# frontend resolves the same names (frontend/utils/resources.py).
+SSM_ROOT = "/docuflow"
+TABLE_NAME_PARAMETER = "table-name"
+BUCKET_NAME_PARAMETER = "bucket-name"
+
+
+def parameter_name(stack_name, parameter):
+    """eg: /docuflow/DocuflowStack/table-name"""
+    return f"{SSM_ROOT}/{stack_name}/{parameter}"
@@ -6,6 +6,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import streamlit as st
 from utils import auth
 from utils import db
+from utils import frames
+from utils import paging
+from utils import sidebar
 import pandas as pd
 
 
@@ -21,15 +24,6 @@ import pandas as pd
 # ]
 
 
-def get_tags(row):
-    """Helper function to extract tags from ai_summary field."""
-    ai_summary = row.get("ai_summary", {})
-    tags = ai_summary.get("tags", [])
-    return (
-        ", ".join(tags) if tags else "N/A"
-    )  # return comma-separated tags or N/A eg: #AI, #ML
-
-
 # 1. Page Configuration(must be at the top)
 st.set_page_config(page_title="Dashboard - Docuflow")
 
@@ -37,26 +31,48 @@ st.set_page_config(page_title="Dashboard - Docuflow")
 auth.require_login()
 
 # 3. fetch data from DynamoDB
-files = db.get_all_files()
-if not files:
+# aggregate counters for the summary tiles and the sidebar, a single BatchGetItem
+stats = db.get_counters()
+selected_category = sidebar.render_category_sidebar(stats["category"])
+if selected_category:
+    # only the documents under the selected node, through the category GSIs
+    df = frames.build_frame(db.query_category(selected_category, db.DASHBOARD_COLUMNS))
+else:
+    # shared frame, built once and patched with the changed rows on later reruns
+    df = db.get_files_frame()
+if df.empty:
     st.info("No files found in the database.")
     st.stop()  # Stop execution if no files found
 
-# Convert to DataFrame for better display
-df = pd.DataFrame(files)  # convert list of dicts to DataFrame
 st.title("Document Dashboard")
 
-# 1. Clean up DataFrame for display
-df["Tags"] = df.apply(get_tags, axis=1)  # extract tags for each row
+# Summary tiles, rendered from the counters (no scan, no DataFrame)
+status_counts = stats["status"]
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Total", sum(status_counts.values()))
+col2.metric("Auto-tagged", status_counts.get("AUTO_TAGGED", 0))
+col3.metric("Needs Review", status_counts.get("NEEDS_REVIEW", 0))
+col4.metric("Reviewed", status_counts.get("REVIEWED", 0))
+if stats["day"]:
+    uploads_per_day = pd.Series(stats["day"], name="Uploads").sort_index().tail(30)
+    st.bar_chart(uploads_per_day, height=160)
 
-# 2. select and rename columns
-display_df = df[["original_file_name", "status", "Tags", "upload_timestamp"]].copy()
+# 1. search, filter, sort and page on the server, the browser only gets the current page
+page_df, page_stats = paging.render_table_controls(
+    df,
+    key="dashboard",
+    sort_options={
+        "Uploaded At": "uploaded_at",
+        "File Name": "file_name",
+        "Status": "status",
+    },
+    search_columns=("file_name", "tags_text"),
+)
+# select and rename columns (tags and timestamps are already prepared in the frame)
+display_df = page_df[["original_file_name", "status", "tags_text", "uploaded_at"]].copy()
 display_df.columns = ["File Name", "Status", "Tags", "Uploaded At"]
 
-# Convert 'Uploaded At' to datetime objects to match column config
-display_df["Uploaded At"] = pd.to_datetime(display_df["Uploaded At"])
-
-# 3. use data_editor to display the advanced table
+# 2. use data_editor to display the advanced table
 st.data_editor(
     display_df,
     column_config={
@@ -64,7 +80,9 @@ st.data_editor(
             "Status",
             options=[
                 "UPLOADED",
+                "QUEUED",
                 "PROCESSING",
+                "DEFERRED",
                 "AUTO_TAGGED",
                 "MANUAL_TAGGED",
                 "ERROR",
@@ -86,4 +104,9 @@ st.data_editor(
     disabled=True,  # make the table read-only temporarily
 )
 
-st.caption(f"Total Documents: {len(files)}")
+paging.render_page_stats(page_stats, display_df)
+sync = db.get_sync_stats()
+if sync:
+    st.caption(
+        f"Last sync: {sync['mode']}, {sync['items_read']} items read, {sync['rcu']:.1f} RCU"
+    )
@@ -1,42 +1,214 @@
 import sys
 import os
 import streamlit as st
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Ensure the utils module is in the path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from utils import auth, s3
+from utils import auth, db, s3
+from utils.direct_upload import direct_upload
 
 st.set_page_config(page_title="Upload Document - Docuflow")
 
 # 1. Require Login
 auth.require_login()
 
-st.title("Upload Document")
+st.title("Upload Documents")
 st.markdown(
     "Upload your documents to Docuflow for AI-powered metadata extraction and management."
 )
 
-# 2. File Upload Section
-uploaded_file = st.file_uploader("Choose a pdf file", type="pdf")
-
-if uploaded_file:
-    # display file details
-    st.write(f"Filename: {uploaded_file.name}")
-
-    # Upload button
-    if st.button("Upload to Cloud", type="primary"):
-        with st.spinner("Uploading file to S3..."):
-            # Generate a unique file ID for storage
-            file_uuid = str(uuid.uuid4())
-            original_filename = uploaded_file.name
-            # build S# Key as <uuid>_<original_filename>
-            s3_key = f"uploads/{file_uuid}_{original_filename}"
-
-            # execute upload
-            if s3.upload_file_to_s3(uploaded_file, s3_key):  # if upload successful
-                st.success("File uploaded successfully!")
-                st.info(f"File {s3_key}. Processing started...")
-                st.markdown("Go to **Dashboard** to check the status.")
-            else:
-                st.error("File upload failed. Please try again.")
+# Statuses after which the pipeline won't touch a file again
+TERMINAL_STATUSES = {"AUTO_TAGGED", "NEEDS_REVIEW", "ERROR", "DELETED"}
+ARCHIVE_TERMINAL_STATUSES = {"DONE", "FAILED"}
+POLL_MIN_SECONDS = 2  # first poll, and again after every change
+POLL_MAX_SECONDS = 30  # backoff ceiling while nothing changes
+
+# {file_id: {"name", "status"}} for the files uploaded in this session
+if "upload_status" not in st.session_state:
+    st.session_state.upload_status = {}
+if "status_poll" not in st.session_state:
+    st.session_state.status_poll = {"next_at": 0.0, "interval": POLL_MIN_SECONDS}
+# {archive_id: {"name", "progress"}} for the archives uploaded in this session
+if "archive_status" not in st.session_state:
+    st.session_state.archive_status = {}
+
+
+def track_uploads(results):
+    """Start following the files of a finished upload batch."""
+    new_ids = False
+    for r in results:
+        if r["ok"] and r["file_id"] not in st.session_state.upload_status:
+            st.session_state.upload_status[r["file_id"]] = {
+                "name": r["file_name"],
+                "status": "UPLOADED",
+            }
+            new_ids = True
+    if new_ids:  # poll soon for the new files
+        st.session_state.status_poll = {
+            "next_at": time.time() + POLL_MIN_SECONDS,
+            "interval": POLL_MIN_SECONDS,
+        }
+
+
+@st.fragment(run_every=1)
+def status_panel():
+    """Processing status of this session's uploads. Only in-flight files are read
+    (BatchGetItem on file_id/status), with exponential backoff while nothing changes."""
+    tracked = st.session_state.upload_status
+    if not tracked:
+        return
+
+    poll = st.session_state.status_poll
+    in_flight = [
+        file_id
+        for file_id, entry in tracked.items()
+        if entry["status"] not in TERMINAL_STATUSES
+    ]
+    if in_flight and time.time() >= poll["next_at"]:
+        statuses = db.get_statuses(in_flight)
+        changed = False
+        for file_id, status in statuses.items():
+            if status and status != tracked[file_id]["status"]:
+                tracked[file_id]["status"] = status
+                changed = True
+        # back off while the pipeline is busy, poll quickly again after a change
+        interval = (
+            POLL_MIN_SECONDS if changed else min(poll["interval"] * 2, POLL_MAX_SECONDS)
+        )
+        st.session_state.status_poll = {
+            "next_at": time.time() + interval,
+            "interval": interval,
+        }
+
+    st.subheader("Processing status")
+    st.dataframe(
+        [
+            {"File": entry["name"], "Status": entry["status"]}
+            for entry in tracked.values()
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
+    remaining = sum(
+        entry["status"] not in TERMINAL_STATUSES for entry in tracked.values()
+    )
+    if remaining:
+        st.caption(f"{remaining} file(s) still processing, this list updates itself.")
+    else:
+        st.caption("All files processed. Open the **Review** page to check the results.")
+
+
+@st.fragment(run_every=POLL_MIN_SECONDS)
+def archive_panel():
+    """Unpacking progress of this session's archives (their __archive__#<id> items)."""
+    tracked = st.session_state.archive_status
+    if not tracked:
+        return
+
+    running = [
+        archive_id
+        for archive_id, entry in tracked.items()
+        if entry["progress"].get("status") not in ARCHIVE_TERMINAL_STATUSES
+    ]
+    if running:
+        for archive_id, progress in db.get_archive_progress(running).items():
+            tracked[archive_id]["progress"] = progress
+
+    st.subheader("Archives")
+    rows = []
+    for entry in tracked.values():
+        progress = entry["progress"]
+        rows.append(
+            {
+                "Archive": entry["name"],
+                "Status": progress.get("status", "UPLOADED"),
+                "PDFs uploaded": int(progress.get("members_uploaded", 0)),
+                "Other files skipped": int(progress.get("members_skipped", 0)),
+                "MB": round(int(progress.get("bytes_uploaded", 0)) / 1024**2, 1),
+                "Files/s": float(progress.get("files_per_second", 0)),
+                "Message": progress.get("message", ""),
+            }
+        )
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    if running:
+        st.caption("Every PDF unpacked is processed like a file uploaded on its own.")
+
+
+# 2. Direct upload: the browser sends the files straight to S3 (presigned POST),
+# several in parallel, so nothing goes through this server.
+results = direct_upload(max_parallel=4)
+
+if results:
+    uploaded = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    if uploaded:
+        st.success(f"{len(uploaded)} file(s) uploaded successfully! Processing started...")
+        track_uploads(uploaded)
+    if failed:
+        st.error(
+            "Upload failed for: " + ", ".join(r["file_name"] for r in failed)
+            + ". Please try again."
+        )
+
+# 3. Archives: a ZIP/TAR of PDFs goes to S3 as is and is unpacked there (lambda/ingest_archive.py)
+with st.expander("Upload an archive of PDFs (.zip, .tar, .tar.gz, .tgz, .tar.bz2)"):
+    archive_results = direct_upload(
+        max_parallel=2,
+        key="archive_upload",
+        prefix=s3.ARCHIVE_PREFIX,
+        extensions=s3.ARCHIVE_EXTENSIONS,
+    )
+    if archive_results:
+        for r in archive_results:
+            # the archive_id is the uuid part of the key, like a file_id
+            if r["ok"] and r["file_id"] not in st.session_state.archive_status:
+                st.session_state.archive_status[r["file_id"]] = {
+                    "name": r["file_name"],
+                    "progress": {},
+                }
+        failed = [r["file_name"] for r in archive_results if not r["ok"]]
+        if failed:
+            st.error("Upload failed for: " + ", ".join(failed) + ". Please try again.")
+
+# 4. Fallback: upload through the server (eg: when the bucket CORS rules don't allow this origin)
+with st.expander("Upload through the server instead"):
+    uploaded_files = st.file_uploader(
+        "Choose pdf files", type="pdf", accept_multiple_files=True
+    )
+
+    if uploaded_files and st.button("Upload to Cloud", type="primary"):
+        with st.spinner(f"Uploading {len(uploaded_files)} file(s) to S3..."):
+            # build S3 Key as <uuid>_<original_filename> (unique and immutable)
+            s3_keys = [
+                f"{s3.UPLOAD_PREFIX}{uuid.uuid4()}_{uploaded_file.name}"
+                for uploaded_file in uploaded_files
+            ]
+            s3.get_bucket_name()  # resolve (and cache) the bucket before fanning out
+            # execute uploads in parallel (the S3 client is thread-safe)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                successes = list(
+                    executor.map(s3.upload_file_to_s3, uploaded_files, s3_keys)
+                )
+
+        # the file_id is the uuid part of the key (same as the Lambda derives it)
+        track_uploads(
+            [
+                {
+                    "file_id": key[len(s3.UPLOAD_PREFIX) :].split("_", 1)[0],
+                    "file_name": uploaded_file.name,
+                    "ok": ok,
+                }
+                for uploaded_file, key, ok in zip(uploaded_files, s3_keys, successes)
+            ]
+        )
+        if all(successes):
+            st.success(f"{len(s3_keys)} file(s) uploaded successfully!")
+        else:
+            st.error("Some uploads failed. Please try again.")
+
+# 5. Live status of this session's uploads
+archive_panel()
+status_panel()
@@ -1,13 +1,11 @@
 import sys
 import os
 import streamlit as st
-import pandas as pd
-import time
 
 
 # Ensure the utils module is in the path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from utils import auth, db, embedding
+from utils import auth, bulk, db, embedding, jobs, knn, paging
 
 # Page Configuration(must be at the top)
 st.set_page_config(page_title="Review - Docuflow")
@@ -19,39 +17,145 @@ st.markdown(
     "Review the AI-extracted metadata for your documents. You can edit tags and summaries as needed."
 )
 
+# Result of the last save/delete, kept across the rerun that refreshed the page
+if "review_message" in st.session_state:
+    st.success(st.session_state.pop("review_message"))
+
 # 1. Display
 # fetch data from DynamoDB
-files = db.get_all_files()
-if not files:
+# shared frame (file name, tags, summary, category already extracted), built once
+# and patched with the changed rows on later reruns
+df = db.get_files_frame()
+if df.empty:
     st.info("No files found in the database.")
     st.stop()  # Stop execution if no files found
 
-# clean up data
-for file in files:
-    details = db.get_file_details(file)
-    file.update(details)
+target_columns = ["file_name", "tags", "summary", "category", "status", "embedding"]
+# search, filter, sort and page on the server, only the current page is sent to the browser
+page_df, page_stats = paging.render_table_controls(
+    df,
+    key="review",
+    sort_options={
+        "Uploaded At": "uploaded_at",
+        "File Name": "file_name",
+        "Status": "status",
+        "Category": "category",
+    },
+    search_columns=("file_name", "tags_text", "summary", "category"),
+)
+# a checkbox column to pick files for the bulk actions below
+table_df = page_df[["file_id", "file_name", "tags", "summary", "category", "status"]].copy()
+# embedding state of each row: pending while a background job runs
+table_df["embedding"] = page_df["embedding_status"].fillna("N/A")
+table_df.insert(0, "Select", False)
+edited_df = st.data_editor(
+    table_df,
+    column_config={
+        "Select": st.column_config.CheckboxColumn("Select", width="small"),
+        "file_id": None,  # hidden, only used to map the selection back
+    },
+    disabled=target_columns,
+    hide_index=True,
+    key=page_stats["view_key"],  # a new page starts with nothing selected
+)
+paging.render_page_stats(page_stats, table_df)
+selected_ids = edited_df.loc[edited_df["Select"], "file_id"].tolist()
+
+
+def split_tags(text):
+    return [tag.strip() for tag in text.split(",") if tag.strip()]
+
+
+def show_bulk_report(action, report):
+    """Show the throughput of a bulk action and any files it couldn't handle."""
+    count = report.get("updated", report.get("deleted", 0))
+    st.success(
+        f"{action} {count} file(s) in {report['seconds']:.1f}s "
+        f"({report['files_per_second']:.1f} files/s)."
+    )
+    if report["failed"]:
+        st.warning(f"{len(report['failed'])} file(s) failed, try again: {', '.join(report['failed'])}")
+    if report["missing"]:
+        st.warning(
+            f"{len(report['missing'])} file(s) no longer exist (deleted meanwhile?): {', '.join(report['missing'])}"
+        )
+
+
+# 1.1 Bulk actions on the selected files
+if selected_ids:
+    with st.expander(f"Bulk actions ({len(selected_ids)} selected)", expanded=True):
+        with st.form(key="bulk_form"):
+            add_tags = st.text_input("Add tags (comma-separated)")
+            remove_tags = st.text_input("Remove tags (comma-separated)")
+            set_category = st.text_input("Set category (leave empty to keep)")
+            apply_button = st.form_submit_button(label="Apply to Selected")
+            confirm_delete = st.checkbox("Yes, delete the selected files")
+            bulk_delete_button = st.form_submit_button(
+                label="Delete Selected", type="primary"
+            )
+
+        if apply_button:
+            selected_rows = df.loc[selected_ids, ["file_name", "tags", "ai_summary"]]
+            updates_by_id = {}
+            texts_to_embed = {}
+            for file_id, file_name, file_tags, file_summary in selected_rows.itertuples():
+                tags = [t for t in file_tags if t not in split_tags(remove_tags)]
+                tags += [t for t in split_tags(add_tags) if t not in tags]
+                ai_summary = dict(file_summary or {}, tags=tags)
+                if set_category.strip():
+                    ai_summary["category"] = set_category.strip()
+                updates_by_id[file_id] = {"ai_summary": ai_summary}
+                # the stored vector was computed from the old tags: flag it in the same write
+                if tags != list(file_tags) or ai_summary.get("category") != (file_summary or {}).get("category"):
+                    text_to_embed = embedding.document_text(file_name, ai_summary.get("summary", ""), tags)
+                    updates_by_id[file_id].update(jobs.pending_embedding(text_to_embed))
+                    texts_to_embed[file_id] = text_to_embed
+
+            progress_bar = st.progress(0.0, text="Updating files...")
+            report = bulk.bulk_update_files(updates_by_id, progress_bar.progress)
+            for file_id, text_to_embed in texts_to_embed.items():
+                if file_id not in report["failed"] and file_id not in report["missing"]:
+                    jobs.start_embedding(file_id, text_to_embed)
+            show_bulk_report("Updated", report)
+
+        if bulk_delete_button:
+            if not confirm_delete:
+                st.warning("Please confirm the deletion first.")
+            else:
+                progress_bar = st.progress(0.0, text="Deleting files...")
+                show_bulk_report("Deleted", bulk.bulk_delete_files(selected_ids, progress_bar.progress))
 
-# Convert to DataFrame for better display
-df = pd.DataFrame(files)  # convert list of dicts to DataFrame
-# extract tags and summaries for each row
-target_columns = ["file_name", "tags", "summary", "category", "status"]
-st.dataframe(df[target_columns])
+# Watch the embedding jobs started by this server, refresh once they are done
+embedding_queue = jobs.get_embedding_queue()
+jobs.recover_embeddings()  # jobs lost with a restart of this or another server
+watched_ids = [
+    file_id
+    for file_id in df.index[df["embedding_status"] == "PENDING"]
+    if embedding_queue.is_pending(file_id)
+]
+if watched_ids:
+
+    @st.fragment(run_every=2)
+    def watch_embeddings():
+        still_pending = [fid for fid in watched_ids if embedding_queue.is_pending(fid)]
+        if not still_pending:
+            st.rerun()  # the jobs wrote their results, the next sync fetches only those rows
+        st.caption(f"Embedding pending for {len(still_pending)} file(s)...")
+
+    watch_embeddings()
 
 st.divider()
 
 # 2. Select
-# prepare a dictionary
-file_options = {f["file_id"]: f["file_name"] for f in files}
-
-# create a dropdown to select a file
-selected_file_id = st.selectbox(
-    "Select a file to review/edit metadata:",
-    options=list(file_options.keys()),  # select by file_id
-    format_func=lambda x: file_options[x],  # display file name instead of file_id
+# searchable dropdown, options are built for the matches of the search only
+selected_file_id = paging.searchable_select(
+    "Select a file to review/edit metadata:", df, key="review_file"
 )
 
 # 3. Edit
-selected_file = next((f for f in files if f["file_id"] == selected_file_id), None)
+selected_file = (
+    df.loc[selected_file_id].to_dict() if selected_file_id in df.index else None
+)
 
 if selected_file:
     with st.form(key="edit_form"):
@@ -80,40 +184,85 @@ if selected_file:
                 "category": new_category,
             }
 
-            # --- Generate Embedding ---
-            with st.spinner("Generating new embeddings..."):
-                # Combine text for embedding: Title + Summary + Tags
-                # This provides a rich context for semantic search
-                text_to_embed = f"{selected_file.get('file_name', '')}\n{new_summary}\n{' '.join(updated_tags)}"
-                new_embedding = embedding.generate_embedding(text_to_embed)
-
-            if new_embedding:
-                # call db function to update the item
-                # Update ai_summary, status, and embedding all at once
-                updates = {
-                    "ai_summary": updated_ai_summary,
-                    "status": "REVIEWED",
-                    "embedding": new_embedding,
-                }
-                success = db.update_file_metadata(selected_file_id, updates)
-
-                if success:
-                    st.success("Metadata updated & Embeddings generated successfully!")
-                    # delay to show the success message before refreshing
-
-                    time.sleep(1)
-                    st.rerun()  # refresh the page to show updated data
+            # --- Embedding (in the background) ---
+            # Combine text for embedding: Title + Summary + Tags
+            # This provides a rich context for semantic search
+            text_to_embed = embedding.document_text(selected_file.get("file_name", ""), new_summary, updated_tags)
+            embedding_key = embedding.cache_key(text_to_embed)
+            # re-embed when the tags, category or embedded text changed (or the last attempt failed)
+            needs_embedding = (
+                embedding_key != selected_file.get("embedding_key")
+                or new_category != selected_file.get("category")
+                or selected_file.get("embedding_status") != "READY"
+            )
+
+            # call db function to update the item, the embedding follows from a worker thread
+            updates = {
+                "ai_summary": updated_ai_summary,
+                "status": "REVIEWED",
+            }
+            if needs_embedding:
+                updates.update(jobs.pending_embedding(text_to_embed))
+            success = db.update_file_metadata(selected_file_id, updates)
+
+            if success:
+                db.patch_cached_file(selected_file_id, updates)  # show the edit without a reload
+                if needs_embedding:
+                    jobs.start_embedding(selected_file_id, text_to_embed)
+                    st.session_state.review_message = "Metadata updated! Embedding is being generated in the background."
                 else:
-                    st.error("Failed to update metadata.")
+                    st.session_state.review_message = "Metadata updated! Embedding unchanged."
+                st.rerun()  # refresh the page to show updated data
             else:
-                st.error("Failed to generate embeddings. Changes not saved.")
+                st.error("Failed to update metadata.")
 
         if delete_button:
             if db.delete_file(selected_file_id):
-                st.success("File deleted successfully.")
-                # delay to show the success message before refreshing
-
-                time.sleep(1)
+                st.session_state.review_message = "File deleted successfully."
                 st.rerun()  # refresh the page to reflect deletion
             else:
                 st.error("Failed to delete file.")
+
+# 3.1 What the model returned, fetched from S3 only when asked for
+if selected_file:
+    with st.expander("Original model output"):
+        if st.button("Load", key=f"model_output_{selected_file_id}"):
+            model_result = db.get_model_result(selected_file_id)
+            if model_result:
+                raw_reply = model_result.get("raw_reply")
+                st.json({k: v for k, v in model_result.items() if k != "raw_reply"})
+                if raw_reply:
+                    st.code(raw_reply, language="json")
+            elif model_result is not None:
+                st.caption("No model result stored for this file.")
+
+# 4. Related documents, precomputed when the embeddings were written (a single GetItem)
+if selected_file:
+    related = [
+        (file_id, score)
+        for file_id, score in knn.get_related(selected_file_id)
+        if file_id in df.index  # deleted since the list was stored
+    ]
+    with st.expander(f"Papers like this one ({len(related)})"):
+        if related:
+            st.dataframe(
+                [
+                    {
+                        "File": df.at[file_id, "file_name"],
+                        "Category": df.at[file_id, "category"],
+                        "Similarity": round(score, 3),
+                    }
+                    for file_id, score in related
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+        else:
+            st.caption("Available once the document has an embedding.")
+
+# Embedding cache effectiveness (unchanged inputs are never re-embedded)
+cache_stats = embedding.get_cache_stats()
+st.caption(
+    f"Embedding cache: {cache_stats['memory_hits']} memory hits, "
+    f"{cache_stats['persistent_hits']} persistent hits, {cache_stats['misses']} misses"
+)
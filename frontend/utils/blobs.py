@@ -0,0 +1,21 @@
+# This file reads the content-addressed blobs the Lambda stores for the bulky parts
+# of a document item (lambda/blobs.py): the item keeps a key such as ai_result_key,
+# the value is fetched from S3 only when a page asks for it. A blob never changes
+# (its key is the hash of its content), so reads are cached without expiry.
+import gzip
+import json
+import streamlit as st
+from utils import s3
+
+BLOB_PREFIX = "blobs/"
+CACHE_ENTRIES = 256  # blobs kept per server process
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def read_blob(key):
+    """Value stored under a blob key (raises ClientError, so failures are not cached)."""
+    bucket_name = s3.get_bucket_name()
+    if not bucket_name:
+        raise LookupError("Could not find the S3 bucket")
+    response = s3.get_s3_client().get_object(Bucket=bucket_name, Key=key)
+    return json.loads(gzip.decompress(response["Body"].read()))
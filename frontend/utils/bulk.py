@@ -0,0 +1,140 @@
+# This file contains the bulk operations of the Review page. Files are handled
+# in batches (BatchGetItem, S3 DeleteObjects, BatchWriteItem) or concurrently,
+# instead of one chain of round-trips per file.
+import boto3
+import logging
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import counters, db, s3
+
+UPDATE_WORKERS = 8  # concurrent UpdateItem calls for bulk edits
+
+logger = logging.getLogger(__name__)
+
+
+def report_progress(progress, fraction, text):
+    if progress:
+        progress(min(fraction, 1.0), text)
+
+
+def bulk_delete_files(file_ids, progress=None):
+    """Delete many files: S3 first (DeleteObjects, 1000 keys per call), then
+    tombstones written with BatchWriteItem (25 per call, unprocessed items are retried).
+    :param progress: Optional callback(fraction, text), eg: st.progress(...).progress
+    :return: Report dict (deleted, failed, missing, seconds, files_per_second), where
+             `missing` are the ids without a record (never existed or already deleted)
+    """
+    started = time.perf_counter()
+    table = db.get_table()
+    file_ids = list(dict.fromkeys(file_ids))  # drop duplicates, keep order
+
+    # 1. Read what we need: the S3 key, and the counted attributes for the counters
+    report_progress(progress, 0.0, "Reading file records...")
+    items, unread = db.batch_get_items(
+        table.name,
+        file_ids,
+        ("file_id", "s3_key", "status", "category", "upload_timestamp", "deleted"),
+    )
+    found = {item["file_id"]: item for item in items if not item.get("deleted")}
+    missing = [f for f in file_ids if f not in found and f not in unread]
+
+    # 2. Delete from S3 first, a file whose object is still there keeps its record (no zombie data)
+    report_progress(progress, 0.2, f"Deleting {len(found)} files from S3...")
+    keys = [item["s3_key"] for item in found.values() if item.get("s3_key")]
+    failed_keys = s3.delete_objects(keys)
+    deletable = [
+        file_id for file_id, item in found.items() if item.get("s3_key") not in failed_keys
+    ]
+    # the extraction artifacts are derived data, a failed delete only leaves an orphan
+    s3.delete_objects([key for file_id in deletable for key in s3.artifact_keys(file_id)])
+
+    # 3. Replace the records with tombstones, one sequence per tombstone
+    deleted = 0
+    if deletable:
+        first_seq = db.bump_table_version(len(deletable)) - len(deletable) + 1
+        with table.batch_writer() as batch:  # sends 25 puts per BatchWriteItem
+            for i, file_id in enumerate(deletable):
+                batch.put_item(Item=db.make_tombstone(file_id, first_seq + i))
+                deleted += 1
+                if deleted % 25 == 0:
+                    report_progress(
+                        progress,
+                        0.4 + 0.6 * deleted / len(deletable),
+                        f"Deleted {deleted}/{len(deletable)} records...",
+                    )
+
+    # 4. One counter update for the whole batch
+    db.update_counters(
+        None,
+        None,
+        counters.merge_deltas(
+            counters.counter_deltas(found[file_id], None) for file_id in deletable
+        ),
+    )
+
+    seconds = time.perf_counter() - started
+    report_progress(progress, 1.0, "Done.")
+    return {
+        "deleted": deleted,
+        "failed": unread + [f for f in found if f not in deletable],
+        "missing": missing,
+        "seconds": seconds,
+        "files_per_second": deleted / seconds if seconds else 0.0,
+    }
+
+
+def bulk_update_files(updates_by_id, progress=None):
+    """Apply per-file updates concurrently (eg: bulk tag or category edits).
+    :param updates_by_id: {file_id: updates}, same updates format as db.update_file_metadata
+    :param progress: Optional callback(fraction, text)
+    :return: Report dict (updated, failed, missing, seconds, files_per_second), where
+             `missing` are the ids without a record (never existed or deleted meanwhile)
+    """
+    started = time.perf_counter()
+    if not updates_by_id:
+        return {"updated": 0, "failed": [], "missing": [], "seconds": 0.0, "files_per_second": 0.0}
+
+    table_name = db.get_table().name
+    first_seq = db.bump_table_version(len(updates_by_id)) - len(updates_by_id) + 1
+
+    # boto3 resources are not thread-safe, every worker thread gets its own table
+    local = threading.local()
+
+    def update_one(seq, file_id, updates):
+        if not hasattr(local, "table"):
+            local.table = boto3.session.Session().resource("dynamodb").Table(table_name)
+        return db.write_update(local.table, file_id, updates, seq)
+
+    deltas = []
+    failed, missing = [], []
+    with ThreadPoolExecutor(max_workers=UPDATE_WORKERS) as executor:
+        futures = {
+            executor.submit(update_one, first_seq + i, file_id, updates): file_id
+            for i, (file_id, updates) in enumerate(updates_by_id.items())
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                deltas.append(counters.counter_deltas(*future.result()))
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    missing.append(futures[future])  # write_update never creates a record
+                else:
+                    logger.warning("Failed to update %s: %s", futures[future], e)
+                    failed.append(futures[future])
+            report_progress(
+                progress, done / len(futures), f"Updated {done}/{len(futures)} files..."
+            )
+
+    db.update_counters(None, None, counters.merge_deltas(deltas))
+
+    seconds = time.perf_counter() - started
+    updated = len(updates_by_id) - len(failed) - len(missing)
+    return {
+        "updated": updated,
+        "failed": failed,
+        "missing": missing,
+        "seconds": seconds,
+        "files_per_second": updated / seconds if seconds else 0.0,
+    }
@@ -0,0 +1,36 @@
+# This file contains the frontend helpers for the category hierarchy (eg: "CS/AI/NLP").
+# Every level of the path is stored as its own top-level attribute, so each
+# node of the category tree can be read with a GSI Query instead of a scan.
+
+# The attributes themselves (category, category_l1..l3) come from lambda/categories.py,
+# the one implementation every writer uses.
+from utils import shared  # noqa: F401  (puts lambda/ on the path)
+from categories import (  # noqa: E402
+    CATEGORY_ATTRIBUTES,
+    CATEGORY_LEVELS,
+    category_attributes,
+    normalize_category,
+)
+
+
+def category_index_for(path):
+    """Pick the GSI and key attribute that list every document under a tree node."""
+    depth = len(path.split("/"))
+    if depth <= CATEGORY_LEVELS:
+        return f"category-l{depth}-index", f"category_l{depth}"
+    return "category-index", "category"  # deeper than the indexed levels: exact match
+
+
+def build_tree(paths):
+    """Expand category paths into the sorted list of every tree node.
+    eg: ["CS/AI/NLP", "Bio"] -> ["Bio", "CS", "CS/AI", "CS/AI/NLP"]
+    """
+    nodes = set()
+    for path in paths:
+        path = normalize_category(path)
+        if not path:
+            continue
+        parts = path.split("/")
+        for depth in range(1, len(parts) + 1):
+            nodes.add("/".join(parts[:depth]))
+    return sorted(nodes)
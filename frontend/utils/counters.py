@@ -0,0 +1,14 @@
+# This file gives the frontend write paths the Dashboard aggregate counters
+# (documents by status, category and upload day). The logic is the Lambda's,
+# lambda/counters.py, imported rather than copied so the two can't drift.
+from utils import shared  # noqa: F401  (puts lambda/ on the path)
+from counters import (  # noqa: E402
+    COUNTER_PREFIX,
+    DIMENSIONS,
+    apply_deltas,
+    count_items,
+    counted_values,
+    counter_deltas,
+    counter_key,
+    merge_deltas,
+)
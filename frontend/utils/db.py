@@ -4,63 +4,597 @@ import os
 import streamlit as st
 from boto3.dynamodb.conditions import Key  # for querying
 from botocore.exceptions import ClientError
+from utils import blobs, counters, frames, resources
+from utils.categories import category_attributes, category_index_for
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from collections import deque
 
 
-# initiate DynamoDB resource
-@st.cache_resource
-def get_dynamodb_resource():
-    return boto3.resource("dynamodb")
-
-
-def get_table_name_by_prefix(prefix="DocuMetaTable"):
-    """Dynamically get the DB table name using the given prefix."""
+def get_table():
+    """Get DynamoDB table instance (name resolved once per process, see utils.resources)."""
     try:
-        client = boto3.client("dynamodb")
-        paginator = client.get_paginator("list_tables")  # paginator for listing tables
-
-        # iterate through pages of table names
-        for page in paginator.paginate():
-            for table_name in page.get("TableNames", []):
-                if prefix in table_name:
-                    return table_name
-        return None
-    except Exception as e:
-        st.error(f"Failed to get table name: {e}")
+        return resources.get_table()
+    except LookupError as e:
+        st.error(
+            f"Couldn't find the DynamoDB table ({e}). Please check your AWS connection."
+        )
         return None
 
 
-def get_table():
-    """Get DynamoDB table instance by dynamic name."""
-    dynamodb = get_dynamodb_resource()
-    table_name = get_table_name_by_prefix()
-    if not table_name:
-        st.error("Couldn't find the DynamoDB table. Please check your AWS connection.")
-        return None
-    return dynamodb.Table(table_name)
+# Sentinel item holding a counter that every writer bumps. Readers compare it
+# with the version their snapshot was synced at, so an unchanged table costs
+# a single GetItem instead of a full scan.
+TABLE_VERSION_KEY = "__table_version__"
+META_PREFIX = "__"  # file_id prefix reserved for bookkeeping items, never listed
+
+# Change feed: every write stamps the item with `updated_at` (the new value of
+# the version counter, so it is monotonically increasing) and `sync_shard`.
+# The sparse `updated-index` GSI (sync_shard, updated_at) then answers
+# "what changed since token X" with a single Query.
+# Every write lands in the one GSI partition of SYNC_SHARD, which takes about 1000
+# writes/s; past that the index throttles and, with it, writes to the table. Far
+# above this app's rates (bulk runs are paced by Bedrock at a few writes/s), so the
+# shard is a constant. Spreading it means N shard values and N queries per sync.
+UPDATED_INDEX = "updated-index"
+SYNC_SHARD = "ALL"
+# Writers bump the counter before they put the item, and the GSI is eventually
+# consistent, so a change with a lower sequence can show up after one with a higher
+# sequence. Each sync re-reads below its token (applying a change twice is harmless):
+# at least SYNC_OVERLAP sequences, and back to the token it had SYNC_OVERLAP_SECONDS
+# ago, so a burst of writes cannot push a lagging one out of the window.
+SYNC_OVERLAP = 50
+SYNC_OVERLAP_SECONDS = 60
+# Anything later than that is picked up by a periodic full scan.
+FULL_REFRESH_SECONDS = 6 * 3600
+
+# Deleted files are replaced by tombstones so snapshots can drop them. DynamoDB
+# TTL removes the tombstone afterwards, which means a snapshot that has not been
+# synced for that long must be rebuilt from a full scan.
+TOMBSTONE_TTL_SECONDS = 7 * 24 * 3600
+
+# Attributes each page actually displays. The 1024-number `embedding` is left
+# out on purpose, it is by far the largest attribute of every item.
+DASHBOARD_COLUMNS = (
+    "file_id",
+    "original_file_name",
+    "status",
+    "ai_summary.tags",
+    "upload_timestamp",
+)
+REVIEW_COLUMNS = (
+    "file_id",
+    "original_file_name",
+    "status",
+    "ai_summary",
+    "embedding_status",
+    "embedding_key",
+)
+# What the local snapshot keeps: the union of the page columns plus sync fields
+SNAPSHOT_COLUMNS = (
+    "file_id",
+    "original_file_name",
+    "status",
+    "ai_summary",
+    "upload_timestamp",
+    "s3_key",
+    "updated_at",
+    "category",
+    "embedding_status",
+    "embedding_key",
+    "embedding_requested_at",
+)
+
+# Progress items of unpacked archives (lambda/ingest_archive.py), "__archive__#<archive_id>"
+ARCHIVE_PROGRESS_PREFIX = "__archive__#"
+ARCHIVE_COLUMNS = (
+    "file_id",
+    "status",
+    "members_found",
+    "members_uploaded",
+    "members_skipped",
+    "bytes_uploaded",
+    "files_per_second",
+    "message",
+)
+
+BATCH_GET_LIMIT = 100  # keys per BatchGetItem call
+MAX_RETRIES = 5  # attempts for unprocessed keys before giving up on them
+
+# Number of parallel scan segments, 1 means a plain sequential scan
+SCAN_SEGMENTS = int(os.environ.get("DOCUFLOW_SCAN_SEGMENTS", "1"))
+
+
+def get_table_version(table=None):
+    """Read the table version marker (0 if nobody has written yet)."""
+    table = table or get_table()
+    response = table.get_item(
+        Key={"file_id": TABLE_VERSION_KEY},
+        ProjectionExpression="#version",
+        ExpressionAttributeNames={"#version": "version"},
+        ConsistentRead=True,  # a stale marker would hide the latest changes
+    )
+    return int(response.get("Item", {}).get("version", 0))
+
+
+def bump_table_version(count=1, table=None):
+    """Atomically increment the table version marker.
+    :param count: Number of writes that follow, each gets its own sequence
+    :return: The new version, used as the `updated_at` of the write that follows
+             (a batch uses new_version - count + 1 ... new_version)
+    """
+    table = table or get_table()
+    response = table.update_item(
+        Key={"file_id": TABLE_VERSION_KEY},
+        UpdateExpression="ADD #version :count",
+        ExpressionAttributeNames={"#version": "version"},
+        ExpressionAttributeValues={":count": count},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["version"])
+
+
+def build_projection(columns):
+    """Build a ProjectionExpression for (possibly nested, dotted) attribute paths.
+    :return: (projection_expression, expression_attribute_names)
+    """
+    attr_names = {}
+    paths = []
+    for column in columns:
+        parts = []
+        for part in column.split("."):  # eg: ai_summary.tags -> #ai_summary.#tags
+            attr_names[f"#{part}"] = part
+            parts.append(f"#{part}")
+        paths.append(".".join(parts))
+    return ", ".join(paths), attr_names
+
+
+def project_item(item, columns):
+    """Copy only the given (possibly dotted) columns of an item, like a ProjectionExpression would."""
+    projected = {}
+    for column in columns:
+        source, target = item, projected
+        parts = column.split(".")
+        for part in parts[:-1]:
+            source = source.get(part)
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(part, {})
+        else:
+            if parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return projected
+
+
+def scan_segment(table_name, columns, segment=0, total_segments=1):
+    """Scan one segment of the table, following LastEvaluatedKey to the end.
+    Tombstones and sentinel items are filtered out.
+    :return: (items, consumed read capacity units)
+    """
+    # boto3 resources are not thread-safe, every segment gets its own
+    table = boto3.session.Session().resource("dynamodb").Table(table_name)
+
+    projection, attr_names = build_projection(columns)
+    attr_names.update({"#file_id": "file_id", "#deleted": "deleted"})
+    scan_kwargs = {
+        "ProjectionExpression": projection,
+        "FilterExpression": "NOT begins_with(#file_id, :meta) AND attribute_not_exists(#deleted)",
+        "ExpressionAttributeNames": attr_names,
+        "ExpressionAttributeValues": {":meta": META_PREFIX},
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if total_segments > 1:
+        scan_kwargs["Segment"] = segment
+        scan_kwargs["TotalSegments"] = total_segments
+
+    items = []
+    consumed = 0.0
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:  # no more pages (each page is at most 1 MB)
+            return items, consumed
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+
+def scan_table(table_name, columns, segments=1):
+    """Full (optionally parallel segmented) scan of the table.
+    :return: (items, consumed read capacity units)
+    """
+    if segments <= 1:
+        return scan_segment(table_name, columns)
 
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        futures = [
+            executor.submit(scan_segment, table_name, columns, segment, segments)
+            for segment in range(segments)
+        ]
+        items = []
+        consumed = 0.0
+        for future in futures:
+            segment_items, segment_consumed = future.result()
+            items.extend(segment_items)
+            consumed += segment_consumed
+        return items, consumed
 
-# get DynamoDB table instance
-def get_all_files():
-    """fetch all files record from DynamoDB table."""
+
+def sync_start(token, history, now):
+    """`since` of the next change-feed query (see SYNC_OVERLAP).
+    :param history: deque of (time, token) of the previous syncs, oldest first, trimmed
+        here to the last one older than SYNC_OVERLAP_SECONDS and those after it
+    """
+    while len(history) > 1 and history[1][0] <= now - SYNC_OVERLAP_SECONDS:
+        history.popleft()
+    since = token - SYNC_OVERLAP
+    if history:
+        since = min(since, history[0][1])
+    return max(since, 0)
+
+
+def query_changes(table_name, since, columns):
+    """Fetch every item (tombstones included) written after the `since` sequence.
+    :return: (items, consumed read capacity units)
+    """
+    table = boto3.session.Session().resource("dynamodb").Table(table_name)
+
+    projection, attr_names = build_projection(tuple(columns) + ("deleted",))
+    attr_names.update({"#sync_shard": "sync_shard", "#updated_at": "updated_at"})
+    query_kwargs = {
+        "IndexName": UPDATED_INDEX,
+        "KeyConditionExpression": "#sync_shard = :shard AND #updated_at > :since",
+        "ProjectionExpression": projection,
+        "ExpressionAttributeNames": attr_names,
+        "ExpressionAttributeValues": {":shard": SYNC_SHARD, ":since": since},
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+
+    items = []
+    consumed = 0.0
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response.get("Items", []))
+        consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return items, consumed
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+
+class TableSnapshot:
+    """In-process copy of the listed columns of every file, kept up to date
+    from the change feed. Shared by all sessions of this Streamlit server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = None  # {file_id: item}, None until the first full load
+        self.version = None  # table version marker at the last sync
+        self.token = 0  # highest `updated_at` applied so far
+        self.synced_at = 0.0  # wall clock of the last sync, for tombstone expiry
+        self.loaded_at = 0.0  # wall clock of the last full load
+        self.history = deque()  # (time, token) of the recent syncs, see sync_start
+        self.last_sync = {}  # stats of the last sync, shown on the pages
+        # Which rows changed, so derived views (utils.frames) can update incrementally:
+        # `generation` changes with every full load, `changed` maps file_id -> revision.
+        self.generation = 0
+        self.revision = 0
+        self.changed = {}
+
+    def is_expired(self, now):
+        # keep a day of margin so a tombstone is never removed before we read it
+        if now - self.synced_at > TOMBSTONE_TTL_SECONDS - 24 * 3600:
+            return True
+        return now - self.loaded_at > FULL_REFRESH_SECONDS
+
+    def full_load(self, table_name, version, now=None):
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        items, consumed = scan_table(table_name, SNAPSHOT_COLUMNS, SCAN_SEGMENTS)
+        self.items = {item["file_id"]: item for item in items}
+        self.generation += 1
+        self.revision = 0
+        self.changed = {}
+        # anything written while we scanned has a higher sequence and comes in with the next delta
+        self.token = version
+        self.loaded_at = now
+        self.history = deque([(now, version)])
+        self.last_sync = {
+            "mode": "full",
+            "items_read": len(items),
+            "rcu": consumed,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def apply_changes(self, table_name, now=None):
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        since = sync_start(self.token, self.history, now)
+        changes, consumed = query_changes(table_name, since, SNAPSHOT_COLUMNS)
+        for item in changes:
+            if item.get("deleted"):
+                self.items.pop(item["file_id"], None)
+            else:
+                self.items[item["file_id"]] = item
+            self.mark_changed(item["file_id"])
+            self.token = max(self.token, int(item.get("updated_at", 0)))
+        self.history.append((now, self.token))
+        self.last_sync = {
+            "mode": "delta",
+            "items_read": len(changes),
+            "rcu": consumed,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def mark_changed(self, file_id):
+        self.revision += 1
+        self.changed[file_id] = self.revision
+
+    def changes_since(self, generation, revision):
+        """What a view built at (generation, revision) has to apply to catch up.
+        :return: (generation, revision, items, removed_ids), where `items` are all
+                 items after a full load, otherwise only the changed ones
+        """
+        with self.lock:
+            if generation != self.generation:
+                return self.generation, self.revision, list(self.items.values()), []
+            changed_ids = [
+                file_id for file_id, rev in self.changed.items() if rev > revision
+            ]
+            items = [self.items[fid] for fid in changed_ids if fid in self.items]
+            removed = [fid for fid in changed_ids if fid not in self.items]
+            return self.generation, self.revision, items, removed
+
+    def sync(self, table_name, version):
+        """Bring the snapshot up to `version`, with a full scan only when unavoidable."""
+        with self.lock:
+            now = time.time()
+            if self.items is None or self.is_expired(now):
+                self.full_load(table_name, version, now)
+            elif version != self.version:
+                self.apply_changes(table_name, now)
+            else:
+                self.last_sync = {"mode": "cached", "items_read": 0, "rcu": 0.0, "seconds": 0.0}
+            self.version = version
+            self.synced_at = now
+            return list(self.items.values())
+
+
+@st.cache_resource
+def get_snapshot(table_name):
+    return TableSnapshot()
+
+
+def get_all_files(columns=REVIEW_COLUMNS):
+    """fetch all files record from DynamoDB table (only the given columns).
+    Served from the local snapshot, which only reads what changed since the last call.
+    """
     table = get_table()
     try:
-        response = table.scan()  # scan the entire table to get all items
-        items = response.get("Items", [])
-        return items
+        version = get_table_version()
+        items = get_snapshot(table.name).sync(table.name, version)
+        return [project_item(item, columns) for item in items]
     except ClientError as e:
+        resources.refresh_if_not_found(e)  # stale cached name, resolve again next time
         st.error(
             f"Failed to fetch items from DynamoDB: {e.response['Error']['Message']}"
         )
         return []
 
 
-def update_file_metadata(file_id, updates):
-    """Update metadata of a file in DynamoDB table."""
+def get_files_frame():
+    """All files as the shared table frame (see utils.frames), built once per
+    server and patched with the rows the last sync changed. Read-only."""
+    table = get_table()
+    try:
+        version = get_table_version()
+        snapshot = get_snapshot(table.name)
+        snapshot.sync(table.name, version)
+        return frames.get_file_frame(table.name).refresh(snapshot)
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(
+            f"Failed to fetch items from DynamoDB: {e.response['Error']['Message']}"
+        )
+        return frames.build_frame([])
+
+
+def patch_cached_file(file_id, updates):
+    """Apply a successful write to the local snapshot right away, so the page can
+    show it without waiting for (or paying for) the next sync."""
     table = get_table()
+    snapshot = get_snapshot(table.name)
+    with snapshot.lock:
+        item = (snapshot.items or {}).get(file_id)
+        if item is None:
+            return
+        item.update(project_item(updates, SNAPSHOT_COLUMNS))
+        snapshot.mark_changed(file_id)
+        if "ai_summary" in updates:  # derived top-level attribute, like write_update does
+            category = category_attributes(updates["ai_summary"].get("category"))["category"]
+            if category:
+                item["category"] = category
+            else:
+                item.pop("category", None)
+
+
+def get_sync_stats():
+    """Stats of the last snapshot sync (mode, items read, consumed RCU, seconds)."""
+    table = get_table()
+    return dict(get_snapshot(table.name).last_sync)
+
+
+def query_category(path, columns=DASHBOARD_COLUMNS):
+    """List every document under a category tree node with a paginated GSI Query."""
+    table = get_table()
+    index_name, key_name = category_index_for(path)
+    projection, attr_names = build_projection(columns)
+    query_kwargs = {
+        "IndexName": index_name,
+        "KeyConditionExpression": Key(key_name).eq(path),
+        "ProjectionExpression": projection,
+        "ExpressionAttributeNames": attr_names,
+    }
+    items = []
+    try:
+        while True:
+            response = table.query(**query_kwargs)
+            items.extend(response.get("Items", []))
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return items
+            query_kwargs["ExclusiveStartKey"] = last_key
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ValidationException" and index_name in str(e):
+            # the level's index isn't deployed yet (added one per deploy, see README)
+            return [
+                project_item(item, columns)
+                for item in get_all_files(SNAPSHOT_COLUMNS)
+                if item.get("category") == path or (item.get("category") or "").startswith(path + "/")
+            ]
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to query category: {e.response['Error']['Message']}")
+        return []
+
+
+def batch_get_items(table_name, file_ids, columns):
+    """Read many items with BatchGetItem, retrying UnprocessedKeys with backoff.
+    :return: (items, file_ids that could not be read)
+    """
+    dynamodb = resources.get_dynamodb()
+    projection, attr_names = build_projection(columns)
+    items = []
+    unread = []
+    for start in range(0, len(file_ids), BATCH_GET_LIMIT):
+        request = {
+            table_name: {
+                "Keys": [
+                    {"file_id": file_id}
+                    for file_id in file_ids[start : start + BATCH_GET_LIMIT]
+                ],
+                "ProjectionExpression": projection,
+                "ExpressionAttributeNames": attr_names,
+            }
+        }
+        for attempt in range(MAX_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            time.sleep(min(0.05 * 2**attempt, 2))  # throttled, back off before retrying
+        else:
+            unread.extend(key["file_id"] for key in request[table_name]["Keys"])
+    return items, unread
+
+
+def get_statuses(file_ids):
+    """Lightweight status check for in-flight uploads: one BatchGetItem per 100 files,
+    only file_id and status are read.
+    :return: {file_id: status}, files the pipeline hasn't picked up yet are "UPLOADED"
+    """
+    table = get_table()
+    if not table or not file_ids:
+        return {}
+    try:
+        items, _ = batch_get_items(
+            table.name, list(file_ids), ("file_id", "status", "deleted")
+        )
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to fetch statuses: {e.response['Error']['Message']}")
+        return {}
+    statuses = {file_id: "UPLOADED" for file_id in file_ids}
+    for item in items:
+        statuses[item["file_id"]] = "DELETED" if item.get("deleted") else item.get("status")
+    return statuses
+
+
+def get_archive_progress(archive_ids):
+    """Progress of archives being unpacked, one BatchGetItem per 100 archives.
+    :return: {archive_id: progress item}, archives the Lambda hasn't picked up yet are missing
+    """
+    table = get_table()
+    if not table or not archive_ids:
+        return {}
+    try:
+        items, _ = batch_get_items(
+            table.name,
+            [f"{ARCHIVE_PROGRESS_PREFIX}{archive_id}" for archive_id in archive_ids],
+            ARCHIVE_COLUMNS,
+        )
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to fetch archive progress: {e.response['Error']['Message']}")
+        return {}
+    return {item["file_id"][len(ARCHIVE_PROGRESS_PREFIX) :]: item for item in items}
+
+
+def update_counters(old_item, new_item, deltas=None):
+    """Adjust the Dashboard counters after a file item changed from old_item to new_item
+    (or apply precomputed `deltas`, eg: merged over a bulk operation)."""
+    if deltas is None:
+        deltas = counters.counter_deltas(old_item, new_item)
+    try:
+        counters.apply_deltas(get_table(), deltas)
+    except ClientError as e:
+        # the write itself succeeded, only the counters drift (scripts/reconcile_counters.py fixes it)
+        st.warning(f"Failed to update counters: {e.response['Error']['Message']}")
+
+
+def get_counters():
+    """Fetch every aggregate counter with a single BatchGetItem.
+    :return: {dimension: {value: count}}, eg: {"status": {"AUTO_TAGGED": 12}}
+    """
+    table = get_table()
+    result = {dimension: {} for dimension in counters.DIMENSIONS}
+    try:
+        response = resources.get_dynamodb().batch_get_item(
+            RequestItems={
+                table.name: {
+                    "Keys": [
+                        {"file_id": counters.counter_key(d)} for d in counters.DIMENSIONS
+                    ]
+                }
+            }
+        )
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to fetch counters: {e.response['Error']['Message']}")
+        return result
+
+    for item in response.get("Responses", {}).get(table.name, []):
+        dimension = item.pop("file_id")[len(counters.COUNTER_PREFIX) :]
+        # values that dropped back to zero keep their attribute, hide them
+        result[dimension] = {k: int(v) for k, v in item.items() if v}
+    return result
+
+
+def write_update(table, file_id, updates, updated_at, expected=None, remove=()):
+    """Apply `updates` to one file item (raises ClientError).
+    No Streamlit calls, so it is safe to run from worker threads.
+    :param expected: Optional {attribute: value} the item must still have, eg: to drop
+                     a background result that a newer edit made obsolete
+    :param remove: Attributes to drop from the item
+    :return: (old_item, new_item), to adjust the counters
+    """
+    # Stamp the change so incremental syncs pick it up
+    updates = dict(updates, sync_shard=SYNC_SHARD, updated_at=updated_at)
+
+    # Keep the indexable category attributes in sync with ai_summary.category
+    remove_parts = [f"#{key}" for key in remove]
+    if "ai_summary" in updates:
+        category = updates["ai_summary"].get("category")
+        for key, value in category_attributes(category).items():
+            if value is None:
+                remove_parts.append(f"#{key}")  # GSI keys can't be empty, drop the level instead
+            else:
+                updates[key] = value
 
     # Build the update expression
     update_parts = []
-    attr_names = {}
+    attr_names = {placeholder: placeholder[1:] for placeholder in remove_parts}
     attr_values = {}
 
     for key, value in updates.items():
@@ -71,18 +605,43 @@ def update_file_metadata(file_id, updates):
         attr_names[k_placeholder] = key
         attr_values[v_placeholder] = value
 
-        # concatenate SET expressions
-        update_expression = "SET " + ", ".join(update_parts)
+    # concatenate SET (and REMOVE) expressions
+    update_expression = "SET " + ", ".join(update_parts)
+    if remove_parts:
+        update_expression += " REMOVE " + ", ".join(remove_parts)
 
+    # never resurrect a deleted file (or create a new one) by updating it
+    conditions = ["attribute_exists(#file_id)", "attribute_not_exists(#deleted)"]
+    attr_names.update({"#file_id": "file_id", "#deleted": "deleted"})
+    for i, (key, value) in enumerate((expected or {}).items()):
+        conditions.append(f"#expected{i} = :expected{i}")
+        attr_names[f"#expected{i}"] = key
+        attr_values[f":expected{i}"] = value
+
+    response = table.update_item(
+        Key={"file_id": file_id},
+        UpdateExpression=update_expression,
+        ConditionExpression=" AND ".join(conditions),
+        ExpressionAttributeNames=attr_names,
+        ExpressionAttributeValues=attr_values,
+        ReturnValues="ALL_OLD",  # the previous version, to adjust the counters
+    )
+    old_item = response.get("Attributes")
+    new_item = dict(old_item or {"file_id": file_id}, **updates)
+    for placeholder in remove_parts:
+        new_item.pop(placeholder[1:], None)
+    return old_item, new_item
+
+
+def update_file_metadata(file_id, updates):
+    """Update metadata of a file in DynamoDB table."""
+    table = get_table()
     try:
-        table.update_item(
-            Key={"file_id": file_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=attr_names,
-            ExpressionAttributeValues=attr_values,
-        )
+        old_item, new_item = write_update(table, file_id, updates, bump_table_version())
+        update_counters(old_item, new_item)
         return True
     except ClientError as e:
+        resources.refresh_if_not_found(e)
         st.error(f"Failed to update item in DynamoDB: {e.response['Error']['Message']}")
         return False
 
@@ -93,14 +652,43 @@ def get_file_by_id(file_id):
     try:
         response = table.get_item(Key={"file_id": file_id})
         item = response.get("Item", None)
+        if item and item.get("deleted"):  # tombstone of a deleted file
+            return None
         return item
     except ClientError as e:
+        resources.refresh_if_not_found(e)
         st.error(
             f"Failed to fetch item from DynamoDB: {e.response['Error']['Message']}"
         )
         return None
 
 
+def get_model_result(file_id):
+    """The full model result of a file (with the raw reply), read lazily from its blob.
+    Items written before the blobs hold it whole in ai_summary.
+    :return: dict, or None when the file or its result can't be read
+    """
+    table = get_table()
+    try:
+        item = table.get_item(
+            Key={"file_id": file_id},
+            ProjectionExpression="ai_summary, ai_result_key",
+        ).get("Item")
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to fetch item from DynamoDB: {e.response['Error']['Message']}")
+        return None
+    if not item:
+        return None
+    if not item.get("ai_result_key"):
+        return item.get("ai_summary")
+    try:
+        return blobs.read_blob(item["ai_result_key"])
+    except (ClientError, LookupError) as e:
+        st.error(f"Failed to fetch the model result from S3: {e}")
+        return None
+
+
 def get_file_details(item):
     """Fetch file details including cleaned filename and AI summary."""
     # Default value
@@ -128,27 +716,54 @@ def get_file_details(item):
         return {"file_name": file_name, "tags": [], "summary": "", "category": "N/A"}
 
 
-from utils.s3 import delete_file_from_s3
+from utils.s3 import artifact_keys, delete_file_from_s3, delete_objects
+
+
+def make_tombstone(file_id, updated_at):
+    """Build the item that replaces a deleted file until DynamoDB TTL removes it."""
+    return {
+        "file_id": file_id,
+        "deleted": True,
+        "sync_shard": SYNC_SHARD,
+        "updated_at": updated_at,
+        "expires_at": int(time.time()) + TOMBSTONE_TTL_SECONDS,  # TTL attribute
+    }
 
 
 def delete_file(file_id):
     """Delete a file record from DynamoDB table and S3."""
     # 1. Get the file info first to find the S3 key
     item = get_file_by_id(file_id)
-    if item:
-        s3_key = item.get("s3_key")
-        if s3_key:
-            # 2. Delete from S3
-            delete_file_from_s3(s3_key)
-        else:
-            st.warning(f"No s3_key found for file {file_id}, skipping S3 deletion.")
+    if not item:  # never existed or already deleted: nothing to do, no sequence taken
+        st.error(f"File {file_id} not found.")
+        return False
+    s3_key = item.get("s3_key")
+    if s3_key:
+        # 2. Delete from S3, with its extraction artifact
+        if delete_file_from_s3(s3_key):
+            delete_objects(artifact_keys(file_id))
+    else:
+        st.warning(f"No s3_key found for file {file_id}, skipping S3 deletion.")
 
-    # 3. Delete from DynamoDB
+    # 3. Replace the DynamoDB item with a tombstone, so snapshots learn about the delete.
+    # The tombstone carries its sequence, so it is taken before the put: when a concurrent
+    # delete wins, that sequence is never used. Syncs read `updated_at > since`, a gap in
+    # the sequence costs nothing.
     table = get_table()
     try:
-        table.delete_item(Key={"file_id": file_id})
+        response = table.put_item(
+            Item=make_tombstone(file_id, bump_table_version()),
+            # no tombstone for a file that never existed, nor a second one
+            ConditionExpression="attribute_exists(file_id) AND attribute_not_exists(deleted)",
+            ReturnValues="ALL_OLD",
+        )
+        update_counters(response.get("Attributes"), None)
         return True
     except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            st.error(f"File {file_id} not found.")
+            return False
+        resources.refresh_if_not_found(e)
         st.error(
             f"Failed to delete item from DynamoDB: {e.response['Error']['Message']}"
         )
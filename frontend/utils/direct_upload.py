@@ -0,0 +1,49 @@
+import os
+import time
+import streamlit as st
+import streamlit.components.v1 as components
+from utils import s3
+
+# Static component (plain HTML/JS, no build step), see components/direct_upload/index.html
+_direct_upload = components.declare_component(
+    "direct_upload",
+    path=os.path.abspath(
+        os.path.join(os.path.dirname(__file__), "..", "components", "direct_upload")
+    ),
+)
+
+POST_EXPIRES_IN = 3600  # seconds a presigned POST stays valid
+POST_REFRESH_MARGIN = 900  # hand out a new one when less than this is left
+
+
+def get_presigned_post(prefix=s3.UPLOAD_PREFIX):
+    """Presigned POST for keys under `prefix` in this session, renewed before it expires."""
+    cache = st.session_state.setdefault("presigned_posts", {})
+    cached = cache.get(prefix)
+    if cached and cached["expires_at"] - time.time() > POST_REFRESH_MARGIN:
+        return cached["post"]
+
+    post = s3.create_presigned_post(prefix, expires_in=POST_EXPIRES_IN)
+    if post:
+        cache[prefix] = {"post": post, "expires_at": time.time() + POST_EXPIRES_IN}
+    return post
+
+
+def direct_upload(max_parallel=4, key="direct_upload", prefix=s3.UPLOAD_PREFIX, extensions=(".pdf",)):
+    """Render the browser-to-S3 uploader.
+    :param prefix: Where the files go, as <prefix><uuid>_<name>
+    :param extensions: File name endings the picker accepts
+    :return: None until a batch finished, then a list of
+             {"file_id", "file_name", "s3_key", "ok"} (one per selected file)
+    """
+    post = get_presigned_post(prefix)
+    if not post:
+        return None
+    return _direct_upload(
+        post=post,
+        prefix=prefix,
+        extensions=list(extensions),
+        max_parallel=max_parallel,
+        key=key,
+        default=None,
+    )
@@ -1,7 +1,30 @@
 import boto3
+import hashlib
 import json
+import logging
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+from botocore.exceptions import ClientError
+from cachetools import LRUCache
 from decimal import Decimal
+from utils import s3
+
+MODEL_ID = "amazon.titan-embed-text-v2:0"
+DIMENSIONS = 1024
+
+# Two cache tiers, keyed by a hash of (model, dimensions, normalized input):
+# an in-process LRU shared by all sessions, then one small JSON object per
+# vector in the documents bucket (outside uploads/, so it never triggers the pipeline).
+# The S3 tier is also where a document's vector lives: items only hold its
+# embedding_key, see get_vectors.
+MEMORY_CACHE_SIZE = 2048
+CACHE_PREFIX = "cache/embeddings/"
+FETCH_WORKERS = 16  # parallel GETs when loading many vectors
+
+logger = logging.getLogger(__name__)
 
 
 @st.cache_resource
@@ -9,23 +32,164 @@ def get_bedrock_runtime():
     return boto3.client("bedrock-runtime", region_name="us-east-1")
 
 
-def generate_embedding(text):
-    client = get_bedrock_runtime()
-    model_id = "amazon.titan-embed-text-v2:0"
-    body = json.dumps({"inputText": text, "dimensions": 1024, "normalize": True})
+class EmbeddingCache:
+    """In-process LRU in front of the persistent S3 tier, with hit/miss counters."""
+
+    def __init__(self, maxsize=MEMORY_CACHE_SIZE):
+        self.lock = threading.Lock()  # cachetools caches are not thread-safe
+        self.memory = LRUCache(maxsize=maxsize)
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+        if vector is not None:
+            self.count("memory_hits")
+            return vector
+
+        vector = read_persistent(key)
+        if vector is not None:
+            self.count("persistent_hits")
+            with self.lock:
+                self.memory[key] = vector
+            return vector
+
+        self.count("misses")
+        return None
+
+    def put(self, key, vector, durable=False):
+        """:param durable: Raise when the S3 tier can't be written (the vector of a document)"""
+        write_persistent(key, vector, raise_errors=durable)
+        with self.lock:
+            self.memory[key] = vector
+
+
+@st.cache_resource
+def get_embedding_cache():
+    return EmbeddingCache()
+
+
+def normalize_text(text):
+    """Normalize the embedding input, so cosmetic differences (unicode forms,
+    whitespace) map to the same cache entry. Case is kept, the model sees it."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def document_text(file_name, summary, tags):
+    """What a document's embedding is computed from: title, summary and tags."""
+    return f"{file_name}\n{summary}\n{' '.join(tags)}"
+
+
+def cache_key(text, model_id=MODEL_ID, dimensions=DIMENSIONS):
+    payload = f"{model_id}\n{dimensions}\n{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_persistent(key):
+    """Vector (list of floats) from the S3 tier, or None."""
+    bucket_name = s3.get_bucket_name()
+    if not bucket_name:
+        return None
     try:
-        response = client.invoke_model(
-            modelId=model_id,
-            body=body,
-            accept="application/json",
-            contentType="application/json",
+        response = s3.get_s3_client().get_object(
+            Bucket=bucket_name, Key=f"{CACHE_PREFIX}{key}.json"
         )
-        response_body = json.loads(response.get("body").read())
-        embedding = response_body.get("embedding")
-        # Convert float to Decimal for DynamoDB compatibility
+        return json.loads(response["Body"].read())
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):  # else the normal miss
+            logger.warning("Failed to read embedding cache entry %s: %s", key, e)
+        return None
+
+
+def write_persistent(key, vector, raise_errors=False):
+    bucket_name = s3.get_bucket_name()
+    if not bucket_name:
+        if raise_errors:
+            raise LookupError("No documents bucket to store the embedding in")
+        return
+    try:
+        s3.get_s3_client().put_object(
+            Bucket=bucket_name,
+            Key=f"{CACHE_PREFIX}{key}.json",
+            Body=json.dumps(vector),
+            ContentType="application/json",
+        )
+    except ClientError as e:
+        if raise_errors:
+            raise
+        logger.warning("Failed to write embedding cache entry %s: %s", key, e)  # only the cache misses out
+
+
+def invoke_embedding_model(text, model_id=MODEL_ID, dimensions=DIMENSIONS):
+    """Call Titan (no cache, no Streamlit calls, raises on error).
+    :return: The embedding as a list of floats
+    """
+    client = get_bedrock_runtime()
+    body = json.dumps(
+        {"inputText": normalize_text(text), "dimensions": dimensions, "normalize": True}
+    )
+    response = client.invoke_model(
+        modelId=model_id,
+        body=body,
+        accept="application/json",
+        contentType="application/json",
+    )
+    response_body = json.loads(response.get("body").read())
+    return response_body.get("embedding")
+
+
+def get_embedding(text, model_id=MODEL_ID, dimensions=DIMENSIONS, durable=False):
+    """Embedding as a list of floats, served from the cache when the normalized
+    input was embedded before (raises on model errors).
+    :param durable: Also raise when a new vector can't be stored in S3, for the
+                    vectors documents point to (embedding_key)"""
+    cache = get_embedding_cache()
+    key = cache_key(text, model_id, dimensions)
+    vector = cache.get(key)
+    if vector is None:
+        vector = invoke_embedding_model(text, model_id, dimensions)
+        if vector:
+            cache.put(key, vector, durable=durable)
+    return vector
+
+
+def get_vectors(keys, workers=FETCH_WORKERS):
+    """Vectors of many embedding keys, through the cache tiers (parallel S3 GETs).
+    :return: {key: vector}, keys without a stored vector are left out
+    """
+    keys = list(dict.fromkeys(keys))
+    cache = get_embedding_cache()
+    if len(keys) <= 1:
+        vectors = [cache.get(key) for key in keys]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(keys))) as executor:
+            vectors = list(executor.map(cache.get, keys))
+    return {key: vector for key, vector in zip(keys, vectors) if vector is not None}
+
+
+def to_decimal(vector):
+    # Convert float to Decimal for DynamoDB compatibility
+    return [Decimal(str(x)) for x in vector]
+
+
+def generate_embedding(text):
+    try:
+        embedding = get_embedding(text)
         if embedding:
-            return [Decimal(str(x)) for x in embedding]
+            return to_decimal(embedding)
         return None
     except Exception as e:
         st.error(f"Failed to generate embedding: {e}")
         return None
+
+
+def get_cache_stats():
+    """Hit/miss counters of the embedding cache (since this server started)."""
+    cache = get_embedding_cache()
+    with cache.lock:
+        return dict(cache.stats, memory_entries=len(cache.memory))
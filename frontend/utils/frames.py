@@ -0,0 +1,130 @@
+import threading
+import time
+import pandas as pd
+import streamlit as st
+
+# Columns of the table frame shared by the Dashboard and Review pages
+FRAME_COLUMNS = [
+    "file_id",
+    "original_file_name",
+    "file_name",  # original_file_name without the "<uuid>_" prefix
+    "status",
+    "tags",  # list of tags
+    "tags_text",  # "#AI, #ML" or "N/A"
+    "summary",
+    "category",  # ai_summary.category as extracted/edited, "N/A" when missing
+    "ai_summary",  # the original map, bulk edits start from it
+    "uploaded_at",  # upload_timestamp parsed to a datetime
+    "embedding_status",
+    "embedding_key",
+]
+
+
+def column(flat, name, default=None):
+    """A column of the flattened frame, or `default` when no item has it."""
+    if name in flat:
+        return flat[name]
+    return pd.Series(default, index=flat.index, dtype=object)
+
+
+def flatten(items):
+    """Items -> frame with the ai_summary fields as "ai_summary.<key>" columns.
+    Same result as pd.json_normalize(items, max_level=1), but the DataFrame
+    constructor builds the columns in bulk, about 20x faster at 50k items."""
+    summaries = [item.get("ai_summary") for item in items]
+    nested = pd.DataFrame(
+        [summary if isinstance(summary, dict) else {} for summary in summaries]
+    ).add_prefix("ai_summary.")
+    flat = pd.DataFrame(items).drop(columns="ai_summary", errors="ignore")
+    return pd.concat([flat, nested], axis=1), summaries
+
+
+def build_frame(items):
+    """Turn file items into the table frame (indexed by file_id), column by column
+    instead of row by row."""
+    if not items:
+        return pd.DataFrame(columns=FRAME_COLUMNS)
+
+    flat, summaries = flatten(items)  # ai_summary.tags, ai_summary.summary, ...
+    names = column(flat, "original_file_name").fillna("N/A").astype(str)
+    tags = column(flat, "ai_summary.tags")
+    # missing tags are NaN, a plain comprehension is still far cheaper than an apply
+    tags = pd.Series([t if isinstance(t, list) else [] for t in tags], index=flat.index)
+    tags_text = tags.str.join(", ")
+
+    frame = pd.DataFrame(
+        {
+            "file_id": flat["file_id"],
+            "original_file_name": names,
+            # split on the first underscore only, the file name may contain more
+            "file_name": names.str.split("_", n=1).str[-1],
+            "status": column(flat, "status"),
+            "tags": tags,
+            "tags_text": tags_text.mask(tags_text == "", "N/A"),
+            "summary": column(flat, "ai_summary.summary").fillna(""),
+            "category": column(flat, "ai_summary.category").fillna("N/A"),
+            "ai_summary": summaries,
+            "uploaded_at": pd.to_datetime(
+                column(flat, "upload_timestamp"), utc=True, errors="coerce", format="ISO8601"
+            ),
+            "embedding_status": column(flat, "embedding_status"),
+            "embedding_key": column(flat, "embedding_key"),
+        }
+    )
+    frame.index = pd.Index(flat["file_id"].to_numpy())
+    return frame
+
+
+def apply_rows(frame, items, removed_ids):
+    """Return a new frame with `items` upserted and `removed_ids` dropped.
+    Changed rows keep their position, new rows are appended."""
+    updated = frame.drop(index=[fid for fid in removed_ids if fid in frame.index])
+    if not items:
+        return updated
+    rows = build_frame(items)
+    new_ids = rows.index.difference(updated.index)
+    if len(new_ids):
+        # grow the index, then fill every upserted row with one assignment
+        # (cheaper than pd.concat, which inspects every value of sparse columns)
+        updated = updated.reindex(updated.index.append(new_ids))
+    updated.loc[rows.index, FRAME_COLUMNS] = rows[FRAME_COLUMNS]
+    return updated
+
+
+class FileFrame:
+    """Table frame of the snapshot, rebuilt after a full load and patched with the
+    changed rows otherwise. Shared by all sessions, so callers must not modify it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = build_frame([])
+        self.generation = None  # snapshot generation/revision the frame reflects
+        self.revision = 0
+        self.last_build = {}  # stats of the last refresh, for the benchmark and the pages
+
+    def refresh(self, snapshot):
+        with self.lock:
+            started = time.perf_counter()
+            generation, revision, items, removed = snapshot.changes_since(
+                self.generation, self.revision
+            )
+            if generation != self.generation:
+                self.frame = build_frame(items)
+                mode = "full"
+            elif items or removed:
+                self.frame = apply_rows(self.frame, items, removed)
+                mode = "incremental"
+            else:
+                mode = "cached"
+            self.generation, self.revision = generation, revision
+            self.last_build = {
+                "mode": mode,
+                "rows": len(items) + len(removed),
+                "seconds": time.perf_counter() - started,
+            }
+            return self.frame
+
+
+@st.cache_resource
+def get_file_frame(table_name):
+    return FileFrame()
@@ -0,0 +1,173 @@
+# This file runs the slow part of a Review save (re-embedding) in the background.
+# The metadata is written immediately with embedding_status = "PENDING"; a worker
+# thread then computes the embedding, stores it in S3 under the item's embedding_key
+# (utils.embedding), marks the item embedding_status = "READY", and inserts the
+# document into the related-documents graph (utils.knn).
+# Jobs live in the server process: the PENDING items a restart left behind are found
+# by recover_embeddings and queued again.
+import boto3
+import logging
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from utils import db, embedding, knn
+
+EMBEDDING_WORKERS = 2  # Titan calls in flight at once, per server process
+# A PENDING embedding requested longer ago than this has no job left (a server restart),
+# unless this server still has it queued. Also the interval of the recovery sweeps.
+STALE_PENDING_SECONDS = 10 * 60
+RECOVERY_COLUMNS = (
+    "file_id",
+    "original_file_name",
+    "ai_summary",
+    "embedding_status",
+    "embedding_key",
+    "embedding_requested_at",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingQueue:
+    """Thread pool for embedding jobs, shared by all sessions of this server."""
+
+    def __init__(self, max_workers=EMBEDDING_WORKERS):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="embedding"
+        )
+        self.lock = threading.Lock()
+        self.pending = set()  # file_ids with a job queued or running
+        self.local = threading.local()
+        self.swept_at = None  # time of the last recovery sweep
+
+    def get_table(self, table_name):
+        # boto3 resources are not thread-safe, every worker thread gets its own table
+        if not hasattr(self.local, "table"):
+            self.local.table = boto3.session.Session().resource("dynamodb").Table(table_name)
+        return self.local.table
+
+    def submit(self, table_name, file_id, text, key):
+        with self.lock:
+            self.pending.add(file_id)
+        self.executor.submit(self.run, table_name, file_id, text, key)
+
+    def sweep_due(self, now):
+        """Whether a recovery sweep is due, taking it if so (one sweep at a time)."""
+        with self.lock:
+            if self.swept_at is not None and now - self.swept_at < STALE_PENDING_SECONDS:
+                return False
+            self.swept_at = now
+            return True
+
+    def recover(self, table_name, items, now=None):
+        """Queue again the PENDING embeddings whose job is gone: requested more than
+        STALE_PENDING_SECONDS ago (or before the request time was recorded) and not
+        queued on this server. The text is rebuilt from the item.
+        :return: The file_ids queued again
+        """
+        now = time.time() if now is None else now
+        requeued = []
+        for item in items:
+            if item.get("embedding_status") != "PENDING" or self.is_pending(item["file_id"]):
+                continue
+            if now - float(item.get("embedding_requested_at", 0)) < STALE_PENDING_SECONDS:
+                continue  # may still be running on another server
+            details = db.get_file_details(item)
+            text = embedding.document_text(details["file_name"], details["summary"], details["tags"])
+            self.submit(table_name, item["file_id"], text, item.get("embedding_key"))
+            requeued.append(item["file_id"])
+        if requeued:
+            logger.warning("Queued %d lost embedding job(s) again: %s", len(requeued), requeued)
+        return requeued
+
+    def run(self, table_name, file_id, text, key):
+        """Compute the embedding and store it, unless a newer edit replaced the input.
+        :param key: The embedding_key the item must still have"""
+        table = self.get_table(table_name)
+        try:
+            try:
+                # READY only once the vector is in S3, readers load it by embedding_key
+                vector = embedding.get_embedding(text, durable=True)
+                if not vector:
+                    raise ValueError("empty embedding")
+                # the key of the text embedded, a recovered job's text may differ from the original
+                updates = {"embedding_status": "READY", "embedding_key": embedding.cache_key(text)}
+            except Exception:  # model or S3 errors: keep the metadata, flag the missing vector
+                logger.exception("Embedding job failed for %s", file_id)
+                vector = None
+                updates = {"embedding_status": "FAILED"}
+
+            seq = db.bump_table_version(table=table)
+            # the vector of items written before the S3 layout goes, it is stale now
+            db.write_update(
+                table, file_id, updates, seq, expected={"embedding_key": key}, remove=("embedding",)
+            )
+            if vector:
+                self.insert_into_graph(table, file_id, vector)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                logger.info("Dropping stale embedding for %s (edited again or deleted)", file_id)
+            else:
+                logger.exception("Failed to store embedding for %s", file_id)
+        except Exception:
+            # the item stays PENDING, the next recovery sweep queues it again
+            logger.exception("Embedding job for %s crashed", file_id)
+        finally:
+            with self.lock:
+                self.pending.discard(file_id)
+
+    def insert_into_graph(self, table, file_id, vector):
+        """Related documents: a failure here leaves the embedding in place, the
+        next rebuild (scripts/rebuild_knn.py) adds the document."""
+        try:
+            stats = knn.insert_document(table, file_id, vector)
+            logger.info(
+                "kNN insert for %s: %d neighbour list(s) updated in %.2fs",
+                file_id,
+                stats["lists_updated"],
+                stats["seconds"],
+            )
+        except Exception:
+            logger.exception("Failed to update related documents for %s", file_id)
+
+    def is_pending(self, file_id):
+        with self.lock:
+            return file_id in self.pending
+
+
+@st.cache_resource
+def get_embedding_queue():
+    return EmbeddingQueue()
+
+
+def pending_embedding(text):
+    """Attributes flagging an item's embedding as being computed from `text`, saved
+    with the edit before start_embedding."""
+    return {
+        "embedding_status": "PENDING",
+        "embedding_key": embedding.cache_key(text),
+        "embedding_requested_at": int(time.time()),
+    }
+
+
+def recover_embeddings():
+    """Sweep for lost embedding jobs (see EmbeddingQueue.recover): on the first call of
+    this server, then at most every STALE_PENDING_SECONDS. Reads the local snapshot.
+    :return: The file_ids queued again
+    """
+    queue = get_embedding_queue()
+    if not queue.sweep_due(time.time()):
+        return []
+    table = db.get_table()
+    if table is None:
+        return []
+    return queue.recover(table.name, db.get_all_files(RECOVERY_COLUMNS))
+
+
+def start_embedding(file_id, text):
+    """Queue the background job, call it after the PENDING metadata (with the
+    matching embedding_key) was saved."""
+    table = db.get_table()
+    get_embedding_queue().submit(table.name, file_id, text, embedding.cache_key(text))
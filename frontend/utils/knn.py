@@ -0,0 +1,296 @@
+# "Papers like this one": a stored kNN graph over the document embeddings.
+# Every file with an embedding has a bookkeeping item "__knn__#<file_id>" holding
+# its K nearest neighbours (cosine similarity), so the Review page serves them with
+# a single GetItem. A newly embedded document gets its list computed once, and is
+# merged into the lists of the documents it is close to; scripts/rebuild_knn.py
+# recomputes the whole graph.
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+import numpy as np
+import streamlit as st
+from botocore.exceptions import ClientError
+from utils import db, embedding
+
+KNN_PREFIX = "__knn__#"
+K = 10  # neighbours stored per document
+# Reverse links: a new document is merged into the lists of its AFFECTED_FACTOR * K
+# nearest documents. Lists it would enter from further away are picked up by a rebuild.
+AFFECTED_FACTOR = 2
+MAX_RETRIES = 3  # optimistic-lock retries when two writers update the same list
+# The vectors are in S3 under embedding_key; items written before that layout (or not
+# migrated yet, scripts/offload_attributes.py) still carry theirs as "embedding".
+VECTOR_COLUMNS = ("file_id", "embedding_key", "embedding", "embedding_status", "updated_at")
+
+
+def normalize(vectors):
+    """Scale rows to unit length, so a dot product is the cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(matrix, ids, vector, k, exclude=None):
+    """Nearest rows of a normalized matrix to a normalized vector.
+    :return: [(file_id, score)] sorted by decreasing similarity
+    """
+    if not len(ids):
+        return []
+    scores = matrix @ vector
+    if exclude is not None:
+        scores[exclude] = -np.inf
+    k = min(k, len(ids) - (exclude is not None))
+    if k <= 0:
+        return []
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(ids[i], float(scores[i])) for i in best]
+
+
+def all_top_k(matrix, ids, k, block=1024):
+    """K nearest neighbours of every row (the full rebuild), one block of rows at a time
+    so the similarity matrix never has to fit in memory.
+    :return: {file_id: [(file_id, score)]}
+    """
+    graph = {}
+    k = min(k, len(ids) - 1)
+    if k <= 0:
+        return {file_id: [] for file_id in ids}
+    for start in range(0, len(ids), block):
+        scores = matrix[start : start + block] @ matrix.T
+        rows = np.arange(scores.shape[0])
+        scores[rows, rows + start] = -np.inf  # never your own neighbour
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for row in rows:
+            graph[ids[start + row]] = [
+                (ids[j], float(score)) for j, score in zip(best[row], best_scores[row])
+            ]
+    return graph
+
+
+def merge_neighbor(neighbors, file_id, score, k=K):
+    """Insert (or move) one neighbour into a sorted list.
+    :return: (new list, whether it changed)
+    """
+    score = round(score, 4)  # stored precision, so an unchanged score is not a change
+    others = [(n, s) for n, s in neighbors if n != file_id]
+    if len(others) == len(neighbors) and len(neighbors) >= k and score <= neighbors[-1][1]:
+        return neighbors, False  # not close enough to enter the list
+    merged = sorted(others + [(file_id, score)], key=lambda pair: -pair[1])[:k]
+    return merged, merged != neighbors
+
+
+def load_vectors(items):
+    """Vectors of the items with a READY embedding (fetched from S3 by embedding_key,
+    in parallel, or taken from a legacy "embedding" attribute).
+    :return: {file_id: list of floats}; items whose vector is missing are left out
+    """
+    ready = [i for i in items if not i.get("deleted") and i.get("embedding_status") == "READY"]
+    vectors = {i["file_id"]: [float(x) for x in i["embedding"]] for i in ready if i.get("embedding")}
+    by_key = {
+        i["file_id"]: i["embedding_key"]
+        for i in ready
+        if i["file_id"] not in vectors and i.get("embedding_key")
+    }
+    stored = embedding.get_vectors(by_key.values())
+    for file_id, key in by_key.items():
+        if key in stored:
+            vectors[file_id] = stored[key]
+        else:
+            print(f"No stored embedding for {file_id} ({key})")
+    return vectors
+
+
+def to_item(file_id, neighbors, revision=0):
+    return {
+        "file_id": f"{KNN_PREFIX}{file_id}",
+        "neighbors": [
+            {"file_id": n, "score": Decimal(f"{score:.4f}")} for n, score in neighbors
+        ],
+        "revision": revision,  # optimistic lock for concurrent merges
+    }
+
+
+def from_item(item):
+    return [(n["file_id"], float(n["score"])) for n in item.get("neighbors", [])]
+
+
+class VectorIndex:
+    """In-process matrix of the normalized embeddings, kept up to date from the
+    change feed like db.TableSnapshot. Shared by the embedding workers of this server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = []
+        self.positions = {}  # file_id -> row
+        self.matrix = np.zeros((0, 0), dtype=np.float32)  # capacity grows by doubling
+        self.version = None
+        self.token = 0
+        self.history = deque()  # (time, token) of the recent syncs, see db.sync_start
+
+    def upsert(self, file_id, vector):
+        vector = normalize(vector)
+        row = self.positions.get(file_id)
+        if row is None:
+            if self.matrix.shape[1] != len(vector):
+                if self.ids:
+                    raise ValueError("Embedding dimension changed, rebuild the kNN graph")
+                self.matrix = np.zeros((1024, len(vector)), np.float32)  # first vector
+            if len(self.ids) == len(self.matrix):
+                grown = np.zeros((2 * len(self.matrix), self.matrix.shape[1]), np.float32)
+                grown[: len(self.ids)] = self.matrix
+                self.matrix = grown
+            row = len(self.ids)
+            self.ids.append(file_id)
+            self.positions[file_id] = row
+        self.matrix[row] = vector
+
+    def remove(self, file_id):
+        row = self.positions.pop(file_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1  # move the last row into the hole
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = self.ids[last]
+            self.positions[self.ids[row]] = row
+        self.ids.pop()
+
+    def apply(self, item, vector=None):
+        if vector is None:
+            self.remove(item["file_id"])
+        else:
+            self.upsert(item["file_id"], vector)
+        self.token = max(self.token, int(item.get("updated_at", 0)))
+
+    def sync(self, table_name, version):
+        """Bring the matrix up to `version` (full scan once, then only the changes)."""
+        with self.lock:
+            now = time.time()
+            if self.version is None:
+                items, _ = db.scan_table(table_name, VECTOR_COLUMNS, db.SCAN_SEGMENTS)
+                self.token = version
+            elif version != self.version:
+                items, _ = db.query_changes(table_name, db.sync_start(self.token, self.history, now), VECTOR_COLUMNS)
+            else:
+                items = []
+            vectors = load_vectors(items)
+            for item in items:
+                self.apply(item, vectors.get(item["file_id"]))
+            self.history.append((now, self.token))
+            self.version = version
+
+    def neighbors(self, vector, k, exclude_id=None):
+        with self.lock:
+            count = len(self.ids)
+            return top_k(
+                self.matrix[:count],
+                self.ids,
+                normalize(vector),
+                k,
+                exclude=self.positions.get(exclude_id),
+            )
+
+    def vector(self, file_id):
+        with self.lock:
+            row = self.positions.get(file_id)
+            return None if row is None else self.matrix[row].copy()
+
+
+@st.cache_resource
+def get_vector_index(table_name):
+    return VectorIndex()
+
+
+def update_list(table, file_id, update):
+    """Read-modify-write of the stored list of `file_id`, with a conditional put on its
+    revision so a concurrent writer is never overwritten (the update is redone instead).
+    :param update: Function of the stored list (None if there is none yet) returning
+        the new list, or None to leave it as it is
+    :return: True if the list was written
+    """
+    key = f"{KNN_PREFIX}{file_id}"
+    for _ in range(MAX_RETRIES):
+        item = table.get_item(Key={"file_id": key}, ConsistentRead=True).get("Item")
+        neighbors = update(from_item(item) if item else None)
+        if neighbors is None:
+            return False
+        if item:
+            revision = int(item.get("revision", 0))
+            condition = {
+                "ConditionExpression": "revision = :revision",
+                "ExpressionAttributeValues": {":revision": revision},
+            }
+        else:
+            revision = 0
+            condition = {"ConditionExpression": "attribute_not_exists(file_id)"}
+        try:
+            table.put_item(Item=to_item(file_id, neighbors, revision + 1), **condition)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+    print(f"Gave up updating the neighbours of {file_id} (contention)")
+    return False
+
+
+def merge_into_list(table, index, file_id, new_id, score):
+    """Merge `new_id` into the stored list of `file_id` (computed from the index if
+    there is none yet), so concurrent merges are never lost.
+    :return: True if the list was written
+    """
+
+    def merge(neighbors):
+        if neighbors is None:  # embedded before the graph existed: its list already includes new_id
+            vector = index.vector(file_id)
+            return None if vector is None else index.neighbors(vector, K, exclude_id=file_id)
+        merged, changed = merge_neighbor(neighbors, new_id, score)
+        return merged if changed else None
+
+    return update_list(table, file_id, merge)
+
+
+def insert_document(table, file_id, vector):
+    """Add a freshly embedded document to the graph: store its own top-K list, then
+    merge it into the lists of the documents nearest to it.
+    :param table: DynamoDB table resource (the caller's thread's own)
+    :return: stats of the insert (seconds, lists updated)
+    """
+    started = time.perf_counter()
+    index = get_vector_index(table.name)
+    index.sync(table.name, db.get_table_version(table))
+    with index.lock:
+        index.upsert(file_id, vector)  # the write may not be in the change feed yet
+
+    nearest = index.neighbors(vector, AFFECTED_FACTOR * K, exclude_id=file_id)
+
+    def recompute(neighbors):
+        own = nearest[:K]
+        for other_id, score in neighbors or []:
+            if index.vector(other_id) is None:  # merged in by a document this index has not seen yet
+                own, _ = merge_neighbor(own, other_id, score)
+        return own
+
+    update_list(table, file_id, recompute)
+    updated = sum(
+        merge_into_list(table, index, other_id, file_id, score) for other_id, score in nearest
+    )
+    return {"seconds": time.perf_counter() - started, "lists_updated": updated}
+
+
+def get_related(file_id):
+    """Stored neighbours of a document: a single GetItem.
+    :return: [(file_id, score)], empty until the document has an embedding
+    """
+    table = db.get_table()
+    try:
+        item = table.get_item(Key={"file_id": f"{KNN_PREFIX}{file_id}"}).get("Item")
+    except ClientError as e:
+        st.error(f"Failed to fetch related documents: {e.response['Error']['Message']}")
+        return []
+    return from_item(item) if item else []
@@ -0,0 +1,119 @@
+import io
+import math
+import time
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+MAX_OPTIONS = 50  # entries of a searchable selector sent to the browser at once
+
+
+def filter_frame(df, search="", statuses=None, search_columns=("file_name",)):
+    """Rows matching the search text (case-insensitive, any of `search_columns`)
+    and one of `statuses`. Vectorized string ops, the frame is never iterated."""
+    mask = pd.Series(True, index=df.index)
+    if statuses:
+        mask &= df["status"].isin(statuses)
+    search = search.strip()
+    if search:
+        matches = pd.Series(False, index=df.index)
+        for name in search_columns:
+            matches |= (
+                df[name].fillna("").astype(str).str.contains(search, case=False, regex=False)
+            )
+        mask &= matches
+    return df[mask]
+
+
+def sort_frame(df, column, ascending=True):
+    if column not in df:
+        return df
+    return df.sort_values(column, ascending=ascending, na_position="last", kind="stable")
+
+
+def page_of(df, page, page_size):
+    """Rows of a 1-based page, clamped to the last page.
+    :return: (rows, page, page_count)
+    """
+    page_count = max(math.ceil(len(df) / page_size), 1)
+    page = min(max(page, 1), page_count)
+    start = (page - 1) * page_size
+    return df.iloc[start : start + page_size], page, page_count
+
+
+def payload_bytes(df):
+    """Size of the Arrow stream Streamlit sends to the browser for `df`."""
+    sink = io.BytesIO()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.tell()
+
+
+def render_table_controls(df, key, sort_options, search_columns=("file_name",)):
+    """Search/status/sort/page controls above a table. Filtering, sorting and
+    paging run here on the server, only the current page goes to the browser.
+    :param sort_options: {label: column} offered in the sort selector
+    :return: (page rows, stats dict for `render_page_stats`)
+    """
+    started = time.perf_counter()
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+    search = col1.text_input("Search", key=f"{key}_search", placeholder="File name, tags...")
+    statuses = col2.multiselect(
+        "Status", sorted(df["status"].dropna().unique()), key=f"{key}_status"
+    )
+    sort_label = col3.selectbox("Sort by", list(sort_options), key=f"{key}_sort")
+    descending = col4.toggle("Desc", value=True, key=f"{key}_desc")
+
+    rows = filter_frame(df, search, statuses, search_columns)
+    rows = sort_frame(rows, sort_options[sort_label], ascending=not descending)
+
+    col1, col2 = st.columns([1, 1])
+    page_size = col2.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    page_count = max(math.ceil(len(rows) / page_size), 1)
+    if st.session_state.get(f"{key}_page", 1) > page_count:  # the filter shrank the result
+        st.session_state[f"{key}_page"] = page_count
+    page = col1.number_input(
+        f"Page (of {page_count})", min_value=1, max_value=page_count, key=f"{key}_page"
+    )
+    page_rows, page, page_count = page_of(rows, int(page), page_size)
+    return page_rows, {
+        "matches": len(rows),
+        "total": len(df),
+        "page": page,
+        "page_count": page_count,
+        "seconds": time.perf_counter() - started,
+        # a changed filter/sort/page is a different table, any edits of the old one are stale
+        "view_key": f"{key}_{hash((search, tuple(statuses), sort_label, descending, page, page_size))}",
+    }
+
+
+def render_page_stats(stats, page_df):
+    """Caption with what this page cost: server-side prep and the payload sent."""
+    st.caption(
+        f"{stats['matches']} of {stats['total']} documents, page {stats['page']}/{stats['page_count']} · "
+        f"prepared in {stats['seconds'] * 1000:.0f} ms · "
+        f"{payload_bytes(page_df) / 1024:.0f} KiB sent"
+    )
+
+
+def searchable_select(label, df, key, search_columns=("file_name",)):
+    """Selectbox over the rows matching a search box, at most MAX_OPTIONS options
+    are built and sent, the rest load as the search narrows down.
+    :return: the selected file_id, or None
+    """
+    search = st.text_input(
+        "Search files", key=f"{key}_search", placeholder="Type part of the file name"
+    )
+    matches = filter_frame(df, search, search_columns=search_columns)
+    options = matches.head(MAX_OPTIONS)
+    if len(matches) > MAX_OPTIONS:
+        st.caption(f"Showing {MAX_OPTIONS} of {len(matches)} matches, refine the search to see more.")
+    names = dict(zip(options["file_id"], options["file_name"]))
+    return st.selectbox(
+        label,
+        options=list(names),  # select by file_id
+        format_func=lambda file_id: names[file_id],  # display file name instead of file_id
+        key=f"{key}_select",
+    )
@@ -0,0 +1,129 @@
+# This file resolves the names of the AWS resources created by the CDK stack.
+# Names are looked up once per process and cached, instead of listing every
+# table and bucket in the account on each user action.
+import boto3
+import os
+import streamlit as st
+from botocore.exceptions import ClientError
+from utils import shared  # noqa: F401  (puts the docuflow package on the path)
+from docuflow.parameters import BUCKET_NAME_PARAMETER, TABLE_NAME_PARAMETER, parameter_name
+
+STACK_NAME = os.environ.get("DOCUFLOW_STACK_NAME", "DocuflowStack")
+# parameters written by that stack, see docuflow/parameters.py
+TABLE_NAME_SSM = parameter_name(STACK_NAME, TABLE_NAME_PARAMETER)
+BUCKET_NAME_SSM = parameter_name(STACK_NAME, BUCKET_NAME_PARAMETER)
+
+# error codes meaning the cached name points to something that no longer exists
+# (eg: the stack was redeployed), the only case where we resolve again
+NOT_FOUND_CODES = {"ResourceNotFoundException", "NoSuchBucket"}
+
+
+def get_names_from_ssm():
+    """Read table and bucket names from SSM Parameter Store (one call)."""
+    ssm = boto3.client("ssm")
+    response = ssm.get_parameters(Names=[TABLE_NAME_SSM, BUCKET_NAME_SSM])
+    values = {p["Name"]: p["Value"] for p in response.get("Parameters", [])}
+    return {
+        "table_name": values.get(TABLE_NAME_SSM),
+        "bucket_name": values.get(BUCKET_NAME_SSM),
+    }
+
+
+def get_names_from_stack_outputs():
+    """Read table and bucket names from the CloudFormation stack outputs."""
+    cloudformation = boto3.client("cloudformation")
+    response = cloudformation.describe_stacks(StackName=STACK_NAME)
+    outputs = {
+        o["OutputKey"]: o["OutputValue"]
+        for o in response["Stacks"][0].get("Outputs", [])
+    }
+    return {
+        "table_name": outputs.get("TableName"),
+        "bucket_name": outputs.get("BucketName"),
+    }
+
+
+def get_table_name_by_prefix(prefix="DocuMetaTable"):
+    """Dynamically get the DB table name using the given prefix (last resort, lists all tables)."""
+    client = boto3.client("dynamodb")
+    paginator = client.get_paginator("list_tables")  # paginator for listing tables
+
+    # iterate through pages of table names
+    for page in paginator.paginate():
+        for table_name in page.get("TableNames", []):
+            if prefix in table_name:
+                return table_name
+    return None
+
+
+def get_bucket_name_by_prefix(prefix="DocuDocs"):
+    """Dynamically get the S3 bucket name using the given prefix (last resort, lists all buckets)."""
+    response = boto3.client("s3").list_buckets()  # list all buckets
+    for bucket in response.get("Buckets", []):
+        bucket_name = bucket.get("Name", "")
+        # Fix: S3 bucket names are always lowercase, so we should compare case-insensitively
+        if prefix.lower() in bucket_name.lower():
+            return bucket_name
+    return None
+
+
+@st.cache_resource
+def get_resource_names():
+    """Resolve table and bucket names once per process.
+    Order: environment variables, SSM parameters, stack outputs, prefix listing.
+    Raises LookupError if a name can't be resolved, so the failure is not cached.
+    """
+    names = {
+        "table_name": os.environ.get("DOCUFLOW_TABLE_NAME"),
+        "bucket_name": os.environ.get("DOCUFLOW_BUCKET_NAME"),
+    }
+
+    for source in (get_names_from_ssm, get_names_from_stack_outputs):
+        if all(names.values()):
+            break
+        try:
+            found = source()
+        except ClientError as e:  # eg: no permission, stack not found
+            print(f"Resource lookup via {source.__name__} failed: {e}")
+            continue
+        for key, value in found.items():
+            names[key] = names[key] or value
+
+    # fall back to the old discovery by prefix
+    try:
+        names["table_name"] = names["table_name"] or get_table_name_by_prefix()
+        names["bucket_name"] = names["bucket_name"] or get_bucket_name_by_prefix()
+    except ClientError as e:
+        print(f"Resource lookup by prefix failed: {e}")
+
+    missing = [key for key, value in names.items() if not value]
+    if missing:
+        raise LookupError(f"Could not resolve {', '.join(missing)}")
+    return names
+
+
+@st.cache_resource
+def get_dynamodb():
+    """DynamoDB service resource, for calls that are not bound to a table (eg: BatchGetItem)."""
+    return boto3.resource("dynamodb")
+
+
+@st.cache_resource
+def get_table():
+    """DynamoDB Table object, cached alongside the resolved name."""
+    return get_dynamodb().Table(get_resource_names()["table_name"])
+
+
+def get_bucket_name():
+    return get_resource_names()["bucket_name"]
+
+
+def refresh_if_not_found(error):
+    """Drop the cached names if an AWS call says the resource does not exist.
+    :return: True if the caches were cleared (the next call resolves again)
+    """
+    if error.response.get("Error", {}).get("Code") not in NOT_FOUND_CODES:
+        return False
+    get_resource_names.clear()
+    get_table.clear()
+    return True
@@ -1,6 +1,17 @@
 import boto3
 import streamlit as st
 from botocore.exceptions import ClientError
+from utils import resources, shared  # noqa: F401  (shared puts lambda/ on the path)
+from artifacts import artifact_key  # noqa: E402  (the Lambda's extraction artifacts)
+
+
+UPLOAD_PREFIX = "uploads/"  # the ingest Lambda is triggered by PDFs written here
+MAX_UPLOAD_BYTES = 5 * 1024**3  # largest object a single POST may create
+ARCHIVE_PREFIX = "archives/"  # ZIP/TAR of PDFs, unpacked into UPLOAD_PREFIX (lambda/ingest_archive.py)
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tgz", ".tar.gz", ".tar.bz2")
+# Content-Type a browser upload is stored with, pinned by the presigned POST policy,
+# so nothing posted there is ever served back as HTML or script
+UPLOAD_CONTENT_TYPES = {UPLOAD_PREFIX: "application/pdf", ARCHIVE_PREFIX: "application/octet-stream"}
 
 
 @st.cache_resource
@@ -9,25 +20,18 @@ def get_s3_client():
     return boto3.client("s3")
 
 
-def get_bucket_name_by_prefix(prefix="DocuDocs"):
-    """Dynamically get the S3 bucket name using the given prefix."""
-    s3 = get_s3_client()
+def get_bucket_name():
+    """Get the S3 bucket name (resolved once per process, see utils.resources)."""
     try:
-        response = s3.list_buckets()  # list all buckets
-        for bucket in response.get("Buckets", []):
-            bucket_name = bucket.get("Name", "")
-            # Fix: S3 bucket names are always lowercase, so we should compare case-insensitively
-            if prefix.lower() in bucket_name.lower():
-                return bucket_name
-        return None
-    except ClientError as e:
-        st.error(f"Failed to get bucket name: {e}")
+        return resources.get_bucket_name()
+    except LookupError as e:
+        print(f"Failed to get bucket name: {e}")
         return None
 
 
 def upload_file_to_s3(file_object, object_name):
     """Upload a file to the specified S3 bucket."""
-    bucket_name = get_bucket_name_by_prefix()
+    bucket_name = get_bucket_name()
     if not bucket_name:
         st.error("Could not find S3 bucket. Please check your AWS connection.")
         return False
@@ -39,13 +43,43 @@ def upload_file_to_s3(file_object, object_name):
         )  # upload the file object to S3
         return True
     except ClientError as e:
+        resources.refresh_if_not_found(e)  # stale cached name, resolve again next time
         st.error(f"Failed to upload file to S3: {e}")
         return False
 
 
+def create_presigned_post(prefix=UPLOAD_PREFIX, expires_in=3600):
+    """Presigned POST letting the browser upload any key under `prefix` straight to S3.
+    :return: {"url": ..., "fields": {...}} or None on error
+    """
+    bucket_name = get_bucket_name()
+    if not bucket_name:
+        st.error("Could not find S3 bucket. Please check your AWS connection.")
+        return None
+
+    content_type = UPLOAD_CONTENT_TYPES.get(prefix, "application/octet-stream")
+    s3 = get_s3_client()
+    try:
+        return s3.generate_presigned_post(
+            Bucket=bucket_name,
+            Key=prefix + "${filename}",  # the browser sets its own <uuid>_<name> key
+            Fields={"Content-Type": content_type},  # posted as is by the uploader
+            Conditions=[
+                ["starts-with", "$key", prefix],  # never outside the upload prefix
+                ["content-length-range", 1, MAX_UPLOAD_BYTES],
+                {"Content-Type": content_type},
+            ],
+            ExpiresIn=expires_in,
+        )
+    except ClientError as e:
+        resources.refresh_if_not_found(e)
+        st.error(f"Failed to create upload URL: {e}")
+        return None
+
+
 def delete_file_from_s3(object_key):
     """Delete a file from the S3 bucket."""
-    bucket_name = get_bucket_name_by_prefix()
+    bucket_name = get_bucket_name()
     if not bucket_name:
         return False
 
@@ -54,5 +88,37 @@ def delete_file_from_s3(object_key):
         s3.delete_object(Bucket=bucket_name, Key=object_key)
         return True
     except ClientError as e:
+        resources.refresh_if_not_found(e)
         st.error(f"Failed to delete file from S3: {e}")
         return False
+
+
+def artifact_keys(file_id):
+    """Keys of the derived objects the Lambda stores for a file, deleted along with it."""
+    return [artifact_key(file_id)]
+
+
+def delete_objects(object_keys):
+    """Delete many files from the S3 bucket, 1000 keys per DeleteObjects call.
+    :return: Set of keys that could not be deleted
+    """
+    bucket_name = get_bucket_name()
+    if not bucket_name:
+        return set(object_keys)
+
+    s3 = get_s3_client()
+    failed = set()
+    object_keys = list(object_keys)
+    for start in range(0, len(object_keys), 1000):  # DeleteObjects limit
+        chunk = object_keys[start : start + 1000]
+        try:
+            response = s3.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+            )
+            failed.update(error["Key"] for error in response.get("Errors", []))
+        except ClientError as e:
+            resources.refresh_if_not_found(e)
+            print(f"Failed to delete files from S3: {e}")
+            failed.update(chunk)
+    return failed
@@ -0,0 +1,12 @@
+# This file gives the frontend the modules it shares with the Lambda and the stack.
+# They exist once, in lambda/ (deployed as the function's code) or in the docuflow
+# package, and are imported from there so every side always computes the same
+# thing (eg: category keys, counters, SSM parameter names).
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+for path in (LAMBDA_DIR, ROOT):
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,36 @@
+import streamlit as st
+from utils import db
+from utils.categories import build_tree
+
+
+def render_category_sidebar(category_counts=None):
+    """Render the category tree in the sidebar.
+    :param category_counts: {path: count} from db.get_counters(), fetched if not given
+    Returns the selected node path (eg: "CS/AI"), or None for all documents.
+    """
+    # the node list comes from the local snapshot, no extra reads
+    files = db.get_all_files(("category",))
+    nodes = build_tree(f.get("category") for f in files)
+    if not nodes:
+        return None
+
+    # per-node counts come from the category counter item, no query per node
+    counts = category_counts if category_counts is not None else db.get_counters()["category"]
+
+    def format_node(path):
+        if path is None:
+            return f"All documents ({len(files)})"
+        depth = path.count("/")
+        label = path.rsplit("/", 1)[-1]
+        count = counts.get(path)
+        suffix = f" ({count})" if count is not None else ""
+        return " " * depth + label + suffix  # em spaces survive Streamlit's whitespace trimming
+
+    st.sidebar.subheader("Categories")
+    return st.sidebar.radio(
+        "Category",
+        options=[None] + nodes,
+        format_func=format_node,
+        label_visibility="collapsed",
+        key="category_node",
+    )
@@ -0,0 +1,245 @@
+"""
+Extraction artifacts: what pypdf got out of a document, kept next to it in the
+documents bucket so re-tagging, embedding or indexing it later is one small GET
+instead of downloading and parsing the PDF again.
+
+    artifacts/<file_id>/extraction.json.gz
+
+    {
+      "extractor_version": 1,          # EXTRACTOR_VERSION that wrote it, other versions are ignored
+      "source_etag": "\"9b2c...\"",      # ETag of the PDF it was read from, another upload is read again
+      "created_at": "2024-...",
+      "page_count": 312,
+      "pages": {"0": "...", "311": "..."},   # text of the pages read so far ("" when unreadable)
+      "sections": {"abstract": {"page": 0, "offset": 812}, ...},   # first heading of each kind
+      "page_map": [{"title": "1 Introduction", "level": 0, "page": 1}, ...],   # from the outline
+      "error": "..."                   # only when the PDF could not be opened
+    }
+
+A new upload under the same key is a different document: the artifact is only used
+while the object's ETag is the one it was read from. A multipart copy (routing of a
+large file) changes the ETag too, which costs one extraction, never a wrong text.
+
+Only the pages a run needed are read (Round 1: head and tail, Round 2: more of both);
+pages read later are added to the artifact, so it converges to whatever the pipeline uses.
+
+The artifact is also the checkpoint of an extraction that does not fit in one invocation:
+pages are read in units of UNIT_PAGES, saved after each unit, and reading stops with
+ExtractionIncomplete once the deadline has passed. The next invocation starts from the
+saved pages.
+"""
+import datetime
+import gzip
+import json
+import re
+import time
+
+from pypdf import PdfReader
+
+ARTIFACT_PREFIX = "artifacts/"
+UNIT_PAGES = 5  # pages read between two checkpoints
+
+# Headings indexed in "sections": name -> pattern, matched at the start of a line
+# (after an optional section number: "1 Introduction", "IV. Conclusion")
+SECTION_HEADINGS = {
+    "abstract": r"(?:Abstract|Executive Summary)",
+    "introduction": r"(?:Introduction|Background)",
+    "conclusion": r"(?:Conclusion|Future Work|Summary)",
+    "references": r"(?:References?|Bibliography|Citations?)",
+}
+
+
+def artifact_key(file_id):
+    return f"{ARTIFACT_PREFIX}{file_id}/extraction.json.gz"
+
+
+def page_selection(total_pages, head, tail):
+    """
+    Pages the pipeline reads: the first `head` and the last `tail` (all of them for short documents).
+    :return: Sorted list of page indexes
+    """
+    if total_pages <= head + tail:
+        return list(range(total_pages))
+    return sorted(set(range(0, head)) | set(range(total_pages - tail, total_pages)))
+
+
+def outline_page_map(reader):
+    """
+    The outline (bookmarks) as a flat list of {"title", "level", "page"}, in document order.
+    Entries without a resolvable page are left out.
+    """
+    page_map = []
+
+    def walk(entries, level):
+        for entry in entries:
+            if isinstance(entry, list):
+                walk(entry, level + 1)  # children of the previous entry
+                continue
+            try:
+                page = reader.get_destination_page_number(entry)
+            except Exception:
+                continue
+            if page is not None and page >= 0:
+                page_map.append({"title": str(entry.title), "level": level, "page": page})
+
+    try:
+        walk(reader.outline, 0)
+    except Exception as e:
+        print(f"Could not read the outline: {str(e)}")
+    return page_map
+
+
+def section_index(pages):
+    """
+    Page and offset in the page's text of the first heading of each SECTION_HEADINGS kind.
+    :param pages: Dict of page index (str) -> text
+    """
+    sections = {}
+    for index in sorted(pages, key=int):
+        for name, pattern in SECTION_HEADINGS.items():
+            if name in sections:
+                continue
+            match = re.search(rf"(?:^|\n)\s*(?:[0-9IVX]+\.?\s+)?{pattern}\s*(?::|\n)", pages[index], re.IGNORECASE)
+            if match:
+                sections[name] = {"page": int(index), "offset": match.start()}
+    return sections
+
+
+class ExtractionIncomplete(Exception):
+    """The deadline passed before all the pages were read; the ones read so far are in the artifact."""
+
+    def __init__(self, pages_done, pages_needed):
+        super().__init__(f"{pages_done}/{pages_needed} pages extracted")
+        self.pages_done = pages_done
+        self.pages_needed = pages_needed
+
+
+class Extraction:
+    """
+    The artifact of one document, with the pages it lacks read from the PDF on demand.
+    :param data: The stored artifact, or None to build a new one
+    :param fetch_pdf: Function returning the local path of the PDF, called at most once
+        and only when a page is missing
+    :param extractor_version: Version stamped on a new artifact
+    :param clock: Function returning the time deadlines are compared with (simulated in tests)
+    :param source_etag: ETag of the PDF, stamped on a new artifact
+    """
+
+    def __init__(self, data, fetch_pdf, extractor_version, clock=time.monotonic, source_etag=None):
+        self.data = data
+        self.fetch_pdf = fetch_pdf
+        self.extractor_version = extractor_version
+        self.source_etag = source_etag
+        self.clock = clock
+        self.reader = None
+        self.opened = False
+        self.changed = data is None  # differs from what is stored in S3
+        self.from_cache = data is not None
+
+    def _open(self):
+        if self.opened:
+            return self.reader
+        self.opened = True
+        path = self.fetch_pdf()  # download errors propagate, like before the artifacts
+        try:
+            self.reader = PdfReader(path)
+            total_pages = len(self.reader.pages)
+        except Exception as e:
+            print(f"Error extracting text from PDF: {str(e)}")
+            self.reader = None
+            total_pages = 0
+        if self.data is None:
+            self.data = {
+                "extractor_version": self.extractor_version,
+                "source_etag": self.source_etag,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "page_count": total_pages,
+                "pages": {},
+                "sections": {},
+                "page_map": outline_page_map(self.reader) if self.reader else [],
+            }
+            if self.reader is None:
+                self.data["error"] = "unreadable PDF"
+        return self.reader
+
+    @property
+    def page_count(self):
+        if self.data is None:
+            self._open()
+        return self.data["page_count"]
+
+    def page_texts(self, pages, deadline=None, checkpoint=None):
+        """
+        Text of these pages, reading the ones not in the artifact yet.
+        :param pages: Page indexes
+        :param deadline: clock() value after which no new page is started (at least one
+            page is read per call, so every invocation makes progress)
+        :param checkpoint: Function called with this extraction after every UNIT_PAGES pages read
+        :return: List of texts, in the given order
+        :raises ExtractionIncomplete: when the deadline passed first
+        """
+        if self.data is None:
+            self._open()
+        stored = self.data["pages"]
+        missing = [i for i in pages if str(i) not in stored]
+        if missing and self._open() is not None:
+            for n, i in enumerate(missing):
+                if n and deadline is not None and self.clock() > deadline:
+                    self.data["sections"] = section_index(stored)
+                    raise ExtractionIncomplete(len(pages) - len(missing) + n, len(pages))
+                stored[str(i)] = self._read_page(i)
+                self.changed = True
+                if checkpoint and (n + 1) % UNIT_PAGES == 0 and n + 1 < len(missing):
+                    self.data["sections"] = section_index(stored)
+                    checkpoint(self)
+            self.data["sections"] = section_index(stored)
+        return [stored.get(str(i), "") for i in pages]
+
+    def _read_page(self, i):
+        try:
+            return self.reader.pages[i].extract_text() or ""
+        except Exception:
+            return ""  # unreadable page, not retried
+
+    def text(self, head, tail, deadline=None, checkpoint=None):
+        """The text of the first `head` and last `tail` pages, empty pages left out (see page_texts)."""
+        pages = page_selection(self.page_count, head, tail)
+        print(f"Total pages: {self.page_count}, Reading pages: {pages}")
+        return "\n".join(text for text in self.page_texts(pages, deadline, checkpoint) if text)
+
+
+def load(s3_client, bucket, file_id, extractor_version, source_etag=None):
+    """
+    The stored artifact of a document.
+    :param source_etag: ETag of the PDF now under the document's key, None to skip the check
+    :return: The artifact dict, None when there is none, it was written by another extractor
+        version or read from another upload
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=artifact_key(file_id))
+        data = json.loads(gzip.decompress(response["Body"].read()))
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"Could not read the extraction artifact of {file_id}: {str(e)}")
+        return None
+    if data.get("extractor_version") != extractor_version:
+        print(f"Extraction artifact of {file_id} is from extractor {data.get('extractor_version')}, extracting again")
+        return None
+    if source_etag is not None and data.get("source_etag") != source_etag:
+        print(f"Extraction artifact of {file_id} was read from another upload, extracting again")
+        return None
+    return data
+
+
+def save(s3_client, bucket, file_id, data):
+    """Store the artifact, gzipped JSON. Losing it only costs a re-extraction, so errors are logged."""
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=artifact_key(file_id),
+            Body=gzip.compress(json.dumps(data, ensure_ascii=False).encode("utf-8")),
+            ContentType="application/gzip",
+        )
+    except Exception as e:
+        print(f"Could not save the extraction artifact of {file_id}: {str(e)}")
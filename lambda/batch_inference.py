@@ -0,0 +1,93 @@
+"""
+Bedrock batch inference for bulk reprocessing (a prompt change, an imported archive):
+the record and file format of a job and the layout of its files in the documents
+bucket. The flow itself is scripts/batch_reprocess.py.
+
+    batch/<job name>/manifest.json            documents of the run, job ARNs, timings
+    batch/<job name>/input/part-000.jsonl     one {"recordId", "modelInput"} per line
+    batch/<job name>/output/<job id>/part-000.jsonl.out
+                                              written by Bedrock: the record plus
+                                              "modelOutput" or "error"
+
+A job costs about half of on-demand InvokeModel and runs without any Lambda;
+Bedrock requires at least MIN_RECORDS records per job.
+"""
+import json
+
+BATCH_PREFIX = "batch/"
+MIN_RECORDS = 100
+MAX_RECORDS_PER_JOB = 50000  # Bedrock quota: records per input file and per job
+MAX_BYTES_PER_JOB = 1 << 30  # Bedrock quota: 1 GB input file
+TERMINAL_JOB_STATUSES = {"Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired"}
+
+
+def job_prefix(job_name):
+    return f"{BATCH_PREFIX}{job_name}/"
+
+
+def manifest_key(job_name):
+    return f"{job_prefix(job_name)}manifest.json"
+
+
+def input_key(job_name, part):
+    return f"{job_prefix(job_name)}input/part-{part:03d}.jsonl"
+
+
+def output_prefix(job_name):
+    return f"{job_prefix(job_name)}output/"
+
+
+def record_line(file_id, model_input):
+    """One line of an input file: the file_id comes back as the recordId of the output."""
+    return json.dumps({"recordId": file_id, "modelInput": model_input}) + "\n"
+
+
+def pack(lines, max_records=MAX_RECORDS_PER_JOB, max_bytes=MAX_BYTES_PER_JOB, min_records=0):
+    """
+    Split record lines into job input files within the per-job quotas.
+    :param lines: Iterable of record lines (see record_line)
+    :param min_records: A short last file takes lines from the one before it to reach this,
+        as far as both quotas allow. Only a run with fewer lines in total stays below it.
+    :return: List of file contents (str), one job each
+    """
+    parts = []  # [lines, size]
+    for line in lines:
+        length = len(line.encode("utf-8"))
+        if not parts or len(parts[-1][0]) >= max_records or parts[-1][1] + length > max_bytes:
+            parts.append([[], 0])
+        parts[-1][0].append(line)
+        parts[-1][1] += length
+    if len(parts) > 1:
+        (previous, _), last = parts[-2], parts[-1]
+        while len(last[0]) < min_records and len(previous) > min_records:
+            length = len(previous[-1].encode("utf-8"))
+            if last[1] + length > max_bytes:
+                break
+            last[0].insert(0, previous.pop())
+            last[1] += length
+    return ["".join(part) for part, _ in parts]
+
+
+def read_output(text, parse_reply):
+    """
+    Results of a job output file.
+    :param text: Content of a .jsonl.out file
+    :param parse_reply: Function turning the model's reply text into a result dict
+    :return: Iterator of (file_id, ai_result)
+    """
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        error = record.get("error")
+        if error:
+            message = error.get("errorMessage", str(error)) if isinstance(error, dict) else str(error)
+            yield record["recordId"], {"status": "ERROR", "message": message}
+            continue
+        content = record.get("modelOutput", {}).get("content") or [{}]
+        yield record["recordId"], parse_reply(content[0].get("text", ""))
+
+
+def job_id(job_arn):
+    """Bedrock writes a job's output under its id, the last part of the ARN."""
+    return job_arn.rsplit("/", 1)[-1]
@@ -0,0 +1,386 @@
+"""
+Model-invocation layer for Bedrock: every model call of the Lambda goes through
+BedrockClient.invoke (InvokeModel) or BedrockClient.invoke_stream
+(InvokeModelWithResponseStream, which can stop reading early), adding
+
+  - a token-bucket rate limiter shared by all threads of the container
+    (RATE requests/s, bursts of BURST),
+  - retries of throttling and transient errors with exponential backoff and
+    full jitter, bounded by a deadline (the Lambda's remaining time),
+  - a circuit breaker: after FAILURE_THRESHOLD calls that ran out of retries it
+    opens for OPEN_SECONDS, calls fail fast, then a single trial call decides,
+  - latency histograms per model ID.
+
+A call that cannot be served right now (retries exhausted or circuit open)
+raises BedrockUnavailable. The caller defers the document instead of storing an
+error (process_doc: status DEFERRED, retried by the scheduled sweep).
+Other errors (validation, access denied, ...) raise immediately, retrying
+would not help.
+
+Error codes are read from the botocore ClientError shape
+(e.response["Error"]["Code"]), so any client raising that shape works here,
+eg: scripts/local_bedrock.py.
+"""
+import bisect
+import json
+import random
+import threading
+import time
+
+RATE = 2.0  # sustained requests per second per container
+BURST = 4
+MAX_ATTEMPTS = 6
+BASE_DELAY = 0.5  # seconds, first backoff ceiling
+MAX_DELAY = 8.0
+FAILURE_THRESHOLD = 3  # consecutive exhausted calls before the circuit opens
+OPEN_SECONDS = 60.0
+
+# Compared case-insensitively: errors raised in the middle of a response stream
+# (botocore EventStreamError) carry camelCase codes, eg: "throttlingException".
+RETRYABLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ModelStreamErrorException",  # only sent mid-stream
+}
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException"}
+CHARS_PER_TOKEN = 4  # token estimate when a stopped stream never reports its usage
+
+# Upper bounds (ms) of the latency buckets, roughly x1.5 apart, the last one is open
+LATENCY_BUCKETS_MS = (50, 100, 150, 250, 400, 600, 1000, 1500, 2500, 4000, 6000, 10000, 15000, 25000)
+
+
+class BedrockUnavailable(Exception):
+    """Bedrock can't serve the call right now; defer the work and try again later."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def error_code(error):
+    """
+    The AWS error code of an exception, None for anything else (network errors, bugs).
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def code_in(code, codes):
+    """Whether an error code is one of `codes`, whatever its case."""
+    return code is not None and code.lower() in {c.lower() for c in codes}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, deadline=None):
+        """
+        Take one token, waiting for it if needed.
+        :param deadline: clock() value to give up at, None to wait as long as it takes
+        :return: True, or False if no token became available before the deadline
+        """
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                # tolerance: a refill can land a rounding error short of 1, and
+                # waiting for the missing 1e-16 token would not move the clock
+                if self.tokens >= 1 - 1e-9:
+                    self.tokens = max(self.tokens - 1, 0.0)
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+    def penalize(self):
+        """Drop the stored burst after a throttle, so the retries go out at the sustained rate."""
+        with self.lock:
+            self._refill(self.clock())
+            self.tokens = min(self.tokens, 0.0)
+
+
+class CircuitBreaker:
+    """
+    closed -> (FAILURE_THRESHOLD consecutive failures) -> open -> (OPEN_SECONDS) ->
+    half-open: one trial call; success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """Whether a call may go out now (only one at a time while half-open)."""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release(self):
+        """End a call that says nothing about capacity (eg: a validation error):
+        neither a success nor a failure, but a half-open trial slot is freed."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_running:
+                    print(f"Bedrock circuit opened after {self.failures} failures")
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+class LatencyHistogram:
+    """Counts of call latencies in LATENCY_BUCKETS_MS buckets (plus one overflow bucket)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, milliseconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+            self.total_ms += milliseconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, p):
+        """Upper bound (ms) of the bucket holding the p-th percentile, None when empty."""
+        total = self.count
+        if not total:
+            return None
+        rank = p / 100 * total
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def summary(self):
+        total = self.count
+        return {
+            "count": total,
+            "mean_ms": round(self.total_ms / total, 1) if total else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class BedrockClient:
+    """
+    Rate-limited, retrying, circuit-broken wrapper around a bedrock-runtime client.
+    One instance per container; it is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        client,
+        rate=RATE,
+        burst=BURST,
+        max_attempts=MAX_ATTEMPTS,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+        breaker=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        rng=None,
+    ):
+        self.client = client
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.histograms = {}
+        self.stats = {
+            "calls": 0,
+            "attempts": 0,
+            "throttled": 0,
+            "retried": 0,
+            "unavailable": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        }
+        self.lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def histogram(self, model_id):
+        with self.lock:
+            return self.histograms.setdefault(model_id, LatencyHistogram())
+
+    def backoff(self, attempt):
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2^attempt)]."""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def invoke(self, model_id, body, deadline=None):
+        """
+        InvokeModel with rate limiting, retries and the circuit breaker.
+        :param model_id: Bedrock model ID
+        :param body: Request body (JSON string)
+        :param deadline: clock() value after which no attempt or wait starts, eg: the Lambda's end
+        :return: The parsed response body (dict)
+        :raises BedrockUnavailable: when the call should be deferred
+        """
+
+        def attempt():
+            response = self.client.invoke_model(modelId=model_id, body=body)
+            result = json.loads(response["body"].read())
+            usage = result.get("usage") or {}
+            self._count("input_tokens", usage.get("input_tokens") or len(body) // CHARS_PER_TOKEN)
+            self._count("output_tokens", usage.get("output_tokens") or 0)
+            return result
+
+        return self._call(model_id, attempt, deadline)
+
+    def invoke_stream(self, model_id, body, new_parser, deadline=None):
+        """
+        InvokeModelWithResponseStream, same retries and limits as invoke().
+        The stream is closed (and generation stopped) as soon as the parser says so.
+        :param new_parser: Factory of an object with feed(text) -> True to stop reading,
+            called per attempt: a retry after a mid-stream error starts over
+        :return: Dict with "parser", "text" (what was read), "stopped_early" and the token counts
+            (estimated from the characters when the stream was stopped before reporting them)
+        :raises BedrockUnavailable: when the call should be deferred
+        """
+
+        def attempt():
+            response = self.client.invoke_model_with_response_stream(modelId=model_id, body=body)
+            stream = response["body"]
+            parser = new_parser()
+            parts = []
+            result = {"parser": parser, "stopped_early": False}
+            try:
+                for event in stream:
+                    if "chunk" not in event:
+                        continue
+                    message = json.loads(event["chunk"]["bytes"])
+                    if message.get("type") == "content_block_delta":
+                        text = message["delta"].get("text", "")
+                        parts.append(text)
+                        if parser.feed(text):
+                            result["stopped_early"] = True
+                            break
+                    metrics = message.get("amazon-bedrock-invocationMetrics")
+                    if metrics:
+                        result["input_tokens"] = metrics.get("inputTokenCount")
+                        result["output_tokens"] = metrics.get("outputTokenCount")
+            finally:
+                stream.close()  # drops the connection when stopping early, the model stops generating
+            result["text"] = "".join(parts)
+            # a stream closed early never gets its usage metrics
+            result.setdefault("input_tokens", len(body) // CHARS_PER_TOKEN)
+            result.setdefault("output_tokens", len(result["text"]) // CHARS_PER_TOKEN)
+            self._count("input_tokens", result["input_tokens"])
+            self._count("output_tokens", result["output_tokens"])
+            return result
+
+        return self._call(model_id, attempt, deadline)
+
+    def _call(self, model_id, attempt_call, deadline):
+        """The retry loop shared by invoke() and invoke_stream()."""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("unavailable")
+            raise BedrockUnavailable("circuit open", code="CircuitOpen")
+
+        last_code = None
+        for attempt in range(self.max_attempts):
+            if not self.bucket.acquire(deadline):
+                break
+            started = self.clock()
+            self._count("attempts")
+            try:
+                result = attempt_call()
+            except Exception as e:
+                last_code = error_code(e)
+                if not code_in(last_code, RETRYABLE_CODES):
+                    # not a capacity problem: neither counts against the circuit nor resets it
+                    self.breaker.release()
+                    raise
+                if code_in(last_code, THROTTLING_CODES):
+                    self._count("throttled")
+                    self.bucket.penalize()
+                delay = self.backoff(attempt)
+                if attempt + 1 == self.max_attempts or (
+                    deadline is not None and self.clock() + delay > deadline
+                ):
+                    break
+                self._count("retried")
+                print(f"Bedrock {last_code}, retry {attempt + 1} in {delay:.2f}s")
+                self.sleep(delay)
+                continue
+            self.histogram(model_id).record((self.clock() - started) * 1000)
+            self.breaker.record_success()
+            return result
+
+        self.breaker.record_failure()
+        self._count("unavailable")
+        raise BedrockUnavailable(f"gave up after {last_code or 'rate limit wait'}", code=last_code)
+
+    def metrics(self):
+        """Counters and per-model latency summaries, for the log line at the end of an invocation."""
+        with self.lock:
+            histograms = dict(self.histograms)
+            stats = dict(self.stats)
+        return {
+            "stats": stats,
+            "circuit": self.breaker.state,
+            "latency": {model_id: h.summary() for model_id, h in histograms.items()},
+        }
@@ -0,0 +1,86 @@
+"""
+Content-addressed store for the bulky parts of a document item (the full model result
+with its raw reply, extracted snippets, ...). The value is written once to the documents
+bucket under the hash of its content and the item only keeps that key:
+
+    blobs/<sha256 of the canonical JSON>.json.gz
+
+Identical values share one object, so storing is idempotent and a blob never changes;
+readers can cache them forever. The frontend reads them lazily (frontend/utils/blobs.py).
+Items stay small, which is what every Scan and every GSI projection pays for.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+BLOB_PREFIX = "blobs/"
+CACHE_SIZE = 256  # blobs kept in memory per container
+
+
+def _plain(value):
+    """JSON encoding of what DynamoDB items hold besides the JSON types."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode(value):
+    """Canonical JSON bytes of a value: equal values give equal bytes, hence equal keys."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_plain).encode("utf-8")
+
+
+def blob_key(data):
+    return f"{BLOB_PREFIX}{hashlib.sha256(data).hexdigest()}.json.gz"
+
+
+class BlobStore:
+    """
+    :param s3_client: boto3 S3 client
+    :param bucket: The documents bucket
+    """
+
+    def __init__(self, s3_client, bucket, cache_size=CACHE_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.cache = OrderedDict()  # key -> value, least recently used first
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def put(self, value):
+        """
+        Store a JSON value (dicts with Decimals, sets... as found in items).
+        :return: Its key, to keep on the item
+        """
+        data = encode(value)
+        key = blob_key(data)
+        with self.lock:
+            known = key in self.cache
+        if not known:  # content-addressed: an object under this key already holds this value
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=key, Body=gzip.compress(data), ContentType="application/gzip"
+            )
+            self._remember(key, json.loads(data))
+        return key
+
+    def get(self, key):
+        """The value stored under a key (from memory when read before)."""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        value = json.loads(gzip.decompress(response["Body"].read()))
+        self._remember(key, value)
+        return value
@@ -0,0 +1,59 @@
+"""
+Category hierarchy (eg: "CS/AI/NLP") as indexable item attributes, shared by every
+writer of the category: the Lambda (process_doc), scripts/batch_reprocess.py and the
+frontend (frontend/utils/categories.py imports it from here), so all of them produce
+the same key layout.
+
+Every level of the path is its own top-level attribute, category_l1 = "CS",
+category_l2 = "CS/AI", category_l3 = "CS/AI/NLP", each the key of a GSI
+(category-l<level>-index), so each node of the category tree is one Query.
+Deeper paths are still browsable through their level-3 prefix, and exactly
+through `category` (category-index).
+"""
+
+CATEGORY_LEVELS = 3
+CATEGORY_ATTRIBUTES = ("category",) + tuple(f"category_l{level}" for level in range(1, CATEGORY_LEVELS + 1))
+
+
+def normalize_category(path):
+    """
+    Clean up a category path, eg: " CS / AI/NLP/ " -> "CS/AI/NLP".
+    :return: The path, None for empty or placeholder values
+    """
+    if not isinstance(path, str) or path.strip().upper() == "N/A":  # the model's placeholder
+        return None
+    parts = [part.strip() for part in path.split("/") if part.strip()]
+    if not parts:
+        return None
+    return "/".join(parts)
+
+
+def category_attributes(path):
+    """
+    Build the indexable category attributes for a path.
+    :param path: Category path like "CS/AI/NLP" (may be messy or missing)
+    :return: Dict with every CATEGORY_ATTRIBUTES key; the ones that don't apply are None
+        (writers REMOVE them, GSI keys can't be empty strings)
+    """
+    path = normalize_category(path)
+    attributes = dict.fromkeys(CATEGORY_ATTRIBUTES)
+    if not path:
+        return attributes
+
+    parts = path.split("/")
+    attributes["category"] = path
+    for level in range(1, min(len(parts), CATEGORY_LEVELS) + 1):
+        attributes[f"category_l{level}"] = "/".join(parts[:level])
+    return attributes
+
+
+def split_attributes(path):
+    """
+    category_attributes as the two halves of an update.
+    :return: (attributes to SET, names of the attributes to REMOVE)
+    """
+    attributes = category_attributes(path)
+    return (
+        {key: value for key, value in attributes.items() if value is not None},
+        [key for key, value in attributes.items() if value is None],
+    )
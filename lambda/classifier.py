@@ -0,0 +1,201 @@
+"""
+Local category classifier: multinomial naive Bayes over hashed word unigrams and
+bigrams, trained on human-reviewed documents (scripts/train_classifier.py).
+
+It runs inside the Lambda in milliseconds. With CLASSIFIER_MODE=on a prediction
+above the confidence threshold replaces the Bedrock call; with CLASSIFIER_MODE=shadow
+Bedrock is still called and the prediction is only recorded next to its answer
+(`classifier_shadow` on the item), which scripts/eval_classifier.py turns into
+agreement/coverage metrics before anyone switches it on.
+
+Models are versioned JSON artifacts in the documents bucket:
+    models/classifier/v<N>.json.gz   the model (sparse log-probabilities per class)
+    models/classifier/latest.json    {"version": N}, the one the Lambda loads
+"""
+import gzip
+import json
+import math
+import re
+import time
+import zlib
+from collections import Counter
+from decimal import Decimal
+
+MODEL_PREFIX = "models/classifier/"
+LATEST_KEY = f"{MODEL_PREFIX}latest.json"
+NUM_FEATURES = 1 << 18  # hashed feature space, collisions are rare at this size
+# Naive Bayes posteriors saturate at 1.0 on long texts; scoring every document as
+# if it had LENGTH_NORM tokens keeps the confidence meaningful for a threshold.
+LENGTH_NORM = 50
+MODEL_REFRESH_SECONDS = 300  # how often a warm Lambda checks for a newer model
+
+_cache = {"model": None, "checked_at": 0.0}
+
+
+def model_key(version):
+    return f"{MODEL_PREFIX}v{version}.json.gz"
+
+
+def features(text):
+    """
+    Hashed unigram and bigram counts of a text.
+    :param text: The extracted text
+    :return: Counter of feature index -> count
+    """
+    words = [w for w in re.findall(r"[a-z][a-z0-9]+", (text or "").lower())]
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return Counter(zlib.crc32(gram.encode()) % NUM_FEATURES for gram in grams)
+
+
+def train(examples, alpha=0.1, min_examples=5, top_tags=5):
+    """
+    Fit the model.
+    :param examples: List of (text, category, tags)
+    :param alpha: Additive smoothing
+    :param min_examples: Categories with fewer examples are left out (too little to learn)
+    :return: Model dict (JSON-serializable)
+    """
+    by_class = {}
+    for text, category, tags in examples:
+        by_class.setdefault(category, []).append((text, tags))
+    by_class = {c: docs for c, docs in by_class.items() if len(docs) >= min_examples}
+    total_docs = sum(len(docs) for docs in by_class.values())
+
+    model = {"classes": sorted(by_class), "log_prior": {}, "log_prob": {}, "unseen_log_prob": {}, "tags": {}}
+    for category in model["classes"]:
+        docs = by_class[category]
+        counts = Counter()
+        tag_counts = Counter()
+        for text, tags in docs:
+            counts.update(features(text))
+            tag_counts.update(tags or [])
+        denominator = sum(counts.values()) + alpha * NUM_FEATURES
+        model["log_prior"][category] = math.log(len(docs) / total_docs)
+        model["log_prob"][category] = {
+            str(f): round(math.log((n + alpha) / denominator), 5) for f, n in counts.items()
+        }
+        model["unseen_log_prob"][category] = math.log(alpha / denominator)
+        model["tags"][category] = [tag for tag, _ in tag_counts.most_common(top_tags)]
+    model["examples"] = total_docs
+    return model
+
+
+def prepare(model):
+    """Convert the JSON form (string keys) into int-keyed dicts once, after loading."""
+    if "_log_prob" not in model:
+        model["_log_prob"] = {
+            c: {int(f): p for f, p in probs.items()} for c, probs in model["log_prob"].items()
+        }
+    return model
+
+
+def predict(model, text):
+    """
+    Most likely category of a text.
+    :return: (category, confidence in [0, 1]), (None, 0.0) if there is nothing to score
+    """
+    model = prepare(model)
+    counts = features(text)
+    total = sum(counts.values())
+    if not total or not model["classes"]:
+        return None, 0.0
+    scores = {}
+    for category in model["classes"]:
+        probs = model["_log_prob"][category]
+        unseen = model["unseen_log_prob"][category]
+        likelihood = sum(n * probs.get(f, unseen) for f, n in counts.items())
+        scores[category] = model["log_prior"][category] + likelihood / total * LENGTH_NORM
+    best = max(scores, key=scores.get)
+    normalizer = sum(math.exp(s - scores[best]) for s in scores.values())
+    return best, 1.0 / normalizer
+
+
+def extractive_summary(text, sentences=2, max_chars=400):
+    """
+    First sentences of the abstract (or of the text), stands in for the LLM summary.
+    """
+    match = re.search(r"abstract\s*[:.\n]", text or "", re.IGNORECASE)
+    body = (text or "")[match.end() if match else 0 :]
+    parts = re.split(r"(?<=[.!?])\s+", " ".join(body.split()))
+    return " ".join(parts[:sentences])[:max_chars]
+
+
+def to_ai_result(model, text, category, confidence):
+    """
+    An ai_summary in the same shape as Bedrock's, so the rest of the pipeline
+    (category attributes, counters, Review page) treats it like any other.
+    """
+    return {
+        "status": "SUCCESS",
+        "summary": extractive_summary(text),
+        "tags": model["tags"].get(category, []),
+        "category": category,
+        "source": "classifier",
+        "classifier_version": model["version"],
+        "confidence": Decimal(str(round(confidence, 4))),  # DynamoDB takes no floats
+    }
+
+
+def save_model(s3_client, bucket, model):
+    """
+    Store a new model version and point latest.json at it.
+    :return: The new version number
+    """
+    try:
+        latest = json.loads(s3_client.get_object(Bucket=bucket, Key=LATEST_KEY)["Body"].read())
+        version = int(latest["version"]) + 1
+    except s3_client.exceptions.NoSuchKey:
+        version = 1
+    model = {k: v for k, v in model.items() if not k.startswith("_")}
+    model["version"] = version
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=model_key(version),
+        Body=gzip.compress(json.dumps(model).encode("utf-8")),
+        ContentType="application/json",
+        ContentEncoding="gzip",
+    )
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=LATEST_KEY,
+        Body=json.dumps({"version": version, "metrics": model.get("metrics", {})}).encode("utf-8"),
+        ContentType="application/json",
+    )
+    return version
+
+
+def load_model(s3_client, bucket, version=None):
+    """
+    Load a model version (default: the one latest.json points at).
+    :return: Model dict, or None if no model was trained yet
+    """
+    try:
+        if version is None:
+            latest = json.loads(s3_client.get_object(Bucket=bucket, Key=LATEST_KEY)["Body"].read())
+            version = latest["version"]
+        body = s3_client.get_object(Bucket=bucket, Key=model_key(version))["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return prepare(json.loads(gzip.decompress(body)))
+
+
+def get_model(s3_client, bucket, version=None):
+    """
+    The model for this Lambda container, reloaded when latest.json moves on
+    (checked at most every MODEL_REFRESH_SECONDS).
+    """
+    now = time.time()
+    cached = _cache["model"]
+    if cached is not None and now - _cache["checked_at"] < MODEL_REFRESH_SECONDS:
+        return cached
+    _cache["checked_at"] = now
+    if version is None:
+        try:
+            latest = json.loads(s3_client.get_object(Bucket=bucket, Key=LATEST_KEY)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        version = latest["version"]
+    if cached is None or cached["version"] != int(version):
+        _cache["model"] = load_model(s3_client, bucket, version)
+        print(f"Loaded classifier model v{version}")
+    return _cache["model"]
@@ -0,0 +1,109 @@
+"""
+Aggregate counters for the Dashboard: document counts by status, by category
+(every level of the path) and by upload day.
+
+Each dimension is one bookkeeping item in the metadata table
+(file_id = "__counter__#<dimension>") holding one numeric attribute per value,
+eg: {"file_id": "__counter__#status", "AUTO_TAGGED": 12, "NEEDS_REVIEW": 3}.
+Writers compute the delta between the old and new version of a file item and
+apply it with UpdateItem ADD, so the counters stay exact without any scan.
+This module is the only implementation: the frontend imports it too
+(frontend/utils/counters.py), so both sides count the same way.
+"""
+
+COUNTER_PREFIX = "__counter__#"
+DIMENSIONS = ("status", "category", "day")
+
+
+def counter_key(dimension):
+    return f"{COUNTER_PREFIX}{dimension}"
+
+
+def counted_values(item):
+    """
+    Which counter values a file item contributes to.
+    :param item: File item (None, a tombstone or a bookkeeping item count for nothing)
+    :return: Dict of dimension -> list of values, eg: {"category": ["CS", "CS/AI"]}
+    """
+    if not item or item.get("deleted") or item.get("file_id", "").startswith("__"):
+        return {}
+
+    values = {}
+    if item.get("status"):
+        values["status"] = [item["status"]]
+    category = item.get("category")
+    if category:
+        parts = category.split("/")
+        values["category"] = ["/".join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+    if item.get("upload_timestamp"):
+        values["day"] = [item["upload_timestamp"][:10]]  # ISO 8601 -> YYYY-MM-DD
+    return values
+
+
+def counter_deltas(old_item, new_item):
+    """
+    Counter changes caused by replacing old_item with new_item.
+    :return: Dict of dimension -> {value: delta}, without zero deltas
+    """
+    deltas = {}
+    for item, sign in ((old_item, -1), (new_item, 1)):
+        for dimension, values in counted_values(item).items():
+            for value in values:
+                dimension_deltas = deltas.setdefault(dimension, {})
+                dimension_deltas[value] = dimension_deltas.get(value, 0) + sign
+
+    return {
+        dimension: {value: delta for value, delta in changes.items() if delta}
+        for dimension, changes in deltas.items()
+        if any(changes.values())
+    }
+
+
+def merge_deltas(deltas_list):
+    """
+    Sum several counter_deltas results, so a bulk operation costs one UpdateItem per dimension.
+    :return: Dict of dimension -> {value: delta}, without zero deltas
+    """
+    merged = {}
+    for deltas in deltas_list:
+        for dimension, changes in deltas.items():
+            dimension_deltas = merged.setdefault(dimension, {})
+            for value, delta in changes.items():
+                dimension_deltas[value] = dimension_deltas.get(value, 0) + delta
+    return {
+        dimension: {value: delta for value, delta in changes.items() if delta}
+        for dimension, changes in merged.items()
+        if any(changes.values())
+    }
+
+
+def apply_deltas(table, deltas):
+    """
+    Apply counter deltas with one atomic UpdateItem ADD per dimension.
+    :param table: The DynamoDB table resource
+    :param deltas: Output of counter_deltas
+    """
+    for dimension, changes in deltas.items():
+        # counter names are arbitrary strings (eg: "CS/AI"), always use placeholders
+        names = {f"#c{i}": value for i, value in enumerate(changes)}
+        values = {f":c{i}": delta for i, delta in enumerate(changes.values())}
+        table.update_item(
+            Key={"file_id": counter_key(dimension)},
+            UpdateExpression="ADD " + ", ".join(f"#c{i} :c{i}" for i in range(len(changes))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+
+def count_items(items):
+    """
+    Recompute every counter from scratch (used by the reconciliation command).
+    :param items: Iterable of file items
+    :return: Dict of dimension -> {value: count}
+    """
+    counts = {dimension: {} for dimension in DIMENSIONS}
+    for item in items:
+        for dimension, values in counted_values(item).items():
+            for value in values:
+                counts[dimension][value] = counts[dimension].get(value, 0) + 1
+    return counts
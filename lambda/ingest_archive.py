@@ -0,0 +1,482 @@
+"""
+IngestArchiveFunction: unpacks ZIP/TAR archives uploaded under archives/ and writes each
+PDF inside to uploads/<uuid>_<name>, where it enters the normal pipeline (process_doc)
+like a file uploaded on its own.
+
+The archive is never held whole, in memory or in /tmp. It is read through ranged GETs
+of READ_BLOCK bytes (S3RangeReader), READAHEAD_BLOCKS of them in flight ahead of the
+reader, and only those blocks are kept:
+    ZIP  zipfile seeks to the central directory, then reads the members in order
+    TAR  tarfile reads it as a stream (mode "r|*", also .tar.gz/.tgz/.tar.bz2)
+Members are uploaded by a thread pool while the next ones are read; the bytes read but
+not uploaded yet are capped at MAX_IN_FLIGHT_BYTES, large members go up as multipart
+uploads part by part.
+
+Progress is a bookkeeping item per archive, "__archive__#<archive_id>" (status RUNNING,
+DONE or FAILED, members found/uploaded/skipped, bytes, files/s), which the Upload page
+polls. The run holds a lease on it like process_doc.claim does: a duplicate delivery
+of the S3 event exits, a retry after a failure resumes after the last member uploaded
+in order (resume_from). Member keys are derived from the archive and the member's
+position, so a member uploaded twice by a retried run overwrites the same object.
+"""
+import datetime
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import urllib.parse
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+
+import routing  # UPLOAD_PREFIX, the prefix that triggers the pipeline
+
+s3_client = boto3.client("s3")
+dynamodb = boto3.resource("dynamodb")
+TABLE_NAME = os.environ.get("TABLE_NAME")
+
+ARCHIVE_PREFIX = "archives/"
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2")
+MEMBER_SUFFIXES = (".pdf",)
+PROGRESS_PREFIX = "__archive__#"
+
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "16"))
+MAX_IN_FLIGHT_BYTES = int(os.environ.get("MAX_IN_FLIGHT_BYTES", 256 * 1024**2))
+PART_SIZE = 16 * 1024**2  # members above it are uploaded in parts
+READ_BLOCK = 8 * 1024**2  # bytes per ranged GET of the archive
+READAHEAD_BLOCKS = int(os.environ.get("READAHEAD_BLOCKS", "4"))  # ranged GETs in flight
+# guards against archive bombs: what one archive may unpack to
+MAX_MEMBERS = int(os.environ.get("MAX_MEMBERS", "20000"))
+MAX_MEMBER_BYTES = 5 * 1024**3  # the largest file the Upload page accepts
+MAX_TOTAL_BYTES = int(os.environ.get("MAX_TOTAL_BYTES", 64 * 1024**3))
+
+LEASE_SECONDS = 60  # a run that stopped writing progress this long ago is presumed dead
+PROGRESS_SECONDS = 5  # progress (and lease) written at most this often
+
+
+class ArchiveRejected(Exception):
+    """Not an archive we unpack (format, size limits), a terminal FAILED."""
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read-only file over an S3 object: aligned blocks of `block` bytes fetched
+    with ranged GETs, the next `readahead` ones in parallel while the current one is
+    read. Only those blocks are held, never the whole object.
+    """
+
+    def __init__(self, client, bucket, key, size=None, block=None, readahead=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size if size is not None else client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.block = block or READ_BLOCK
+        self.readahead = READAHEAD_BLOCKS if readahead is None else readahead
+        self.executor = ThreadPoolExecutor(max_workers=max(self.readahead, 1), thread_name_prefix="readahead")
+        self.blocks = {}  # block number -> future of its bytes
+        self.position = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def _get(self, number):
+        start = number * self.block
+        end = min(start + self.block, self.size) - 1
+        self.requests += 1
+        return self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    def _block(self, number):
+        """Bytes of a block, queueing the ones after it and dropping the ones before."""
+        last = (self.size - 1) // self.block
+        wanted = range(number, min(number + self.readahead, last) + 1)
+        for stale in [n for n in self.blocks if n not in wanted]:
+            self.blocks.pop(stale).cancel()
+        for n in wanted:
+            if n not in self.blocks:
+                self.blocks[n] = self.executor.submit(self._get, n)
+        return self.blocks[number].result()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b""
+        chunks = []
+        while size > 0:
+            number, offset = divmod(self.position, self.block)
+            chunk = self._block(number)[offset : offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        for future in self.blocks.values():
+            future.cancel()
+        self.blocks.clear()
+        self.executor.shutdown(wait=False)
+        super().close()
+
+
+class ByteBudget:
+    """Blocks the reader while `limit` bytes are waiting to be uploaded."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            # a single part larger than the limit still goes, alone
+            self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+def archive_id_of(key):
+    """The <uuid> of archives/<uuid>_<name> (the Upload page's layout), or one derived from the key."""
+    name = os.path.basename(key)
+    try:
+        return str(uuid.UUID(name.split("_", 1)[0]))
+    except ValueError:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def member_key(archive_id, index, name):
+    """uploads/<uuid>_<file name>, the same key for the same member on every run."""
+    file_id = uuid.uuid5(uuid.UUID(archive_id), str(index))
+    return f"{routing.UPLOAD_PREFIX}{file_id}_{os.path.basename(name)}"
+
+
+def wanted(name):
+    """PDFs, without the folders and resource forks archivers add (__MACOSX/, ._name)."""
+    base = os.path.basename(name)
+    return (
+        base.lower().endswith(MEMBER_SUFFIXES)
+        and not base.startswith(".")
+        and not name.startswith("__MACOSX/")
+    )
+
+
+def zip_members(reader):
+    """(name, size, file object) of the members of a ZIP, in archive order."""
+    with zipfile.ZipFile(reader) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # opened lazily: members that are skipped are never read
+            yield info.filename, info.file_size, lambda info=info: archive.open(info)
+
+
+def tar_members(stream):
+    """(name, size, file object) of the members of a TAR read as a stream, in order."""
+    with tarfile.open(fileobj=stream, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            yield info.name, info.size, lambda info=info: archive.extractfile(info)
+
+
+def open_members(client, bucket, key):
+    """Members of the archive at key, read straight from S3."""
+    lower = key.lower()
+    if not lower.endswith(ARCHIVE_SUFFIXES):
+        raise ArchiveRejected(f"Not a ZIP or TAR archive: {key}")
+    reader = S3RangeReader(client, bucket, key)
+    members = zip_members(reader) if lower.endswith(".zip") else tar_members(reader)
+    try:
+        yield from members
+    finally:
+        reader.close()
+
+
+class Uploader:
+    """
+    Uploads members in parallel while the caller reads the next ones.
+    resume_from: every member below this index is uploaded (the ones above may be too).
+    """
+
+    def __init__(self, client, bucket, archive_id, workers=UPLOAD_WORKERS, budget=MAX_IN_FLIGHT_BYTES):
+        self.client = client
+        self.bucket = bucket
+        self.archive_id = archive_id
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive")
+        self.budget = ByteBudget(budget)
+        self.lock = threading.Lock()
+        self.done = set()  # member indexes uploaded, above resume_from
+        self.resume_from = 0
+        self.uploaded = 0
+        self.bytes = 0
+        self.errors = []
+
+    def mark_done(self, index, size):
+        with self.lock:
+            self.done.add(index)
+            while self.resume_from in self.done:
+                self.done.discard(self.resume_from)
+                self.resume_from += 1
+            if size is not None:
+                self.uploaded += 1
+                self.bytes += size
+
+    def skip(self, index):
+        self.mark_done(index, None)
+
+    def _put(self, key, data):
+        try:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=data,
+                ContentType="application/pdf",
+                Metadata={"archive-id": self.archive_id},
+            )
+        finally:
+            self.budget.release(len(data))
+
+    def _part(self, key, upload_id, number, data):
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self.budget.release(len(data))
+
+    def _done_callback(self, index, key, size):
+        def callback(future):
+            if future.exception() is not None:
+                with self.lock:
+                    self.errors.append(f"{key}: {future.exception()}")
+            else:
+                self.mark_done(index, size)
+
+        return callback
+
+    def _complete(self, key, upload_id, futures):
+        """Finish a multipart upload once its parts are up. Its parts were queued before
+        it, so they are running or done by the time a worker runs this."""
+        try:
+            parts = [future.result() for future in futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def upload(self, index, key, fileobj, size):
+        """Read one member and queue its upload, as one PUT or part by part."""
+        if size <= PART_SIZE:
+            data = fileobj.read()
+            self.budget.acquire(len(data))
+            future = self.executor.submit(self._put, key, data)
+            future.add_done_callback(self._done_callback(index, key, len(data)))
+            return
+
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ContentType="application/pdf", Metadata={"archive-id": self.archive_id}
+        )["UploadId"]
+        futures = []
+        try:
+            while True:
+                data = fileobj.read(PART_SIZE)
+                if not data:
+                    break
+                self.budget.acquire(len(data))
+                futures.append(self.executor.submit(self._part, key, upload_id, len(futures) + 1, data))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        future = self.executor.submit(self._complete, key, upload_id, futures)
+        future.add_done_callback(self._done_callback(index, key, size))
+
+    def close(self):
+        """Wait for the queued uploads. :raises RuntimeError: When some failed"""
+        self.executor.shutdown(wait=True)
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} upload(s) failed, eg: {self.errors[0]}")
+
+
+def now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def claim(table, archive_id, key, owner):
+    """
+    Take the archive's lease (first delivery, or a retry after the previous run died or failed).
+    :return: resume_from of the previous run (0 for a new archive), None when not claimed
+    """
+    now = int(time.time())
+    try:
+        response = table.update_item(
+            Key={"file_id": f"{PROGRESS_PREFIX}{archive_id}"},
+            UpdateExpression=(
+                "SET #status = :running, #archive_key = :key, #lease_owner = :owner, "
+                "#lease_expires_at = :expires, #started_at = if_not_exists(#started_at, :now)"
+            ),
+            ConditionExpression=(
+                "attribute_not_exists(#file_id) OR (#status <> :done AND #lease_expires_at < :now_epoch)"
+            ),
+            ExpressionAttributeNames={
+                "#file_id": "file_id",
+                "#status": "status",
+                "#archive_key": "archive_key",
+                "#lease_owner": "lease_owner",
+                "#lease_expires_at": "lease_expires_at",
+                "#started_at": "started_at",
+            },
+            ExpressionAttributeValues={
+                ":running": "RUNNING",
+                ":done": "DONE",
+                ":key": key,
+                ":owner": owner,
+                ":expires": now + LEASE_SECONDS,
+                ":now": now_iso(),
+                ":now_epoch": now,
+            },
+            ReturnValues="ALL_OLD",
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+    return int((response.get("Attributes") or {}).get("resume_from", 0))
+
+
+def save_progress(table, archive_id, owner, progress, release=False):
+    """Write the progress counters (and renew the lease) while this run holds it.
+    :return: False when the lease was lost"""
+    changes = dict(progress, lease_expires_at=0 if release else int(time.time()) + LEASE_SECONDS)
+    try:
+        table.update_item(
+            Key={"file_id": f"{PROGRESS_PREFIX}{archive_id}"},
+            UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in changes),
+            ConditionExpression="#lease_owner = :owner",
+            ExpressionAttributeNames=dict({f"#{k}": k for k in changes}, **{"#lease_owner": "lease_owner"}),
+            ExpressionAttributeValues=dict({f":{k}": v for k, v in changes.items()}, **{":owner": owner}),
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def ingest_archive(bucket, key, client=None, table=None, workers=UPLOAD_WORKERS):
+    """
+    Unpack one archive into uploads/.
+    :return: The final progress (status DONE), None when another run has it
+    """
+    client = client or s3_client
+    table = table or dynamodb.Table(TABLE_NAME)
+    archive_id = archive_id_of(key)
+    owner = uuid.uuid4().hex
+    resume_from = claim(table, archive_id, key, owner)
+    if resume_from is None:
+        print(f"Archive {archive_id} is being or was already unpacked, skipping")
+        return None
+    print(f"Unpacking s3://{bucket}/{key} as {archive_id}, from member {resume_from}")
+
+    uploader = Uploader(client, bucket, archive_id, workers=workers)
+    uploader.resume_from = resume_from
+    started = time.monotonic()
+    found = skipped = total_bytes = 0
+    last_saved = started
+
+    def progress(status):
+        seconds = max(time.monotonic() - started, 1e-6)
+        return {
+            "status": status,
+            "members_found": found,
+            "members_uploaded": uploader.uploaded,
+            "members_skipped": skipped,
+            "bytes_uploaded": uploader.bytes,
+            "resume_from": uploader.resume_from,
+            "files_per_second": Decimal(str(round(uploader.uploaded / seconds, 2))),
+            "progress_at": now_iso(),
+        }
+
+    try:
+        for index, (name, size, open_member) in enumerate(open_members(client, bucket, key)):
+            if index >= MAX_MEMBERS:
+                raise ArchiveRejected(f"More than {MAX_MEMBERS} members")
+            if index < resume_from:
+                continue  # uploaded by an earlier run
+            if not wanted(name) or size > MAX_MEMBER_BYTES:
+                skipped += 1
+                uploader.skip(index)
+                continue
+            total_bytes += size
+            if total_bytes > MAX_TOTAL_BYTES:
+                raise ArchiveRejected(f"Unpacks to more than {MAX_TOTAL_BYTES} bytes")
+            found += 1
+            with open_member() as member:
+                uploader.upload(index, member_key(archive_id, index, name), member, size)
+            if time.monotonic() - last_saved > PROGRESS_SECONDS:
+                last_saved = time.monotonic()
+                if not save_progress(table, archive_id, owner, progress("RUNNING")):
+                    raise RuntimeError(f"Lease on archive {archive_id} lost")
+        uploader.close()
+    except Exception as e:
+        uploader.executor.shutdown(wait=True)  # what was queued still counts for resume_from
+        failed = dict(progress("FAILED"), message=str(e)[:500])
+        save_progress(table, archive_id, owner, failed, release=True)
+        print(f"Unpacking {archive_id} failed after {uploader.uploaded} member(s): {str(e)}")
+        if isinstance(e, (ArchiveRejected, zipfile.BadZipFile, tarfile.TarError)):
+            return failed  # retrying won't help
+        raise e
+
+    final = dict(progress("DONE"), finished_at=now_iso())
+    save_progress(table, archive_id, owner, final, release=True)
+    print(
+        f"Unpacked {archive_id}: {uploader.uploaded} PDF(s), {skipped} other member(s) skipped, "
+        f"{uploader.bytes} bytes, {final['files_per_second']} files/s"
+    )
+    return final
+
+
+def handler(event, context):
+    """
+    S3 trigger on archives/*.zip|tar|tgz|tar.gz|tar.bz2.
+    :return: A dictionary with status code and the final progress
+    """
+    print("Received event: " + json.dumps(event, indent=2))
+    results = {}
+    for record in event.get("Records", []):
+        bucket = record["s3"]["bucket"]["name"]
+        key = urllib.parse.unquote_plus(record["s3"]["object"]["key"], encoding="utf-8")
+        if not key.startswith(ARCHIVE_PREFIX):
+            print(f"{key} is not under {ARCHIVE_PREFIX}, skipping")
+            continue
+        results[key] = ingest_archive(bucket, key)
+    return {"statusCode": 200, "body": json.dumps(results, default=str)}
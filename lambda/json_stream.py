@@ -0,0 +1,105 @@
+"""
+Incremental parser for the JSON object a model streams back, one text delta at a time.
+
+It only tracks what the pipeline needs to decide early:
+  - the top-level string fields as soon as each one is complete
+    (eg: "status": "INSUFFICIENT_DATA" ends the call before the rest is generated),
+  - the end of the first top-level object, which is returned right away instead of
+    waiting for the end of the stream.
+Text around the object (a preamble, code fences) is ignored, like the old
+first "{" / last "}" slice did.
+"""
+import json
+
+
+class IncrementalJSON:
+    """
+    :param stop_statuses: Values of the top-level "status" field after which the rest
+        of the reply is not needed, feed() returns True as soon as one is read
+    """
+
+    def __init__(self, stop_statuses=()):
+        self.stop_statuses = set(stop_statuses)
+        self.buffer = []  # text of the object so far
+        self.fields = {}  # complete top-level string fields
+        self.complete = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string = []  # the string being read, when it is a top-level key or value
+        self.key = None  # last top-level key read
+        self.expect = "key"  # top level: "key" or "value", after a ":" / ","
+        self.received = 0  # characters fed, including text around the object
+
+    def feed(self, text):
+        """
+        Consume the next piece of the reply.
+        :param text: A text delta
+        :return: True once the object is complete or has a stop status (stop reading)
+        """
+        self.received += len(text)
+        for char in text:
+            if self.complete:
+                break
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    self.buffer.append(char)
+                continue
+            self.buffer.append(char)
+            self._step(char)
+        return self.complete or self.status in self.stop_statuses
+
+    def _step(self, char):
+        top = self.depth == 1
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+                if top:
+                    self._string_done()
+                return
+            if top:
+                self.string.append(char)
+            return
+        if char == '"':
+            self.in_string = True
+            self.string = []
+        elif char in "{[":
+            self.depth += 1
+        elif char in "}]":
+            self.depth -= 1
+            if self.depth == 0:
+                self.complete = True
+        elif top and char == ":":
+            self.expect = "value"
+        elif top and char == ",":
+            self.expect = "key"
+
+    def _string_done(self):
+        raw = "".join(self.string)
+        try:
+            value = json.loads(f'"{raw}"')  # resolve escapes
+        except ValueError:
+            value = raw
+        if self.expect == "key":
+            self.key = value
+        elif self.key is not None:
+            self.fields[self.key] = value
+            self.key = None
+
+    @property
+    def status(self):
+        return self.fields.get("status")
+
+    def value(self):
+        """
+        The parsed object, once complete.
+        :raises ValueError: when the object is incomplete or not valid JSON
+        """
+        if not self.complete:
+            raise ValueError("incomplete JSON object")
+        return json.loads("".join(self.buffer))
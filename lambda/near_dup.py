@@ -0,0 +1,191 @@
+"""
+Near-duplicate detection for ingested documents (arXiv v1/v2/v3, camera-ready
+versions of the same paper, ...) with MinHash signatures and LSH banding.
+
+A document's extracted text is cut into word shingles; its MinHash signature
+(NUM_PERM 32-bit minimums) estimates the Jaccard similarity of two shingle sets.
+The signature is split into BANDS bands of ROWS rows; documents sharing any band
+are candidates, so a lookup costs one BatchGetItem of BANDS bucket items plus one
+for the candidates, however many documents are indexed.
+
+Buckets are bookkeeping items in the metadata table
+(file_id = "__lsh__#<band>#<hash of the band>", attribute `file_ids`: string set),
+the signature itself is stored on the file item (`minhash`, 512 bytes binary).
+With 32 bands of 4 rows, pairs above ~0.5 Jaccard become candidates with high
+probability (0.5 -> 87%, 0.6 -> 99%); candidates are then confirmed against
+SIMILARITY_THRESHOLD. Unrelated papers share well under 1% of their shingles.
+"""
+import hashlib
+import random
+import re
+import struct
+import time
+import zlib
+
+LSH_PREFIX = "__lsh__#"
+SHINGLE_SIZE = 3  # words per shingle, short so a revised sentence changes few of them
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = 0.5  # estimated Jaccard to call two documents versions of each other
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures must stay comparable across invocations and deployments
+_rng = random.Random(20240307)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)
+]
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Hashed word shingles of a text (case and punctuation insensitive).
+    :param text: The extracted text
+    :return: Set of 32-bit shingle hashes, empty if there is no text
+    """
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i : i + size]).encode())
+        for i in range(len(words) - size + 1)
+    }
+
+
+def signature(text):
+    """
+    MinHash signature of a text.
+    :param text: The extracted text
+    :return: Tuple of NUM_PERM ints, or None when there is no text to compare
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    return tuple(
+        min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the fraction of equal minimums."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def pack(sig):
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+
+def unpack(data):
+    data = getattr(data, "value", data)  # boto3 returns Binary objects
+    return struct.unpack(f"<{NUM_PERM}I", bytes(data))
+
+
+def bucket_keys(sig):
+    """
+    The LSH bucket items a signature belongs to, one per band.
+    :param sig: MinHash signature
+    :return: List of file_id keys, eg: "__lsh__#03#9f86d081884c7d65"
+    """
+    keys = []
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}I", *sig[band * ROWS : (band + 1) * ROWS])
+        keys.append(f"{LSH_PREFIX}{band:02d}#{hashlib.blake2b(rows, digest_size=8).hexdigest()}")
+    return keys
+
+
+def batch_get(dynamodb, table_name, keys, projection, attr_names, max_retries=5):
+    """
+    BatchGetItem with retries of UnprocessedKeys (keys must fit in one call, <= 100).
+    :return: List of items
+    """
+    items = []
+    request = {
+        table_name: {
+            "Keys": [{"file_id": key} for key in keys],
+            "ProjectionExpression": projection,
+            "ExpressionAttributeNames": attr_names,
+        }
+    }
+    for attempt in range(max_retries):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        items.extend(response.get("Responses", {}).get(table_name, []))
+        request = response.get("UnprocessedKeys")
+        if not request:
+            break
+        time.sleep(min(0.05 * 2**attempt, 1))
+    return items
+
+
+def find_near_duplicate(dynamodb, table_name, file_id, sig, threshold=SIMILARITY_THRESHOLD):
+    """
+    Look up the most similar indexed document.
+    :param dynamodb: boto3 DynamoDB service resource
+    :param table_name: The metadata table
+    :param file_id: The document being ingested (never matched with itself)
+    :param sig: Its MinHash signature
+    :return: (item, similarity) of the best match above `threshold`, or (None, 0.0).
+             The item carries file_id, status, ai_summary and version_of.
+    """
+    buckets = batch_get(
+        dynamodb, table_name, bucket_keys(sig), "#file_ids", {"#file_ids": "file_ids"}
+    )
+    candidates = set()
+    for bucket in buckets:
+        candidates.update(bucket.get("file_ids", ()))
+    candidates.discard(file_id)
+    if not candidates:
+        return None, 0.0
+
+    best, best_similarity = None, 0.0
+    candidates = sorted(candidates)
+    for start in range(0, len(candidates), 100):
+        items = batch_get(
+            dynamodb,
+            table_name,
+            candidates[start : start + 100],
+            "#file_id, #minhash, #status, #ai_summary, #version_of, #deleted",
+            {
+                f"#{name}": name
+                for name in ("file_id", "minhash", "status", "ai_summary", "version_of", "deleted")
+            },
+        )
+        for item in items:
+            if item.get("deleted") or "minhash" not in item:
+                continue  # deleted since it was indexed
+            score = similarity(sig, unpack(item["minhash"]))
+            if score >= threshold and score > best_similarity:
+                best, best_similarity = item, score
+    print(f"Near-duplicate lookup: {len(candidates)} candidate(s), best similarity {best_similarity:.2f}")
+    return best, best_similarity
+
+
+def index_signature(table, file_id, sig):
+    """
+    Add a document to the LSH buckets of its signature (one UpdateItem ADD per band).
+    :param table: The DynamoDB table resource
+    """
+    for key in bucket_keys(sig):
+        table.update_item(
+            Key={"file_id": key},
+            UpdateExpression="ADD #file_ids :file_id",
+            ExpressionAttributeNames={"#file_ids": "file_ids"},
+            ExpressionAttributeValues={":file_id": {file_id}},
+        )
+
+
+def link_version(table, root_id, file_id):
+    """
+    Record `file_id` among the versions of `root_id` (the first document of the family).
+    :param table: The DynamoDB table resource
+    """
+    try:
+        table.update_item(
+            Key={"file_id": root_id},
+            UpdateExpression="ADD #versions :file_id",
+            ConditionExpression="attribute_exists(file_id) AND attribute_not_exists(deleted)",
+            ExpressionAttributeNames={"#versions": "versions"},
+            ExpressionAttributeValues={":file_id": {file_id}},
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Version root {root_id} no longer exists, link not recorded on it")
@@ -4,8 +4,19 @@ import boto3  # AWS SDK for Python
 import os
 import re  # Regular expressions
 import datetime
+import time
 import uuid  # For generating unique file IDs
-from pypdf import PdfReader  # PDF processing library
+import counters  # Dashboard aggregate counters
+import categories  # category path -> indexable attributes, shared with the frontend
+import near_dup  # MinHash/LSH near-duplicate (version) detection
+import classifier  # local category classifier (naive Bayes)
+import bedrock_client  # rate limiting, retries and circuit breaker around InvokeModel
+import json_stream  # incremental parsing of the streamed reply
+import artifacts  # per-document extraction cache in S3
+import blobs  # content-addressed S3 storage for the bulky fields of an item
+import routing  # server-side move of tagged files to processed/{Category}/
+from table_version import SYNC_SHARD, TABLE_VERSION_KEY, bump_table_version  # change feed of the frontend sync
+from decimal import Decimal
 
 #  init clients
 s3_client = boto3.client("s3")
@@ -13,10 +24,53 @@ dynamodb = boto3.resource("dynamodb")
 bedrock_runtime = boto3.client(
     "bedrock-runtime", region_name="us-east-1"
 )  # Bedrock is only available in us-east-1 as of now
+# One per container: the rate limiter, circuit breaker and latency histograms outlive an invocation
+bedrock = bedrock_client.BedrockClient(bedrock_runtime)
+lambda_client = boto3.client("lambda")  # to continue a long extraction in a new invocation
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
 
 # environment variables： Captured table and bucket names from CDK stack deployment
 TABLE_NAME = os.environ.get("TABLE_NAME")
 BUCKET_NAME = os.environ.get("BUCKET_NAME")
+# One per container and bucket, like the clients: the in-memory cache outlives an invocation
+blob_stores = {BUCKET_NAME: blobs.BlobStore(s3_client, BUCKET_NAME)}
+
+
+# Stored on every processed item: bump them when the prompt or the text extraction changes,
+# so scripts/backfill.py knows which documents to run again.
+PROMPT_VERSION = 1
+EXTRACTOR_VERSION = 1
+
+# Items keep the fields the UI lists (ai_summary); the full model result, with the raw
+# reply, is a content-addressed blob in S3 whose key is stored as ai_result_key.
+SUMMARY_FIELDS = ("status", "summary", "tags", "category", "source", "message")
+
+# Reuse the AI result of a near-identical earlier version instead of calling Bedrock again
+REUSE_DUPLICATE_RESULTS = os.environ.get("REUSE_DUPLICATE_RESULTS", "false").lower() == "true"
+REUSE_SIMILARITY = 0.9  # stricter than near_dup.SIMILARITY_THRESHOLD, which only links versions
+
+# Local classifier: off | shadow (predict and record, always call Bedrock) | on (skip
+# Bedrock above the threshold). The threshold defaults to the one calibrated at training.
+CLASSIFIER_MODE = os.environ.get("CLASSIFIER_MODE", "off").lower()
+CLASSIFIER_THRESHOLD = os.environ.get("CLASSIFIER_THRESHOLD")
+
+# Files whose Bedrock call was deferred (throttling, circuit open), as a string set on
+# one bookkeeping item; the scheduled sweep ({"retry_deferred": true}) processes them again.
+DEFERRED_KEY = "__deferred__"
+SAVE_MARGIN_SECONDS = 5  # Lambda time kept back for saving the result after the last Bedrock wait
+
+# State lock: a run claims the file (status PROCESSING, lease_owner, lease_expires_at) with a
+# conditional write before any download or model call. Duplicate or concurrent deliveries of
+# the same S3 event fail the condition and exit; a lease left by a crashed run expires.
+LEASE_SECONDS = int(os.environ.get("LEASE_SECONDS", "300"))
+
+# Extraction that does not fit in one invocation: it stops MODEL_RESERVE_SECONDS before the
+# deadline (the model call must still fit), checkpoints the pages read in the artifact and
+# hands the rest to a new asynchronous invocation of this function ({"continue_extraction": ...}).
+MODEL_RESERVE_SECONDS = 10
+MAX_CONTINUATIONS = int(os.environ.get("MAX_CONTINUATIONS", "20"))
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")  # set by the Lambda runtime
+clock = time.monotonic  # what deadlines are measured with, simulated in tests
 
 
 def download_file_from_s3_to_tmp(bucket_name, key):
@@ -83,58 +137,56 @@ def extract_sections_by_keywords(text):
 
 def extract_text_smartly(pdf_path, head=4, tail=5):
     """
-    Extract text from a PDF file, removing the first few pages and the last few pages.
+    Extract text from a PDF file: the first few pages and the last few pages.
     :param pdf_path: Path to the PDF file
-    :param head: Number of pages to skip from the start
-    :param tail: Number of pages to skip from the end
+    :param head: Number of pages to read from the start
+    :param tail: Number of pages to read from the end
     :return: Cleaned text from the PDF
     """
-    try:
-        reader = PdfReader(pdf_path)  # Read the PDF file
-        total_pages = len(reader.pages)  # Get total number of pages
-        text_content = []
+    return extracted_text(artifacts.Extraction(None, lambda: pdf_path, EXTRACTOR_VERSION), head, tail)
 
-        if total_pages <= head + tail:
-            pages_to_read = range(total_pages)  # If not enough pages, read all
-        else:
-            head_pages = range(0, head)  # Pages to skip from the start
-            tail_pages = range(
-                total_pages - tail, total_pages
-            )  # Pages to skip from the end
-            pages_to_read = sorted(
-                list(set(list(head_pages) + list(tail_pages)))
-            )  # Combine and sort the pages to read
-        print(f"Total pages: {total_pages}, Reading pages: {list(pages_to_read)}")
-
-        for i in pages_to_read:
-            try:
-                page_text = reader.pages[
-                    i
-                ].extract_text()  # Extract text from each page
-                if page_text:
-                    text_content.append(page_text)  # Append non-empty text
-            except Exception:
-                continue  # Skip pages that cannot be read
-
-        full_text = "\n".join(text_content)  # Join all text into a single string
-        cleaned_text = clean_reference(full_text)  # Clean up references
-        return (
-            cleaned_text.strip()
-        )  # Return cleaned text, removing leading/trailing whitespace
-    except Exception as e:
-        print(f"Error extracting text from PDF: {str(e)}")
-        return ""  # Return empty string on error
+
+def extracted_text(extraction, head=4, tail=5, deadline=None, checkpoint=None):
+    """
+    The text the pipeline works on, from a document's extraction artifact (pages it lacks are read from the PDF).
+    :param extraction: artifacts.Extraction of the document
+    :param deadline: clock() value after which no new page is read (raises artifacts.ExtractionIncomplete)
+    :param checkpoint: Function saving the artifact, called between units of pages
+    :return: Cleaned text, references cut off ("" for an unreadable PDF; download errors are raised)
+    """
+    full_text = extraction.text(head, tail, deadline, checkpoint)  # Join the text of the selected pages
+    cleaned_text = clean_reference(full_text)  # Clean up references
+    return cleaned_text.strip()  # Return cleaned text, removing leading/trailing whitespace
 
 
-def ask_bedrock_model(text):
+def load_extraction(bucket, key, file_id):
     """
-    Send the extracted text to an Amazon Bedrock model for processing.
-    :param text: The text extracted from the PDF
-    :return: The response from the Bedrock model
+    The extraction artifact of a document (artifacts/<file_id>/extraction.json.gz), or a new
+    one when it has none, an older EXTRACTOR_VERSION or was read from another upload of the key.
+    The PDF is downloaded only if a page is missing.
     """
+    etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"]  # errors propagate, like a failed download
+    data = artifacts.load(s3_client, bucket, file_id, EXTRACTOR_VERSION, etag)
+    if data is not None:
+        print(f"Using the extraction artifact of {file_id} ({len(data['pages'])} pages)")
+    fetch_pdf = lambda: download_file_from_s3_to_tmp(bucket, key)  # noqa: E731
+    return artifacts.Extraction(data, fetch_pdf, EXTRACTOR_VERSION, clock, source_etag=etag)
+
+
+def save_extraction(bucket, file_id, extraction):
+    """Store the artifact when this run read new pages."""
+    if extraction.changed and extraction.data is not None:
+        artifacts.save(s3_client, bucket, file_id, extraction.data)
+        extraction.changed = False
+
 
-    # prompt construction
-    prompt = f"""
+def build_prompt(text):
+    """
+    The analysis prompt for a document, shared by the Lambda and batch reprocessing.
+    :param text: The text extracted from the PDF
+    :return: The prompt string
+    """
+    return f"""
     You are an expert research librarian. Analyze the following academic paper text (which is truncated).
 
     <text>
@@ -160,40 +212,144 @@ def ask_bedrock_model(text):
     Output ONLY JSON.
     """
 
-    # request body containing model parameters, token limits, and the constructed prompt
-    body = json.dumps(
-        {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": [{"role": "user", "content": prompt}],
-        }
-    )
 
+def request_body(text):
+    """
+    Request body containing model parameters, token limits, and the constructed prompt
+    (the modelInput of a batch inference record).
+    """
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 1000,
+        "messages": [{"role": "user", "content": build_prompt(text)}],
+    }
+
+
+def parse_reply(ai_reply):
+    """
+    The JSON object in a complete model reply (text around it is ignored).
+    :param ai_reply: The model's reply text
+    :return: The result dict, status ERROR if it can't be parsed
+    """
+    parser = json_stream.IncrementalJSON()
+    parser.feed(ai_reply or "")
     try:
-        # invoke bedrock model
-        response = bedrock_runtime.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0", body=body
-        )
-        response_body = json.loads(response.get("body").read())  # Parse response body
-        ai_reply = response_body["content"][0][
-            "text"
-        ]  # Extract model's reply text, structure may vary by model
+        result = parser.value()
+    except ValueError as e:
+        print(f"Error parsing JSON from model response: {ai_reply}, Error: {str(e)}")
+        result = {"status": "ERROR", "message": "Failed to parse model response"}
+    if isinstance(result, dict):
+        result["raw_reply"] = ai_reply  # kept in the result blob only, see offload_result
+    return result
 
-        # Try to extract JSON from the model's reply
-        try:
-            json_str = ai_reply[ai_reply.find("{") : ai_reply.rfind("}") + 1]
-            return json.loads(json_str)
-        except Exception as e:
-            print(
-                f"Error parsing JSON from model response: {ai_reply}, Error: {str(e)}"
-            )
-            return {"status": "ERROR", "message": "Failed to parse model response"}
+
+def model_text(text):
+    """
+    What is sent to the model for a Round 1 text: its Abstract/Intro/Conclusion
+    when they can be found (saves tokens), the whole text otherwise.
+    """
+    # Try Semantic Extraction (Keyword-based)
+    semantic_text = extract_sections_by_keywords(text)
+    if semantic_text and len(semantic_text) > 600:
+        print("Semantic extraction successful! Using optimized text.")
+        return semantic_text
+    print("Semantic extraction failed or too short. Using full Head+Tail text.")
+    return text
+
+
+def ask_bedrock_model(text, deadline=None):
+    """
+    Send the extracted text to an Amazon Bedrock model for processing.
+    :param text: The text extracted from the PDF
+    :param deadline: time.monotonic() value after which no retry starts
+    :return: The response from the Bedrock model
+    :raises bedrock_client.BedrockUnavailable: throttled or circuit open, defer the file
+    """
+    body = json.dumps(request_body(text))
+
+    try:
+        # invoke bedrock model, streamed (rate limited, retried with backoff, see bedrock_client.py).
+        # Reading stops as soon as the JSON object closes or the status says INSUFFICIENT_DATA,
+        # so the retry path doesn't wait for (or pay for) a reply it will throw away.
+        response = bedrock.invoke_stream(
+            MODEL_ID,
+            body,
+            lambda: json_stream.IncrementalJSON(stop_statuses=["INSUFFICIENT_DATA"]),
+            deadline=deadline,
+        )
+        parser = response["parser"]
+        if parser.complete:
+            return parse_reply(response["text"])
+        if parser.status == "INSUFFICIENT_DATA":
+            print(f"INSUFFICIENT_DATA after {parser.received} characters, generation stopped")
+            return {"status": "INSUFFICIENT_DATA", "stopped_early": True}
+        print(f"Error parsing JSON from model response: {response['text']}, Error: incomplete object")
+        return {"status": "ERROR", "message": "Failed to parse model response"}
+    except bedrock_client.BedrockUnavailable:
+        raise  # not an error of this document, the handler defers it
     except Exception as e:
         print(f"Error invoking Bedrock model: {str(e)}")
         return {"status": "ERROR", "message": {str(e)}}
 
 
-def save_metadata_to_DDB(file_id, original_file_name, s3_key, ai_result):
+def compact_summary(ai_result):
+    """The part of a model result kept on the item: SUMMARY_FIELDS and small flags (eg: retry_performed)."""
+    return {
+        key: value
+        for key, value in ai_result.items()
+        if key in SUMMARY_FIELDS or isinstance(value, (bool, int, Decimal))
+    }
+
+
+def blob_store(bucket):
+    """The BlobStore of a bucket (scripts pass their own), created on first use."""
+    if bucket not in blob_stores:
+        blob_stores[bucket] = blobs.BlobStore(s3_client, bucket)
+    return blob_stores[bucket]
+
+
+def offload_result(bucket, ai_result):
+    """
+    Split a model result for storage: the compact ai_summary goes on the item, the full
+    result (with the raw reply) to a blob in S3.
+    :return: (ai_summary, ai_result_key); when the blob can't be written the key is None
+        and ai_summary is the whole result without the raw reply, like before the blobs
+    """
+    try:
+        key = blob_store(bucket or BUCKET_NAME).put(ai_result)
+        return compact_summary(ai_result), key
+    except Exception as e:
+        print(f"Could not store the model result in S3: {str(e)}")
+        return {k: v for k, v in ai_result.items() if k != "raw_reply"}, None
+
+
+# Attributes a run owns on the item: the lease and progress of the run, and the result fields
+# that depend on the result (category when tagged, version link when a near-duplicate, ...).
+# The final write sets the ones it has and removes the others.
+PIPELINE_ATTRIBUTES = (
+    "lease_owner",
+    "lease_expires_at",
+    "claimed_event",
+    "extraction_progress",
+    "ai_result_key",
+    "minhash",
+    "version_of",
+    "similarity",
+    "classifier_shadow",
+) + categories.CATEGORY_ATTRIBUTES
+
+
+def save_metadata_to_DDB(
+    file_id, original_file_name, s3_key, ai_result, extra_attributes=None, owner=None, event_id=None, bucket=None
+):
+    """
+    Write the result onto the file's item (terminal status) and release the lease. Only the
+    pipeline's attributes change: notes, verification, embedding and version links stay.
+    :param owner: The run's lease owner: the write only goes through while it holds the lease
+    :param event_id: The S3 event processed, later deliveries of it are recognized as duplicates
+    :param bucket: Bucket of the result blob (default: BUCKET_NAME)
+    :return: The final status, None when the lease was lost to another run
+    """
     table = dynamodb.Table(TABLE_NAME)
     ai_status = ai_result.get("status", "ERROR")
     if ai_status == "SUCCESS":
@@ -201,119 +357,624 @@ def save_metadata_to_DDB(file_id, original_file_name, s3_key, ai_result):
     else:
         final_status = "NEEDS_REVIEW"
     print(f"AI processing status: {ai_status} -> final status: {final_status}")
-    item = {
-        "file_id": file_id,
+    ai_summary, ai_result_key = offload_result(bucket, ai_result)
+    changes = {
         "original_file_name": original_file_name,
         "s3_key": s3_key,
-        "upload_timestamp": datetime.datetime.now(
-            datetime.timezone.utc
-        ).isoformat(),  # ISO 8601 format
         "status": final_status,  # AUTO_TAGGED, NEEDS_REVIEW, etc.
-        "ai_summary": ai_result,  # Store full AI result for reference (json dict concluding status, summary, tags, category)
-        "user_notes": "",  # Placeholder for user notes
-        "is_verified": False,  # Placeholder for verification status
+        "ai_summary": ai_summary,  # status, summary, tags, category; the full result is in S3 (ai_result_key)
+        "sync_shard": SYNC_SHARD,  # partition key of the sparse updated-index GSI
+        "prompt_version": PROMPT_VERSION,
+        "extractor_version": EXTRACTOR_VERSION,
     }
+    if final_status == "AUTO_TAGGED":
+        changes.update(categories.split_attributes(ai_result.get("category"))[0])  # feeds the category GSIs
+    changes.update(extra_attributes or {})  # eg: minhash signature and version links
+    if ai_result_key:
+        changes["ai_result_key"] = ai_result_key
+    if event_id:
+        changes["processed_event"] = event_id
+    # what an earlier run of the pipeline may have left and this one doesn't set; the rest
+    # of the item (upload time, notes, verification, embedding, versions) is kept
+    removed = [key for key in PIPELINE_ATTRIBUTES if key not in changes]
+
+    update = "SET " + ", ".join(f"#{k} = :{k}" for k in changes)
+    update += ", #updated_at = :updated_at, #upload_timestamp = if_not_exists(#upload_timestamp, :now)"
+    update += ", #user_notes = if_not_exists(#user_notes, :empty), #is_verified = if_not_exists(#is_verified, :false)"
+    update += " REMOVE " + ", ".join(f"#{k}" for k in removed)
+    names = {f"#{k}": k for k in list(changes) + removed + ["updated_at", "upload_timestamp", "user_notes", "is_verified"]}
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()  # ISO 8601 format
+    values = dict({f":{k}": v for k, v in changes.items()}, **{":now": now, ":empty": "", ":false": False})
+    update_kwargs = {}
+    if owner:
+        condition, owner_values = owned_by(owner)
+        update_kwargs["ConditionExpression"] = condition
+        names["#lease_owner"] = "lease_owner"
+        values.update(owner_values)
 
     try:
-        table.put_item(Item=item)
+        values[":updated_at"] = changes["updated_at"] = bump_table_version(table)
+        response = table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression=update,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_OLD",
+            **update_kwargs,
+        )
         print(f"Metadata saved to DynamoDB for file_id: {file_id}")
+        # compare with the previous version (if this file was processed before) to keep counters exact
+        old_item = response.get("Attributes")
+        new_item = dict(old_item or {"file_id": file_id, "upload_timestamp": now}, **changes)
+        for key in removed:
+            new_item.pop(key, None)
+        counters.apply_deltas(table, counters.counter_deltas(old_item, new_item))
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Lease on {file_id} lost to another run, result not saved")
+        return None
     except Exception as e:
         print(f"Error saving metadata to DynamoDB: {str(e)}")
         raise e
+    return final_status
 
 
-def handler(event, context):
+def route_document(bucket, file_id, key, category, deadline=None):
     """
-    This is the entry point for the Lambda function. AWS will call this function when a file is uploaded to S3, passing information about the file in the 'event' parameter.
-    :param event: The event data from S3, it is a dictionary containing details about the S3 object that triggered the Lambda function
-    :param context: The runtime information of the Lambda function
-    :return: A dictionary with status code and message
+    Move a tagged file to the prefix of its category (routing.move). A file that can't be
+    moved stays where it is, its item keeps pointing at it; scripts/reroute.py catches up.
+    :return: The file's key after routing
+    """
+    if deadline is not None and clock() > deadline:
+        print(f"No time left to route {file_id}, it stays at {key}")
+        return key
+    try:
+        new_key, _ = routing.move(s3_client, dynamodb.Table(TABLE_NAME), bucket, file_id, key, category)
+        return new_key
+    except Exception as e:
+        print(f"Could not route {file_id}: {str(e)}")
+        return key
+
+
+def get_file_id_from_key(key):
+    """
+    Extract the file_id (UUID) from an S3 key (Format: uploads/UUID_Filename.pdf).
+    If extraction fails (e.g. manual upload without UUID), fallback to generating a new one.
+    :param key: The S3 object key
+    :return: The file_id
+    """
+    try:
+        # key example: "uploads/123e4567-e89b-12d3-a456-426614174000_paper.pdf"
+        filename = os.path.basename(key)
+        if "_" in filename:
+            # Split by the first underscore
+            file_id = filename.split("_", 1)[0]
+            # Validate if it looks like a UUID (simple length check or try-except)
+            uuid.UUID(file_id)  # This will raise ValueError if not a valid UUID
+            return file_id
+        raise ValueError("No UUID found in filename")
+    except Exception:
+        print("Could not extract UUID from filename, generating a new one.")
+        return str(uuid.uuid4())
+
+
+def check_near_duplicate(file_id, text):
+    """
+    Compute the MinHash signature of the extracted text and look for an earlier version.
+    A failed lookup never fails the ingest, the document is then treated as new.
+    :param file_id: The document being ingested
+    :param text: The extracted text
+    :return: (signature or None, matching item or None, similarity)
     """
+    sig = near_dup.signature(text)
+    if sig is None:
+        return None, None, 0.0
+    try:
+        match, score = near_dup.find_near_duplicate(dynamodb, TABLE_NAME, file_id, sig)
+    except Exception as e:
+        print(f"Near-duplicate lookup failed: {str(e)}")
+        return sig, None, 0.0
+    if match:
+        print(f"{file_id} is a version of {match['file_id']} (similarity {score:.2f})")
+    return sig, match, score
+
+
+def reusable_result(match, score):
+    """
+    The AI result of an earlier version, if reuse is enabled and it can be trusted.
+    :return: The result to store for the new document, or None
+    """
+    if not (REUSE_DUPLICATE_RESULTS and match and score >= REUSE_SIMILARITY):
+        return None
+    ai_summary = match.get("ai_summary") or {}
+    if match.get("status") not in ("AUTO_TAGGED", "REVIEWED") or ai_summary.get("status") != "SUCCESS":
+        return None
+    print(f"Reusing the AI result of {match['file_id']}")
+    return dict(ai_summary, reused_from=match["file_id"])
+
+
+def version_attributes(sig, match, score):
+    """
+    Item attributes recording the signature and, for a near-duplicate, its version family.
+    """
+    attributes = {"minhash": near_dup.pack(sig)} if sig else {}
+    if match:
+        attributes["version_of"] = match.get("version_of") or match["file_id"]  # family root
+        attributes["similarity"] = Decimal(str(round(score, 3)))
+    return attributes
+
+
+def index_near_duplicate(file_id, sig, match):
+    """
+    Make the saved document findable by later versions, and link it to its family.
+    """
+    if sig is None:
+        return
+    table = dynamodb.Table(TABLE_NAME)
+    try:
+        near_dup.index_signature(table, file_id, sig)
+        if match:
+            near_dup.link_version(table, match.get("version_of") or match["file_id"], file_id)
+    except Exception as e:
+        print(f"Error indexing near-duplicate signature: {str(e)}")
+
+
+def classify_locally(text):
+    """
+    Run the local classifier (CLASSIFIER_MODE shadow or on). Never fails the ingest.
+    :param text: The full Round 1 text
+    :return: (model, category, confidence), or None when off, untrained or failing
+    """
+    if CLASSIFIER_MODE not in ("shadow", "on") or not text:
+        return None
+    try:
+        model = classifier.get_model(s3_client, BUCKET_NAME)
+        if model is None:
+            print("No classifier model trained yet.")
+            return None
+        started = time.perf_counter()
+        category, confidence = classifier.predict(model, text)
+    except Exception as e:
+        print(f"Classifier failed: {str(e)}")
+        return None
     print(
-        "Received event: " + json.dumps(event, indent=2)
-    )  # Log the received event for debugging. indent=2 makes it pretty-printed
+        f"Classifier v{model['version']}: {category} ({confidence:.3f}) "
+        f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return model, category, confidence
+
+
+def is_confident(model, confidence):
+    threshold = CLASSIFIER_THRESHOLD or model.get("threshold", 0.95)
+    return confidence >= float(threshold)
+
+
+def classifier_result(prediction, text):
+    """
+    The classifier's answer in place of Bedrock's (CLASSIFIER_MODE=on, confident only).
+    :return: ai_result dict, or None to ask Bedrock
+    """
+    if CLASSIFIER_MODE != "on" or prediction is None:
+        return None
+    model, category, confidence = prediction
+    if category is None or not is_confident(model, confidence):
+        return None
+    return classifier.to_ai_result(model, text, category, confidence)
+
+
+def classifier_attributes(prediction, ai_result):
+    """
+    Record the prediction next to the final answer, for scripts/eval_classifier.py.
+    """
+    if prediction is None:
+        return {}
+    model, category, confidence = prediction
+    used = ai_result.get("source") == "classifier"
+    record = {
+        "version": model["version"],
+        "category": category or "",
+        "confidence": Decimal(str(round(confidence, 4))),
+        "confident": is_confident(model, confidence),
+        "used": used,
+    }
+    if not used and ai_result.get("status") == "SUCCESS":
+        record["llm_category"] = ai_result.get("category", "")
+    return {"classifier_shadow": record}
+
+
+def set_status(file_id, status, original_file_name, s3_key, extra=None, condition=None, condition_values=None):
+    """
+    Record a status transition (eg: PROCESSING, ERROR) as soon as it happens,
+    so the frontend can follow in-flight files with a BatchGetItem instead of a scan.
+    :param file_id: The file_id of the document
+    :param status: The new status
+    :param extra: More attributes to set in the same write (eg: the lease)
+    :param condition: ConditionExpression the write depends on (attribute names as #name)
+    :param condition_values: Its ExpressionAttributeValues
+    :return: True, or False when the condition failed (nothing was written)
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    changes = dict(
+        {
+            "status": status,
+            "original_file_name": original_file_name,
+            "s3_key": s3_key,
+            "sync_shard": SYNC_SHARD,
+        },
+        **(extra or {}),
+    )
+    names = {f"#{k}": k for k in changes}
+    names.update({"#upload_timestamp": "upload_timestamp", "#updated_at": "updated_at"})
+    if condition:
+        names.update({f"#{name}": name for name in re.findall(r"#(\w+)", condition)})
+    values = dict({f":{k}": v for k, v in changes.items()}, **(condition_values or {}))
+    values[":now"] = now
+    try:
+        values[":updated_at"] = bump_table_version(table)
+        update_kwargs = {}
+        if condition:
+            update_kwargs["ConditionExpression"] = condition
+        response = table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET "
+            + ", ".join(f"#{k} = :{k}" for k in changes)
+            + ", #updated_at = :updated_at, #upload_timestamp = if_not_exists(#upload_timestamp, :now)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_OLD",  # the previous version, to adjust the counters
+            **update_kwargs,
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    old_item = response.get("Attributes")
+    new_item = dict(old_item or {"file_id": file_id, "upload_timestamp": now}, **changes)
+    counters.apply_deltas(table, counters.counter_deltas(old_item, new_item))
+    print(f"Status of {file_id} -> {status}")
+    return True
+
+
+def claim(file_id, original_file_name, s3_key, owner, event_id=None):
+    """
+    Take the state lock of a file before doing any work on it.
+    Fails when another run holds an unexpired lease, or when this S3 event was already
+    processed (a retried or duplicate delivery).
+    :param owner: Unique id of this run, later writes only go through while it holds the lease
+    :param event_id: Identity of the S3 event (its sequencer), None for reruns (backfill, sweep)
+    :return: True when claimed
+    """
+    now = int(time.time())
+    # no live lease ...
+    clauses = ["(attribute_not_exists(#lease_expires_at) OR #lease_expires_at < :now_epoch)"]
+    values = {":now_epoch": now}
+    if event_id:
+        # ... and this event not processed yet
+        clauses.append("(attribute_not_exists(#processed_event) OR #processed_event <> :event_id)")
+        values[":event_id"] = event_id
+    lock_free = clauses[0] if len(clauses) == 1 else f"({' AND '.join(clauses)})"
+    condition = f"attribute_not_exists(#file_id) OR {lock_free}"
+    extra = {"lease_owner": owner, "lease_expires_at": now + LEASE_SECONDS}
+    if event_id:
+        extra["claimed_event"] = event_id
+    return set_status(
+        file_id, "PROCESSING", original_file_name, s3_key, extra=extra, condition=condition, condition_values=values
+    )
+
+
+def owned_by(owner):
+    """Condition for the writes of a run: only while it still holds the lease."""
+    return "#lease_owner = :owner", {":owner": owner}
+
+
+def defer(file_id, original_file_name, s3_key, reason, owner=None):
+    """
+    Park a file whose Bedrock call can't be served now (throttling, circuit open):
+    status DEFERRED instead of ERROR, and its id in the set the sweep retries.
+    :param owner: The run's lease owner, the lease is released with it
+    """
+    if owner:
+        condition, values = owned_by(owner)
+        released = {"lease_expires_at": 0}
+        if not set_status(file_id, "DEFERRED", original_file_name, s3_key, released, condition, values):
+            print(f"Lease on {file_id} lost, not deferring it")
+            return
+    else:
+        set_status(file_id, "DEFERRED", original_file_name, s3_key)
+    dynamodb.Table(TABLE_NAME).update_item(
+        Key={"file_id": DEFERRED_KEY},
+        UpdateExpression="ADD #file_ids :id",
+        ExpressionAttributeNames={"#file_ids": "file_ids"},
+        ExpressionAttributeValues={":id": {file_id}},
+    )
+    print(f"Deferred {file_id}: {reason}")
+
+
+def undefer(file_id):
+    dynamodb.Table(TABLE_NAME).update_item(
+        Key={"file_id": DEFERRED_KEY},
+        UpdateExpression="DELETE #file_ids :id",
+        ExpressionAttributeNames={"#file_ids": "file_ids"},
+        ExpressionAttributeValues={":id": {file_id}},
+    )
+
+
+def deadline_of(context):
+    """clock() value by which the last Bedrock retry must have started."""
+    if context is None:
+        return None
+    return clock() + context.get_remaining_time_in_millis() / 1000 - SAVE_MARGIN_SECONDS
+
 
-    # 1. 从 event 里解析出是谁触发了我
-    # (S3 发来的消息里包含 bucket 名字和 file key)
+def record_error(file_id, original_file_name, s3_key, owner):
+    """Terminal ERROR status, so a failed run doesn't leave the file PROCESSING."""
     try:
-        record = event["Records"][
-            0
-        ]  # event的结构：{"Records": [ { "s3": { "bucket": { "name": "my-bucket" }, "object": { "key": "my-file.txt" } } } ] }
-        bucket = record["s3"]["bucket"]["name"]
-        key = urllib.parse.unquote_plus(
-            record["s3"]["object"]["key"], encoding="utf-8"
-        )  # unquote_plus 用于解码 URL 编码的字符串, 比如把 %20 转换为空格。将s3 object key 解码成正常文件名
+        # the lease is released, a new event can retry
+        condition, values = owned_by(owner)
+        released = {"lease_expires_at": 0}
+        set_status(file_id, "ERROR", original_file_name, s3_key, released, condition, values)
+    except Exception as status_error:
+        print(f"Error recording ERROR status: {str(status_error)}")
 
-        print(
-            f"Processing file: s3://{bucket}/{key}"
-        )  # Log the bucket and key being processed
 
-        # 2. download the file from S3 to /tmp
-        local_file_path = download_file_from_s3_to_tmp(bucket, key)
+def continue_later(bucket, key, file_id, event_id, owner, deep_scan, continuation, incomplete):
+    """
+    Hand an unfinished extraction to a new invocation of this function: record the progress,
+    release the lease (the next invocation claims the file again) and invoke asynchronously.
+    :param deep_scan: Whether the Round 2 pages were being read (Round 1 is not asked again)
+    :param continuation: Number of invocations before this one
+    :param incomplete: The artifacts.ExtractionIncomplete raised
+    :return: CONTINUED, or DUPLICATE when the lease was lost
+    """
+    name = os.path.basename(key)
+    if continuation + 1 >= MAX_CONTINUATIONS or not FUNCTION_NAME:
+        raise RuntimeError(f"Extraction unfinished after {continuation + 1} invocations ({incomplete})")
+    condition, values = owned_by(owner)
+    progress = {
+        "lease_expires_at": 0,
+        "extraction_progress": {
+            "pages_done": incomplete.pages_done,
+            "pages_needed": incomplete.pages_needed,
+            "invocations": continuation + 1,
+        },
+    }
+    if not set_status(file_id, "PROCESSING", name, key, progress, condition, values):
+        return "DUPLICATE"
+    lambda_client.invoke(
+        FunctionName=FUNCTION_NAME,
+        InvocationType="Event",  # asynchronous, retried by Lambda on errors
+        Payload=json.dumps(
+            {
+                "continue_extraction": {
+                    "bucket": bucket,
+                    "key": key,
+                    "file_id": file_id,
+                    "event_id": event_id,
+                    "deep_scan": deep_scan,
+                    "continuation": continuation + 1,
+                }
+            }
+        ),
+    )
+    print(f"Extraction of {file_id} continues in a new invocation ({incomplete})")
+    return "CONTINUED"
+
+
+def process_object(bucket, key, deadline=None, file_id=None, event_id=None, deep_scan=False, continuation=0):
+    """
+    Run the pipeline for one uploaded PDF: extract, classify, save.
+    :param bucket: The S3 bucket name
+    :param key: The S3 object key
+    :param deadline: clock() value after which no Bedrock retry starts
+    :param file_id: The file_id when it is already known (keys without a UUID get a new one)
+    :param event_id: Identity of the triggering S3 event, to recognize its duplicate deliveries
+    :param deep_scan: Continue with Round 2, Round 1 already came back INSUFFICIENT_DATA
+    :param continuation: Invocations the extraction of this file already took
+    :return: The final status written (eg: AUTO_TAGGED, DEFERRED), DUPLICATE when another
+        run has (or had) it, CONTINUED when the extraction goes on in a new invocation
+    """
+    file_id = file_id or get_file_id_from_key(key)
+    owner = uuid.uuid4().hex
+    # the pages are read while the model call still fits in the invocation
+    extraction_deadline = None if deadline is None else deadline - MODEL_RESERVE_SECONDS
+
+    # UPLOADED -> PROCESSING under the state lock, before any download or model call
+    if not claim(file_id, os.path.basename(key), key, owner, event_id):
+        print(f"{file_id} is being or was already processed for this event, skipping")
+        return "DUPLICATE"
+
+    try:
+        # 2. the extraction artifact, the PDF is only downloaded to /tmp for pages it lacks
+        extraction = load_extraction(bucket, key, file_id)
+        checkpoint = lambda e: save_extraction(bucket, file_id, e)  # noqa: E731
 
         # 3. Round 1: Standard scan (Head4 + Tail5)
         print("Starting Round 1: Standard scan (Head4 + Tail5)")
-        text = extract_text_smartly(local_file_path, head=4, tail=5)
+        text = extracted_text(extraction, head=4, tail=5, deadline=extraction_deadline, checkpoint=checkpoint)
+        save_extraction(bucket, file_id, extraction)  # before the model call, a deferred retry reuses it
+
+        # 3.0 Near-duplicate check on the full Round 1 text (arXiv v2, camera-ready, ...)
+        sig, duplicate, duplicate_similarity = check_near_duplicate(file_id, text)
+        full_text = text
+
+        # 3.0.1 Local classifier (CLASSIFIER_MODE=shadow|on), milliseconds instead of a Bedrock call
+        prediction = classify_locally(full_text)
 
         # 3.1 Try Semantic Extraction (Keyword-based)
         # If we can find Abstract/Intro/Conclusion, use that instead of the full text to save tokens.
-        semantic_text = extract_sections_by_keywords(text)
-        if semantic_text and len(semantic_text) > 600:
-            print("Semantic extraction successful! Using optimized text.")
-            text = semantic_text
-        else:
-            print("Semantic extraction failed or too short. Using full Head+Tail text.")
+        text = model_text(text)
 
-        ai_result = None  # placeholder for AI result
-        if not text or len(text) < 100:  # too little text extracted
+        ai_result = reusable_result(duplicate, duplicate_similarity) or classifier_result(
+            prediction, full_text
+        )
+        if deep_scan:
+            print("Continuing Round 2, Round 1 was INSUFFICIENT_DATA.")
+            ai_result = {"status": "INSUFFICIENT_DATA"}
+        elif ai_result:
+            print(f"Skipping Bedrock, result from the {ai_result.get('source', 'earlier version')}.")
+        elif not text or len(text) < 100:  # too little text extracted
             print("Insufficient text extracted in Round 1.")
             ai_result = {
                 "status": "INSUFFICIENT_DATA"
             }  # dict indicating insufficient data
         else:
-            ai_result = ask_bedrock_model(text)
+            ai_result = ask_bedrock_model(text, deadline)
             if ai_result.get("status") == "INSUFFICIENT_DATA":
                 print("Round 1 result: INSUFFICIENT_DATA")
 
         # 4. Round 2: Deep scan (Smart retry)
         if ai_result.get("status") == "INSUFFICIENT_DATA":
             print("Starting Round 2: Deep scan (Head20 + Tail20)")
-            text_deep = extract_text_smartly(local_file_path, head=20, tail=20)
+            deep_scan = True
+            text_deep = extracted_text(
+                extraction, head=20, tail=20, deadline=extraction_deadline, checkpoint=checkpoint
+            )
+            save_extraction(bucket, file_id, extraction)
             if text_deep and len(text_deep) > len(text) + 500:
-                ai_result = ask_bedrock_model(text_deep)
+                ai_result = ask_bedrock_model(text_deep, deadline)
                 ai_result["retry_performed"] = True  # mark that we did a retry
             else:
                 print("Deep scan did not yield significantly more text.")
 
-        # 5. Save metadata to DynamoDB
-        # Extract UUID from S3 key (Format: uploads/UUID_Filename.pdf)
-        # If extraction fails (e.g. manual upload without UUID), fallback to generating a new one.
-        try:
-            # key example: "uploads/123e4567-e89b-12d3-a456-426614174000_paper.pdf"
-            filename = os.path.basename(key)
-            if "_" in filename:
-                # Split by the first underscore
-                file_id = filename.split("_", 1)[0]
-                # Validate if it looks like a UUID (simple length check or try-except)
-                uuid.UUID(file_id)  # This will raise ValueError if not a valid UUID
-            else:
-                raise ValueError("No UUID found in filename")
-        except Exception:
-            print("Could not extract UUID from filename, generating a new one.")
-            file_id = str(uuid.uuid4())
-
-        save_metadata_to_DDB(
+        # 5. Save metadata to DynamoDB (terminal status)
+        final_status = save_metadata_to_DDB(
             file_id=file_id,
             original_file_name=os.path.basename(key),
             s3_key=key,  # S3 object key
             ai_result=ai_result,
+            extra_attributes=dict(
+                version_attributes(sig, duplicate, duplicate_similarity),
+                **classifier_attributes(prediction, ai_result),
+            ),
+            owner=owner,
+            event_id=event_id,
+            bucket=bucket,
         )
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps("Processing complete."),
-        }
+        if final_status is None:
+            return "DUPLICATE"  # another run took the lease over and owns the result
+        index_near_duplicate(file_id, sig, duplicate)
+
+        # 6. Routing: out of the inbox, into processed/{Category}/ (tagged files only)
+        if final_status == "AUTO_TAGGED":
+            route_document(bucket, file_id, key, ai_result.get("category"), deadline)
+        return final_status
+
+    except bedrock_client.BedrockUnavailable as e:
+        # Bedrock is saturated, not this document's fault: park it for the sweep
+        defer(file_id, os.path.basename(key), key, str(e), owner=owner)
+        return "DEFERRED"
+
+    except artifacts.ExtractionIncomplete as incomplete:
+        # out of time before the model call: keep the pages read and go on in a new invocation
+        save_extraction(bucket, file_id, extraction)
+        try:
+            return continue_later(bucket, key, file_id, event_id, owner, deep_scan, continuation, incomplete)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            record_error(file_id, os.path.basename(key), key, owner)
+            raise e
 
     except Exception as e:
         print(f"Error: {str(e)}")
+        record_error(file_id, os.path.basename(key), key, owner)  # terminal, don't leave it PROCESSING
         raise e
+
+
+def retry_deferred(context):
+    """
+    Scheduled sweep: process the deferred files again while the circuit is closed and
+    there is time left. Files deferred again stay in the set for the next sweep.
+    :return: Dict of file_id -> final status, for the files it got to
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    item = table.get_item(Key={"file_id": DEFERRED_KEY}).get("Item") or {}
+    file_ids = sorted(item.get("file_ids", set()))
+    print(f"{len(file_ids)} deferred files")
+    deadline = deadline_of(context)
+    results = {}
+    for file_id in file_ids:
+        if bedrock.breaker.state == "open" or (deadline is not None and clock() > deadline):
+            break
+        file_item = table.get_item(Key={"file_id": file_id}).get("Item")
+        if not file_item or file_item.get("deleted") or file_item.get("status") != "DEFERRED":
+            undefer(file_id)  # deleted, or processed again by a new upload
+            continue
+        status = process_object(BUCKET_NAME, file_item["s3_key"], deadline, file_id=file_id)
+        results[file_id] = status
+        if status == "DEFERRED":
+            break  # still saturated, the next sweep tries again
+        undefer(file_id)
+    return results
+
+
+def response_for(status):
+    """The handler's reply for the outcome of process_object."""
+    messages = {
+        "DEFERRED": (202, "Deferred."),
+        "DUPLICATE": (200, "Duplicate delivery, skipped."),
+        "CONTINUED": (202, "Extraction continues in a new invocation."),
+        "IGNORED": (200, "Not an upload, skipped."),
+    }
+    status_code, message = messages.get(status, (200, "Processing complete."))
+    return {"statusCode": status_code, "body": json.dumps(message)}
+
+
+def handler(event, context):
+    """
+    This is the entry point for the Lambda function. AWS will call this function when a file is uploaded to S3, passing information about the file in the 'event' parameter.
+    :param event: The event data from S3, it is a dictionary containing details about the S3 object that triggered the Lambda function
+    :param context: The runtime information of the Lambda function
+    :return: A dictionary with status code and message
+    """
+    print(
+        "Received event: " + json.dumps(event, indent=2)
+    )  # Log the received event for debugging. indent=2 makes it pretty-printed
+
+    try:
+        # Scheduled sweep of the files deferred while Bedrock was throttling
+        if event.get("retry_deferred"):
+            results = retry_deferred(context)
+            return {"statusCode": 200, "body": json.dumps(results)}
+
+        # Next invocation of an extraction that did not fit in the previous one
+        if event.get("continue_extraction"):
+            job = event["continue_extraction"]
+            status = process_object(
+                job["bucket"],
+                job["key"],
+                deadline_of(context),
+                file_id=job["file_id"],
+                event_id=job.get("event_id"),
+                deep_scan=job.get("deep_scan", False),
+                continuation=job.get("continuation", 0),
+            )
+            return response_for(status)
+
+        # 1. 从 event 里解析出是谁触发了我
+        # (S3 发来的消息里包含 bucket 名字和 file key)
+        try:
+            record = event["Records"][
+                0
+            ]  # event的结构：{"Records": [ { "s3": { "bucket": { "name": "my-bucket" }, "object": { "key": "my-file.txt" } } } ] }
+            bucket = record["s3"]["bucket"]["name"]
+            key = urllib.parse.unquote_plus(
+                record["s3"]["object"]["key"], encoding="utf-8"
+            )  # unquote_plus 用于解码 URL 编码的字符串, 比如把 %20 转换为空格。将s3 object key 解码成正常文件名
+
+            print(
+                f"Processing file: s3://{bucket}/{key}"
+            )  # Log the bucket and key being processed
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            raise e
+
+        # only uploads start the pipeline: routed copies (processed/...) must never loop back
+        if not key.startswith(routing.UPLOAD_PREFIX):
+            print(f"{key} is not under {routing.UPLOAD_PREFIX}, skipping")
+            return response_for("IGNORED")
+
+        # S3 may deliver an event more than once; its sequencer identifies the upload
+        event_id = record["s3"]["object"].get("sequencer") or record["s3"]["object"].get("eTag")
+        status = process_object(bucket, key, deadline_of(context), event_id=event_id)
+        return response_for(status)
+    finally:
+        # one line per invocation: throttles, retries, circuit state, latency per model
+        print("Bedrock metrics: " + json.dumps(bedrock.metrics()))
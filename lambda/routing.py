@@ -0,0 +1,165 @@
+"""
+Routing of tagged documents out of the upload inbox, DESIGN.md step 5:
+
+    uploads/<file_id>_paper.pdf  ->  processed/<Category>/<SubCategory>/<file_id>_paper.pdf
+
+S3 has no move: the object is copied server side (CopyObject, or UploadPartCopy with
+parts copied in parallel for large objects), the item's s3_key is switched with a
+conditional update, then the source is deleted. A failure before the switch leaves
+the item pointing at the source and removes the copy; the source never disappears
+before the item points at the copy.
+
+Routed keys are never under UPLOAD_PREFIX, the prefix that triggers the pipeline,
+so a move can't start a new run.
+"""
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from table_version import SYNC_SHARD, bump_table_version
+
+UPLOAD_PREFIX = "uploads/"  # the S3 trigger's prefix (DocuflowStack)
+ROUTED_PREFIX = "processed/"
+UNCATEGORIZED = "Uncategorized"
+
+# CopyObject copies up to 5 GiB in one request; larger objects need a multipart copy.
+# Objects above MULTIPART_THRESHOLD are copied in parts anyway: the parts run in
+# parallel, which is several times faster than one CopyObject for large files.
+MAX_SINGLE_COPY = 5 * 1024**3
+MULTIPART_THRESHOLD = int(os.environ.get("ROUTING_MULTIPART_THRESHOLD", 256 * 1024**2))
+PART_SIZE = 128 * 1024**2
+MAX_PARTS = 10000
+COPY_WORKERS = 8
+
+
+class RoutingConflict(Exception):
+    """The item changed meanwhile (deleted, or moved by another run): the copy was dropped."""
+
+
+def path_segment(name):
+    """A category level as a key segment: no slashes, no characters S3 tools trip on."""
+    return re.sub(r"[^\w.\- ]+", "-", name, flags=re.UNICODE).strip(" .-")
+
+
+def routed_key(file_id, key, category):
+    """
+    Destination of a document.
+    :param file_id: Kept as the file name prefix, so the key still names its file_id
+    :param key: Current key of the object
+    :param category: Category path (eg: "CS/AI"), None or "" for uncategorized
+    """
+    name = os.path.basename(key)
+    if not name.startswith(f"{file_id}_"):
+        name = f"{file_id}_{name}"
+    levels = [segment for segment in map(path_segment, (category or "").split("/")) if segment]
+    destination = ROUTED_PREFIX + "/".join((levels or [UNCATEGORIZED]) + [name])
+    if destination.startswith(UPLOAD_PREFIX):
+        raise ValueError(f"Refusing to route into the trigger prefix: {destination}")
+    return destination
+
+
+def part_ranges(size, part_size=PART_SIZE):
+    """Byte ranges (inclusive) of the parts of a multipart copy, at most MAX_PARTS of them."""
+    part_size = max(part_size, math.ceil(size / MAX_PARTS))
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+def copy_object(
+    s3_client, bucket, source_key, destination_key, workers=COPY_WORKERS, threshold=MULTIPART_THRESHOLD, part_size=PART_SIZE
+):
+    """
+    Server-side copy, the bytes never pass through the Lambda.
+    :return: Size of the object copied
+    """
+    head = s3_client.head_object(Bucket=bucket, Key=source_key)
+    size = head["ContentLength"]
+    source = {"Bucket": bucket, "Key": source_key}
+    if head.get("VersionId"):
+        source["VersionId"] = head["VersionId"]  # every part from the same version
+    if size <= min(threshold, MAX_SINGLE_COPY):
+        s3_client.copy_object(Bucket=bucket, Key=destination_key, CopySource=source)
+        return size
+
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=bucket,
+        Key=destination_key,
+        ContentType=head.get("ContentType", "application/octet-stream"),
+        Metadata=head.get("Metadata", {}),
+    )["UploadId"]
+
+    def copy_part(numbered_range):
+        number, (start, end) = numbered_range
+        response = s3_client.upload_part_copy(
+            Bucket=bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource=source,
+            CopySourceRange=f"bytes={start}-{end}",
+        )
+        return {"PartNumber": number, "ETag": response["CopyPartResult"]["ETag"]}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(copy_part, enumerate(part_ranges(size, part_size), start=1)))
+        s3_client.complete_multipart_upload(
+            Bucket=bucket, Key=destination_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=destination_key, UploadId=upload_id)
+        raise
+    return size
+
+
+def switch_key(table, file_id, source_key, destination_key):
+    """Point the item at the copy, only if it still points at the source and is not deleted.
+    Stamps a new updated_at, so the frontend's snapshot picks the new key up.
+    :return: True if switched"""
+    try:
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET #s3_key = :destination, #updated_at = :updated_at, #sync_shard = :sync_shard",
+            ConditionExpression="#s3_key = :source AND attribute_not_exists(#deleted)",
+            ExpressionAttributeNames={
+                "#s3_key": "s3_key",
+                "#deleted": "deleted",
+                "#updated_at": "updated_at",
+                "#sync_shard": "sync_shard",
+            },
+            ExpressionAttributeValues={
+                ":source": source_key,
+                ":destination": destination_key,
+                ":updated_at": bump_table_version(table),
+                ":sync_shard": SYNC_SHARD,
+            },
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def move(s3_client, table, bucket, file_id, source_key, category, **copy_kwargs):
+    """
+    Route one document to the prefix of its category.
+    :param table: DynamoDB table resource holding the document's item
+    :param copy_kwargs: workers/threshold/part_size of copy_object
+    :return: (destination key, bytes copied); bytes is 0 when it already was in place
+    :raises RoutingConflict: When the item changed meanwhile, the source is left as is
+    """
+    destination_key = routed_key(file_id, source_key, category)
+    if destination_key == source_key:
+        return destination_key, 0
+    size = copy_object(s3_client, bucket, source_key, destination_key, **copy_kwargs)
+    if not switch_key(table, file_id, source_key, destination_key):
+        item = table.get_item(Key={"file_id": file_id}, ConsistentRead=True).get("Item") or {}
+        if item.get("s3_key") != destination_key:  # else a concurrent run moved it to the same place
+            s3_client.delete_object(Bucket=bucket, Key=destination_key)
+        raise RoutingConflict(f"{file_id} no longer points at {source_key}, copy dropped")
+    s3_client.delete_object(Bucket=bucket, Key=source_key)
+    print(f"Routed {file_id}: {source_key} -> {destination_key} ({size} bytes)")
+    return destination_key, size
@@ -0,0 +1,71 @@
+import json
+import os
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+# Optional push path for status changes (deployed with: cdk deploy -c status_push=true).
+# The table stream delivers every write; only real status transitions of
+# documents are forwarded to the SNS topic, so subscribers (email, webhooks,
+# an SQS queue per frontend) never have to poll DynamoDB.
+
+sns = boto3.client("sns")
+deserializer = TypeDeserializer()
+TOPIC_ARN = os.environ.get("TOPIC_ARN")
+META_PREFIX = "__"  # bookkeeping items (table version, counters), never published
+
+
+def to_python(image):
+    """
+    Convert a stream image (DynamoDB JSON) into a plain dict.
+    :param image: The NewImage/OldImage of a stream record
+    :return: dict of attribute values
+    """
+    return {key: deserializer.deserialize(value) for key, value in (image or {}).items()}
+
+
+def status_change(record):
+    """
+    Extract the status transition of a stream record.
+    :param record: One record of the DynamoDB stream event
+    :return: The message to publish, or None if the status didn't change
+    """
+    if record.get("eventName") not in ("INSERT", "MODIFY"):
+        return None  # tombstones are writes too, TTL removals are not interesting
+    data = record["dynamodb"]
+    new = to_python(data.get("NewImage"))
+    old = to_python(data.get("OldImage"))
+    file_id = new.get("file_id", "")
+    if file_id.startswith(META_PREFIX):
+        return None
+    status = "DELETED" if new.get("deleted") else new.get("status")
+    if not status or status == old.get("status"):
+        return None
+    return {
+        "file_id": file_id,
+        "original_file_name": new.get("original_file_name"),
+        "status": status,
+        "previous_status": old.get("status", "UPLOADED"),
+    }
+
+
+def handler(event, context):
+    """
+    Lambda handler: publish the status transitions of a stream batch to SNS.
+    """
+    published = 0
+    for record in event.get("Records", []):
+        message = status_change(record)
+        if not message:
+            continue
+        sns.publish(
+            TopicArn=TOPIC_ARN,
+            Message=json.dumps(message),
+            # subscribers can filter on these without parsing the message
+            MessageAttributes={
+                "file_id": {"DataType": "String", "StringValue": message["file_id"]},
+                "status": {"DataType": "String", "StringValue": message["status"]},
+            },
+        )
+        published += 1
+    print(f"Published {published} status change(s)")
+    return {"published": published}
@@ -0,0 +1,26 @@
+"""
+The table's change sequence. A sentinel item is bumped on every write of a file item;
+its new value is stamped on the item as `updated_at`, which the frontend's incremental
+sync queries through the sparse `updated-index` GSI (partition key sync_shard).
+A write that skips it is never seen by the frontend's snapshot.
+All items share the one SYNC_SHARD partition of the index (about 1000 writes/s,
+see SYNC_SHARD in frontend/utils/db.py).
+"""
+TABLE_VERSION_KEY = "__table_version__"
+SYNC_SHARD = "ALL"
+
+
+def bump_table_version(table):
+    """
+    Atomically increment the table version marker.
+    :param table: The DynamoDB table resource
+    :return: The new version, a monotonically increasing change sequence
+    """
+    response = table.update_item(
+        Key={"file_id": TABLE_VERSION_KEY},
+        UpdateExpression="ADD #version :one",
+        ExpressionAttributeNames={"#version": "version"},
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(response["Attributes"]["version"])
@@ -0,0 +1,280 @@
+"""
+Run the Lambda's pipeline (process_doc.process_object) over objects already in the
+bucket, without re-uploading them: after a prompt or extractor change, or to
+process files copied in by other means.
+
+Objects come from S3 prefixes (default uploads/ and processed/, where tagged files
+are routed to) or a manifest file (one key per line). Documents whose item already carries the current PROMPT_VERSION and
+EXTRACTOR_VERSION are skipped, so are documents a human reviewed.
+At most --concurrency documents are in flight; Bedrock calls go through the
+Lambda's rate-limited client, so throttling defers documents instead of failing them.
+
+Progress is checkpointed to a local file every --checkpoint-every documents;
+running the same command again resumes where it stopped, and retries the documents
+that ended in ERROR or DEFERRED.
+At the end (and with every checkpoint) it reports throughput, errors and the
+estimated model cost.
+
+Usage:
+    python scripts/backfill.py --table <TableName> --bucket <BucketName> [--prefix uploads/ --prefix processed/]
+    python scripts/backfill.py ... --manifest keys.txt --checkpoint backfill.json --concurrency 8
+    python scripts/backfill.py ... --fake-model --endpoint-url http://localhost:5000
+
+--fake-model answers with the in-process fake (scripts/local_bedrock.py) instead of Bedrock;
+with --endpoint-url pointing at S3/DynamoDB emulators nothing leaves the machine.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+
+# The Lambda's own pipeline
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+import bedrock_client
+import process_doc
+
+HUMAN_STATUSES = {"REVIEWED", "MANUAL_TAGGED"}
+DONE_STATUSES = {"AUTO_TAGGED", "NEEDS_REVIEW"}
+RETRY_OUTCOMES = {"ERROR", "DEFERRED"}  # not checkpointed as done: the next run tries them again
+# On-demand price of the model, USD per 1000 tokens (Claude 3 Haiku, us-east-1)
+INPUT_PRICE = 0.00025
+OUTPUT_PRICE = 0.00125
+BATCH_GET_LIMIT = 100
+NO_TOKENS = {"input_tokens": 0, "output_tokens": 0}
+# the inbox, and where tagged files are routed to (lambda/routing.py)
+DEFAULT_PREFIXES = (process_doc.routing.UPLOAD_PREFIX, process_doc.routing.ROUTED_PREFIX)
+
+
+def list_keys(s3_client, bucket, prefixes, manifest):
+    if manifest:
+        with open(manifest, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    keys = []
+    for prefix in prefixes:
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []) if obj["Key"].lower().endswith(".pdf"))
+    return keys
+
+
+def current_items(dynamodb, table_name, file_ids):
+    """
+    Status and versions of the items of these files, one BatchGetItem per 100.
+    :return: Dict of file_id -> item (missing files are left out)
+    """
+    items = {}
+    file_ids = list(dict.fromkeys(file_ids))
+    for start in range(0, len(file_ids), BATCH_GET_LIMIT):
+        request = {
+            table_name: {
+                "Keys": [{"file_id": i} for i in file_ids[start : start + BATCH_GET_LIMIT]],
+                "ProjectionExpression": "#file_id, #status, #prompt_version, #extractor_version, #deleted",
+                "ExpressionAttributeNames": {
+                    f"#{name}": name
+                    for name in ("file_id", "status", "prompt_version", "extractor_version", "deleted")
+                },
+            }
+        }
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(table_name, []):
+                items[item["file_id"]] = item
+            request = response.get("UnprocessedKeys") or None
+    return items
+
+
+def is_current(item, force):
+    """Whether a document can be skipped."""
+    if not item or item.get("deleted"):
+        return False
+    if item.get("status") in HUMAN_STATUSES:
+        return True  # never overwrite a human decision
+    if force:
+        return False
+    return (
+        item.get("status") in DONE_STATUSES
+        and int(item.get("prompt_version", 0)) == process_doc.PROMPT_VERSION
+        and int(item.get("extractor_version", 0)) == process_doc.EXTRACTOR_VERSION
+    )
+
+
+class Checkpoint:
+    """
+    Keys done so far, keys that failed (retried by the next run) and the running totals,
+    saved atomically to a local JSON file.
+    A checkpoint of other prompt/extractor versions is ignored: everything is due again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        versions = [process_doc.PROMPT_VERSION, process_doc.EXTRACTOR_VERSION]
+        self.data = {"versions": versions, "done": {}, "failed": {}, "elapsed": 0.0, "tokens": dict(NO_TOKENS)}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("versions") == versions:
+                self.data = dict(saved, failed=saved.get("failed", {}))
+            else:
+                print(f"Checkpoint {path} is for versions {saved.get('versions')}, starting over")
+
+    def done(self, key, outcome):
+        with self.lock:
+            if outcome in RETRY_OUTCOMES:
+                self.data["failed"][key] = outcome
+            else:
+                self.data["done"][key] = outcome
+                self.data["failed"].pop(key, None)
+
+    def stats(self):
+        """Documents per outcome, the failed ones by their last outcome."""
+        with self.lock:
+            outcomes = list(self.data["done"].values()) + list(self.data["failed"].values())
+        stats = {}
+        for outcome in outcomes:
+            stats[outcome] = stats.get(outcome, 0) + 1
+        return stats
+
+    def save(self, elapsed, tokens):
+        """
+        :param elapsed: Seconds spent so far, over all runs
+        :param tokens: Tokens used so far, over all runs
+        """
+        if not self.path:
+            return
+        with self.lock:
+            data = dict(self.data, elapsed=elapsed, tokens=tokens)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)  # never leaves a half-written checkpoint
+
+
+def cost(tokens):
+    return tokens["input_tokens"] / 1000 * INPUT_PRICE + tokens["output_tokens"] / 1000 * OUTPUT_PRICE
+
+
+def report(checkpoint, processed, elapsed, tokens, remaining):
+    """
+    :param processed: Documents processed by this run, in `elapsed` seconds
+    :param tokens: Tokens used by this run
+    """
+    stats = checkpoint.stats()
+    rate = processed / elapsed * 3600 if elapsed else 0.0
+    errors = stats.get("ERROR", 0)
+    line = (
+        f"{len(checkpoint.data['done'])} done ({', '.join(f'{k} {v}' for k, v in sorted(stats.items()))}), "
+        f"{len(checkpoint.data['failed'])} to retry, "
+        f"{remaining} to go | {rate:,.0f} docs/hour | {errors} errors | "
+        f"{tokens['input_tokens']:,} in + {tokens['output_tokens']:,} out tokens, ~${cost(tokens):.2f}"
+    )
+    if processed and remaining:
+        line += f" | ~${cost(tokens) / processed * remaining:.2f} and {remaining / rate:.1f}h for the rest"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--bucket", required=True, help="documents bucket")
+    parser.add_argument(
+        "--prefix",
+        action="append",
+        help=f"objects to process, repeatable (default: {' '.join(DEFAULT_PREFIXES)})",
+    )
+    parser.add_argument("--manifest", help="file with one S3 key per line, instead of --prefix")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint.json", help="progress file ('' to disable)")
+    parser.add_argument("--checkpoint-every", type=int, default=25, help="documents between checkpoints")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents in flight")
+    parser.add_argument("--rate", type=float, default=bedrock_client.RATE, help="Bedrock requests/s")
+    parser.add_argument("--limit", type=int, help="stop after this many documents")
+    parser.add_argument("--force", action="store_true", help="also rerun documents on the current versions")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would run")
+    parser.add_argument("--fake-model", action="store_true", help="canned model replies, no Bedrock")
+    parser.add_argument("--endpoint-url", help="S3/DynamoDB endpoint, eg: an emulator")
+    args = parser.parse_args()
+
+    s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    dynamodb = boto3.resource("dynamodb", endpoint_url=args.endpoint_url)
+    # the Lambda module reads these at import time
+    process_doc.TABLE_NAME, process_doc.BUCKET_NAME = args.table, args.bucket
+    process_doc.s3_client, process_doc.dynamodb = s3_client, dynamodb
+    if args.fake_model:
+        from local_bedrock import FakeBedrock
+
+        runtime = FakeBedrock(latency=0.0, chunk_latency=0.0)
+    else:
+        runtime = process_doc.bedrock_runtime
+    # one rate-limited client for the whole pool, like the threads of one Lambda container
+    process_doc.bedrock = bedrock_client.BedrockClient(runtime, rate=args.rate, burst=max(args.rate, 1))
+
+    checkpoint = Checkpoint(args.checkpoint)
+    keys = [k for k in list_keys(s3_client, args.bucket, args.prefix or DEFAULT_PREFIXES, args.manifest) if k not in checkpoint.data["done"]]
+    file_ids = {key: process_doc.get_file_id_from_key(key) for key in keys}
+    items = current_items(dynamodb.meta.client, args.table, file_ids.values())
+    todo = [key for key in keys if not is_current(items.get(file_ids[key]), args.force)]
+    print(
+        f"{len(keys)} objects left ({len(checkpoint.data['done'])} done before, "
+        f"{len(checkpoint.data['failed'])} to retry), "
+        f"{len(keys) - len(todo)} already current, {len(todo)} to process"
+    )
+    if args.limit is not None:
+        todo = todo[: args.limit]
+    if args.dry_run or not todo:
+        return
+
+    def run(key):
+        try:
+            # the file_id the upload gave it (keys without a UUID get a new one, like in the Lambda)
+            return process_doc.process_object(args.bucket, key, file_id=file_ids[key])
+        except Exception as e:
+            print(f"Error processing {key}: {str(e)}")
+            return "ERROR"
+
+    previous_elapsed = checkpoint.data["elapsed"]
+    previous_tokens = checkpoint.data.get("tokens") or NO_TOKENS
+
+    def tokens_of(total=False):
+        stats = process_doc.bedrock.stats
+        return {k: stats[k] + (previous_tokens[k] if total else 0) for k in NO_TOKENS}
+
+    started = time.monotonic()
+    processed = 0
+    in_flight = {}
+    pending = iter(todo)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            while True:
+                # keep at most `concurrency` documents submitted, so memory stays flat on 20k keys
+                while len(in_flight) < args.concurrency:
+                    key = next(pending, None)
+                    if key is None:
+                        break
+                    in_flight[executor.submit(run, key)] = key
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    checkpoint.done(in_flight.pop(future), future.result())
+                    processed += 1
+                    if processed % args.checkpoint_every == 0:
+                        elapsed = time.monotonic() - started
+                        checkpoint.save(previous_elapsed + elapsed, tokens_of(total=True))
+                        report(checkpoint, processed, elapsed, tokens_of(), len(todo) - processed)
+    except KeyboardInterrupt:
+        print("Interrupted, saving the checkpoint (documents in flight are redone next time).")
+    elapsed = time.monotonic() - started
+    checkpoint.save(previous_elapsed + elapsed, tokens_of(total=True))
+    report(checkpoint, processed, elapsed, tokens_of(), len(todo) - processed)
+    total = tokens_of(total=True)
+    print(f"All runs: {previous_elapsed + elapsed:.0f}s, ~${cost(total):.2f} estimated model cost")
+
+
+if __name__ == "__main__":
+    main()
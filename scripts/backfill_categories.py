@@ -0,0 +1,77 @@
+"""
+Write the indexable category attributes (category, category_l1..l3) on items
+stored before they existed, so the category GSIs cover the whole table.
+
+Usage:
+    python scripts/backfill_categories.py --table <TableName> [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+import boto3
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambda")))
+from categories import category_attributes
+
+TABLE_VERSION_KEY = "__table_version__"
+META_PREFIX = "__"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    scan_kwargs = {
+        "ProjectionExpression": "file_id, ai_summary, category, deleted",
+    }
+    updated = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            if item["file_id"].startswith(META_PREFIX) or item.get("deleted"):
+                continue
+            attributes = {
+                key: value
+                for key, value in category_attributes(
+                    item.get("ai_summary", {}).get("category")
+                ).items()
+                if value is not None
+            }
+            if not attributes or item.get("category") == attributes["category"]:
+                continue
+
+            print(f"{item['file_id']}: {attributes['category']}")
+            updated += 1
+            if args.dry_run:
+                continue
+
+            # stamp the change like any other write, so frontend snapshots pick it up
+            version = table.update_item(
+                Key={"file_id": TABLE_VERSION_KEY},
+                UpdateExpression="ADD #version :one",
+                ExpressionAttributeNames={"#version": "version"},
+                ExpressionAttributeValues={":one": 1},
+                ReturnValues="UPDATED_NEW",
+            )["Attributes"]["version"]
+            attributes.update({"updated_at": version, "sync_shard": "ALL"})
+            table.update_item(
+                Key={"file_id": item["file_id"]},
+                UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in attributes),
+                ExpressionAttributeNames={f"#{k}": k for k in attributes},
+                ExpressionAttributeValues={f":{k}": v for k, v in attributes.items()},
+            )
+
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+    print(f"{'Would update' if args.dry_run else 'Updated'} {updated} items.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Reprocess many documents at once with Bedrock batch inference instead of one
+Lambda invocation (and one InvokeModel call) per file, eg: after a prompt change
+or to import an archive already copied to the bucket.
+
+    prepare  extract the text of every selected PDF (like the Lambda's Round 1, from
+             its extraction artifact when it has one),
+             pack the prompts into JSONL job inputs, mark the documents QUEUED
+    submit   start one batch inference job per input file
+    wait     poll the jobs until they finish
+    ingest   write the results back (status, ai_summary, category attributes, the
+             full result as a blob in S3);
+             documents of failed jobs are DEFERRED for the Lambda's sweep
+    run      all of the above, then report end-to-end documents/hour
+
+Every step reads and updates batch/<job name>/manifest.json in the bucket, so a
+run can be resumed with the step that was interrupted.
+Documents a human reviewed in the meantime (REVIEWED, MANUAL_TAGGED) are left alone.
+Deep scans (Round 2) of INSUFFICIENT_DATA results are not part of a batch run,
+reprocess those files through the Lambda.
+
+Usage:
+    python scripts/batch_reprocess.py run --table <TableName> --bucket <BucketName> \\
+        --role-arn <BatchInferenceRoleArn> [--status NEEDS_REVIEW] [--prefix uploads/ --prefix processed/]
+    python scripts/batch_reprocess.py run ... --local --fake-model --endpoint-url http://localhost:5000
+
+--local replaces the Bedrock job API with an in-process stand-in that runs each
+record through InvokeModel (--fake-model: through scripts/local_bedrock.py),
+so the whole flow runs offline against S3/DynamoDB emulators. Its jobs live in
+the process, so use it with `run` only.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+# The Lambda's own extraction, prompt and storage code
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+import batch_inference
+import categories
+import counters
+import process_doc
+
+META_PREFIX = "__"
+HUMAN_STATUSES = ["REVIEWED", "MANUAL_TAGGED"]  # never overwritten by a batch run
+DEFAULT_STATUSES = ["UPLOADED", "AUTO_TAGGED", "NEEDS_REVIEW", "ERROR", "DEFERRED"]
+
+
+def load_manifest(s3_client, bucket, job_name):
+    body = s3_client.get_object(Bucket=bucket, Key=batch_inference.manifest_key(job_name))["Body"]
+    return json.loads(body.read())
+
+
+def save_manifest(s3_client, bucket, manifest):
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=batch_inference.manifest_key(manifest["job_name"]),
+        Body=json.dumps(manifest, indent=1).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def select_documents(table, s3_client, bucket, statuses, prefixes):
+    """
+    :param prefixes: S3 prefixes to list instead of the table, eg: ["uploads/", "processed/"]
+    :return: Dict of file_id -> s3_key, from the table (by status) or from S3 prefixes
+    """
+    if prefixes:
+        documents = {}
+        for prefix in prefixes:
+            for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    if obj["Key"].lower().endswith(".pdf"):
+                        documents[process_doc.get_file_id_from_key(obj["Key"])] = obj["Key"]
+        return documents
+
+    documents = {}
+    scan_kwargs = {
+        "ProjectionExpression": "#file_id, #s3_key, #deleted",
+        "ExpressionAttributeNames": {"#file_id": "file_id", "#s3_key": "s3_key", "#deleted": "deleted"},
+        "FilterExpression": Attr("status").is_in(statuses) & Attr("s3_key").exists(),
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            if item["file_id"].startswith(META_PREFIX) or item.get("deleted"):
+                continue
+            documents[item["file_id"]] = item["s3_key"]
+        if not response.get("LastEvaluatedKey"):
+            return documents
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def extract(s3_client, bucket, file_id, s3_key):
+    """
+    The text the Lambda would send to the model (Round 1 + semantic extraction), from the
+    document's extraction artifact; the PDF is only downloaded when it has none.
+    """
+    etag = s3_client.head_object(Bucket=bucket, Key=s3_key)["ETag"]  # an artifact of another upload is ignored
+    data = process_doc.artifacts.load(s3_client, bucket, file_id, process_doc.EXTRACTOR_VERSION, etag)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+
+        def fetch_pdf():
+            s3_client.download_file(bucket, s3_key, pdf.name)
+            return pdf.name
+
+        extraction = process_doc.artifacts.Extraction(data, fetch_pdf, process_doc.EXTRACTOR_VERSION, source_etag=etag)
+        text = process_doc.extracted_text(extraction, head=4, tail=5)
+    if extraction.changed:
+        process_doc.artifacts.save(s3_client, bucket, file_id, extraction.data)
+    return process_doc.model_text(text)
+
+
+def prepare(args, s3_client, table):
+    started = time.time()
+    documents = select_documents(table, s3_client, args.bucket, args.status, args.prefix)
+    print(f"{len(documents)} documents selected")
+    ids = sorted(documents)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        texts = list(executor.map(lambda i: extract(s3_client, args.bucket, i, documents[i]), ids))
+
+    lines, insufficient = [], []
+    for file_id, text in zip(ids, texts):
+        if not text or len(text) < 100:  # too little text extracted, same rule as the Lambda
+            insufficient.append(file_id)
+            continue
+        lines.append(batch_inference.record_line(file_id, process_doc.request_body(text)))
+    files = batch_inference.pack(lines, min_records=batch_inference.MIN_RECORDS)
+    short = [f.count("\n") for f in files if f.count("\n") < batch_inference.MIN_RECORDS]
+    if (short or not files) and not args.local:
+        # before any document is marked QUEUED: nothing would ever take them out of it
+        raise SystemExit(
+            f"{len(lines)} records, Bedrock batch jobs need at least {batch_inference.MIN_RECORDS} "
+            "each. Reprocess these through the Lambda instead."
+        )
+    parts = []
+    for number, content in enumerate(files):
+        key = batch_inference.input_key(args.job_name, number)
+        s3_client.put_object(Bucket=args.bucket, Key=key, Body=content.encode("utf-8"))
+        parts.append(key)
+
+    # visible on the Dashboard and Upload page until the results are ingested
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(
+            executor.map(
+                lambda i: process_doc.set_status(i, "QUEUED", os.path.basename(documents[i]), documents[i]),
+                ids,
+            )
+        )
+
+    manifest = {
+        "job_name": args.job_name,
+        "model_id": process_doc.MODEL_ID,
+        "documents": documents,
+        "insufficient": insufficient,
+        "records": len(lines),
+        "parts": parts,
+        "jobs": [],
+        "timings": {"started": started, "prepared": time.time()},
+    }
+    save_manifest(s3_client, args.bucket, manifest)
+    print(
+        f"Packed {len(lines)} records into {len(parts)} input file(s), "
+        f"{len(insufficient)} without enough text, in {manifest['timings']['prepared'] - started:.0f}s"
+    )
+    return manifest
+
+
+def submit(args, s3_client, bedrock):
+    manifest = load_manifest(s3_client, args.bucket, args.job_name)
+    if manifest["records"] < batch_inference.MIN_RECORDS and not args.local:
+        raise SystemExit(
+            f"{manifest['records']} records, Bedrock batch jobs need at least "
+            f"{batch_inference.MIN_RECORDS}. Reprocess these through the Lambda instead."
+        )
+    submitted = {job["part"] for job in manifest["jobs"]}
+    for number, key in enumerate(manifest["parts"]):
+        if key in submitted:
+            continue  # resumed run
+        response = bedrock.create_model_invocation_job(
+            jobName=f"{args.job_name}-{number:03d}",
+            roleArn=args.role_arn,
+            modelId=manifest["model_id"],
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{args.bucket}/{key}"}},
+            outputDataConfig={
+                "s3OutputDataConfig": {"s3Uri": f"s3://{args.bucket}/{batch_inference.output_prefix(args.job_name)}"}
+            },
+        )
+        manifest["jobs"].append({"part": key, "arn": response["jobArn"], "status": "Submitted"})
+        save_manifest(s3_client, args.bucket, manifest)  # a job is never submitted twice
+        print(f"Submitted {response['jobArn']}")
+    manifest["timings"]["submitted"] = time.time()
+    save_manifest(s3_client, args.bucket, manifest)
+    return manifest
+
+
+def wait(args, s3_client, bedrock):
+    manifest = load_manifest(s3_client, args.bucket, args.job_name)
+    while True:
+        for job in manifest["jobs"]:
+            if job["status"] not in batch_inference.TERMINAL_JOB_STATUSES:
+                job["status"] = bedrock.get_model_invocation_job(jobIdentifier=job["arn"])["status"]
+        pending = [j for j in manifest["jobs"] if j["status"] not in batch_inference.TERMINAL_JOB_STATUSES]
+        print(", ".join(f"{batch_inference.job_id(j['arn'])}: {j['status']}" for j in manifest["jobs"]))
+        if not pending:
+            break
+        time.sleep(args.poll_seconds)
+    manifest["timings"]["finished"] = time.time()
+    save_manifest(s3_client, args.bucket, manifest)
+    return manifest
+
+
+def save_result(table, bucket, file_id, s3_key, ai_result):
+    """
+    Write a batch result onto the file item, keeping everything else on it
+    (notes, embedding, version links). Skips files a human reviewed meanwhile.
+    The full result goes to a blob in S3, like the Lambda's (process_doc.offload_result).
+    :return: The final status, or None when skipped
+    """
+    final_status = "AUTO_TAGGED" if ai_result.get("status") == "SUCCESS" else "NEEDS_REVIEW"
+    ai_summary, ai_result_key = process_doc.offload_result(bucket, ai_result)
+    changes = {
+        "status": final_status,
+        "ai_summary": ai_summary,
+        "original_file_name": os.path.basename(s3_key),
+        "s3_key": s3_key,
+        "sync_shard": process_doc.SYNC_SHARD,
+        "prompt_version": process_doc.PROMPT_VERSION,
+        "extractor_version": process_doc.EXTRACTOR_VERSION,
+    }
+    removed = []
+    if ai_result_key:
+        changes["ai_result_key"] = ai_result_key
+    else:
+        removed.append("ai_result_key")  # the blob of an earlier result
+    if final_status == "AUTO_TAGGED":
+        category, removed_levels = categories.split_attributes(ai_result.get("category"))
+        changes.update(category)
+        removed += removed_levels
+    else:
+        removed += list(categories.CATEGORY_ATTRIBUTES)
+    changes["updated_at"] = process_doc.bump_table_version(table)
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    update = "SET " + ", ".join(f"#{k} = :{k}" for k in changes)
+    update += ", #upload_timestamp = if_not_exists(#upload_timestamp, :now)"
+    update += ", #user_notes = if_not_exists(#user_notes, :empty), #is_verified = if_not_exists(#is_verified, :false)"
+    removed = [k for k in removed if k not in changes]
+    if removed:
+        update += " REMOVE " + ", ".join(f"#{k}" for k in removed)
+    names = {f"#{k}": k for k in list(changes) + removed + ["upload_timestamp", "user_notes", "is_verified", "deleted"]}
+    values = dict({f":{k}": v for k, v in changes.items()}, **{":now": now, ":empty": "", ":false": False})
+    values.update({f":human{i}": status for i, status in enumerate(HUMAN_STATUSES)})
+    try:
+        response = table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression=update,
+            ConditionExpression="attribute_not_exists(#deleted) AND NOT #status IN ("
+            + ", ".join(f":human{i}" for i in range(len(HUMAN_STATUSES)))
+            + ")",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_OLD",
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Skipped {file_id}: reviewed or deleted meanwhile")
+        return None
+    old_item = response.get("Attributes")
+    new_item = dict(old_item or {"file_id": file_id, "upload_timestamp": now}, **changes)
+    for key in removed:
+        new_item.pop(key, None)
+    counters.apply_deltas(table, counters.counter_deltas(old_item, new_item))
+    return final_status
+
+
+def ingest(args, s3_client, table):
+    manifest = load_manifest(s3_client, args.bucket, args.job_name)
+    documents = manifest["documents"]
+    results = {file_id: {"status": "INSUFFICIENT_DATA"} for file_id in manifest["insufficient"]}
+    for job in manifest["jobs"]:
+        if job["status"] not in ("Completed", "PartiallyCompleted"):
+            continue
+        prefix = batch_inference.output_prefix(args.job_name) + batch_inference.job_id(job["arn"]) + "/"
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=args.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if not obj["Key"].endswith(".jsonl.out"):
+                    continue  # manifest.json.out and other job files
+                text = s3_client.get_object(Bucket=args.bucket, Key=obj["Key"])["Body"].read().decode("utf-8")
+                for file_id, ai_result in batch_inference.read_output(text, process_doc.parse_reply):
+                    ai_result["batch_job"] = args.job_name
+                    results[file_id] = ai_result
+
+    def write(file_id):
+        if file_id not in results:
+            # its job failed or the record is missing: the Lambda's sweep processes it one by one
+            process_doc.defer(file_id, os.path.basename(documents[file_id]), documents[file_id], "batch job failed")
+            return "DEFERRED"
+        return save_result(table, args.bucket, file_id, documents[file_id], results[file_id])
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        statuses = list(executor.map(write, documents))
+    manifest["timings"]["ingested"] = time.time()
+    manifest["outcome"] = {status or "SKIPPED": statuses.count(status) for status in set(statuses)}
+    save_manifest(s3_client, args.bucket, manifest)
+    print(f"Ingested: {manifest['outcome']}")
+    return manifest
+
+
+def report(manifest):
+    timings = manifest["timings"]
+    steps = [("prepare", "started", "prepared"), ("jobs", "submitted", "finished"), ("ingest", "finished", "ingested")]
+    for name, start, end in steps:
+        if start in timings and end in timings:
+            print(f"{name:<8} {timings[end] - timings[start]:8.1f}s")
+    if "ingested" in timings:
+        elapsed = max(timings["ingested"] - timings["started"], 1e-9)
+        count = len(manifest["documents"])
+        print(f"{count} documents end to end in {elapsed:.1f}s: {count / elapsed * 3600:,.0f} documents/hour")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("step", choices=["prepare", "submit", "wait", "ingest", "run"])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--bucket", required=True, help="documents bucket")
+    parser.add_argument("--job-name", default=None, help="default: reprocess-<timestamp> (prepare/run)")
+    parser.add_argument("--role-arn", default="", help="BatchInferenceRoleArn stack output")
+    parser.add_argument("--status", action="append", help=f"statuses to reprocess (default: {DEFAULT_STATUSES})")
+    parser.add_argument(
+        "--prefix",
+        action="append",
+        help="process every PDF under this S3 prefix instead (imports), repeatable; "
+        "tagged files are under processed/, not uploads/",
+    )
+    parser.add_argument("--workers", type=int, default=8, help="parallel downloads and writes")
+    parser.add_argument("--poll-seconds", type=float, default=60)
+    parser.add_argument("--local", action="store_true", help="run jobs in-process instead of on Bedrock")
+    parser.add_argument("--fake-model", action="store_true", help="with --local: canned model replies")
+    parser.add_argument("--endpoint-url", help="S3/DynamoDB endpoint, eg: an emulator")
+    args = parser.parse_args()
+    args.status = [s for s in (args.status or DEFAULT_STATUSES) if s not in HUMAN_STATUSES]
+    if not args.job_name:
+        if args.step not in ("prepare", "run"):
+            parser.error("--job-name is required for this step")
+        args.job_name = datetime.datetime.now(datetime.timezone.utc).strftime("reprocess-%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+    s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    dynamodb = boto3.resource("dynamodb", endpoint_url=args.endpoint_url)
+    table = dynamodb.Table(args.table)
+    # the Lambda module reads these at import time
+    process_doc.TABLE_NAME, process_doc.BUCKET_NAME = args.table, args.bucket
+    process_doc.s3_client, process_doc.dynamodb = s3_client, dynamodb
+
+    if args.local:
+        if args.step != "run":
+            parser.error("--local jobs only live as long as the process, use it with the run step")
+        from local_bedrock import FakeBatchJobs, FakeBedrock
+
+        runtime = FakeBedrock(latency=0.0, chunk_latency=0.0) if args.fake_model else boto3.client("bedrock-runtime")
+        bedrock = FakeBatchJobs(s3_client, runtime)
+        args.poll_seconds = 0
+    else:
+        bedrock = boto3.client("bedrock")
+
+    print(f"Job: {args.job_name}")
+    if args.step in ("prepare", "run"):
+        prepare(args, s3_client, table)
+    if args.step in ("submit", "run"):
+        submit(args, s3_client, bedrock)
+    if args.step in ("wait", "run"):
+        wait(args, s3_client, bedrock)
+    if args.step in ("ingest", "run"):
+        report(ingest(args, s3_client, table))
+
+
+if __name__ == "__main__":
+    main()
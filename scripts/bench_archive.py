@@ -0,0 +1,225 @@
+"""
+Measure archive ingestion (lambda/ingest_archive.py): files/s unpacking one archive
+of --gb GB (PDF-sized members, a few large scans above the multipart size, some
+non-PDF files) into uploads/, with --workers uploads and --readahead ranged GETs at
+a time against one GET and one upload at a time.
+
+Usage:
+    python scripts/bench_archive.py --gb 2 --format zip --workers 16 --rtt 20 --get-rate 200 --put-rate 50
+
+Runs in-process: the archive is written to a temporary file that backs a local S3
+stand-in, which charges --rtt ms per request and streams at --get-rate/--put-rate
+MB/s per connection (uploaded objects are only counted, not kept), and moto for the
+DynamoDB progress item (requirements-dev.txt). No AWS access needed.
+"""
+import argparse
+import io
+import os
+import random
+import resource
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import redirect_stdout
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+for name, value in (("AWS_DEFAULT_REGION", "us-east-1"), ("AWS_ACCESS_KEY_ID", "x"), ("AWS_SECRET_ACCESS_KEY", "x")):
+    os.environ.setdefault(name, value)
+import boto3
+import moto
+
+import ingest_archive
+
+CHUNK = 1024**2
+
+
+class ThrottledBody:
+    """GET body streamed from a file range at `rate` bytes/s."""
+
+    def __init__(self, path, start, length, rate):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.left = length
+        self.rate = rate
+
+    def read(self, size=-1):
+        size = self.left if size is None or size < 0 else min(size, self.left)
+        data = self.file.read(size)
+        self.left -= len(data)
+        time.sleep(len(data) / self.rate)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class LocalS3:
+    """The S3 calls of ingest_archive over one archive on disk, with a simulated cost."""
+
+    def __init__(self, path, key, rtt, get_rate, put_rate):
+        self.path = path
+        self.key = key
+        self.size = os.path.getsize(path)
+        self.rtt = rtt / 1000
+        self.get_rate = get_rate * CHUNK
+        self.put_rate = put_rate * CHUNK
+        self.objects = {}  # uploaded key -> size
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.rtt)
+
+    def head_object(self, Bucket, Key):
+        self._request()
+        return {"ContentLength": self.size}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._request()
+        start, end = 0, self.size - 1
+        if Range:
+            start, end = (int(x) for x in Range[len("bytes=") :].split("-"))
+        return {"Body": ThrottledBody(self.path, start, end - start + 1, self.get_rate)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._request()
+        time.sleep(len(Body) / self.put_rate)
+        with self.lock:
+            self.objects[Key] = len(Body)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._request()
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._request()
+        time.sleep(len(Body) / self.put_rate)
+        with self.lock:
+            self.uploads[UploadId][PartNumber] = len(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._request()
+        with self.lock:
+            parts = self.uploads.pop(UploadId)
+            self.objects[Key] = sum(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+def members(total, rng):
+    """(name, size) of an archive of about `total` bytes."""
+    count = 0
+    while total > 0:
+        count += 1
+        if count % 50 == 0:
+            name, size = f"scans/scan{count}.pdf", rng.randint(24, 48) * CHUNK  # multipart
+        elif count % 20 == 0:
+            name, size = f"papers/notes{count}.txt", rng.randint(1, 64) * 1024
+        else:
+            name, size = f"papers/paper{count}.pdf", int(min(rng.lognormvariate(14.5, 0.5), 12 * CHUNK))
+        total -= size
+        yield name, size
+
+
+def write_archive(path, fmt, total, rng):
+    """Members of incompressible bytes (stored, like scanned PDFs), written without holding them."""
+    pool = os.urandom(16 * CHUNK)
+
+    def body(size):
+        offset = rng.randrange(len(pool) - min(size, len(pool)) + 1)
+        while size > 0:
+            piece = pool[offset : offset + min(size, len(pool) - offset)]
+            yield piece
+            size -= len(piece)
+            offset = 0
+
+    count = 0
+    if fmt == "zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for name, size in members(total, rng):
+                with archive.open(zipfile.ZipInfo(name), "w", force_zip64=size > 2**31) as member:
+                    for piece in body(size):
+                        member.write(piece)
+                count += 1
+    else:
+        with tarfile.open(path, "w") as archive:
+            for name, size in members(total, rng):
+                info = tarfile.TarInfo(name)
+                info.size = size
+                archive.addfile(info, io.BufferedReader(io.BytesIO(b"".join(body(size)))))
+                count += 1
+    return count
+
+
+def run(table, s3_client, key, workers, readahead):
+    ingest_archive.READAHEAD_BLOCKS = readahead
+    table.delete_item(Key={"file_id": f"{ingest_archive.PROGRESS_PREFIX}{ingest_archive.archive_id_of(key)}"})
+    s3_client.objects.clear()
+    s3_client.requests = 0
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        progress = ingest_archive.ingest_archive("docs", key, client=s3_client, table=table, workers=workers)
+    return progress, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gb", type=float, default=2.0, help="archive size")
+    parser.add_argument("--format", choices=("zip", "tar"), default="zip")
+    parser.add_argument("--workers", type=int, default=ingest_archive.UPLOAD_WORKERS)
+    parser.add_argument("--readahead", type=int, default=ingest_archive.READAHEAD_BLOCKS, help="ranged GETs in flight")
+    parser.add_argument("--rtt", type=float, default=20.0, help="ms per S3 request")
+    parser.add_argument("--get-rate", type=float, default=200.0, help="MB/s of one GET")
+    parser.add_argument("--put-rate", type=float, default=50.0, help="MB/s of one PUT/UploadPart")
+    parser.add_argument("--skip-sequential", action="store_true", help="only the parallel run")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"archive.{args.format}")
+        started = time.perf_counter()
+        count = write_archive(path, args.format, int(args.gb * 1024**3), rng)
+        size = os.path.getsize(path)
+        print(f"{args.format}: {count} members, {size / 1024**2:,.0f} MiB (written in {time.perf_counter() - started:.0f}s)")
+        key = f"archives/{uuid.uuid4()}_bench.{args.format}"
+
+        with moto.mock_aws():
+            table = boto3.resource("dynamodb").create_table(
+                TableName="docs",
+                KeySchema=[{"AttributeName": "file_id", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "file_id", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            s3_client = LocalS3(path, key, args.rtt, args.get_rate, args.put_rate)
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            runs = [(f"{args.workers} workers", args.workers, args.readahead)]
+            if not args.skip_sequential:  # one GET and one upload at a time
+                runs.insert(0, ("one at a time", 1, 0))
+            for label, workers, readahead in runs:
+                progress, seconds = run(table, s3_client, key, workers, readahead)
+                uploaded = int(progress["members_uploaded"])
+                print(
+                    f"{label:<14}: {progress['status']} {uploaded} PDF(s), {int(progress['members_skipped'])} skipped, "
+                    f"{int(progress['bytes_uploaded']) / 1024**2:,.0f} MiB in {seconds:.1f}s = "
+                    f"{uploaded / seconds:.1f} files/s, {size / 1024**2 / seconds:,.0f} MiB/s of archive, "
+                    f"{s3_client.requests} S3 requests"
+                )
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"peak RSS {rss_after / 1024:,.0f} MiB (before unpacking {rss_before / 1024:,.0f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
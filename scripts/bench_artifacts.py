@@ -0,0 +1,161 @@
+"""
+Measure the latency of re-tagging a document (getting the text the model is sent)
+with and without its extraction artifact: download and parse the PDF with pypdf,
+or one GET of artifacts/<file_id>/extraction.json.gz.
+
+Usage:
+    python scripts/bench_artifacts.py --documents 20 --pages 40 --rtt 20 --bandwidth 80
+
+Runs in-process: generated text PDFs (tests/unit/fake_pdf.py) in a dict-backed
+S3 stand-in that charges --rtt ms per request and --bandwidth MB/s, roughly what a
+Lambda sees from S3 in the same region. No AWS access needed.
+"""
+import argparse
+import hashlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")  # process_doc creates its clients at import
+import artifacts
+import process_doc
+from tests.unit.fake_pdf import make_pdf
+
+WORDS = "cache latency artifact extraction model prompt page section outline index".split()
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class LocalS3:
+    """The few S3 calls the pipeline makes, over a dict, with a simulated network cost."""
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, rtt, bandwidth):
+        self.objects = {}
+        self.rtt = rtt / 1000
+        self.bandwidth = bandwidth * 1024 * 1024
+        self.bytes_read = 0
+
+    def _transfer(self, size):
+        time.sleep(self.rtt + size / self.bandwidth)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._transfer(len(Body))
+        self.objects[Key] = Body
+
+    def head_object(self, Bucket, Key):
+        self._transfer(0)
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"ETag": f'"{hashlib.md5(self.objects[Key]).hexdigest()}"'}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            self._transfer(0)
+            raise NoSuchKey(Key)
+        body = self.objects[Key]
+        self._transfer(len(body))
+        self.bytes_read += len(body)
+        return {"Body": io.BytesIO(body)}
+
+    def download_file(self, Bucket, Key, Filename):
+        body = self.get_object(Bucket, Key)["Body"].read()
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+
+def page_text(document, page, chars):
+    words = [WORDS[(document + page + i) % len(WORDS)] for i in range(chars // 8)]
+    lines = [" ".join(words[i : i + 12]) for i in range(0, len(words), 12)]
+    heading = "Abstract" if page == 0 else f"{page} Section"
+    return "\n".join([heading] + lines)
+
+
+def retag(file_id, key, use_artifact):
+    """One re-tag's extraction: the model text of Round 1, like the Lambda."""
+    if use_artifact:
+        extraction = process_doc.load_extraction("bench", key, file_id)
+    else:  # what every re-tag did before the artifacts
+        fetch_pdf = lambda: process_doc.download_file_from_s3_to_tmp("bench", key)  # noqa: E731
+        extraction = artifacts.Extraction(None, fetch_pdf, process_doc.EXTRACTOR_VERSION)
+    return process_doc.model_text(process_doc.extracted_text(extraction, head=4, tail=5))
+
+
+def timed_run(name, documents, s3_client, use_artifact):
+    latencies, texts = [], []
+    s3_client.bytes_read = 0
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")  # silence the pipeline's logging
+    try:
+        for file_id, key in documents:
+            started = time.perf_counter()
+            texts.append(retag(file_id, key, use_artifact))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print(
+        f"{name:<17} median {statistics.median(latencies) * 1000:>7.1f} ms  "
+        f"max {max(latencies) * 1000:>7.1f} ms  read {s3_client.bytes_read / 1024:>8.0f} KiB"
+    )
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40, help="pages per PDF")
+    parser.add_argument("--chars", type=int, default=3000, help="characters per page")
+    parser.add_argument("--rtt", type=float, default=20.0, help="ms per S3 request")
+    parser.add_argument("--bandwidth", type=float, default=80.0, help="S3 MB/s")
+    args = parser.parse_args()
+
+    s3_client = LocalS3(args.rtt, args.bandwidth)
+    process_doc.s3_client = s3_client
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def download(bucket, key):
+            path = os.path.join(tmp, os.path.basename(key))
+            s3_client.download_file(bucket, key, path)
+            return path
+
+        process_doc.download_file_from_s3_to_tmp = download
+        documents = []
+        for n in range(args.documents):
+            file_id = f"doc{n:04d}"
+            key = f"uploads/{file_id}_paper.pdf"
+            s3_client.objects[key] = make_pdf([page_text(n, p, args.chars) for p in range(args.pages)])
+            documents.append((file_id, key))
+        pdf_bytes = sum(len(s3_client.objects[key]) for _, key in documents)
+
+        # the first processing of each document writes its artifact
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            for file_id, key in documents:
+                extraction = process_doc.load_extraction("bench", key, file_id)
+                process_doc.extracted_text(extraction, head=4, tail=5)
+                process_doc.save_extraction("bench", file_id, extraction)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        without = timed_run("without artifact", documents, s3_client, use_artifact=False)
+        with_artifact = timed_run("with artifact", documents, s3_client, use_artifact=True)
+        artifact_bytes = sum(len(s3_client.objects[artifacts.artifact_key(f)]) for f, _ in documents)
+        print(
+            f"PDFs {pdf_bytes / 1024:.0f} KiB, artifacts {artifact_bytes / 1024:.0f} KiB; "
+            f"same model text: {without == with_artifact}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare how a burst of uploads fares against a throttling Bedrock endpoint:
+the old single bare InvokeModel call, naive immediate retries, and the
+rate-limited, backoff-and-jitter client of lambda/bedrock_client.py.
+
+Usage:
+    python scripts/bench_bedrock_client.py --documents 200 --threads 16 --capacity 20
+
+Runs against the in-process fake (scripts/local_bedrock.py) in real time, no AWS
+access needed. A failed document is one the old code stored as NEEDS_REVIEW; the new
+client defers it instead (status DEFERRED, picked up by the sweep).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+import bedrock_client
+from local_bedrock import FakeBedrock
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+BODY = json.dumps({"messages": []})
+
+
+class RealClock:
+    def __call__(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+def bare(fake):
+    def call():
+        fake.invoke_model(modelId=MODEL_ID, body=BODY)
+
+    return call
+
+
+def naive_retry(fake, attempts=6):
+    def call():
+        for attempt in range(attempts):
+            try:
+                return fake.invoke_model(modelId=MODEL_ID, body=BODY)
+            except Exception:
+                if attempt + 1 == attempts:
+                    raise
+
+    return call
+
+
+def adaptive(fake, rate):
+    client = bedrock_client.BedrockClient(fake, rate=rate, burst=rate)
+
+    def call():
+        client.invoke(MODEL_ID, BODY, deadline=time.monotonic() + 25)  # a Lambda's budget
+
+    return call
+
+
+def run(name, make_call, args):
+    fake = FakeBedrock(capacity=args.capacity, latency=args.latency, chunk_latency=0.0, clock=RealClock())
+    call = make_call(fake)
+    latencies = []
+    failed = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            with lock:
+                failed += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(one, range(args.documents)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float("nan")
+    print(
+        f"{name:<12} ok {len(latencies):>4}/{args.documents}  failed {failed:>4}  "
+        f"requests {fake.calls:>5}  throttled {fake.throttled:>5}  "
+        f"p95 {p95 * 1000:>6.0f} ms  wall {elapsed:>5.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent invocations")
+    parser.add_argument("--capacity", type=int, default=20, help="requests/s the fake serves")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per model call")
+    args = parser.parse_args()
+
+    run("bare", bare, args)
+    run("naive retry", naive_retry, args)
+    # the whole burst shares one limiter here; in Lambda each container has its own
+    run("adaptive", lambda fake: adaptive(fake, args.capacity), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure the render preparation of the Dashboard/Review tables: the per-row code the
+pages used to run on every rerun vs. the shared frame (full build and incremental patch).
+
+Usage:
+    python scripts/bench_frames.py --items 50000 --changes 10
+
+Runs in memory on synthetic items, no AWS access needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+# Reuse the frontend code, so the numbers reflect what the pages actually do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils import db, frames
+
+
+def make_item(i):
+    item = {
+        "file_id": str(uuid.uuid4()),
+        "original_file_name": f"{uuid.uuid4()}_paper_{i}.pdf",
+        "status": random.choice(["AUTO_TAGGED", "NEEDS_REVIEW", "REVIEWED"]),
+        "upload_timestamp": f"2025-12-{1 + i % 28:02d}T10:00:00+00:00",
+    }
+    if i % 10:  # some files have no extraction result yet
+        item["ai_summary"] = {
+            "summary": "Proposes a synthetic benchmark document. " * 3,
+            "tags": ["#Benchmark", "#Synthetic", f"#Tag{i % 50}"],
+            "category": "CS/Databases",
+        }
+    return item
+
+
+def legacy_dashboard(items):
+    """What 1_Dashboard.py did: DataFrame, then a row-wise apply for the tags."""
+
+    def get_tags(row):
+        ai_summary = row.get("ai_summary")
+        if not isinstance(ai_summary, dict):
+            ai_summary = {}
+        tags = ai_summary.get("tags", [])
+        return ", ".join(tags) if tags else "N/A"
+
+    df = pd.DataFrame(items)
+    df["Tags"] = df.apply(get_tags, axis=1)
+    display_df = df[["original_file_name", "status", "Tags", "upload_timestamp"]].copy()
+    display_df["upload_timestamp"] = pd.to_datetime(display_df["upload_timestamp"])
+    return display_df
+
+
+def legacy_review(items):
+    """What 3_Review.py did: get_file_details + dict.update per item, then a DataFrame."""
+    files = [dict(item) for item in items]
+    for file in files:
+        file.update(db.get_file_details(file))
+    return pd.DataFrame(files)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--changes", type=int, default=10, help="rows changed between reruns")
+    args = parser.parse_args()
+
+    items = [make_item(i) for i in range(args.items)]
+    print(f"{args.items} items")
+
+    _, seconds = timed(legacy_dashboard, items)
+    print(f"legacy dashboard (apply per row):      {seconds * 1000:8.1f} ms per rerun")
+    _, seconds = timed(legacy_review, items)
+    print(f"legacy review (get_file_details loop): {seconds * 1000:8.1f} ms per rerun")
+
+    frame, seconds = timed(frames.build_frame, items)
+    print(f"shared frame, full build:              {seconds * 1000:8.1f} ms once per server")
+
+    changed = []
+    for item in random.sample(items, args.changes):
+        item = dict(item, status="REVIEWED")
+        item["ai_summary"] = dict(item.get("ai_summary") or {}, tags=["#Edited"])
+        changed.append(item)
+    added = [make_item(args.items + i) for i in range(args.changes)]
+    removed = [item["file_id"] for item in random.sample(items, args.changes)]
+    patched, seconds = timed(frames.apply_rows, frame, changed + added, removed)
+    print(
+        f"shared frame, incremental patch:       {seconds * 1000:8.1f} ms "
+        f"({args.changes} changed, {args.changes} added, {args.changes} removed)"
+    )
+    assert len(patched) == args.items  # +added -removed
+    assert patched.loc[changed[0]["file_id"], "tags_text"] == "#Edited"
+
+    _, seconds = timed(lambda: patched[["original_file_name", "status", "tags_text", "uploaded_at"]].copy())
+    print(f"shared frame, dashboard column select: {seconds * 1000:8.1f} ms per rerun")
+
+
+if __name__ == "__main__":
+    main()
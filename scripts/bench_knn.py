@@ -0,0 +1,79 @@
+"""
+Compare the cost of keeping the related-documents graph current: a full rebuild
+vs. incremental inserts (what the embedding workers do), and how close the
+incrementally maintained graph stays to the exact one.
+
+Usage:
+    python scripts/bench_knn.py --items 20000 --inserts 200
+
+Runs in memory on synthetic clustered embeddings, no AWS access needed.
+Writes are counted in neighbour-list items (one PutItem each).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils import knn
+
+
+def make_embeddings(count, dimensions, clusters, seed):
+    """Documents around topic centres, so neighbourhoods look like real ones."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimensions))
+    topics = rng.integers(0, clusters, size=count)
+    return knn.normalize(centres[topics] + rng.normal(scale=1.5, size=(count, dimensions)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--inserts", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    args = parser.parse_args()
+
+    matrix = make_embeddings(args.items, args.dimensions, args.clusters, seed=1)
+    ids = [f"doc{i}" for i in range(args.items)]
+    base = args.items - args.inserts
+
+    started = time.perf_counter()
+    exact = knn.all_top_k(matrix, ids, knn.K)
+    rebuild_seconds = time.perf_counter() - started
+    print(
+        f"full rebuild of {args.items} documents: {rebuild_seconds:.2f}s compute, "
+        f"{args.items} list writes"
+    )
+
+    # start from an exact graph of the first documents, then insert the rest one by one
+    graph = knn.all_top_k(matrix[:base], ids[:base], knn.K)
+    writes = 0
+    started = time.perf_counter()
+    for row in range(base, args.items):
+        nearest = knn.top_k(matrix[:row], ids[:row], matrix[row], knn.AFFECTED_FACTOR * knn.K)
+        graph[ids[row]] = nearest[: knn.K]
+        writes += 1
+        for other_id, score in nearest:
+            graph[other_id], changed = knn.merge_neighbor(graph[other_id], ids[row], score)
+            writes += changed
+    insert_seconds = (time.perf_counter() - started) / args.inserts
+    print(
+        f"incremental insert: {insert_seconds * 1000:.1f} ms compute, "
+        f"{writes / args.inserts:.1f} list writes per document "
+        f"(a rebuild per insert would be {rebuild_seconds / insert_seconds:.0f}x the compute)"
+    )
+
+    # how many of the exact neighbours the incremental graph holds
+    found = total = 0
+    for file_id, neighbors in exact.items():
+        expected = {n for n, _ in neighbors}
+        found += len(expected & {n for n, _ in graph[file_id]})
+        total += len(expected)
+    print(f"recall@{knn.K} of the incremental graph vs. exact: {found / total:.4f}")
+
+
+if __name__ == "__main__":
+    main()
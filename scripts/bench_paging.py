@@ -0,0 +1,66 @@
+"""
+Measure what the Dashboard/Review tables send to the browser: the whole frame
+(before paging) vs. one server-side filtered, sorted page, and the selector options.
+
+Usage:
+    python scripts/bench_paging.py --items 50000 --page-size 50
+
+Runs in memory on synthetic items, no AWS access needed. The payload is the Arrow
+stream Streamlit serializes for st.dataframe/st.data_editor, which is what the
+browser has to download and lay out before the page becomes interactive.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Reuse the frontend code, so the numbers reflect what the pages actually do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils import frames, paging
+from bench_frames import make_item
+
+REVIEW_TABLE_COLUMNS = ["file_id", "file_name", "tags", "summary", "category", "status"]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    df = frames.build_frame([make_item(i) for i in range(args.items)])
+    print(f"{args.items} items, page size {args.page_size}")
+
+    full = df[REVIEW_TABLE_COLUMNS]
+    size, seconds = timed(paging.payload_bytes, full)
+    print(f"whole table:      {size / 1024:10.0f} KiB ({seconds * 1000:.0f} ms to serialize)")
+    options, seconds = timed(lambda: dict(zip(df["file_id"], df["file_name"])))
+    print(f"all {len(options)} selectbox options built in {seconds * 1000:.0f} ms")
+
+    def one_page(search, statuses):
+        rows = paging.filter_frame(df, search, statuses, ("file_name", "tags_text", "summary"))
+        rows = paging.sort_frame(rows, "uploaded_at", ascending=False)
+        return paging.page_of(rows, 3, args.page_size)[0][REVIEW_TABLE_COLUMNS]
+
+    for search, statuses in [("", None), ("tag7", None), ("paper_1", ["REVIEWED"])]:
+        page, seconds = timed(one_page, search, statuses)
+        print(
+            f"page (search={search!r}, status={statuses}): "
+            f"{paging.payload_bytes(page) / 1024:6.1f} KiB, prepared in {seconds * 1000:.0f} ms"
+        )
+
+    matches, seconds = timed(paging.filter_frame, df, "paper_123")
+    print(
+        f"searchable selector: {min(len(matches), paging.MAX_OPTIONS)} of {len(matches)} "
+        f"matches as options, {seconds * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
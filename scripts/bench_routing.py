@@ -0,0 +1,152 @@
+"""
+Measure the routing stage (lambda/routing.py) on a re-categorization: --files
+documents already under processed/<old category>/ get a new category and are moved
+by scripts/reroute.py, one at a time and --workers at a time. Also compares one
+CopyObject with the parallel multipart copy for a single large object.
+
+Usage:
+    python scripts/bench_routing.py --files 1000 --workers 32 --rtt 15 --copy-rate 100
+
+Runs in-process: a size-only S3 stand-in that charges --rtt ms per request and
+copies server side at --copy-rate MB/s per request, and moto for DynamoDB
+(requirements-dev.txt). No AWS access needed.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import redirect_stdout
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+for name, value in (("AWS_DEFAULT_REGION", "us-east-1"), ("AWS_ACCESS_KEY_ID", "x"), ("AWS_SECRET_ACCESS_KEY", "x")):
+    os.environ.setdefault(name, value)
+import boto3
+import moto
+
+import reroute
+import routing
+
+CATEGORIES = ["CS/AI", "CS/Systems", "Biology/Genomics", "Physics/Optics", "Math/Statistics"]
+
+
+class LocalS3:
+    """The S3 calls of the routing stage over a dict of object sizes, with a simulated cost."""
+
+    def __init__(self, rtt, copy_rate):
+        self.sizes = {}
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.rtt = rtt / 1000
+        self.copy_rate = copy_rate * 1024 * 1024
+        self.requests = 0
+
+    def _request(self, copied=0):
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.rtt + copied / self.copy_rate)
+
+    def head_object(self, Bucket, Key):
+        self._request()
+        return {"ContentLength": self.sizes[Key], "ContentType": "application/pdf"}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        if self.sizes[CopySource["Key"]] > routing.MAX_SINGLE_COPY:
+            raise ValueError("InvalidRequest: the copy source is larger than the maximum allowable size")
+        self._request(self.sizes[CopySource["Key"]])
+        self.sizes[Key] = self.sizes[CopySource["Key"]]
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._request()
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        start, end = (int(x) for x in CopySourceRange[len("bytes=") :].split("-"))
+        self._request(end - start + 1)
+        self.uploads[UploadId][PartNumber] = end - start + 1
+        return {"CopyPartResult": {"ETag": f'"{PartNumber}"'}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._request()
+        parts = self.uploads.pop(UploadId)
+        self.sizes[Key] = sum(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+    def delete_object(self, Bucket, Key):
+        self._request()
+        self.sizes.pop(Key, None)
+
+
+def file_size(rng):
+    return int(min(rng.lognormvariate(14.5, 0.9), 200 * 1024**2))  # median ~2 MB, a tail of large scans
+
+
+def setup(s3_client, table, count, rng):
+    """count documents routed to one category and since moved to another on the Review page."""
+    with table.batch_writer() as batch:
+        for n in range(count):
+            file_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            old, new = rng.sample(CATEGORIES, 2)
+            key = routing.routed_key(file_id, f"uploads/{file_id}_paper{n}.pdf", old)
+            s3_client.sizes[key] = file_size(rng)
+            batch.put_item(Item={"file_id": file_id, "s3_key": key, "category": new, "status": "REVIEWED"})
+    return reroute.plan(reroute.scan_documents(table))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--sequential-files", type=int, default=100, help="files of the one-at-a-time run")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rtt", type=float, default=15.0, help="ms per S3 request")
+    parser.add_argument("--copy-rate", type=float, default=100.0, help="server-side copy MB/s per request")
+    parser.add_argument("--large-gb", type=float, default=2.0, help="size of the single large object")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with moto.mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        table = dynamodb.create_table(
+            TableName="docs",
+            KeySchema=[{"AttributeName": "file_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "file_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        s3_client = LocalS3(args.rtt, args.copy_rate)
+        moves = setup(s3_client, table, args.files, rng)
+        total = sum(s3_client.sizes[key] for _, key, _ in moves)
+        print(f"{len(moves)} files to move, {total / 1024**2:,.0f} MiB")
+
+        def table_factory():
+            return boto3.session.Session().resource("dynamodb").Table("docs")
+
+        with redirect_stdout(io.StringIO()):  # one log line per file moved
+            sequential = reroute.reroute(s3_client, table_factory, "docs", moves[: args.sequential_files], workers=1)
+            parallel = reroute.reroute(s3_client, table_factory, "docs", moves[args.sequential_files :], workers=args.workers)
+        print(f"one at a time ({args.sequential_files} files): ", end="")
+        reroute.print_report(sequential)
+        print(f"{args.workers} workers ({len(moves) - args.sequential_files} files): ", end="")
+        reroute.print_report(parallel)
+        left = reroute.plan(reroute.scan_documents(table))
+        print(f"files not under their category afterwards: {len(left)}")
+
+        # one large object: a single CopyObject against parts copied in parallel
+        size = int(args.large_gb * 1024**3)
+        s3_client.sizes["processed/Big/scan.pdf"] = size
+        for name, threshold in (("single CopyObject", routing.MAX_SINGLE_COPY), ("parallel part copy", routing.MULTIPART_THRESHOLD)):
+            started = time.perf_counter()
+            routing.copy_object(s3_client, "docs", "processed/Big/scan.pdf", f"processed/Copy/{name}.pdf", threshold=threshold)
+            seconds = time.perf_counter() - started
+            print(f"{args.large_gb:g} GB, {name:<18}: {seconds:6.1f}s ({size / 1024**2 / seconds:,.0f} MiB/s)")
+
+
+if __name__ == "__main__":
+    main()
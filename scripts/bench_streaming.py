@@ -0,0 +1,89 @@
+"""
+Time-to-decision of a Bedrock call with and without streaming: how long the
+Lambda waits before it knows the result, and how much output is generated.
+
+Usage:
+    python scripts/bench_streaming.py --first-token 0.4 --tokens-per-second 60
+
+Runs against the in-process fake (scripts/local_bedrock.py) on a simulated
+clock, no AWS access needed. Streamed replies are read through the same parser
+the Lambda uses: stopped at the closing brace, or as soon as the status is
+INSUFFICIENT_DATA.
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+import bedrock_client
+import json_stream
+from local_bedrock import FakeBedrock, FakeClock
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+BODY = json.dumps({"messages": []})
+CHARS_PER_TOKEN = 4
+
+SUCCESS = json.dumps(
+    {
+        "status": "SUCCESS",
+        "summary": "Proposes a sparse attention scheme that scales transformers to long "
+        "documents while keeping accuracy on summarization benchmarks.",
+        "tags": ["#Transformer", "#SparseAttention", "#LongContext", "#Summarization"],
+        "category": "CS/AI/NLP",
+    },
+    indent=4,
+) + "\n\nThe summary is based on the abstract and the conclusion, the middle sections were truncated."
+INSUFFICIENT = json.dumps(
+    {
+        "status": "INSUFFICIENT_DATA",
+        "reason": "The text only contains the title page, author affiliations and the "
+        "reference list. There is no abstract, method or conclusion to summarize, and "
+        "guessing the contribution from the references alone would be speculation.",
+    },
+    indent=4,
+)
+
+
+def stop_on_insufficient():
+    # the parser the Lambda streams into (process_doc.ask_bedrock_model)
+    return json_stream.IncrementalJSON(stop_statuses=["INSUFFICIENT_DATA"])
+
+
+def measure(reply, stream, args):
+    clock = FakeClock()
+    fake = FakeBedrock(
+        reply=reply,
+        clock=clock,
+        latency=args.first_token,
+        chunk_chars=CHARS_PER_TOKEN,
+        chunk_latency=1 / args.tokens_per_second,
+    )
+    client = bedrock_client.BedrockClient(fake, clock=clock, sleep=clock.sleep)
+    if stream:
+        client.invoke_stream(MODEL_ID, BODY, stop_on_insufficient)
+    else:
+        client.invoke(MODEL_ID, BODY)
+    return clock(), fake.streamed_chars / CHARS_PER_TOKEN
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--first-token", type=float, default=0.4, help="seconds to the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    args = parser.parse_args()
+
+    for name, reply in (("SUCCESS", SUCCESS), ("INSUFFICIENT_DATA", INSUFFICIENT)):
+        full_seconds, full_tokens = measure(reply, False, args)
+        stream_seconds, stream_tokens = measure(reply, True, args)
+        print(
+            f"{name:<18} full reply {full_seconds:5.2f}s {full_tokens:4.0f} tokens | "
+            f"streamed {stream_seconds:5.2f}s {stream_tokens:4.0f} tokens "
+            f"({1 - stream_seconds / full_seconds:.0%} sooner)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare the read cost of a full table scan with an incremental (change feed) sync.
+
+Usage:
+    python scripts/bench_sync.py --table <TableName> --items 50000 --changes 100 --seed
+    python scripts/bench_sync.py --table <TableName> --endpoint-url http://localhost:8000 --seed
+
+--seed writes synthetic items first (each with a 1024-number embedding, like reviewed files).
+Point --endpoint-url at DynamoDB Local to run it without touching AWS.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+# Reuse the frontend data layer, so the numbers reflect what the pages actually do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils import db
+
+
+def seed(table, count, version):
+    """Write `count` synthetic file items, stamped like real writes."""
+    embedding = [Decimal("0.0123")] * 1024
+    with table.batch_writer() as batch:
+        for i in range(count):
+            version += 1
+            batch.put_item(
+                Item={
+                    "file_id": str(uuid.uuid4()),
+                    "original_file_name": f"{uuid.uuid4()}_paper_{i}.pdf",
+                    "s3_key": f"uploads/paper_{i}.pdf",
+                    "upload_timestamp": "2025-12-10T10:00:00+00:00",
+                    "status": "AUTO_TAGGED",
+                    "ai_summary": {
+                        "status": "SUCCESS",
+                        "summary": "Proposes a synthetic benchmark document. " * 3,
+                        "tags": ["#Benchmark", "#Synthetic", "#DynamoDB"],
+                        "category": "CS/Databases",
+                    },
+                    "embedding": embedding,
+                    "sync_shard": db.SYNC_SHARD,
+                    "updated_at": version,
+                }
+            )
+    return version
+
+
+def set_version(table, version):
+    table.put_item(Item={"file_id": db.TABLE_VERSION_KEY, "version": version})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--items", type=int, default=50000, help="items to seed")
+    parser.add_argument("--changes", type=int, default=100, help="items changed between syncs")
+    parser.add_argument("--seed", action="store_true", help="write synthetic items first")
+    parser.add_argument("--segments", type=int, default=1, help="parallel scan segments")
+    parser.add_argument("--endpoint-url", help="eg: DynamoDB Local")
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        os.environ["AWS_ENDPOINT_URL"] = args.endpoint_url  # picked up by every boto3 client
+
+    import boto3
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    version = int(
+        table.get_item(Key={"file_id": db.TABLE_VERSION_KEY}).get("Item", {}).get("version", 0)
+    )
+    if args.seed:
+        print(f"Seeding {args.items} items...")
+        version = seed(table, args.items, version)
+        set_version(table, version)
+
+    # 1. full scan, what every page load used to cost
+    started = time.perf_counter()
+    items, full_rcu = db.scan_table(args.table, db.SNAPSHOT_COLUMNS, args.segments)
+    full_seconds = time.perf_counter() - started
+    token = version
+
+    # 2. change a few items, then read only the delta
+    print(f"Changing {args.changes} items...")
+    for item in items[: args.changes]:
+        version += 1
+        table.update_item(
+            Key={"file_id": item["file_id"]},
+            UpdateExpression="SET #status = :status, #updated_at = :updated_at",
+            ExpressionAttributeNames={"#status": "status", "#updated_at": "updated_at"},
+            ExpressionAttributeValues={":status": "REVIEWED", ":updated_at": version},
+        )
+    set_version(table, version)
+
+    started = time.perf_counter()
+    changes, delta_rcu = db.query_changes(
+        args.table, max(token - db.SYNC_OVERLAP, 0), db.SNAPSHOT_COLUMNS
+    )
+    delta_seconds = time.perf_counter() - started
+
+    print(f"Full scan : {len(items):>7} items, {full_rcu:>10.1f} RCU, {full_seconds:.2f}s")
+    print(f"Delta sync: {len(changes):>7} items, {delta_rcu:>10.1f} RCU, {delta_seconds:.2f}s")
+    if delta_rcu:
+        print(f"Delta sync reads {full_rcu / delta_rcu:.0f}x fewer capacity units")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare upload throughput: the old path (bytes go through the Streamlit server,
+one upload_fileobj at a time) against direct presigned POSTs sent in parallel.
+
+Usage (local S3 stand-in, eg: `moto_server -p 5000` or MinIO):
+    python scripts/bench_upload.py --bucket bench --endpoint-url http://localhost:5000 --create-bucket
+    python scripts/bench_upload.py --bucket bench --files 100 --size-mb 20 --parallel 8
+"""
+import argparse
+import io
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import requests
+
+PREFIX = "bench-uploads/"  # outside uploads/, so a real deployment doesn't process the files
+
+
+def upload_through_server(s3, bucket, payload, count):
+    """Old path: the browser sends the file to Streamlit, which then uploads it to S3."""
+    for i in range(count):
+        received = io.BytesIO(bytes(payload))  # the copy the server holds after the browser hop
+        s3.upload_fileobj(received, bucket, f"{PREFIX}{uuid.uuid4()}_server_{i}.pdf")
+
+
+def upload_direct(s3, bucket, payload, count, parallel):
+    """New path: presigned POST, every client request goes straight to S3."""
+    post = s3.generate_presigned_post(
+        Bucket=bucket,
+        Key=PREFIX + "${filename}",
+        Conditions=[["starts-with", "$key", PREFIX]],
+        ExpiresIn=3600,
+    )
+
+    def post_one(i):
+        fields = dict(post["fields"], key=f"{PREFIX}{uuid.uuid4()}_direct_{i}.pdf")
+        response = requests.post(
+            post["url"], data=fields, files={"file": ("paper.pdf", payload)}, timeout=600
+        )
+        response.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        list(executor.map(post_one, range(count)))
+
+
+def report(name, seconds, count, size_mb):
+    print(
+        f"{name:<15} {seconds:8.2f}s  {count / seconds:8.2f} files/s  {count * size_mb / seconds:8.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--parallel", type=int, default=4, help="concurrent direct uploads")
+    parser.add_argument("--endpoint-url", help="local S3 stand-in")
+    parser.add_argument("--create-bucket", action="store_true")
+    args = parser.parse_args()
+
+    s3 = boto3.client("s3", endpoint_url=args.endpoint_url)
+    if args.create_bucket:
+        s3.create_bucket(Bucket=args.bucket)
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+
+    started = time.perf_counter()
+    upload_through_server(s3, args.bucket, payload, args.files)
+    report("through server", time.perf_counter() - started, args.files, args.size_mb)
+
+    started = time.perf_counter()
+    upload_direct(s3, args.bucket, payload, args.files, args.parallel)
+    report("direct (POST)", time.perf_counter() - started, args.files, args.size_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Shadow-mode metrics of the local classifier, from the `classifier_shadow` record the
+Lambda stores on every item it classified (CLASSIFIER_MODE=shadow or on).
+
+Per model version:
+  coverage            share of documents above the confidence threshold
+  agreement (LLM)     confident predictions matching Bedrock's category (shadow mode)
+  accuracy (review)   confident predictions matching the category after human review
+  bedrock calls saved documents the classifier answered (mode on)
+
+Usage:
+    python scripts/eval_classifier.py --table <TableName> [--version 3]
+"""
+import argparse
+from collections import defaultdict
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+
+def ratio(hits, total):
+    return f"{hits / total:.3f} ({hits}/{total})" if total else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--version", type=int, help="only this model version")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    scan_kwargs = {
+        "ProjectionExpression": "#shadow, #status, #category, #deleted",
+        "ExpressionAttributeNames": {
+            "#shadow": "classifier_shadow",
+            "#status": "status",
+            "#category": "category",
+            "#deleted": "deleted",
+        },
+        "FilterExpression": Attr("classifier_shadow").exists(),
+    }
+    stats = defaultdict(lambda: defaultdict(int))
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            record = item["classifier_shadow"]
+            version = int(record["version"])
+            if item.get("deleted") or (args.version and version != args.version):
+                continue
+            s = stats[version]
+            s["documents"] += 1
+            if not record.get("confident"):
+                continue
+            s["confident"] += 1
+            s["used"] += bool(record.get("used"))
+            if record.get("llm_category"):
+                s["llm_compared"] += 1
+                s["llm_agree"] += record["llm_category"] == record["category"]
+            if item.get("status") == "REVIEWED":  # the category a human confirmed or fixed
+                s["reviewed"] += 1
+                s["review_agree"] += item.get("category") == record["category"]
+        if not response.get("LastEvaluatedKey"):
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    if not stats:
+        print("No classified documents yet (is CLASSIFIER_MODE shadow or on?).")
+    for version in sorted(stats):
+        s = stats[version]
+        print(f"model v{version}: {s['documents']} documents")
+        print(f"  coverage:            {ratio(s['confident'], s['documents'])}")
+        print(f"  agreement (LLM):     {ratio(s['llm_agree'], s['llm_compared'])}")
+        print(f"  accuracy (review):   {ratio(s['review_agree'], s['reviewed'])}")
+        print(f"  bedrock calls saved: {s['used']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Precision/recall of the near-duplicate detection on a synthetic corpus.
+
+Each "paper" gets a few versions (arXiv v2/v3, camera-ready), made by editing a
+share of its words, next to unrelated papers drawn from the same vocabulary.
+Every document is looked up and then indexed, in upload order, like the Lambda
+does; a document flagged as a near-duplicate of a version of its own paper is a
+true positive, a match in another paper a false positive.
+
+Usage:
+    python scripts/eval_near_dup.py --papers 300 --versions 3 --edit-rate 0.03
+
+Runs in memory (a dict stands in for the LSH bucket items), no AWS access needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+# The detection code the Lambda runs
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambda")))
+import near_dup
+
+
+def make_vocabulary(rng, size=20000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(3, 10))) for _ in range(size)]
+
+
+def make_paper(rng, vocabulary, words):
+    # Zipf-like word frequencies, so unrelated papers share common words like real text
+    return rng.choices(vocabulary, weights=[1 / (i + 1) for i in range(len(vocabulary))], k=words)
+
+
+def make_version(rng, vocabulary, words, edit_rate):
+    """Replace, delete or insert a share of the words (revisions between versions)."""
+    version = []
+    for word in words:
+        roll = rng.random()
+        if roll < edit_rate / 3:
+            continue  # deleted
+        if roll < 2 * edit_rate / 3:
+            version.append(rng.choice(vocabulary))  # replaced
+            continue
+        version.append(word)
+        if roll < edit_rate:
+            version.append(rng.choice(vocabulary))  # inserted
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--papers", type=int, default=300)
+    parser.add_argument("--versions", type=int, default=3, help="versions per paper (incl. the first)")
+    parser.add_argument("--words", type=int, default=1500, help="words of extracted text per paper")
+    parser.add_argument("--edit-rate", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    documents = []  # (doc_id, paper, text)
+    for paper in range(args.papers):
+        base = make_paper(rng, vocabulary, args.words)
+        documents.append((f"p{paper}v1", paper, " ".join(base)))
+        for version in range(2, args.versions + 1):
+            edited = make_version(rng, vocabulary, base, args.edit_rate)
+            documents.append((f"p{paper}v{version}", paper, " ".join(edited)))
+    rng.shuffle(documents)  # versions arrive in any order, mixed with other papers
+
+    buckets = defaultdict(set)  # stands in for the __lsh__# items
+    signatures = {}
+    paper_of = {}
+    true_positives = false_positives = missed = 0
+    candidates_checked = 0
+    started = time.perf_counter()
+    for doc_id, paper, text in documents:
+        sig = near_dup.signature(text)
+        keys = near_dup.bucket_keys(sig)
+        candidates = set().union(*(buckets[key] for key in keys))
+        candidates_checked += len(candidates)
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            score = near_dup.similarity(sig, signatures[candidate])
+            if score >= near_dup.SIMILARITY_THRESHOLD and score > best_score:
+                best, best_score = candidate, score
+
+        has_earlier_version = paper in paper_of.values()
+        if best is not None:
+            if paper_of[best] == paper:
+                true_positives += 1
+            else:
+                false_positives += 1
+        elif has_earlier_version:
+            missed += 1
+
+        for key in keys:
+            buckets[key].add(doc_id)
+        signatures[doc_id] = sig
+        paper_of[doc_id] = paper
+    seconds = time.perf_counter() - started
+
+    flagged = true_positives + false_positives
+    expected = true_positives + missed
+    print(
+        f"{len(documents)} documents ({args.papers} papers x {args.versions} versions, "
+        f"{args.edit_rate:.0%} edits)"
+    )
+    print(f"precision: {true_positives / flagged if flagged else 1.0:.3f} ({false_positives} false positives)")
+    print(f"recall:    {true_positives / expected if expected else 1.0:.3f} ({missed} missed)")
+    print(
+        f"candidates per lookup: {candidates_checked / len(documents):.2f}, "
+        f"{seconds / len(documents) * 1000:.1f} ms per document (signature + lookup)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+In-process stand-in for the bedrock-runtime client (and the batch inference API),
+used by the tests, the benchmarks and the --local runs of scripts/backfill.py and
+scripts/batch_reprocess.py. It raises ClientError-shaped exceptions
+(e.response["Error"]["Code"]) like botocore does.
+
+Throttling follows a server-side token bucket (`capacity` requests per second),
+so clients that back off get through and clients that hammer it don't.
+"""
+import io
+import json
+import threading
+
+
+class FakeClientError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class FakeClock:
+    """Simulated time: sleep() advances it instantly, so backoff costs nothing in tests."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += max(seconds, 0.0)
+
+
+class FakeBedrock:
+    """
+    :param reply: Text the model answers with (a dict is sent as JSON)
+    :param capacity: Requests per second it serves before throttling, None for unlimited
+    :param latency: Simulated seconds per successful call (advances the clock)
+    :param script: Error codes (or None for success) returned by the first calls, in order
+    :param chunk_chars: Characters per streamed text delta (about one token)
+    :param chunk_latency: Simulated seconds between streamed deltas
+    :param stream_errors: Error codes raised in the middle of the first streams, in order
+        (None for a stream that completes), like botocore's EventStreamError, eg: "throttlingException"
+    """
+
+    def __init__(
+        self, reply=None, capacity=None, latency=0.2, clock=None, script=(), chunk_chars=4, chunk_latency=0.01, stream_errors=()
+    ):
+        self.reply = reply if reply is not None else {"status": "SUCCESS", "summary": "s", "tags": ["#a"], "category": "CS/AI"}
+        self.capacity = capacity
+        self.latency = latency
+        self.clock = clock or FakeClock()
+        self.script = list(script)
+        self.tokens = float(capacity or 0)
+        self.updated = self.clock()
+        self.chunk_chars = chunk_chars
+        self.chunk_latency = chunk_latency
+        self.stream_errors = list(stream_errors)
+        self.calls = 0
+        self.throttled = 0
+        self.streamed_chars = 0  # generated before the client closed the stream
+        self.lock = threading.Lock()
+
+    def _admit(self):
+        with self.lock:
+            self.calls += 1
+            if self.script:
+                return self.script.pop(0)
+            if self.capacity is None:
+                return None
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return "ThrottlingException"
+
+    def _check(self):
+        code = self._admit()
+        if code:
+            if code == "ThrottlingException":
+                self.throttled += 1
+            raise FakeClientError(code, "Rate exceeded" if code == "ThrottlingException" else "")
+
+    def _text(self):
+        return self.reply if isinstance(self.reply, str) else json.dumps(self.reply)
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._check()
+        text = self._text()
+        # the whole reply is generated before the response comes back
+        chunks = -(-len(text) // self.chunk_chars)
+        self.clock.sleep(self.latency + chunks * self.chunk_latency)
+        self.streamed_chars += len(text)
+        payload = {"content": [{"type": "text", "text": text}], "model": modelId}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        self._check()
+        with self.lock:
+            error = self.stream_errors.pop(0) if self.stream_errors else None
+        return {"body": FakeStream(self, self._text(), error)}
+
+
+def event(message):
+    return {"chunk": {"bytes": json.dumps(message).encode("utf-8")}}
+
+
+class FakeStream:
+    """Anthropic messages event stream; generation stops when the client closes it.
+    With `error`, it raises that code half way through the text."""
+
+    def __init__(self, fake, text, error=None):
+        self.fake = fake
+        self.text = text
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        fake = self.fake
+        yield event({"type": "message_start", "message": {"model": "fake"}})
+        fake.clock.sleep(fake.latency)  # time to first token
+        sent = 0
+        for start in range(0, len(self.text), fake.chunk_chars):
+            if self.closed:
+                return
+            if self.error and start >= len(self.text) // 2:
+                raise FakeClientError(self.error, "raised mid-stream")
+            piece = self.text[start : start + fake.chunk_chars]
+            fake.streamed_chars += len(piece)
+            sent += 1
+            yield event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}})
+            fake.clock.sleep(fake.chunk_latency)
+        yield event({"type": "content_block_stop", "index": 0})
+        yield event(
+            {
+                "type": "message_stop",
+                "amazon-bedrock-invocationMetrics": {"inputTokenCount": 1000, "outputTokenCount": sent},
+            }
+        )
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBatchJobs:
+    """
+    Stand-in for the batch inference API of the bedrock (control plane) client:
+    create_model_invocation_job / get_model_invocation_job. A job moves
+    Submitted -> InProgress -> Completed over successive polls and runs every
+    record through `runtime.invoke_model`, writing Bedrock's output format to S3.
+
+    :param s3_client: Client holding the input and output files (real, or pointed at an emulator)
+    :param runtime: Anything with invoke_model, eg: FakeBedrock or a bedrock-runtime client
+    """
+
+    def __init__(self, s3_client, runtime):
+        self.s3_client = s3_client
+        self.runtime = runtime
+        self.jobs = {}
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig, **kwargs):
+        job_arn = f"arn:aws:bedrock:us-east-1:000000000000:model-invocation-job/{len(self.jobs) + 1:012d}"
+        self.jobs[job_arn] = {
+            "jobArn": job_arn,
+            "jobName": jobName,
+            "modelId": modelId,
+            "input": inputDataConfig["s3InputDataConfig"]["s3Uri"],
+            "output": outputDataConfig["s3OutputDataConfig"]["s3Uri"],
+            "status": "Submitted",
+        }
+        return {"jobArn": job_arn}
+
+    def get_model_invocation_job(self, jobIdentifier):
+        job = self.jobs[jobIdentifier]
+        if job["status"] == "Submitted":
+            job["status"] = "InProgress"
+        elif job["status"] == "InProgress":
+            job["status"] = self._run(job)
+        return {k: v for k, v in job.items() if k not in ("input", "output")}
+
+    def _run(self, job):
+        bucket, key = job["input"][len("s3://") :].split("/", 1)
+        lines = self.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8").splitlines()
+        out, failed = [], 0
+        for line in lines:
+            record = json.loads(line)
+            try:
+                response = self.runtime.invoke_model(modelId=job["modelId"], body=json.dumps(record["modelInput"]))
+                record["modelOutput"] = json.loads(response["body"].read())
+            except Exception as e:
+                failed += 1
+                record["error"] = {"errorCode": 400, "errorMessage": str(e)}
+            out.append(json.dumps(record) + "\n")
+        out_bucket, out_prefix = job["output"][len("s3://") :].split("/", 1)
+        out_key = f"{out_prefix.rstrip('/')}/{job['jobArn'].rsplit('/', 1)[-1]}/{key.rsplit('/', 1)[-1]}.out"
+        self.s3_client.put_object(Bucket=out_bucket, Key=out_key, Body="".join(out).encode("utf-8"))
+        return "PartiallyCompleted" if failed else "Completed"
@@ -0,0 +1,246 @@
+"""
+Move the bulky attributes of existing document items to S3, the layout new items
+are written with (lambda/blobs.py):
+
+    ai_summary   the full model result goes to a content-addressed blob, the item
+                 keeps the compact summary and its key as ai_result_key
+    embedding    the vector goes to the embedding store (cache/embeddings/<embedding_key>.json),
+                 the item keeps embedding_key
+
+and report what a full scan of the table costs before and after (bytes, RCU).
+
+Usage:
+    python scripts/offload_attributes.py --table <TableName> --bucket <BucketName> [--dry-run]
+
+Updates are conditional on the item's updated_at, so an item edited meanwhile is
+skipped (run again to pick it up). They don't bump updated_at: what the pages show
+is unchanged, so the snapshots and the vector index don't need to refetch anything.
+Items being processed and bookkeeping items are left alone. --dry-run writes
+nothing and reports the sizes the items would have.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import ClientError
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")  # process_doc creates its clients at import
+import blobs
+import process_doc
+
+META_PREFIX = "__"
+EMBEDDING_PREFIX = "cache/embeddings/"  # CACHE_PREFIX of frontend/utils/embedding.py
+SKIPPED_STATUSES = {"PROCESSING"}  # the Lambda's put_item would write the old layout back
+
+
+def attribute_size(value):
+    """Approximate DynamoDB size of a value, per the documented sizing rules."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = str(value).lstrip("-").replace(".", "").lstrip("0") or "0"
+        return math.ceil(len(digits) / 2) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(1 + item_size_of(k, v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + attribute_size(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(attribute_size(v) for v in value)
+    return len(str(value))
+
+
+def item_size_of(name, value):
+    return len(name.encode("utf-8")) + attribute_size(value)
+
+
+def item_size(item):
+    return sum(item_size_of(name, value) for name, value in item.items())
+
+
+def scan_cost(sizes):
+    """RCU of an eventually consistent scan: items are summed per 1 MB page, 0.5 per 4 KB."""
+    pages, page = [], 0
+    for size in sizes:
+        if page + size > 1024 * 1024:
+            pages.append(page)
+            page = 0
+        page += size
+    pages.append(page)
+    return sum(math.ceil(p / 4096) * 0.5 for p in pages if p)
+
+
+def scan_items(table):
+    """Every item of the table, whole (what a scan without projection reads).
+    :return: (items, consumed read capacity units as reported by DynamoDB)
+    """
+    items, consumed = [], 0.0
+    scan_kwargs = {"ReturnConsumedCapacity": "TOTAL"}
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        if not response.get("LastEvaluatedKey"):
+            return items, consumed
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def needs_offload(item):
+    if item["file_id"].startswith(META_PREFIX) or item.get("deleted"):
+        return False
+    if item.get("status") in SKIPPED_STATUSES:
+        return False
+    return has_full_summary(item) or "embedding" in item
+
+
+def has_full_summary(item):
+    """ai_summary holds more than the compact fields (eg: a whole model result)."""
+    summary = item.get("ai_summary")
+    return isinstance(summary, dict) and process_doc.compact_summary(summary) != summary
+
+
+def vector_key(vector):
+    """Key for a vector stored before items had an embedding_key (its input text is unknown)."""
+    return hashlib.sha256(("vector\n" + json.dumps(vector)).encode("utf-8")).hexdigest()
+
+
+def offloaded(item, blob_store=None, s3_client=None, bucket=None):
+    """
+    The item in the S3 layout, storing its bulky values on the way (unless the
+    store/client are None, for a dry run).
+    :return: (changes to SET, attributes to REMOVE)
+    """
+    changes, removed = {}, []
+    if has_full_summary(item):
+        summary = item["ai_summary"]
+        changes["ai_summary"] = process_doc.compact_summary(summary)
+        if not item.get("ai_result_key"):  # else the blob already holds the whole result
+            changes["ai_result_key"] = blob_store.put(summary) if blob_store else blobs.blob_key(blobs.encode(summary))
+    if "embedding" in item:
+        vector = [float(x) for x in item["embedding"]]
+        key = item.get("embedding_key") or vector_key(vector)
+        if s3_client:
+            # the Review page may already have stored it under its embedding_key, overwriting is harmless
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{EMBEDDING_PREFIX}{key}.json",
+                Body=json.dumps(vector),
+                ContentType="application/json",
+            )
+        if not item.get("embedding_key"):
+            changes["embedding_key"] = key
+        removed.append("embedding")
+    return changes, removed
+
+
+def write_offload(table, item, changes, removed):
+    """Conditional on the item being unchanged since it was scanned.
+    :return: True if written"""
+    names = {f"#{k}": k for k in list(changes) + removed}
+    values = {f":{k}": v for k, v in changes.items()}
+    expression = []
+    if changes:
+        expression.append("SET " + ", ".join(f"#{k} = :{k}" for k in changes))
+    if removed:
+        expression.append("REMOVE " + ", ".join(f"#{k}" for k in removed))
+    names.update({"#deleted": "deleted", "#updated_at": "updated_at"})
+    if "updated_at" in item:
+        condition = "#updated_at = :seen AND attribute_not_exists(#deleted)"
+        values[":seen"] = item["updated_at"]
+    else:
+        condition = "attribute_not_exists(#updated_at) AND attribute_not_exists(#deleted)"
+    update_kwargs = {
+        "Key": {"file_id": item["file_id"]},
+        "UpdateExpression": " ".join(expression),
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        update_kwargs["ExpressionAttributeValues"] = values
+    try:
+        table.update_item(**update_kwargs)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def report(name, items, consumed=None):
+    sizes = [item_size(item) for item in items]
+    total = sum(sizes)
+    line = (
+        f"{name:<7} {len(items)} items, {total / 1024:.0f} KiB, "
+        f"avg {total / max(len(items), 1) / 1024:.2f} KiB, max {max(sizes, default=0) / 1024:.1f} KiB; "
+        f"full scan ~{scan_cost(sizes):.0f} RCU (estimated)"
+    )
+    if consumed is not None:
+        line += f", {consumed:.0f} RCU (consumed)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--bucket", required=True, help="documents bucket")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--endpoint-url", help="DynamoDB/S3 endpoint (emulators)")
+    parser.add_argument("--dry-run", action="store_true", help="only report the sizes after the migration")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb", endpoint_url=args.endpoint_url)
+    s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    table = dynamodb.Table(args.table)
+    blob_store = blobs.BlobStore(s3_client, args.bucket)
+
+    items, consumed = scan_items(table)
+    report("before", items, consumed)
+    todo = [item for item in items if needs_offload(item)]
+    print(f"{len(todo)} item(s) to migrate")
+
+    if args.dry_run:
+        after = []
+        for item in items:
+            if needs_offload(item):
+                changes, removed = offloaded(item)
+                item = {k: v for k, v in dict(item, **changes).items() if k not in removed}
+            after.append(item)
+        report("after", after)
+        return
+
+    local = threading.local()
+
+    def migrate(item):
+        # boto3 resources are not thread-safe, every worker thread gets its own table
+        if not hasattr(local, "table"):
+            session = boto3.session.Session()
+            local.table = session.resource("dynamodb", endpoint_url=args.endpoint_url).Table(args.table)
+        changes, removed = offloaded(item, blob_store, s3_client, args.bucket)
+        return write_offload(local.table, item, changes, removed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        written = sum(executor.map(migrate, todo))
+    print(
+        f"Migrated {written} item(s), skipped {len(todo) - written} changed meanwhile, "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    items, consumed = scan_items(table)
+    report("after", items, consumed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Recompute the related-documents graph (the "__knn__#<file_id>" items) from every
+stored embedding, and delete the lists of documents that no longer have one.
+
+Run it once after deploying the graph (documents embedded before it existed only
+get a list when a neighbour is inserted), or to fold in the long-range links the
+incremental inserts skip (see utils/knn.py).
+
+Usage:
+    python scripts/rebuild_knn.py --table <TableName> [--k 10] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils import db, knn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--k", type=int, default=knn.K, help="neighbours per document")
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be written")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    items, consumed = db.scan_table(args.table, knn.VECTOR_COLUMNS, args.segments)
+    vectors = knn.load_vectors(items)  # from S3 by embedding_key (legacy items: on the item)
+    ids = list(vectors)
+    matrix = knn.normalize([vectors[file_id] for file_id in ids])
+    loaded = time.perf_counter()
+    print(f"Loaded {len(ids)} embeddings ({consumed:.0f} RCU) in {loaded - started:.1f}s")
+
+    graph = knn.all_top_k(matrix, ids, args.k)
+    computed = time.perf_counter()
+    print(f"Computed {len(graph)} neighbour lists in {computed - loaded:.1f}s")
+
+    # lists of documents that were deleted or lost their embedding
+    table = boto3.resource("dynamodb").Table(args.table)
+    stale = []
+    scan_kwargs = {
+        "ProjectionExpression": "file_id",
+        "FilterExpression": Attr("file_id").begins_with(knn.KNN_PREFIX),
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        stale.extend(
+            item["file_id"]
+            for item in response.get("Items", [])
+            if item["file_id"][len(knn.KNN_PREFIX) :] not in graph
+        )
+        if not response.get("LastEvaluatedKey"):
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    if args.dry_run:
+        print(f"Would write {len(graph)} lists and delete {len(stale)} stale ones.")
+        return
+
+    # batch_writer sends 25 items per BatchWriteItem and retries unprocessed ones
+    with table.batch_writer() as batch:
+        for file_id, neighbors in graph.items():
+            batch.put_item(Item=knn.to_item(file_id, neighbors))
+        for key in stale:
+            batch.delete_item(Key={"file_id": key})
+    print(
+        f"Wrote {len(graph)} lists, deleted {len(stale)} stale ones "
+        f"in {time.perf_counter() - computed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Rebuild the Dashboard aggregate counters from a full scan and report drift.
+
+Usage:
+    python scripts/reconcile_counters.py --table <TableName>        # report only
+    python scripts/reconcile_counters.py --table <TableName> --fix  # overwrite drifted counters
+
+Exits with status 1 when drift was found (and not fixed), so it can run from cron/CI.
+Writes that land while --fix runs may be lost from the counters, run it when the table is quiet.
+"""
+import argparse
+import os
+import sys
+
+import boto3
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambda")))
+import counters
+
+
+def scan_files(table):
+    """Yield every item with just the attributes the counters look at."""
+    scan_kwargs = {
+        "ProjectionExpression": "#file_id, #status, #category, #upload_timestamp, #deleted",
+        "ExpressionAttributeNames": {
+            f"#{name}": name
+            for name in ("file_id", "status", "category", "upload_timestamp", "deleted")
+        },
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+
+def read_counters(table):
+    stored = {}
+    for dimension in counters.DIMENSIONS:
+        item = table.get_item(
+            Key={"file_id": counters.counter_key(dimension)}, ConsistentRead=True
+        ).get("Item", {})
+        item.pop("file_id", None)
+        stored[dimension] = {key: int(value) for key, value in item.items()}
+    return stored
+
+
+def find_drift(expected, stored):
+    """List (dimension, value, stored, expected) for every counter that is off."""
+    drift = []
+    for dimension in counters.DIMENSIONS:
+        for value in sorted(set(expected[dimension]) | set(stored[dimension])):
+            want = expected[dimension].get(value, 0)
+            have = stored[dimension].get(value, 0)
+            if want != have:
+                drift.append((dimension, value, have, want))
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--fix", action="store_true", help="overwrite the counters with the rebuilt values")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    expected = counters.count_items(scan_files(table))
+    stored = read_counters(table)
+    drift = find_drift(expected, stored)
+
+    for dimension, value, have, want in drift:
+        print(f"{dimension:>8} {value!r}: stored {have}, actual {want} ({want - have:+d})")
+    print(f"{len(drift)} drifted counters.")
+
+    if drift and args.fix:
+        for dimension in counters.DIMENSIONS:
+            table.put_item(
+                Item=dict(expected[dimension], file_id=counters.counter_key(dimension))
+            )
+        print("Counters rebuilt.")
+        return 0
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
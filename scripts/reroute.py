@@ -0,0 +1,131 @@
+"""
+Move documents to the prefix of their current category (lambda/routing.py): files
+tagged before the routing existed, files whose category was changed on the Review
+page since, or that the Lambda could not route in time.
+
+Every document with a category whose s3_key is not processed/<its category>/... is
+copied server side, switched over with a conditional update, and its old object
+deleted. Items being processed, tombstones and documents without a category stay
+where they are. Reports files/s and the bytes copied.
+
+Usage:
+    python scripts/reroute.py --table <TableName> --bucket <BucketName> [--workers 32] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+import routing
+
+META_PREFIX = "__"
+COLUMNS = ("file_id", "s3_key", "category", "status", "deleted")
+
+
+def scan_documents(table):
+    """file_id, s3_key, category and status of every document item."""
+    items = []
+    scan_kwargs = {
+        "ProjectionExpression": ", ".join(f"#{c}" for c in COLUMNS),
+        "ExpressionAttributeNames": {f"#{c}": c for c in COLUMNS},
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if not response.get("LastEvaluatedKey"):
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def plan(items):
+    """The documents not where their category says: [(file_id, s3_key, category)]"""
+    moves = []
+    for item in items:
+        if item["file_id"].startswith(META_PREFIX) or item.get("deleted") or item.get("status") == "PROCESSING":
+            continue
+        if not item.get("category") or not item.get("s3_key"):
+            continue
+        if routing.routed_key(item["file_id"], item["s3_key"], item["category"]) != item["s3_key"]:
+            moves.append((item["file_id"], item["s3_key"], item["category"]))
+    return moves
+
+
+def reroute(s3_client, table_factory, bucket, moves, workers, **copy_kwargs):
+    """
+    Move the documents, `workers` at a time (each large file also copies its parts in parallel).
+    :param table_factory: Returns a DynamoDB table resource, called once per worker thread
+    :return: Report with moved, conflicts, failed (file_ids), bytes, seconds, files_per_second
+    """
+    local = threading.local()
+
+    def move(entry):
+        file_id, key, category = entry
+        if not hasattr(local, "table"):  # boto3 resources are not thread-safe
+            local.table = table_factory()
+        try:
+            _, size = routing.move(s3_client, local.table, bucket, file_id, key, category, **copy_kwargs)
+            return "moved", size
+        except routing.RoutingConflict:
+            return "conflict", 0  # edited, moved or deleted meanwhile
+        except Exception as e:
+            print(f"Failed to route {file_id}: {e}")
+            return "failed", 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(move, moves))
+    seconds = time.perf_counter() - started
+    outcomes = [outcome for outcome, _ in results]
+    return {
+        "moved": outcomes.count("moved"),
+        "conflicts": outcomes.count("conflict"),
+        "failed": [entry[0] for entry, (outcome, _) in zip(moves, results) if outcome == "failed"],
+        "bytes": sum(size for _, size in results),
+        "seconds": seconds,
+        "files_per_second": len(moves) / seconds if seconds else 0.0,
+    }
+
+
+def print_report(report):
+    print(
+        f"Moved {report['moved']} file(s), {report['bytes'] / 1024**2:,.0f} MiB, in {report['seconds']:.1f}s "
+        f"({report['files_per_second']:.1f} files/s); {report['conflicts']} changed meanwhile, "
+        f"{len(report['failed'])} failed"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--bucket", required=True, help="documents bucket")
+    parser.add_argument("--workers", type=int, default=32, help="files moved at once")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would move")
+    parser.add_argument("--endpoint-url", help="S3/DynamoDB endpoint, eg: an emulator")
+    args = parser.parse_args()
+
+    s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)  # clients are thread-safe
+    table = boto3.resource("dynamodb", endpoint_url=args.endpoint_url).Table(args.table)
+    moves = plan(scan_documents(table))
+    print(f"{len(moves)} document(s) to move")
+    if args.dry_run:
+        for file_id, key, category in moves:
+            print(f"  {key} -> {routing.routed_key(file_id, key, category)}")
+        return
+
+    def table_factory():
+        return boto3.session.Session().resource("dynamodb", endpoint_url=args.endpoint_url).Table(args.table)
+
+    report = reroute(s3_client, table_factory, args.bucket, moves, args.workers)
+    print_report(report)
+    if report["failed"]:
+        print(f"Run again to retry: {', '.join(report['failed'][:20])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Replay the processing of one large scanned PDF through ProcessDocFunction's 30 s
+timeout on a simulated clock, with and without the checkpointed extraction:
+every invocation, how long it ran, how many pages it read and how it ended.
+
+Usage:
+    python scripts/simulate_extraction.py --pages 400 --page-seconds 2.5 --timeout 30
+
+Everything runs in-process: moto for S3 and DynamoDB (requirements-dev.txt), the
+fake model and the local Lambda runner from tests/unit, a generated PDF whose
+Round 1 pages are nearly empty so that the deep scan runs.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "lambda"))
+sys.path.append(ROOT)
+for name, value in (("AWS_DEFAULT_REGION", "us-east-1"), ("AWS_ACCESS_KEY_ID", "x"), ("AWS_SECRET_ACCESS_KEY", "x")):
+    os.environ.setdefault(name, value)
+import boto3
+import moto
+
+import artifacts
+import process_doc
+from local_bedrock import FakeBedrock, FakeClock
+from tests.unit.fake_lambda import LocalLambda
+from tests.unit.fake_pdf import make_pdf
+
+KEY = "uploads/0b9d5b8e-0000-4000-8000-00000000000a_scan.pdf"
+
+
+def simulate(args, checkpointed):
+    with moto.mock_aws(), tempfile.TemporaryDirectory() as tmp:
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="docs")
+        body = ["cover"] * 4 + ["Chapter\n" + "scanned page text " * 20] * (args.pages - 9) + ["end"] * 5
+        s3_client.put_object(Bucket="docs", Key=KEY, Body=make_pdf(body))
+        dynamodb = boto3.resource("dynamodb")
+        table = dynamodb.create_table(
+            TableName="docs",
+            KeySchema=[{"AttributeName": "file_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "file_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        clock = FakeClock()
+        runner = LocalLambda(process_doc.handler, clock, timeout=args.timeout)
+        pages_read = []
+        read_page = artifacts.Extraction._read_page
+
+        def slow_read_page(extraction, i):
+            pages_read.append(len(runner.invocations))  # index of the running invocation
+            runner.spend(args.page_seconds)
+            return read_page(extraction, i)
+
+        def download(bucket, key):
+            path = os.path.join(tmp, os.path.basename(key))
+            s3_client.download_file(bucket, key, path)
+            runner.spend(args.download_seconds)
+            return path
+
+        extracted_text = process_doc.extracted_text
+        artifacts.Extraction._read_page = slow_read_page
+        process_doc.s3_client, process_doc.dynamodb, process_doc.TABLE_NAME = s3_client, dynamodb, "docs"
+        process_doc.clock, process_doc.lambda_client, process_doc.FUNCTION_NAME = clock, runner, runner.function_name
+        process_doc.download_file_from_s3_to_tmp = download
+        process_doc.bedrock = process_doc.bedrock_client.BedrockClient(
+            FakeBedrock(clock=clock, latency=args.model_seconds, chunk_latency=0.0), clock=clock, sleep=clock.sleep
+        )
+        process_doc.check_near_duplicate = lambda file_id, text: (None, None, 0.0)
+        process_doc.index_near_duplicate = lambda file_id, sig, match: None
+        if not checkpointed:
+            # the extraction before checkpoints: no deadline, everything in one invocation
+            process_doc.extracted_text = lambda extraction, head=4, tail=5, **_: extracted_text(extraction, head, tail)
+        try:
+            event = {"Records": [{"s3": {"bucket": {"name": "docs"}, "object": {"key": KEY, "sequencer": "01"}}}]}
+            for number, (_, response, seconds) in enumerate(run_quietly(runner, event)):
+                read = pages_read.count(number)
+                outcome = response if isinstance(response, str) else response.get("body", response)
+                print(f"  invocation {number + 1}: {seconds:5.1f}s, {read:3d} pages read -> {outcome}")
+            item = table.get_item(Key={"file_id": process_doc.get_file_id_from_key(KEY)}).get("Item", {})
+            print(f"  final status: {item.get('status', 'no record')}")
+        finally:
+            artifacts.Extraction._read_page = read_page
+            process_doc.extracted_text = extracted_text
+
+
+def run_quietly(runner, event):
+    with redirect_stdout(io.StringIO()):
+        return runner.run(event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--page-seconds", type=float, default=2.5, help="simulated pypdf time per page")
+    parser.add_argument("--download-seconds", type=float, default=2.0, help="simulated PDF download time")
+    parser.add_argument("--model-seconds", type=float, default=3.0, help="simulated Bedrock latency")
+    parser.add_argument("--timeout", type=float, default=30.0, help="function timeout, seconds")
+    args = parser.parse_args()
+
+    print("Single invocation (before checkpoints):")
+    simulate(args, checkpointed=False)
+    print("Checkpointed extraction:")
+    simulate(args, checkpointed=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Train the local category classifier on human-reviewed documents (status REVIEWED)
+and publish it as a new model version in the documents bucket.
+
+The text is extracted from each PDF exactly like the Lambda does (Round 1,
+head 4 + tail 5 pages) and cached locally, so retraining only downloads new files.
+A holdout split calibrates the confidence threshold: the lowest one whose
+predictions reach --target-precision. The published model is then trained on
+everything and carries that threshold and the holdout metrics.
+
+Usage:
+    python scripts/train_classifier.py --table <TableName> --bucket <BucketName> [--dry-run]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+# The Lambda's own extraction and classifier code
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambda")))
+import classifier
+from process_doc import extract_text_smartly
+
+META_PREFIX = "__"
+
+
+def reviewed_documents(table):
+    """Every reviewed document: (file_id, s3_key, category, tags)."""
+    scan_kwargs = {
+        "ProjectionExpression": "#file_id, #s3_key, #category, #ai_summary.#tags, #deleted",
+        "ExpressionAttributeNames": {
+            f"#{name}": name
+            for name in ("file_id", "s3_key", "category", "ai_summary", "tags", "deleted")
+        },
+        "FilterExpression": Attr("status").eq("REVIEWED") & Attr("category").exists(),
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get("Items", []):
+            if item["file_id"].startswith(META_PREFIX) or item.get("deleted"):
+                continue
+            tags = item.get("ai_summary", {}).get("tags", [])
+            yield item["file_id"], item.get("s3_key"), item["category"], tags
+        if not response.get("LastEvaluatedKey"):
+            return
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def load_text(s3_client, bucket, cache_dir, file_id, s3_key):
+    cached = os.path.join(cache_dir, f"{file_id}.txt")
+    if os.path.exists(cached):
+        with open(cached, encoding="utf-8") as f:
+            return f.read()
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+        s3_client.download_file(bucket, s3_key, pdf.name)
+        text = extract_text_smartly(pdf.name, head=4, tail=5)
+    with open(cached, "w", encoding="utf-8") as f:
+        f.write(text)
+    return text
+
+
+def in_holdout(file_id, share):
+    # deterministic split, so the holdout stays the same between runs
+    return int(hashlib.sha256(file_id.encode()).hexdigest(), 16) % 1000 < share * 1000
+
+
+def calibrate(model, holdout, target_precision):
+    """
+    Holdout metrics and the lowest threshold whose predictions reach the target precision.
+    :return: (threshold, metrics dict)
+    """
+    predictions = sorted(
+        ((*classifier.predict(model, text), category) for text, category, _ in holdout),
+        key=lambda p: -p[1],
+    )
+    correct = sum(predicted == category for predicted, _, category in predictions)
+    threshold, coverage, precision = 1.0, 0.0, 1.0
+    hits = 0
+    for rank, (predicted, confidence, category) in enumerate(predictions, start=1):
+        hits += predicted == category
+        if hits / rank >= target_precision:
+            threshold, coverage, precision = confidence, rank / len(predictions), hits / rank
+    return threshold, {
+        "holdout_examples": len(predictions),
+        "holdout_accuracy": round(correct / len(predictions), 4) if predictions else None,
+        "threshold": round(threshold, 4),
+        "precision_at_threshold": round(precision, 4),
+        "coverage_at_threshold": round(coverage, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--bucket", required=True, help="documents bucket (PDFs and models)")
+    parser.add_argument("--cache-dir", default=".classifier_cache", help="extracted text cache")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share used for calibration")
+    parser.add_argument("--target-precision", type=float, default=0.95)
+    parser.add_argument("--min-examples", type=int, default=5, help="per category")
+    parser.add_argument("--workers", type=int, default=8, help="parallel downloads")
+    parser.add_argument("--dry-run", action="store_true", help="report metrics, don't publish")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    s3_client = boto3.client("s3")
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    documents = [d for d in reviewed_documents(table) if d[1]]
+    print(f"{len(documents)} reviewed documents")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        texts = list(
+            executor.map(
+                lambda d: load_text(s3_client, args.bucket, args.cache_dir, d[0], d[1]), documents
+            )
+        )
+    examples = [
+        (text, category, tags)
+        for (file_id, _, category, tags), text in zip(documents, texts)
+        if text
+    ]
+    ids = [file_id for (file_id, *_), text in zip(documents, texts) if text]
+
+    train_set = [e for e, i in zip(examples, ids) if not in_holdout(i, args.holdout)]
+    holdout = [e for e, i in zip(examples, ids) if in_holdout(i, args.holdout)]
+    model = classifier.train(train_set, min_examples=args.min_examples)
+    holdout = [e for e in holdout if e[1] in model["classes"]]  # categories it can predict
+    threshold, metrics = calibrate(model, holdout, args.target_precision)
+    for name, value in metrics.items():
+        print(f"{name}: {value}")
+
+    final = classifier.train(examples, min_examples=args.min_examples)
+    final["threshold"] = threshold
+    final["metrics"] = dict(metrics, classes=len(final["classes"]), target_precision=args.target_precision)
+    print(f"{len(final['classes'])} categories, {final['examples']} training examples")
+    if args.dry_run:
+        return
+    version = classifier.save_model(s3_client, args.bucket, final)
+    print(f"Published s3://{args.bucket}/{classifier.model_key(version)} (latest -> v{version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# Lambda code is deployed as a flat directory (see DocuflowStack), import its modules the same way
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "lambda")))
+# and the frontend's helpers as the pages do (from utils import db)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend")))
+# and the local stand-ins the scripts run against (scripts/local_bedrock.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "scripts")))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")  # the Lambda modules create clients on import
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """In-memory S3 and DynamoDB (moto): the "docs" bucket and the "docs" table, keyed on file_id."""
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="docs")
+        table = boto3.resource("dynamodb", region_name="us-east-1").create_table(
+            TableName="docs",
+            KeySchema=[{"AttributeName": "file_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "file_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield s3_client, table
+
+
+@pytest.fixture
+def process_doc_aws(aws, monkeypatch):
+    """The shared bucket and table, with process_doc's clients pointed at them."""
+    import boto3
+    import process_doc
+
+    s3_client, table = aws
+    monkeypatch.setattr(process_doc, "s3_client", s3_client)
+    monkeypatch.setattr(process_doc, "dynamodb", boto3.resource("dynamodb", region_name="us-east-1"))
+    monkeypatch.setattr(process_doc, "TABLE_NAME", table.name)
+    monkeypatch.setattr(process_doc, "blob_stores", {})
+    return aws
@@ -0,0 +1,72 @@
+"""
+Local stand-in for the Lambda service running process_doc.handler, on a simulated clock:
+each invocation gets `timeout` seconds, asynchronous self-invocations (lambda_client.invoke
+with InvocationType="Event") are queued and run one after the other, like a Step
+Functions loop would. Work that overruns its invocation is killed with LambdaTimeout, which
+no `except Exception` catches, like the real timeout leaves no chance to clean up.
+"""
+import json
+
+
+class LambdaTimeout(BaseException):
+    """The invocation ran out of time (Task timed out)."""
+
+
+class FakeContext:
+    def __init__(self, clock, ends_at, function_name):
+        self.clock = clock
+        self.ends_at = ends_at
+        self.function_name = function_name
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self.ends_at - self.clock()) * 1000), 0)
+
+
+class LocalLambda:
+    """
+    :param handler: The function's handler (process_doc.handler)
+    :param clock: FakeClock shared with the code under test
+    :param timeout: Seconds per invocation (ProcessDocFunction: 30)
+    """
+
+    def __init__(self, handler, clock, timeout=30, function_name="ProcessDocFunction"):
+        self.handler = handler
+        self.clock = clock
+        self.timeout = timeout
+        self.function_name = function_name
+        self.queue = []
+        self.invocations = []  # (event, response or "TIMEOUT" or the exception raised, seconds)
+        self.context = None
+
+    def spend(self, seconds):
+        """Simulated work: advance the clock, killing the invocation if it overruns."""
+        self.clock.sleep(seconds)
+        if self.context is not None and self.clock() > self.context.ends_at:
+            raise LambdaTimeout(f"Task timed out after {self.timeout:.2f} seconds")
+
+    # the part of the lambda client process_doc uses
+    def invoke(self, FunctionName, InvocationType, Payload):
+        assert FunctionName == self.function_name and InvocationType == "Event"
+        self.queue.append(json.loads(Payload))
+        return {"StatusCode": 202}
+
+    def run(self, event, max_invocations=100):
+        """
+        Invoke the handler with `event`, then with every event it queued, in order.
+        :return: The list of invocations, see self.invocations
+        """
+        self.queue.append(event)
+        while self.queue and len(self.invocations) < max_invocations:
+            event = self.queue.pop(0)
+            started = self.clock()
+            self.context = FakeContext(self.clock, started + self.timeout, self.function_name)
+            try:
+                response = self.handler(event, self.context)
+            except LambdaTimeout:
+                response = "TIMEOUT"
+            except Exception as e:
+                response = e  # a failed invocation
+            finally:
+                self.context = None
+            self.invocations.append((event, response, self.clock() - started))
+        return self.invocations
@@ -0,0 +1,78 @@
+"""
+Minimal text PDFs for tests and benchmarks: one Helvetica text line per page line,
+an optional outline. Enough for pypdf's extract_text and outline reading.
+"""
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages, outline=()):
+    """
+    :param pages: List of page texts ("\\n" separates lines)
+    :param outline: (title, page index) bookmarks, all at the top level
+    :return: The PDF bytes
+    """
+    objects = []  # object n is objects[n - 1]
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_obj = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for text in pages:
+        lines = text.split("\n")
+        ops = ["BT /F1 10 Tf 14 TL 50 780 Td"]
+        ops += [f"({_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+            )
+        )
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    outline_ref = b""
+    if outline:
+        root = add(None)
+        items = []
+        for title, page in outline:
+            items.append(add(None))
+        for n, (item, (title, page)) in enumerate(zip(items, outline)):
+            links = b""
+            if n:
+                links += b" /Prev %d 0 R" % items[n - 1]
+            if n + 1 < len(items):
+                links += b" /Next %d 0 R" % items[n + 1]
+            objects[item - 1] = b"<< /Title (%s) /Parent %d 0 R /Dest [%d 0 R /Fit]%s >>" % (
+                _escape(title).encode("latin-1"),
+                root,
+                page_ids[page],
+                links,
+            )
+        objects[root - 1] = b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>" % (
+            items[0],
+            items[-1],
+            len(items),
+        )
+        outline_ref = b" /Outlines %d 0 R" % root
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R%s >>" % (pages_obj, outline_ref)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
@@ -0,0 +1,107 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import ingest_archive
+
+ARCHIVE_ID = "0b9d5b8e-0000-4000-8000-0000000000aa"
+
+
+@pytest.fixture
+def aws(aws, monkeypatch):
+    """The shared bucket and table, read in small blocks."""
+    monkeypatch.setattr(ingest_archive, "READ_BLOCK", 64 * 1024)  # many ranged GETs
+    return aws
+
+
+def pdf(n, size=200 * 1024):
+    return b"%PDF-1.4 " + bytes([n]) * size
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("papers/", b"")
+        for name, body in members:
+            archive.writestr(name, body)
+    return buffer.getvalue()
+
+
+def make_tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, body in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(body)
+            archive.addfile(info, io.BytesIO(body))
+    return buffer.getvalue()
+
+
+def uploads(s3_client):
+    contents = s3_client.list_objects_v2(Bucket="docs", Prefix="uploads/").get("Contents", [])
+    return {o["Key"]: s3_client.get_object(Bucket="docs", Key=o["Key"])["Body"].read() for o in contents}
+
+
+def run(s3_client, table, key):
+    return ingest_archive.ingest_archive("docs", key, client=s3_client, table=table, workers=4)
+
+
+def test_zip_members_fan_out_to_uploads(aws):
+    s3_client, table = aws
+    members = [("papers/a.pdf", pdf(1)), ("papers/b.PDF", pdf(2)), ("notes.txt", b"x"), ("__MACOSX/papers/._a.pdf", b"x")]
+    key = f"archives/{ARCHIVE_ID}_papers.zip"
+    s3_client.put_object(Bucket="docs", Key=key, Body=make_zip(members + [("c.pdf", pdf(3))]))
+
+    progress = run(s3_client, table, key)
+
+    uploaded = uploads(s3_client)
+    assert sorted(k.split("_", 1)[1] for k in uploaded) == ["a.pdf", "b.PDF", "c.pdf"]
+    assert sorted(uploaded.values()) == [pdf(1), pdf(2), pdf(3)]
+    assert progress["status"] == "DONE" and progress["members_uploaded"] == 3 and progress["members_skipped"] == 2
+    item = table.get_item(Key={"file_id": f"__archive__#{ARCHIVE_ID}"})["Item"]
+    assert item["status"] == "DONE" and item["resume_from"] == 5 and item["lease_expires_at"] == 0
+
+    assert run(s3_client, table, key) is None  # duplicate delivery
+    assert len(uploads(s3_client)) == 3
+
+
+def test_tar_is_streamed_and_large_members_go_in_parts(aws, monkeypatch):
+    s3_client, table = aws
+    monkeypatch.setattr(ingest_archive, "PART_SIZE", 5 * 1024 * 1024)  # S3's smallest part
+    large = os.urandom(11 * 1024 * 1024)
+    key = f"archives/{ARCHIVE_ID}_scans.tar.gz"
+    s3_client.put_object(Bucket="docs", Key=key, Body=make_tar([("scans/big.pdf", large), ("small.pdf", pdf(4))]))
+
+    run(s3_client, table, key)
+
+    uploaded = uploads(s3_client)
+    assert sorted(uploaded.values(), key=len) == [pdf(4), large]
+    big_key = next(k for k in uploaded if k.endswith("_big.pdf"))
+    assert s3_client.head_object(Bucket="docs", Key=big_key)["ETag"].endswith('-3"')
+
+
+def test_a_retry_resumes_after_the_members_uploaded(aws):
+    s3_client, table = aws
+    key = f"archives/{ARCHIVE_ID}_papers.zip"
+    s3_client.put_object(Bucket="docs", Key=key, Body=make_zip([(f"{n}.pdf", pdf(n)) for n in range(4)]))
+    # a run that failed after the first two members
+    table.put_item(Item={"file_id": f"__archive__#{ARCHIVE_ID}", "status": "FAILED", "resume_from": 2, "lease_expires_at": 0})
+
+    progress = run(s3_client, table, key)
+
+    assert progress["status"] == "DONE"
+    assert sorted(k.split("_", 1)[1] for k in uploads(s3_client)) == ["2.pdf", "3.pdf"]
+
+
+def test_a_corrupt_archive_fails_without_retries(aws):
+    s3_client, table = aws
+    key = f"archives/{ARCHIVE_ID}_broken.zip"
+    s3_client.put_object(Bucket="docs", Key=key, Body=b"not a zip at all")
+
+    progress = run(s3_client, table, key)
+
+    assert progress["status"] == "FAILED" and "zip" in progress["message"].lower()
+    assert uploads(s3_client) == {}
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+import artifacts
+import process_doc
+from tests.unit.fake_pdf import make_pdf
+
+PAGES = ["Title\nAbstract\nWe study caching."] + [f"1 Introduction\npage {i}" for i in range(1, 28)] + [
+    "Conclusion\nIt works.",
+    "References\n[1] Someone",
+]
+
+
+@pytest.fixture
+def bucket(process_doc_aws, monkeypatch, tmp_path):
+    """process_doc against an in-memory bucket holding one 30-page PDF, downloads counted."""
+    s3_client, _ = process_doc_aws
+    s3_client.put_object(Bucket="docs", Key="uploads/f1_paper.pdf", Body=make_pdf(PAGES, [("Intro", 1)]))
+    downloads = []
+
+    def download(bucket_name, key):
+        downloads.append(key)
+        path = str(tmp_path / os.path.basename(key))
+        s3_client.download_file(bucket_name, key, path)
+        return path
+
+    monkeypatch.setattr(process_doc, "download_file_from_s3_to_tmp", download)
+    return s3_client, downloads
+
+
+def test_page_selection():
+    assert artifacts.page_selection(5, 4, 5) == [0, 1, 2, 3, 4]
+    assert artifacts.page_selection(12, 2, 3) == [0, 1, 9, 10, 11]
+
+
+def test_retag_reads_the_artifact_instead_of_the_pdf(bucket):
+    s3_client, downloads = bucket
+    first = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    text = process_doc.extracted_text(first, head=4, tail=5)
+    process_doc.save_extraction("docs", "f1", first)
+    assert downloads == ["uploads/f1_paper.pdf"]
+    assert "We study caching." in text and "[1] Someone" not in text  # references cut
+
+    again = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    assert again.from_cache
+    assert process_doc.extracted_text(again, head=4, tail=5) == text
+    assert downloads == ["uploads/f1_paper.pdf"]  # no second download
+    assert again.data["page_count"] == 30
+    assert again.data["page_map"] == [{"title": "Intro", "level": 0, "page": 1}]
+    assert again.data["sections"]["abstract"]["page"] == 0
+    assert again.data["sections"]["conclusion"]["page"] == 28
+
+
+def test_deep_scan_adds_its_pages_to_the_artifact(bucket):
+    s3_client, downloads = bucket
+    extraction = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    process_doc.extracted_text(extraction, head=4, tail=5)
+    process_doc.save_extraction("docs", "f1", extraction)
+    stored = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    assert len(stored.data["pages"]) == 9
+
+    deep = process_doc.extracted_text(stored, head=20, tail=20)  # needs the pages in between
+    process_doc.save_extraction("docs", "f1", stored)
+    assert len(downloads) == 2 and "page 12" in deep
+    assert len(process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1").data["pages"]) == 30
+
+
+def test_another_extractor_version_extracts_again(bucket, monkeypatch):
+    s3_client, downloads = bucket
+    extraction = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    process_doc.extracted_text(extraction)
+    process_doc.save_extraction("docs", "f1", extraction)
+
+    monkeypatch.setattr(process_doc, "EXTRACTOR_VERSION", process_doc.EXTRACTOR_VERSION + 1)
+    extraction = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    assert not extraction.from_cache
+    process_doc.extracted_text(extraction)
+    process_doc.save_extraction("docs", "f1", extraction)
+    assert len(downloads) == 2
+    assert artifacts.load(s3_client, "docs", "f1", process_doc.EXTRACTOR_VERSION)["extractor_version"] == 2
+
+
+def test_a_new_upload_of_the_same_key_is_extracted_again(bucket):
+    s3_client, downloads = bucket
+    extraction = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+    assert "We study caching." in process_doc.extracted_text(extraction)
+    process_doc.save_extraction("docs", "f1", extraction)
+
+    s3_client.put_object(Bucket="docs", Key="uploads/f1_paper.pdf", Body=make_pdf(["Abstract\nA different paper."]))
+    extraction = process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1")
+
+    assert not extraction.from_cache
+    text = process_doc.extracted_text(extraction)
+    assert "A different paper." in text and "We study caching." not in text
+    assert downloads == ["uploads/f1_paper.pdf"] * 2
+    process_doc.save_extraction("docs", "f1", extraction)
+    assert process_doc.load_extraction("docs", "uploads/f1_paper.pdf", "f1").from_cache  # this upload's artifact
+
+
+def test_unreadable_pdf_gives_no_text(bucket):
+    s3_client, downloads = bucket
+    s3_client.put_object(Bucket="docs", Key="uploads/f2_broken.pdf", Body=b"not a pdf")
+    extraction = process_doc.load_extraction("docs", "uploads/f2_broken.pdf", "f2")
+    assert process_doc.extracted_text(extraction) == ""
+    assert extraction.data["page_count"] == 0 and "error" in extraction.data
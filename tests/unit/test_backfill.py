@@ -0,0 +1,43 @@
+import json
+import sys
+import uuid
+
+import backfill
+import process_doc
+from tests.unit.fake_pdf import make_pdf
+
+PAGE = "Abstract: a long enough paper text about retrieval " * 8
+
+
+def run_cli(monkeypatch, checkpoint):
+    monkeypatch.setattr(
+        sys, "argv", ["backfill.py", "--table", "docs", "--bucket", "docs", "--fake-model", "--checkpoint", str(checkpoint)]
+    )
+    backfill.main()
+    with open(checkpoint, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_failed_documents_are_retried_on_resume(process_doc_aws, monkeypatch, tmp_path):
+    s3_client, _ = process_doc_aws
+    monkeypatch.setattr(process_doc, "BUCKET_NAME", "docs")
+    monkeypatch.setattr(process_doc, "bedrock", process_doc.bedrock)  # restored after main() swaps it
+    keys = [f"uploads/{uuid.uuid4()}_paper{i}.pdf" for i in range(3)]
+    for key in keys:
+        s3_client.put_object(Bucket="docs", Key=key, Body=make_pdf([PAGE] * 3))
+    pipeline, calls = process_doc.process_object, []
+
+    def flaky(bucket, key, **kwargs):
+        calls.append(key)
+        if key == keys[0] and calls.count(key) == 1:
+            raise RuntimeError("throttled")
+        return pipeline(bucket, key, **kwargs)
+
+    monkeypatch.setattr(process_doc, "process_object", flaky)
+
+    first = run_cli(monkeypatch, tmp_path / "checkpoint.json")
+    assert first["failed"] == {keys[0]: "ERROR"} and sorted(first["done"]) == sorted(keys[1:])
+
+    second = run_cli(monkeypatch, tmp_path / "checkpoint.json")
+    assert calls.count(keys[0]) == 2 and len(calls) == 4  # only the failed one again
+    assert second["failed"] == {} and sorted(second["done"]) == sorted(keys)
@@ -0,0 +1,75 @@
+import io
+import json
+
+import batch_inference
+from local_bedrock import FakeBatchJobs, FakeBedrock
+
+
+class MemoryS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+def parse(text):
+    return json.loads(text)
+
+
+def test_pack_respects_record_and_size_limits():
+    lines = [batch_inference.record_line(f"id{i}", {"prompt": "x" * 50}) for i in range(10)]
+
+    assert [f.count("\n") for f in batch_inference.pack(lines, max_records=4)] == [4, 4, 2]
+    files = batch_inference.pack(lines, max_bytes=len(lines[0]) * 3)
+    assert [f.count("\n") for f in files] == [3, 3, 3, 1]
+    assert "".join(files) == "".join(lines)
+
+
+def test_pack_fills_a_short_last_file_up_to_the_minimum():
+    lines = [batch_inference.record_line(f"id{i}", {"prompt": "x"}) for i in range(10)]
+
+    files = batch_inference.pack(lines, max_records=8, min_records=3)
+    assert [f.count("\n") for f in files] == [7, 3]
+    assert "".join(files) == "".join(lines)  # order kept
+    assert [f.count("\n") for f in batch_inference.pack(lines[:2], min_records=3)] == [2]  # too few in total
+
+
+def test_read_output_maps_records_and_errors():
+    text = "\n".join(
+        [
+            json.dumps({"recordId": "a", "modelOutput": {"content": [{"text": '{"status": "SUCCESS"}'}]}}),
+            json.dumps({"recordId": "b", "error": {"errorCode": 400, "errorMessage": "Too long"}}),
+            "",
+        ]
+    )
+
+    assert dict(batch_inference.read_output(text, parse)) == {
+        "a": {"status": "SUCCESS"},
+        "b": {"status": "ERROR", "message": "Too long"},
+    }
+
+
+def test_local_jobs_write_bedrock_output_format():
+    s3 = MemoryS3()
+    lines = [batch_inference.record_line(f"id{i}", {"messages": []}) for i in range(3)]
+    s3.put_object(Bucket="b", Key=batch_inference.input_key("job", 0), Body="".join(lines).encode())
+    jobs = FakeBatchJobs(s3, FakeBedrock(latency=0.0, chunk_latency=0.0))
+
+    arn = jobs.create_model_invocation_job(
+        jobName="job-000",
+        roleArn="role",
+        modelId="model",
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": "s3://b/" + batch_inference.input_key("job", 0)}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": "s3://b/" + batch_inference.output_prefix("job")}},
+    )["jobArn"]
+    statuses = [jobs.get_model_invocation_job(jobIdentifier=arn)["status"] for _ in range(2)]
+    assert statuses == ["InProgress", "Completed"]
+
+    out_key = f"{batch_inference.output_prefix('job')}{batch_inference.job_id(arn)}/part-000.jsonl.out"
+    results = dict(batch_inference.read_output(s3.objects[("b", out_key)].decode(), parse))
+    assert sorted(results) == ["id0", "id1", "id2"]
+    assert results["id0"]["status"] == "SUCCESS"
@@ -0,0 +1,43 @@
+import argparse
+
+import pytest
+
+import batch_inference
+import batch_reprocess
+
+
+def args(**overrides):
+    values = dict(bucket="docs", job_name="job", status=["ERROR"], prefix=None, workers=2, local=False)
+    return argparse.Namespace(**dict(values, **overrides))
+
+
+@pytest.fixture
+def selected(monkeypatch):
+    def select(count):
+        documents = {f"f{i}": f"uploads/f{i}_a.pdf" for i in range(count)}
+        monkeypatch.setattr(batch_reprocess, "select_documents", lambda *a: documents)
+        monkeypatch.setattr(batch_reprocess, "extract", lambda s3, bucket, file_id, key: "text " * 50)
+        return documents
+
+    return select
+
+
+def test_too_few_records_are_refused_before_anything_is_queued(process_doc_aws, selected):
+    s3_client, table = process_doc_aws
+    selected(batch_inference.MIN_RECORDS - 1)
+
+    with pytest.raises(SystemExit):
+        batch_reprocess.prepare(args(), s3_client, table)
+
+    assert "Item" not in table.get_item(Key={"file_id": "f0"})  # not left QUEUED
+    assert s3_client.list_objects_v2(Bucket="docs", Prefix=batch_inference.BATCH_PREFIX)["KeyCount"] == 0
+
+
+def test_enough_records_are_packed_and_queued(process_doc_aws, selected):
+    s3_client, table = process_doc_aws
+    selected(batch_inference.MIN_RECORDS)
+
+    manifest = batch_reprocess.prepare(args(), s3_client, table)
+
+    assert manifest["records"] == batch_inference.MIN_RECORDS and len(manifest["parts"]) == 1
+    assert table.get_item(Key={"file_id": "f0"})["Item"]["status"] == "QUEUED"
@@ -0,0 +1,145 @@
+import json
+import random
+
+import pytest
+
+import bedrock_client
+from json_stream import IncrementalJSON
+from local_bedrock import FakeBedrock, FakeClock
+
+BODY = json.dumps({"messages": []})
+
+
+def stop_on_insufficient():
+    return IncrementalJSON(stop_statuses=["INSUFFICIENT_DATA"])
+
+
+def make_client(fake, clock, **kwargs):
+    return bedrock_client.BedrockClient(
+        fake, clock=clock, sleep=clock.sleep, rng=random.Random(1), **kwargs
+    )
+
+
+def test_throttling_is_retried_with_backoff():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, script=["ThrottlingException", "ThrottlingException"])
+    client = make_client(fake, clock)
+
+    result = client.invoke("model-a", BODY)
+    assert result["content"][0]["text"].startswith("{")
+    assert fake.calls == 3
+    assert client.stats["throttled"] == 2 and client.stats["retried"] == 2
+    assert client.metrics()["latency"]["model-a"]["count"] == 1
+
+
+def test_non_retryable_errors_raise_immediately():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, script=["ValidationException"])
+    client = make_client(fake, clock)
+
+    with pytest.raises(Exception) as raised:
+        client.invoke("model-a", BODY)
+    assert bedrock_client.error_code(raised.value) == "ValidationException"
+    assert fake.calls == 1
+
+
+def test_circuit_opens_defers_and_recovers():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, script=["ThrottlingException"] * 6)
+    client = make_client(fake, clock, max_attempts=2)
+
+    for _ in range(3):  # FAILURE_THRESHOLD calls run out of retries
+        with pytest.raises(bedrock_client.BedrockUnavailable):
+            client.invoke("model-a", BODY)
+    assert client.breaker.state == "open"
+
+    calls = fake.calls
+    with pytest.raises(bedrock_client.BedrockUnavailable) as raised:
+        client.invoke("model-a", BODY)
+    assert raised.value.code == "CircuitOpen" and fake.calls == calls  # failed fast
+
+    clock.sleep(bedrock_client.OPEN_SECONDS)
+    assert client.breaker.state == "half_open"
+    client.invoke("model-a", BODY)  # the trial call succeeds
+    assert client.breaker.state == "closed"
+
+
+def test_deadline_bounds_the_retries():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, capacity=None, script=["ThrottlingException"] * 100)
+    client = make_client(fake, clock, max_attempts=100)
+
+    with pytest.raises(bedrock_client.BedrockUnavailable):
+        client.invoke("model-a", BODY, deadline=clock() + 10)
+    assert clock() <= 10
+
+
+def test_rate_limiter_keeps_a_saturated_backend_mostly_unthrottled():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, capacity=2, latency=0.0, chunk_latency=0.0)
+    client = make_client(fake, clock, rate=2, burst=2)
+
+    for _ in range(40):
+        client.invoke("model-a", BODY)
+    assert fake.throttled <= 2
+    assert clock() == pytest.approx(19, abs=1)  # 40 calls at 2/s
+
+
+def test_latency_histogram_percentiles():
+    histogram = bedrock_client.LatencyHistogram()
+    for ms in [40] * 90 + [900] * 9 + [30000]:
+        histogram.record(ms)
+
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(95) == 1000
+    assert histogram.percentile(100) == float("inf")
+
+
+def test_stream_stops_at_the_closing_brace():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, reply=json.dumps({"status": "SUCCESS", "summary": "s"}) + " trailing text" * 20)
+    client = make_client(fake, clock)
+
+    result = client.invoke_stream("model-a", BODY, stop_on_insufficient)
+    assert result["stopped_early"]
+    assert result["parser"].value() == {"status": "SUCCESS", "summary": "s"}
+    assert fake.streamed_chars < 50
+    assert client.stats["output_tokens"] == len(result["text"]) // bedrock_client.CHARS_PER_TOKEN  # estimated
+
+
+def test_stream_aborts_on_insufficient_data():
+    clock = FakeClock()
+    reply = '{"status": "INSUFFICIENT_DATA", "explanation": "' + "the text is fragmented " * 40 + '"}'
+    fake = FakeBedrock(clock=clock, reply=reply, script=["ThrottlingException"])
+    client = make_client(fake, clock)
+
+    result = client.invoke_stream("model-a", BODY, stop_on_insufficient)
+    assert result["parser"].status == "INSUFFICIENT_DATA"
+    assert not result["parser"].complete
+    assert fake.streamed_chars < 40  # of ~950 the model would have generated
+    assert client.stats["retried"] == 1
+
+
+def test_mid_stream_throttling_is_retried():
+    clock = FakeClock()
+    reply = json.dumps({"status": "SUCCESS", "summary": "s" * 80})
+    fake = FakeBedrock(clock=clock, reply=reply, stream_errors=["throttlingException", "modelStreamErrorException"])
+    client = make_client(fake, clock)
+
+    result = client.invoke_stream("model-a", BODY, stop_on_insufficient)
+    assert result["parser"].value() == json.loads(reply)  # the retry starts over with a new parser
+    assert fake.calls == 3
+    assert client.stats["throttled"] == 1 and client.stats["retried"] == 2
+    assert client.breaker.state == "closed"
+
+
+def test_non_retryable_errors_do_not_reset_the_circuit():
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, script=["ThrottlingException"] * 2 + ["ValidationException"])
+    client = make_client(fake, clock, max_attempts=2)
+
+    with pytest.raises(bedrock_client.BedrockUnavailable):
+        client.invoke("model-a", BODY)
+    with pytest.raises(Exception):
+        client.invoke("model-a", BODY)
+    assert client.breaker.failures == 1  # the validation error hid nothing
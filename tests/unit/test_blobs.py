@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+import blobs
+import process_doc
+
+RAW_REPLY = '{"status": "SUCCESS", "summary": "Caching.", "tags": ["#cache"], "category": "CS/Systems", "evidence": "' + "x" * 5000 + '"}'
+
+
+def test_blobs_are_content_addressed(aws):
+    s3_client, _ = aws
+    store = blobs.BlobStore(s3_client, "docs")
+
+    key = store.put({"tags": ["#a"], "score": Decimal("0.5"), "n": Decimal(3)})
+    assert store.put({"n": 3, "score": 0.5, "tags": ["#a"]}) == key  # same content, same key
+    assert key.startswith(blobs.BLOB_PREFIX) and key.endswith(".json.gz")
+    assert len(s3_client.list_objects_v2(Bucket="docs", Prefix=blobs.BLOB_PREFIX)["Contents"]) == 1
+
+    fresh = blobs.BlobStore(s3_client, "docs")  # another container: reads S3
+    assert fresh.get(key) == {"n": 3, "score": 0.5, "tags": ["#a"]}
+
+
+def test_item_keeps_the_compact_summary(process_doc_aws):
+    s3_client, table = process_doc_aws
+    ai_result = process_doc.parse_reply(RAW_REPLY)
+    ai_result["retry_performed"] = True
+
+    status = process_doc.save_metadata_to_DDB("f1", "f1_paper.pdf", "uploads/f1_paper.pdf", ai_result, bucket="docs")
+
+    item = table.get_item(Key={"file_id": "f1"})["Item"]
+    assert status == "AUTO_TAGGED" and item["category"] == "CS/Systems"
+    assert set(item["ai_summary"]) == {"status", "summary", "tags", "category", "retry_performed"}
+    full = blobs.BlobStore(s3_client, "docs").get(item["ai_result_key"])
+    assert full["raw_reply"] == RAW_REPLY and len(full["evidence"]) == 5000
+
+
+def test_result_stays_on_the_item_when_s3_fails(process_doc_aws):
+    ai_result = process_doc.parse_reply(RAW_REPLY)
+
+    summary, key = process_doc.offload_result("no-such-bucket", ai_result)
+
+    assert key is None
+    assert "raw_reply" not in summary and len(summary["evidence"]) == 5000  # nothing lost but the raw text
+
+
+def test_the_store_and_its_cache_are_kept_between_calls(process_doc_aws):
+    s3_client, _ = process_doc_aws
+    ai_result = process_doc.parse_reply(RAW_REPLY)
+    _, key = process_doc.offload_result("docs", ai_result)
+    s3_client.delete_object(Bucket="docs", Key=key)
+
+    assert process_doc.offload_result("docs", ai_result)[1] == key
+    assert "Contents" not in s3_client.list_objects_v2(Bucket="docs", Prefix=blobs.BLOB_PREFIX)  # not written again
@@ -0,0 +1,49 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import bulk, db
+
+
+@pytest.fixture
+def files(aws, monkeypatch):
+    """Three files in the moto bucket and table, the frontend pointed at them."""
+    s3_client, table = aws
+    monkeypatch.setattr(db, "get_table", lambda: table)
+    monkeypatch.setattr(bulk.s3, "get_bucket_name", lambda: "docs")
+    monkeypatch.setattr(bulk.s3, "get_s3_client", lambda: s3_client)
+    for file_id in ("a", "b", "c"):
+        key = f"processed/{file_id}_paper.pdf"
+        s3_client.put_object(Bucket="docs", Key=key, Body=b"%PDF")
+        table.put_item(Item={"file_id": file_id, "s3_key": key, "status": "AUTO_TAGGED"})
+    return s3_client, table
+
+
+def test_update_reports_failed_and_missing_files(files, monkeypatch):
+    _, table = files
+    write_update = db.write_update
+
+    def flaky(table, file_id, updates, seq, **kwargs):
+        if file_id == "b":
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "slow down"}}, "UpdateItem")
+        return write_update(table, file_id, updates, seq, **kwargs)
+
+    monkeypatch.setattr(db, "write_update", flaky)
+    updates = {"status": "REVIEWED"}
+
+    report = bulk.bulk_update_files({"a": updates, "b": updates, "gone": updates})
+
+    assert (report["updated"], report["failed"], report["missing"]) == (1, ["b"], ["gone"])
+    assert table.get_item(Key={"file_id": "a"})["Item"]["status"] == "REVIEWED"
+    assert table.get_item(Key={"file_id": "b"})["Item"]["status"] == "AUTO_TAGGED"
+    assert "Item" not in table.get_item(Key={"file_id": "gone"})  # never created
+
+
+def test_delete_reports_missing_files(files):
+    s3_client, table = files
+
+    report = bulk.bulk_delete_files(["a", "gone", "a"])
+
+    assert (report["deleted"], report["failed"], report["missing"]) == (1, [], ["gone"])
+    assert table.get_item(Key={"file_id": "a"})["Item"]["deleted"]
+    assert s3_client.list_objects_v2(Bucket="docs", Prefix="processed/a_")["KeyCount"] == 0
+    assert bulk.bulk_delete_files(["a"])["missing"] == ["a"]  # already deleted
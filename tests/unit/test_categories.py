@@ -0,0 +1,16 @@
+import categories
+
+
+def test_category_attributes_have_one_key_per_level():
+    assert categories.category_attributes(" CS / AI/NLP/Transformers ") == {
+        "category": "CS/AI/NLP/Transformers",
+        "category_l1": "CS",
+        "category_l2": "CS/AI",
+        "category_l3": "CS/AI/NLP",
+    }
+
+
+def test_missing_levels_are_removed_not_written_empty():
+    assert categories.split_attributes("Bio") == ({"category": "Bio", "category_l1": "Bio"}, ["category_l2", "category_l3"])
+    for path in (None, "", "N/A", " / "):
+        assert categories.split_attributes(path) == ({}, list(categories.CATEGORY_ATTRIBUTES))
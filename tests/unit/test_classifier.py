@@ -0,0 +1,41 @@
+import classifier
+
+NLP = "language model transformer attention tokens translation corpus text generation"
+VISION = "image pixels convolution segmentation camera detection object recognition"
+
+
+def make_examples():
+    examples = []
+    for i in range(6):
+        examples.append((f"{NLP} sample {i}", "CS/AI/NLP", ["#NLP", "#Transformer"]))
+        examples.append((f"{VISION} sample {i}", "CS/AI/Vision", ["#Vision"]))
+    examples.append(("rare topic only once", "Bio/Genomics", ["#DNA"]))
+    return examples
+
+
+def test_predicts_the_closest_category_with_confidence():
+    model = classifier.train(make_examples())
+
+    category, confidence = classifier.predict(model, "a transformer language model for translation")
+    assert category == "CS/AI/NLP"
+    assert 0.5 < confidence <= 1.0
+    assert classifier.predict(model, "")[0] is None
+
+
+def test_categories_without_enough_examples_are_left_out():
+    model = classifier.train(make_examples(), min_examples=5)
+
+    assert model["classes"] == ["CS/AI/NLP", "CS/AI/Vision"]
+    assert model["tags"]["CS/AI/NLP"][:2] == ["#NLP", "#Transformer"]
+
+
+def test_result_has_the_bedrock_shape():
+    model = dict(classifier.train(make_examples()), version=3)
+    text = "Title\nAbstract: We study images. Results are good. More text here."
+
+    result = classifier.to_ai_result(model, text, "CS/AI/Vision", 0.99)
+    assert result["status"] == "SUCCESS"
+    assert result["category"] == "CS/AI/Vision"
+    assert result["tags"] == ["#Vision"]
+    assert result["summary"] == "We study images. Results are good."
+    assert result["classifier_version"] == 3
@@ -0,0 +1,56 @@
+import counters
+
+
+def make_item(status="AUTO_TAGGED", category="CS/AI", day="2025-12-10"):
+    return {
+        "file_id": "123",
+        "status": status,
+        "category": category,
+        "upload_timestamp": f"{day}T10:00:00+00:00",
+    }
+
+
+def test_new_item_counts_every_category_level():
+    deltas = counters.counter_deltas(None, make_item(category="CS/AI/NLP"))
+
+    assert deltas == {
+        "status": {"AUTO_TAGGED": 1},
+        "category": {"CS": 1, "CS/AI": 1, "CS/AI/NLP": 1},
+        "day": {"2025-12-10": 1},
+    }
+
+
+def test_update_only_moves_what_changed():
+    deltas = counters.counter_deltas(
+        make_item(), make_item(status="REVIEWED", category="CS/Systems")
+    )
+
+    assert deltas == {
+        "status": {"AUTO_TAGGED": -1, "REVIEWED": 1},
+        "category": {"CS/AI": -1, "CS/Systems": 1},
+    }
+
+
+def test_tombstones_and_bookkeeping_items_are_not_counted():
+    tombstone = {"file_id": "123", "deleted": True}
+
+    assert counters.counter_deltas(make_item(), tombstone) == {
+        "status": {"AUTO_TAGGED": -1},
+        "category": {"CS": -1, "CS/AI": -1},
+        "day": {"2025-12-10": -1},
+    }
+    assert counters.count_items([{"file_id": "__table_version__", "status": "X"}]) == {
+        "status": {},
+        "category": {},
+        "day": {},
+    }
+
+
+def test_bulk_deltas_merge_into_one_update_per_dimension():
+    first = counters.counter_deltas(make_item(status="NEEDS_REVIEW"), make_item(status="REVIEWED"))
+    second = counters.counter_deltas(make_item(status="REVIEWED"), make_item(status="NEEDS_REVIEW"))
+    third = counters.counter_deltas(None, make_item(category="Bio"))
+
+    merged = counters.merge_deltas([first, second, third])
+
+    assert merged == {"status": {"AUTO_TAGGED": 1}, "category": {"Bio": 1}, "day": {"2025-12-10": 1}}
@@ -13,3 +13,233 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def get_stack(context=None):
+    return DocuflowStack(core.App(context=context), "docuflow")
+
+
+def get_template(context=None):
+    return assertions.Template.from_stack(get_stack(context))
+
+
+def test_table_has_change_feed_index_and_ttl():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True},
+            "GlobalSecondaryIndexes": assertions.Match.array_with(
+                [
+                    assertions.Match.object_like(
+                        {
+                            "IndexName": "updated-index",
+                            "KeySchema": [
+                                {"AttributeName": "sync_shard", "KeyType": "HASH"},
+                                {"AttributeName": "updated_at", "KeyType": "RANGE"},
+                            ],
+                        }
+                    )
+                ]
+            ),
+        },
+    )
+
+
+def test_resource_names_are_published():
+    template = get_template()
+
+    # under the stack's own name, a second stack or stage publishes its own
+    template.has_resource_properties(
+        "AWS::SSM::Parameter", {"Name": "/docuflow/docuflow/table-name"}
+    )
+    template.has_resource_properties(
+        "AWS::SSM::Parameter", {"Name": "/docuflow/docuflow/bucket-name"}
+    )
+    template.has_output("TableName", {})
+    template.has_output("BucketName", {})
+
+
+def test_table_has_one_index_per_category_level():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "GlobalSecondaryIndexes": assertions.Match.array_with(
+                [
+                    assertions.Match.object_like(
+                        {
+                            "IndexName": f"category-l{level}-index",
+                            "KeySchema": [
+                                {"AttributeName": f"category_l{level}", "KeyType": "HASH"}
+                            ],
+                        }
+                    )
+                    for level in range(1, 4)
+                ]
+            ),
+        },
+    )
+
+
+def test_bucket_accepts_browser_posts():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::S3::Bucket",
+        {
+            "CorsConfiguration": {
+                "CorsRules": [
+                    assertions.Match.object_like({"AllowedMethods": ["POST"]})
+                ]
+            }
+        },
+    )
+
+
+def test_cors_is_open_only_with_a_warning():
+    stack = get_stack()
+    assertions.Annotations.from_stack(stack).has_warning(
+        "/docuflow", assertions.Match.string_like_regexp("frontend_origin is not set")
+    )
+
+    stack = get_stack({"frontend_origin": "https://docs.example.com"})
+    assertions.Annotations.from_stack(stack).has_no_warning("/docuflow", assertions.Match.any_value())
+    assertions.Template.from_stack(stack).has_resource_properties(
+        "AWS::S3::Bucket",
+        {"CorsConfiguration": {"CorsRules": [assertions.Match.object_like({"AllowedOrigins": ["https://docs.example.com"]})]}},
+    )
+
+
+def test_status_push_is_opt_in():
+    template = get_template()
+    template.resource_count_is("AWS::SNS::Topic", 0)
+
+    template = get_template({"status_push": "true"})
+    template.resource_count_is("AWS::SNS::Topic", 1)
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {"StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}},
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping", {"StartingPosition": "LATEST"}
+    )
+
+
+def test_status_push_false_from_the_cli_stays_off():
+    for value in ("false", "0", "no"):  # -c status_push=false passes a string
+        template = get_template({"status_push": value})
+        template.resource_count_is("AWS::SNS::Topic", 0)
+        template.resource_count_is("AWS::Lambda::EventSourceMapping", 0)
+
+
+def test_deferred_files_are_swept_on_a_schedule():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::Events::Rule",
+        {
+            "ScheduleExpression": "rate(10 minutes)",
+            "Targets": [assertions.Match.object_like({"Input": '{"retry_deferred":true}'})],
+        },
+    )
+
+
+def test_process_function_can_invoke_itself():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": assertions.Match.array_with(
+                    [assertions.Match.object_like({"Action": "lambda:InvokeFunction", "Effect": "Allow"})]
+                )
+            }
+        },
+    )
+
+
+def test_only_the_upload_prefix_triggers_processing():
+    template = get_template()
+
+    template.has_resource_properties(
+        "Custom::S3BucketNotifications",
+        {
+            "NotificationConfiguration": {
+                "LambdaFunctionConfigurations": assertions.Match.array_with(
+                    [
+                        assertions.Match.object_like(
+                            {
+                                "Filter": {
+                                    "Key": {
+                                        "FilterRules": assertions.Match.array_with(
+                                            [{"Name": "prefix", "Value": "uploads/"}]
+                                        )
+                                    }
+                                }
+                            }
+                        )
+                    ]
+                )
+            }
+        },
+    )
+
+
+def test_archives_are_unpacked_by_their_own_function():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "ingest_archive.handler", "Timeout": 900}
+    )
+    rules = [
+        assertions.Match.object_like(
+            {
+                "Filter": {
+                    "Key": {
+                        "FilterRules": assertions.Match.array_with(
+                            [{"Name": "suffix", "Value": suffix}, {"Name": "prefix", "Value": "archives/"}]
+                        )
+                    }
+                }
+            }
+        )
+        for suffix in (".zip", ".tar.gz")
+    ]
+    template.has_resource_properties(
+        "Custom::S3BucketNotifications",
+        {"NotificationConfiguration": {"LambdaFunctionConfigurations": assertions.Match.array_with(rules)}},
+    )
+
+
+def test_category_level_indexes_can_be_added_one_per_deploy():
+    def level_indexes(template):
+        tables = template.find_resources("AWS::DynamoDB::Table")
+        (table,) = tables.values()
+        names = [index["IndexName"] for index in table["Properties"]["GlobalSecondaryIndexes"]]
+        return [name for name in names if name.startswith("category-l")]
+
+    assert level_indexes(get_template({"category_index_levels": "1"})) == ["category-l1-index"]
+    assert len(level_indexes(get_template())) == 3
+
+
+def test_uploads_left_behind_by_routing_expire():
+    template = get_template()
+
+    template.has_resource_properties(
+        "AWS::S3::Bucket",
+        {
+            "LifecycleConfiguration": {
+                "Rules": assertions.Match.array_with(
+                    [
+                        assertions.Match.object_like(
+                            {"Prefix": "uploads/", "NoncurrentVersionExpiration": {"NoncurrentDays": 7}}
+                        )
+                    ]
+                )
+            }
+        },
+    )
@@ -0,0 +1,68 @@
+import json
+import logging
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import embedding
+
+
+@pytest.fixture
+def cache(aws, monkeypatch):
+    """A fresh cache in front of the moto bucket, and a model that counts its calls."""
+    s3_client, _ = aws
+    cache = embedding.EmbeddingCache(maxsize=2)
+    monkeypatch.setattr(embedding, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(embedding.s3, "get_bucket_name", lambda: "docs")
+    monkeypatch.setattr(embedding.s3, "get_s3_client", lambda: s3_client)
+    calls = []
+    monkeypatch.setattr(
+        embedding, "invoke_embedding_model", lambda text, model_id, dimensions: calls.append(text) or [0.5, 0.25]
+    )
+    return cache, s3_client, calls
+
+
+def test_cache_key():
+    key = embedding.cache_key("Attention  is all\nyou need")
+
+    assert key == embedding.cache_key(" Attention is all you need ")  # whitespace only
+    assert key == embedding.cache_key("Attention is all \uff59ou need")  # full-width y, same NFKC form
+    assert key != embedding.cache_key("attention is all you need")  # case is kept
+    assert key != embedding.cache_key("Attention is all you need", dimensions=256)
+    assert key != embedding.cache_key("Attention is all you need", model_id="other-model")
+
+
+def test_a_miss_calls_the_model_and_fills_both_tiers(cache):
+    cache, s3_client, calls = cache
+
+    assert embedding.get_embedding("paper", durable=True) == [0.5, 0.25]
+    assert embedding.get_embedding(" paper ") == [0.5, 0.25]
+
+    assert calls == ["paper"]
+    assert cache.stats == {"memory_hits": 1, "persistent_hits": 0, "misses": 1}
+    stored = s3_client.get_object(Bucket="docs", Key=f"{embedding.CACHE_PREFIX}{embedding.cache_key('paper')}.json")
+    assert json.loads(stored["Body"].read()) == [0.5, 0.25]
+
+
+def test_reads_go_through_to_s3_and_back_into_memory(cache):
+    cache, s3_client, calls = cache
+    key = embedding.cache_key("stored by another server")
+    s3_client.put_object(Bucket="docs", Key=f"{embedding.CACHE_PREFIX}{key}.json", Body=b"[1.0, 0.0]")
+
+    assert embedding.get_vectors([key, "no-such-key", key]) == {key: [1.0, 0.0]}
+    assert cache.get(key) == [1.0, 0.0]
+
+    assert calls == []
+    assert cache.stats == {"memory_hits": 1, "persistent_hits": 1, "misses": 1}
+
+
+def test_a_failed_write_only_fails_durable_puts(cache, monkeypatch, caplog):
+    cache, _, _ = cache
+    monkeypatch.setattr(embedding.s3, "get_bucket_name", lambda: "no-such-bucket")
+
+    with caplog.at_level(logging.WARNING, logger=embedding.__name__):
+        cache.put("k1", [1.0])
+    assert "Failed to write embedding cache entry k1" in caplog.text and cache.get("k1") == [1.0]
+
+    with pytest.raises(ClientError):
+        cache.put("k2", [1.0], durable=True)
@@ -0,0 +1,27 @@
+from utils import frames
+
+
+def item(file_id, tags=None, **fields):
+    summary = {"summary": f"about {file_id}", "category": "CS/AI"}
+    if tags is not None:
+        summary["tags"] = tags
+    return dict(fields, file_id=file_id, original_file_name=f"{file_id}_paper.pdf", ai_summary=summary)
+
+
+def test_build_frame_flattens_the_summary():
+    frame = frames.build_frame([item("a", ["#x", "#y"], status="AUTO_TAGGED"), item("b")])
+
+    assert list(frame.columns) == frames.FRAME_COLUMNS and list(frame.index) == ["a", "b"]
+    assert frame.at["a", "file_name"] == "paper.pdf" and frame.at["a", "tags_text"] == "#x, #y"
+    assert frame.at["b", "tags"] == [] and frame.at["b", "tags_text"] == "N/A"
+
+
+def test_apply_rows_upserts_list_valued_columns():
+    frame = frames.build_frame([item("a", ["#x"]), item("b", ["#y"]), item("c", ["#z"])])
+
+    updated = frames.apply_rows(frame, [item("b", ["#y", "#new"]), item("d", ["#d1", "#d2"])], ["c", "gone"])
+
+    assert list(updated.index) == ["a", "b", "d"]  # changed rows keep their place, new rows at the end
+    assert updated.at["b", "tags"] == ["#y", "#new"] and updated.at["b", "tags_text"] == "#y, #new"
+    assert updated.at["d", "tags"] == ["#d1", "#d2"] and updated.at["d", "ai_summary"]["tags"] == ["#d1", "#d2"]
+    assert frame.at["b", "tags"] == ["#y"] and "c" in frame.index  # the shared frame is left alone
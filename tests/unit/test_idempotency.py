@@ -0,0 +1,134 @@
+import json
+import time
+import uuid
+
+import pytest
+
+import process_doc
+from local_bedrock import FakeBedrock, FakeClock
+
+TEXT = "Abstract: " + "a long enough paper text " * 40
+
+
+@pytest.fixture
+def pipeline(process_doc_aws, monkeypatch):
+    """process_doc against an in-memory table, a fake model and no real PDFs."""
+    _, table = process_doc_aws
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, latency=0.0, chunk_latency=0.0)
+    downloads = []
+    monkeypatch.setattr(process_doc, "bedrock", process_doc.bedrock_client.BedrockClient(fake, clock=clock, sleep=clock.sleep))
+    monkeypatch.setattr(process_doc, "load_extraction", lambda bucket, key, file_id: downloads.append(key))
+    monkeypatch.setattr(process_doc, "extracted_text", lambda extraction, head=4, tail=5, **_: TEXT)
+    monkeypatch.setattr(process_doc, "save_extraction", lambda bucket, file_id, extraction: None)
+    monkeypatch.setattr(process_doc, "check_near_duplicate", lambda file_id, text: (None, None, 0.0))
+    monkeypatch.setattr(process_doc, "index_near_duplicate", lambda file_id, sig, match: None)
+    return table, fake, downloads
+
+
+def s3_event(key, sequencer):
+    return {"Records": [{"s3": {"bucket": {"name": "b"}, "object": {"key": key, "sequencer": sequencer}}}]}
+
+
+def test_duplicate_delivery_exits_before_any_work(pipeline):
+    table, fake, downloads = pipeline
+    file_id = str(uuid.uuid4())
+    key = f"uploads/{file_id}_paper.pdf"
+
+    first = process_doc.handler(s3_event(key, "0A1"), None)
+    second = process_doc.handler(s3_event(key, "0A1"), None)
+
+    assert json.loads(first["body"]) == "Processing complete."
+    assert json.loads(second["body"]) == "Duplicate delivery, skipped."
+    assert downloads == [key] and fake.calls == 1
+    item = table.get_item(Key={"file_id": file_id})["Item"]
+    assert item["status"] == "AUTO_TAGGED" and "lease_owner" not in item
+
+
+def test_a_new_upload_of_the_same_key_is_processed(pipeline):
+    _, fake, downloads = pipeline
+    key = f"uploads/{uuid.uuid4()}_paper.pdf"
+
+    process_doc.handler(s3_event(key, "0A1"), None)
+    process_doc.handler(s3_event(key, "0B2"), None)
+    assert len(downloads) == 2 and fake.calls == 2
+
+
+def test_concurrent_delivery_is_skipped_while_the_lease_is_live(pipeline):
+    table, fake, downloads = pipeline
+    file_id = str(uuid.uuid4())
+    key = f"uploads/{file_id}_paper.pdf"
+    assert process_doc.claim(file_id, "paper.pdf", key, owner="other-run", event_id="0A1")
+
+    assert process_doc.process_object("b", key, event_id="0A1") == "DUPLICATE"
+    assert process_doc.process_object("b", key) == "DUPLICATE"  # a rerun waits for the lease too
+    assert downloads == [] and fake.calls == 0
+    assert table.get_item(Key={"file_id": file_id})["Item"]["lease_owner"] == "other-run"
+
+
+def test_stale_lease_is_reclaimed(pipeline):
+    table, fake, downloads = pipeline
+    file_id = str(uuid.uuid4())
+    key = f"uploads/{file_id}_paper.pdf"
+    table.put_item(
+        Item={
+            "file_id": file_id,
+            "status": "PROCESSING",
+            "lease_owner": "crashed-run",
+            "lease_expires_at": int(time.time()) - 1,
+            "claimed_event": "0A1",
+        }
+    )
+
+    assert process_doc.process_object("b", key, event_id="0A1") == "AUTO_TAGGED"
+    assert downloads == [key]
+
+
+def test_a_run_that_lost_its_lease_does_not_overwrite(pipeline, monkeypatch):
+    table, fake, downloads = pipeline
+    file_id = str(uuid.uuid4())
+    key = f"uploads/{file_id}_paper.pdf"
+
+    def slow_model(text, deadline=None):
+        # meanwhile the lease expired and another run took the file over
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET lease_owner = :other",
+            ExpressionAttributeValues={":other": "newer-run"},
+        )
+        return {"status": "SUCCESS", "summary": "s", "tags": [], "category": "CS"}
+
+    monkeypatch.setattr(process_doc, "ask_bedrock_model", slow_model)
+    assert process_doc.process_object("b", key, event_id="0A1") == "DUPLICATE"
+    item = table.get_item(Key={"file_id": file_id})["Item"]
+    assert item["status"] == "PROCESSING" and item["lease_owner"] == "newer-run"
+
+
+def test_reprocessing_keeps_what_the_pipeline_does_not_own(pipeline):
+    table, fake, downloads = pipeline
+    file_id = str(uuid.uuid4())
+    key = f"uploads/{file_id}_paper.pdf"
+    table.put_item(
+        Item={
+            "file_id": file_id,
+            "s3_key": key,
+            "status": "NEEDS_REVIEW",
+            "upload_timestamp": "2024-01-02T03:04:05+00:00",
+            "user_notes": "read section 3",
+            "is_verified": True,
+            "embedding_key": "abc123",
+            "embedding_status": "READY",
+            "versions": {"other-file"},
+            "claimed_event": "0A0",
+        }
+    )
+
+    process_doc.handler(s3_event(key, "0B1"), None)
+
+    item = table.get_item(Key={"file_id": file_id})["Item"]
+    assert item["status"] == "AUTO_TAGGED" and item["category"] == "CS/AI"
+    assert item["upload_timestamp"] == "2024-01-02T03:04:05+00:00"
+    assert item["user_notes"] == "read section 3" and item["is_verified"] is True
+    assert item["embedding_key"] == "abc123" and item["embedding_status"] == "READY"
+    assert item["versions"] == {"other-file"}
+    assert "lease_owner" not in item and "claimed_event" not in item  # the run's own state is cleared
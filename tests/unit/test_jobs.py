@@ -0,0 +1,98 @@
+import logging
+
+import pytest
+
+from utils import embedding, jobs
+
+
+@pytest.fixture
+def queue(aws, monkeypatch):
+    """An embedding queue writing to the moto table, with a fake model and kNN graph."""
+    _, table = aws
+    queue = jobs.EmbeddingQueue(max_workers=1)
+    queue.get_table = lambda table_name: table
+    inserted = []
+    monkeypatch.setattr(jobs.embedding, "get_embedding", lambda text, durable=False: [0.1, 0.2])
+    monkeypatch.setattr(jobs.knn, "insert_document", lambda t, file_id, vector: inserted.append(file_id) or {"lists_updated": 0, "seconds": 0.0})
+    return queue, table, inserted
+
+
+def pending(table, file_id, text, requested_at=0):
+    item = dict(
+        jobs.pending_embedding(text),
+        file_id=file_id,
+        original_file_name=f"{file_id}_paper.pdf",
+        ai_summary={"summary": "s", "tags": ["t"]},
+        embedding_requested_at=requested_at,
+    )
+    table.put_item(Item=item)
+    return item
+
+
+def test_a_job_marks_the_embedding_ready(queue):
+    queue, table, inserted = queue
+    item = pending(table, "f1", "paper\ns\nt")
+
+    queue.run(table.name, "f1", "paper\ns\nt", item["embedding_key"])
+
+    assert table.get_item(Key={"file_id": "f1"})["Item"]["embedding_status"] == "READY"
+    assert inserted == ["f1"]
+
+
+def test_a_result_for_an_edited_document_is_dropped(queue, caplog):
+    queue, table, inserted = queue
+    pending(table, "f1", "edited again")
+    queue.pending.add("f1")
+
+    with caplog.at_level(logging.INFO, logger=jobs.__name__):
+        queue.run(table.name, "f1", "paper\ns\nt", embedding.cache_key("paper\ns\nt"))
+
+    assert table.get_item(Key={"file_id": "f1"})["Item"]["embedding_status"] == "PENDING"
+    assert inserted == [] and not queue.is_pending("f1")
+    assert "Dropping stale embedding for f1" in caplog.text
+
+
+def test_a_model_failure_is_logged_and_flagged(queue, monkeypatch, caplog):
+    queue, table, inserted = queue
+    item = pending(table, "f1", "paper\ns\nt")
+
+    def fail(text, durable=False):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(jobs.embedding, "get_embedding", fail)
+    queue.run(table.name, "f1", "paper\ns\nt", item["embedding_key"])
+
+    assert table.get_item(Key={"file_id": "f1"})["Item"]["embedding_status"] == "FAILED"
+    assert inserted == []
+    assert [r.levelno for r in caplog.records if r.name == jobs.__name__] == [logging.ERROR]
+
+
+def test_lost_jobs_are_queued_again(queue, monkeypatch):
+    queue, table, inserted = queue
+    submitted = []
+    monkeypatch.setattr(queue, "submit", lambda *args: submitted.append(args))
+    now = 10_000
+    items = [
+        pending(table, "lost", "old text", requested_at=now - jobs.STALE_PENDING_SECONDS - 1),
+        pending(table, "recent", "new text", requested_at=now - 1),  # maybe running elsewhere
+        pending(table, "running", "text", requested_at=0),
+        dict(pending(table, "done", "text"), embedding_status="READY"),
+    ]
+    queue.pending.add("running")
+
+    assert queue.recover(table.name, items, now) == ["lost"]
+    (table_name, file_id, text, key), = submitted
+    assert text == embedding.document_text("paper.pdf", "s", ["t"]) and key == items[0]["embedding_key"]
+
+    # the rebuilt text differs from the one requested: the item takes the key of what was embedded
+    queue.run(table_name, file_id, text, key)
+    item = table.get_item(Key={"file_id": "lost"})["Item"]
+    assert item["embedding_status"] == "READY" and item["embedding_key"] == embedding.cache_key(text)
+
+
+def test_sweeps_are_spaced_out():
+    queue = jobs.EmbeddingQueue(max_workers=1)
+
+    assert queue.sweep_due(100.0)
+    assert not queue.sweep_due(100.0 + jobs.STALE_PENDING_SECONDS - 1)
+    assert queue.sweep_due(100.0 + jobs.STALE_PENDING_SECONDS)
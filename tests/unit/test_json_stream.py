@@ -0,0 +1,47 @@
+import json
+
+from json_stream import IncrementalJSON
+
+REPLY = {"status": "SUCCESS", "summary": 'A "quoted" {brace}', "tags": ["#A", "#B"], "category": "CS/AI"}
+
+
+def feed_in_pieces(text, size):
+    parser = IncrementalJSON()
+    for start in range(0, len(text), size):
+        if parser.feed(text[start : start + size]):
+            break
+    return parser
+
+
+def test_object_is_complete_at_the_closing_brace():
+    text = "Here is the JSON:\n```json\n" + json.dumps(REPLY) + "\n```\nHope this helps."
+    for size in (1, 3, 7, len(text)):
+        parser = feed_in_pieces(text, size)
+        assert parser.complete
+        assert parser.value() == REPLY
+    assert feed_in_pieces(text, 3).received < len(text)  # the trailing text isn't read
+
+
+def test_top_level_fields_are_known_before_the_end():
+    parser = IncrementalJSON()
+    parser.feed('{"status": "INSUFFICIENT_DATA", "reason": "the text is frag')
+
+    assert parser.status == "INSUFFICIENT_DATA"
+    assert not parser.complete
+
+
+def test_nested_strings_are_not_top_level_fields():
+    parser = IncrementalJSON()
+    parser.feed('{"details": {"status": "nested"}, "tags": ["status"], "status": "SUCC')
+
+    assert parser.status is None
+    parser.feed('ESS"}')
+    assert parser.status == "SUCCESS" and parser.complete
+
+
+def test_escaped_quotes_and_backslashes():
+    parser = IncrementalJSON()
+    parser.feed(r'{"summary": "say \"hi\" \\", "status": "SUCCESS"}')
+
+    assert parser.fields["summary"] == 'say "hi" \\'
+    assert parser.value()["status"] == "SUCCESS"
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from utils import knn
+
+
+def unit(*values):
+    return knn.normalize([list(values)])[0]
+
+
+def test_top_k_orders_excludes_and_caps():
+    ids = ["a", "b", "c", "d"]
+    matrix = knn.normalize([[1, 0], [0.9, 0.1], [0, 1], [0.5, 0.5]])
+
+    result = knn.top_k(matrix, ids, unit(1, 0), 2, exclude=0)
+    assert [n for n, _ in result] == ["b", "d"] and result[0][1] > result[1][1]
+    assert len(knn.top_k(matrix, ids, unit(1, 0), 10, exclude=0)) == 3  # K capped, self left out
+    assert knn.top_k(matrix[:1], ids[:1], unit(1, 0), 5, exclude=0) == []
+    assert knn.top_k(matrix[:0], [], unit(1, 0), 5) == []
+
+
+def test_all_top_k_matches_top_k_row_by_row():
+    rng = np.random.default_rng(7)
+    ids = [f"f{i}" for i in range(40)]
+    matrix = knn.normalize(rng.normal(size=(40, 8)))
+
+    graph = knn.all_top_k(matrix, ids, 5, block=16)  # more than one block
+
+    for row, file_id in enumerate(ids):
+        expected = knn.top_k(matrix, ids, matrix[row], 5, exclude=row)
+        assert [n for n, _ in graph[file_id]] == [n for n, _ in expected]
+        assert file_id not in dict(graph[file_id])
+    assert knn.all_top_k(matrix[:1], ids[:1], 5) == {"f0": []}
+
+
+def test_merge_neighbor():
+    neighbors = [("a", 0.9), ("b", 0.5)]
+
+    assert knn.merge_neighbor(neighbors, "c", 0.7) == ([("a", 0.9), ("c", 0.7), ("b", 0.5)], True)
+    assert knn.merge_neighbor(neighbors, "b", 0.95) == ([("b", 0.95), ("a", 0.9)], True)  # moved up
+    assert knn.merge_neighbor(neighbors, "b", 0.50001) == (neighbors, False)  # same stored score
+    assert knn.merge_neighbor(neighbors, "c", 0.5, k=2) == (neighbors, False)  # a tie does not enter a full list
+    assert knn.merge_neighbor(neighbors, "c", 0.6, k=2) == ([("a", 0.9), ("c", 0.6)], True)
+
+
+def test_vector_index_upsert_remove_and_neighbors():
+    index = knn.VectorIndex()
+    for i in range(1500):  # past the initial capacity
+        index.upsert(f"f{i}", [1.0, i / 1500])
+    index.upsert("f0", [0.0, 1.0])  # re-embedded: same row
+
+    assert len(index.ids) == 1500 and index.positions["f0"] == 0
+    index.remove("f1")
+    assert "f1" not in index.positions and index.ids[index.positions["f1499"]] == "f1499"
+    assert index.neighbors([0.0, 1.0], 1) == [("f0", pytest.approx(1.0))]
+    assert index.neighbors([0.0, 1.0], 1, exclude_id="f0")[0][0] == "f1499"
+    with pytest.raises(ValueError):
+        index.upsert("other", [1.0, 0.0, 0.0])
+
+
+@pytest.fixture
+def graph(aws, monkeypatch):
+    _, table = aws
+    index = knn.VectorIndex()
+    index.sync = lambda table_name, version: None
+    monkeypatch.setattr(knn, "get_vector_index", lambda table_name: index)
+    monkeypatch.setattr(knn.db, "get_table_version", lambda table: 1)
+    for file_id, vector in {"a": [1, 0], "b": [0.8, 0.2], "c": [0, 1]}.items():
+        index.upsert(file_id, vector)
+    return table, index
+
+
+def test_insert_keeps_neighbours_merged_in_concurrently(graph):
+    table, _ = graph
+    # "late" was embedded by another server, which already merged itself into the new list
+    table.put_item(Item=knn.to_item("new", [("late", 0.999)], revision=3))
+
+    knn.insert_document(table, "new", [1, 0.1])
+
+    item = table.get_item(Key={"file_id": f"{knn.KNN_PREFIX}new"})["Item"]
+    assert [n for n, _ in knn.from_item(item)] == ["late", "a", "b", "c"]
+    assert item["revision"] == 4
+    a = table.get_item(Key={"file_id": f"{knn.KNN_PREFIX}a"})["Item"]
+    assert "new" in dict(knn.from_item(a))
+
+
+def test_update_is_redone_when_another_writer_got_in_between(graph):
+    table, _ = graph
+    table.put_item(Item=knn.to_item("a", [("b", 0.9)], revision=1))
+
+    class Racing:
+        """Table whose first conditional put loses against a concurrent merge."""
+
+        name = table.name
+        raced = False
+
+        def get_item(self, **kwargs):
+            return table.get_item(**kwargs)
+
+        def put_item(self, **kwargs):
+            if not self.raced:
+                self.raced = True
+                table.put_item(Item=knn.to_item("a", [("b", 0.9), ("x", 0.8)], revision=2))
+            return table.put_item(**kwargs)
+
+    assert knn.merge_into_list(Racing(), None, "a", "new", 0.85)
+
+    item = table.get_item(Key={"file_id": f"{knn.KNN_PREFIX}a"})["Item"]
+    assert knn.from_item(item) == [("b", 0.9), ("new", 0.85), ("x", 0.8)] and item["revision"] == 3
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+import artifacts
+import process_doc
+from local_bedrock import FakeBedrock, FakeClock
+from tests.unit.fake_lambda import LocalLambda
+from tests.unit.fake_pdf import make_pdf
+
+FILE_ID = "6f1c9a52-0000-4000-8000-000000000001"
+KEY = f"uploads/{FILE_ID}_scan.pdf"
+# Round 1 (the first 4 and last 5 pages) finds almost nothing, so the deep scan runs
+PAGES = ["cover"] * 4 + [f"Chapter {i}\n" + "findings about slow scanned pages " * 10 for i in range(52)] + ["end"] * 5
+SECONDS_PER_PAGE = 2.0  # a heavy scanned page
+
+
+@pytest.fixture
+def service(process_doc_aws, monkeypatch, tmp_path):
+    """process_doc in a LocalLambda with a 30 s timeout, over an in-memory bucket and table."""
+    s3_client, table = process_doc_aws
+    s3_client.put_object(Bucket="docs", Key=KEY, Body=make_pdf(PAGES))
+    clock = FakeClock()
+    fake = FakeBedrock(clock=clock, latency=1.0, chunk_latency=0.0)
+    runner = LocalLambda(process_doc.handler, clock, timeout=30)
+    read_page = artifacts.Extraction._read_page
+
+    def slow_read_page(extraction, i):
+        runner.spend(SECONDS_PER_PAGE)
+        return read_page(extraction, i)
+
+    def download(bucket, key):
+        path = str(tmp_path / os.path.basename(key))
+        s3_client.download_file(bucket, key, path)
+        return path
+
+    monkeypatch.setattr(artifacts.Extraction, "_read_page", slow_read_page)
+    monkeypatch.setattr(process_doc, "clock", clock)
+    monkeypatch.setattr(process_doc, "lambda_client", runner)
+    monkeypatch.setattr(process_doc, "FUNCTION_NAME", runner.function_name)
+    monkeypatch.setattr(process_doc, "download_file_from_s3_to_tmp", download)
+    monkeypatch.setattr(process_doc, "bedrock", process_doc.bedrock_client.BedrockClient(fake, clock=clock, sleep=clock.sleep))
+    monkeypatch.setattr(process_doc, "check_near_duplicate", lambda file_id, text: (None, None, 0.0))
+    monkeypatch.setattr(process_doc, "index_near_duplicate", lambda file_id, sig, match: None)
+    return runner, table, fake
+
+
+def s3_event():
+    return {"Records": [{"s3": {"bucket": {"name": "docs"}, "object": {"key": KEY, "sequencer": "0A1"}}}]}
+
+
+def test_one_invocation_times_out_without_a_record(service, monkeypatch):
+    runner, table, fake = service
+    # the extraction before checkpoints: no deadline, the whole deep scan in one go
+    extracted_text = process_doc.extracted_text
+    monkeypatch.setattr(process_doc, "extracted_text", lambda extraction, head=4, tail=5, **_: extracted_text(extraction, head, tail))
+
+    (_, response, _), = runner.run(s3_event())
+
+    assert response == "TIMEOUT"
+    assert table.get_item(Key={"file_id": FILE_ID})["Item"]["status"] == "PROCESSING"  # stuck
+
+
+def test_deep_scan_continues_across_invocations(service):
+    runner, table, fake = service
+
+    invocations = runner.run(s3_event())
+
+    assert len(invocations) > 1
+    assert all(response != "TIMEOUT" and seconds <= runner.timeout for _, response, seconds in invocations)
+    assert invocations[-1][1]["body"] == '"Processing complete."'
+    assert invocations[-1][0]["continue_extraction"]["deep_scan"]  # Round 1 was not asked again
+    item = table.get_item(Key={"file_id": FILE_ID})["Item"]
+    assert item["status"] == "AUTO_TAGGED" and item["ai_summary"]["retry_performed"]
+    assert "extraction_progress" not in item
+    assert fake.calls == 1  # Round 1 had too little text, only the deep scan asked the model
+    stored = artifacts.load(process_doc.s3_client, "docs", FILE_ID, process_doc.EXTRACTOR_VERSION)
+    assert len(stored["pages"]) == 40  # merged from every invocation's pages
+
+
+def test_progress_is_recorded_between_invocations(service):
+    runner, table, fake = service
+    runner.run(s3_event(), max_invocations=1)
+
+    item = table.get_item(Key={"file_id": FILE_ID})["Item"]
+    assert item["status"] == "PROCESSING" and item["lease_expires_at"] == 0
+    progress = item["extraction_progress"]
+    assert 0 < progress["pages_done"] < progress["pages_needed"] == 9 and progress["invocations"] == 1
+    assert runner.queue[0]["continue_extraction"]["continuation"] == 1
+
+
+def test_too_many_invocations_is_an_error(service, monkeypatch):
+    runner, table, fake = service
+    monkeypatch.setattr(process_doc, "MAX_CONTINUATIONS", 2)
+
+    invocations = runner.run(s3_event())
+
+    assert len(invocations) == 2 and isinstance(invocations[-1][1], RuntimeError)
+    assert table.get_item(Key={"file_id": FILE_ID})["Item"]["status"] == "ERROR"
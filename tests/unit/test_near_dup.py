@@ -0,0 +1,42 @@
+import random
+
+import near_dup
+
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def make_text(seed, words=800):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def revise(text, every=50):
+    """Change one word in `every`, like a revised version of the same paper."""
+    words = text.split()
+    return " ".join("revised" if i % every == 0 else w for i, w in enumerate(words))
+
+
+def test_versions_share_buckets_and_pass_the_threshold():
+    original = near_dup.signature(make_text(1))
+    revised = near_dup.signature(revise(make_text(1)))
+
+    assert near_dup.similarity(original, revised) >= near_dup.SIMILARITY_THRESHOLD
+    assert set(near_dup.bucket_keys(original)) & set(near_dup.bucket_keys(revised))
+
+
+def test_unrelated_documents_do_not_match():
+    a = near_dup.signature(make_text(1))
+    b = near_dup.signature(make_text(2))
+
+    assert near_dup.similarity(a, b) < 0.1
+    assert not set(near_dup.bucket_keys(a)) & set(near_dup.bucket_keys(b))
+
+
+def test_signature_is_stable_and_roundtrips():
+    text = make_text(3)
+    sig = near_dup.signature(text)
+
+    assert sig == near_dup.signature(text.upper())  # case-insensitive
+    assert near_dup.unpack(near_dup.pack(sig)) == sig
+    assert len(near_dup.bucket_keys(sig)) == near_dup.BANDS
+    assert near_dup.signature("") is None
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from utils import paging
+
+
+def frame(count):
+    return pd.DataFrame(
+        {
+            "file_id": [f"f{i}" for i in range(count)],
+            "file_name": [f"paper {i}.pdf" for i in range(count)],
+            "status": ["AUTO_TAGGED" if i % 2 else "NEEDS_REVIEW" for i in range(count)],
+            "uploaded_at": [pd.Timestamp("2026-01-01", tz="UTC") + pd.Timedelta(days=i) for i in range(count)],
+        }
+    )
+
+
+def test_page_bounds():
+    df = frame(55)
+
+    rows, page, page_count = paging.page_of(df, 2, 25)
+    assert (page, page_count) == (2, 3) and list(rows["file_id"]) == [f"f{i}" for i in range(25, 50)]
+    rows, page, _ = paging.page_of(df, 3, 25)
+    assert page == 3 and len(rows) == 5  # the last page is short
+    assert paging.page_of(df, 9, 25)[1:] == (3, 3)  # past the end: the last page
+    assert paging.page_of(df, 0, 25)[1:] == (1, 3)
+    rows, page, page_count = paging.page_of(frame(0), 4, 25)
+    assert rows.empty and (page, page_count) == (1, 1)
+
+
+def test_filter_and_sort():
+    df = frame(12)
+    df.loc[3, "uploaded_at"] = pd.NaT
+
+    rows = paging.filter_frame(df, " PAPER 1", ["AUTO_TAGGED"])
+    assert list(rows["file_id"]) == ["f1", "f11"]  # case-insensitive, statuses combined with AND
+    assert len(paging.filter_frame(df, "", None)) == 12
+
+    newest = paging.sort_frame(df, "uploaded_at", ascending=False)
+    assert list(newest["file_id"][:2]) == ["f11", "f10"] and newest["file_id"].iloc[-1] == "f3"  # missing last
+    assert paging.sort_frame(df, "no such column") is df
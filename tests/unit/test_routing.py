@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import process_doc
+import routing
+
+FILE_ID = "6f1c9a52-0000-4000-8000-000000000002"
+KEY = f"uploads/{FILE_ID}_paper.pdf"
+
+
+@pytest.fixture
+def aws(aws):
+    """The shared bucket and table, with the record of the file to route."""
+    _, table = aws
+    table.put_item(Item={"file_id": FILE_ID, "s3_key": KEY, "status": "AUTO_TAGGED"})
+    return aws
+
+
+def keys(s3_client):
+    return sorted(o["Key"] for o in s3_client.list_objects_v2(Bucket="docs").get("Contents", []))
+
+
+def test_routed_keys_stay_out_of_the_trigger_prefix():
+    assert routing.routed_key(FILE_ID, KEY, "CS/AI") == f"processed/CS/AI/{FILE_ID}_paper.pdf"
+    assert routing.routed_key(FILE_ID, KEY, "../uploads") == f"processed/uploads/{FILE_ID}_paper.pdf"
+    assert routing.routed_key(FILE_ID, "uploads/scan.pdf", None) == f"processed/Uncategorized/{FILE_ID}_scan.pdf"
+    assert routing.part_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+
+
+def test_move_copies_switches_then_deletes(aws):
+    s3_client, table = aws
+    s3_client.put_object(Bucket="docs", Key=KEY, Body=b"%PDF small")
+
+    destination, size = routing.move(s3_client, table, "docs", FILE_ID, KEY, "CS/AI")
+
+    assert keys(s3_client) == [destination] and size == 10
+    item = table.get_item(Key={"file_id": FILE_ID})["Item"]
+    assert item["s3_key"] == destination
+    assert item["updated_at"] == 1 and item["sync_shard"] == "ALL"  # the frontend's sync sees the move
+    assert routing.move(s3_client, table, "docs", FILE_ID, destination, "CS/AI") == (destination, 0)  # in place
+
+
+def test_large_objects_are_copied_in_parallel_parts(aws):
+    s3_client, table = aws
+    body = os.urandom(12 * 1024 * 1024)
+    s3_client.put_object(Bucket="docs", Key=KEY, Body=body)
+
+    destination, _ = routing.move(
+        s3_client, table, "docs", FILE_ID, KEY, "Physics", threshold=1024, part_size=5 * 1024 * 1024
+    )
+
+    assert s3_client.get_object(Bucket="docs", Key=destination)["Body"].read() == body
+    assert s3_client.head_object(Bucket="docs", Key=destination)["ETag"].endswith('-3"')  # 3 parts
+
+
+def test_deleted_meanwhile_drops_the_copy(aws):
+    s3_client, table = aws
+    s3_client.put_object(Bucket="docs", Key=KEY, Body=b"%PDF")
+    table.put_item(Item={"file_id": FILE_ID, "deleted": True})
+
+    with pytest.raises(routing.RoutingConflict):
+        routing.move(s3_client, table, "docs", FILE_ID, KEY, "CS/AI")
+
+    assert keys(s3_client) == [KEY]
+
+
+def test_routed_copies_never_trigger_the_pipeline(monkeypatch):
+    monkeypatch.setattr(process_doc, "process_object", lambda *a, **k: pytest.fail("processed a routed copy"))
+    event = {"Records": [{"s3": {"bucket": {"name": "docs"}, "object": {"key": f"processed/CS/{FILE_ID}_paper.pdf"}}}]}
+
+    assert process_doc.handler(event, None)["body"] == '"Not an upload, skipped."'
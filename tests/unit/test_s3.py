@@ -0,0 +1,23 @@
+import base64
+import json
+
+from utils import s3
+
+
+def policy_conditions(post):
+    return json.loads(base64.b64decode(post["fields"]["policy"]))["conditions"]
+
+
+def test_presigned_posts_pin_the_content_type(aws, monkeypatch):
+    s3_client, _ = aws
+    monkeypatch.setattr(s3, "get_bucket_name", lambda: "docs")
+    monkeypatch.setattr(s3, "get_s3_client", lambda: s3_client)
+
+    post = s3.create_presigned_post()
+    assert post["fields"]["Content-Type"] == "application/pdf"
+    conditions = policy_conditions(post)
+    assert {"Content-Type": "application/pdf"} in conditions
+    assert ["starts-with", "$key", s3.UPLOAD_PREFIX] in conditions
+
+    archive_post = s3.create_presigned_post(s3.ARCHIVE_PREFIX)
+    assert {"Content-Type": "application/octet-stream"} in policy_conditions(archive_post)
@@ -0,0 +1,96 @@
+import pytest
+
+from utils import db
+
+
+def item(file_id, updated_at, **fields):
+    return dict(fields, file_id=file_id, updated_at=updated_at)
+
+
+@pytest.fixture
+def snapshot():
+    """A snapshot synced up to sequence 100 with two files."""
+    snapshot = db.TableSnapshot()
+    snapshot.items = {"a": item("a", 90, status="AUTO_TAGGED"), "b": item("b", 100, status="AUTO_TAGGED")}
+    snapshot.token = 100
+    return snapshot
+
+
+def feed(monkeypatch, changes):
+    """Serve `changes` as the change feed, recording the `since` of each query."""
+    queries = []
+
+    def query_changes(table_name, since, columns):
+        queries.append(since)
+        return [c for c in changes if c["updated_at"] > since], 0.5
+
+    monkeypatch.setattr(db, "query_changes", query_changes)
+    return queries
+
+
+def test_tombstones_remove_the_file(snapshot, monkeypatch):
+    feed(monkeypatch, [item("b", 101, deleted=True)])
+
+    snapshot.apply_changes("docs")
+
+    assert set(snapshot.items) == {"a"} and snapshot.token == 101
+    generation, revision, items, removed = snapshot.changes_since(snapshot.generation, 0)
+    assert items == [] and removed == ["b"]
+    feed(monkeypatch, [item("c", 102, deleted=True)])
+    snapshot.apply_changes("docs")  # the tombstone of a file never listed
+    assert set(snapshot.items) == {"a"}
+
+
+def test_the_overlap_window_catches_late_writes(snapshot, monkeypatch):
+    # sequence 95 was taken before 100 but its write landed after the last sync
+    queries = feed(monkeypatch, [item("a", 95, status="REVIEWED"), item("b", 100, status="AUTO_TAGGED")])
+
+    snapshot.apply_changes("docs")
+
+    assert queries == [100 - db.SYNC_OVERLAP]
+    assert snapshot.items["a"]["status"] == "REVIEWED"
+    assert snapshot.token == 100  # a late write never moves the token back
+
+
+def test_a_write_lagging_behind_a_burst_is_still_read(snapshot, monkeypatch):
+    snapshot.history.append((0.0, 100))
+    # 200 writes since the last sync, the index has not caught up with sequence 150 yet
+    burst = [item(f"f{n}", n) for n in range(101, 301) if n != 150]
+    feed(monkeypatch, burst)
+    snapshot.apply_changes("docs", now=10.0)
+    assert snapshot.token == 300 and "f150" not in snapshot.items
+
+    queries = feed(monkeypatch, burst + [item("f150", 150)])  # behind the token by more than SYNC_OVERLAP
+    snapshot.apply_changes("docs", now=20.0)
+    assert queries == [100] and "f150" in snapshot.items
+
+    snapshot.apply_changes("docs", now=20.0 + db.SYNC_OVERLAP_SECONDS)
+    assert queries[-1] == 300 - db.SYNC_OVERLAP  # the window moved on
+
+
+def test_a_full_load_is_redone_periodically(snapshot):
+    snapshot.synced_at = snapshot.loaded_at = 1000.0
+
+    assert not snapshot.is_expired(1000.0 + db.FULL_REFRESH_SECONDS - 1)
+    assert snapshot.is_expired(1000.0 + db.FULL_REFRESH_SECONDS + 1)
+
+
+def test_deleting_a_file_that_never_existed_writes_nothing(aws, monkeypatch):
+    _, table = aws
+    monkeypatch.setattr(db, "get_table", lambda: table)
+
+    assert db.delete_file("no-such-file") is False
+    assert "Item" not in table.get_item(Key={"file_id": "no-such-file"})
+    assert db.get_table_version(table) == 0  # no sequence taken
+
+
+def test_a_file_is_deleted_once(aws, monkeypatch):
+    _, table = aws
+    monkeypatch.setattr(db, "get_table", lambda: table)
+    table.put_item(Item={"file_id": "f1", "status": "AUTO_TAGGED"})
+
+    assert db.delete_file("f1") is True
+    tombstone = table.get_item(Key={"file_id": "f1"})["Item"]
+    assert tombstone["deleted"] and tombstone["updated_at"] == db.get_table_version(table) == 1
+    assert db.delete_file("f1") is False
+    assert db.get_table_version(table) == 1
@@ -0,0 +1,83 @@
+import process_doc
+from utils import db
+
+
+class FakeDynamoDB:
+    """BatchGetItem that leaves the last `unprocessed` keys of a larger request unprocessed."""
+
+    def __init__(self, statuses, unprocessed=0, always_unprocessed=()):
+        self.statuses = statuses
+        self.unprocessed = unprocessed
+        self.always_unprocessed = set(always_unprocessed)  # throttled on every attempt
+        self.calls = []
+
+    def batch_get_item(self, RequestItems):
+        (table_name, request), = RequestItems.items()
+        keys = [key["file_id"] for key in request["Keys"]]
+        self.calls.append(keys)
+        left = [k for k in keys if k in self.always_unprocessed]
+        if self.unprocessed and len(keys) > self.unprocessed:
+            left += [k for k in keys[-self.unprocessed :] if k not in left]
+        items = [
+            {"file_id": k, "status": self.statuses[k]} for k in keys if k not in left and k in self.statuses
+        ]
+        response = {"Responses": {table_name: items}}
+        if left:
+            response["UnprocessedKeys"] = {table_name: dict(request, Keys=[{"file_id": k} for k in left])}
+        return response
+
+
+class FakeTable:
+    name = "docs"
+
+
+def test_statuses_are_read_in_chunks_and_unprocessed_keys_retried(monkeypatch):
+    file_ids = [f"f{i}" for i in range(250)]
+    fake = FakeDynamoDB({fid: "AUTO_TAGGED" for fid in file_ids[:240]}, unprocessed=5)
+    monkeypatch.setattr(db.resources, "get_dynamodb", lambda: fake)
+    monkeypatch.setattr(db, "get_table", lambda: FakeTable())
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+
+    statuses = db.get_statuses(file_ids)
+
+    assert [len(keys) for keys in fake.calls] == [100, 5, 100, 5, 50, 5]  # each chunk, then its retry
+    assert statuses["f0"] == "AUTO_TAGGED" and statuses["f99"] == "AUTO_TAGGED"
+    assert statuses["f245"] == "UPLOADED"  # not picked up by the pipeline yet
+
+
+def test_keys_still_unprocessed_after_the_retries_are_reported(monkeypatch):
+    fake = FakeDynamoDB({"a": "PROCESSING", "b": "PROCESSING"}, always_unprocessed=["b"])
+    monkeypatch.setattr(db.resources, "get_dynamodb", lambda: fake)
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+
+    items, unread = db.batch_get_items("docs", ["a", "b"], ("file_id", "status"))
+
+    assert items == [{"file_id": "a", "status": "PROCESSING"}] and unread == ["b"]
+    assert len(fake.calls) == db.MAX_RETRIES
+
+
+def test_set_status_records_each_transition(process_doc_aws):
+    _, table = process_doc_aws
+
+    assert process_doc.set_status("f1", "PROCESSING", "f1_a.pdf", "uploads/f1_a.pdf")
+    first = table.get_item(Key={"file_id": "f1"})["Item"]
+    assert process_doc.set_status("f1", "AUTO_TAGGED", "f1_a.pdf", "uploads/f1_a.pdf")
+    second = table.get_item(Key={"file_id": "f1"})["Item"]
+
+    assert (first["status"], first["updated_at"], first["sync_shard"]) == ("PROCESSING", 1, "ALL")
+    assert (second["status"], second["updated_at"]) == ("AUTO_TAGGED", 2)
+    assert second["upload_timestamp"] == first["upload_timestamp"]  # set once
+    counter = table.get_item(Key={"file_id": "__counter__#status"})["Item"]
+    assert counter["PROCESSING"] == 0 and counter["AUTO_TAGGED"] == 1
+
+
+def test_set_status_writes_nothing_when_its_condition_fails(process_doc_aws):
+    _, table = process_doc_aws
+    process_doc.set_status("f1", "PROCESSING", "f1_a.pdf", "uploads/f1_a.pdf", extra={"lease_owner": "run-1"})
+
+    moved = process_doc.set_status(
+        "f1", "ERROR", "f1_a.pdf", "uploads/f1_a.pdf", condition="#lease_owner = :owner", condition_values={":owner": "run-2"}
+    )
+
+    assert moved is False
+    assert table.get_item(Key={"file_id": "f1"})["Item"]["status"] == "PROCESSING"
@@ -0,0 +1,32 @@
+import status_stream
+
+
+def record(event_name, new=None, old=None):
+    def image(values):
+        if values is None:
+            return None
+        return {k: {"BOOL": v} if isinstance(v, bool) else {"S": v} for k, v in values.items()}
+
+    data = {k: v for k, v in (("NewImage", image(new)), ("OldImage", image(old))) if v is not None}
+    return {"eventName": event_name, "dynamodb": data}
+
+
+def test_transitions_are_published():
+    message = status_stream.status_change(
+        record("MODIFY", {"file_id": "f1", "status": "AUTO_TAGGED", "original_file_name": "f1_a.pdf"}, {"file_id": "f1", "status": "PROCESSING"})
+    )
+    assert message == {"file_id": "f1", "original_file_name": "f1_a.pdf", "status": "AUTO_TAGGED", "previous_status": "PROCESSING"}
+
+    first = status_stream.status_change(record("INSERT", {"file_id": "f1", "status": "PROCESSING"}))
+    assert first["status"] == "PROCESSING" and first["previous_status"] == "UPLOADED"
+
+    tombstone = status_stream.status_change(record("MODIFY", {"file_id": "f1", "deleted": True}, {"file_id": "f1", "status": "REVIEWED"}))
+    assert tombstone["status"] == "DELETED" and tombstone["previous_status"] == "REVIEWED"
+
+
+def test_other_writes_are_not():
+    same = {"file_id": "f1", "status": "AUTO_TAGGED"}
+    assert status_stream.status_change(record("MODIFY", dict(same, user_notes="x"), same)) is None  # an edit
+    assert status_stream.status_change(record("REMOVE", None, same)) is None  # TTL removal
+    assert status_stream.status_change(record("MODIFY", {"file_id": "__table_version__", "status": "x"})) is None
+    assert status_stream.status_change(record("INSERT", {"file_id": "f2"})) is None  # no status yet